@@ -0,0 +1,39 @@
+# 批量发布缓冲
+# 累计到max_size条样本，或最早一条样本已等待max_age毫秒时，整批作为一条消息发出
+import time
+
+
+class SampleBatcher:
+    def __init__(self, max_size=10, max_age=60000):
+        if max_size < 1:
+            raise ValueError('批量大小必须大于0')
+        self.max_size = max_size
+        self.max_age = max_age
+        self.timestamps = []
+        self.values = []
+        self._first_time = 0  # 批内第一条样本加入的时刻
+
+    def __len__(self):
+        return len(self.values)
+
+    # 加入一条样本，返回批次是否已满
+    def add(self, timestamp, value):
+        if not self.values:
+            self._first_time = time.ticks_ms()
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+        return len(self.values) >= self.max_size
+
+    # 批次是否应当发出: 已满，或最早样本等待时间达到max_age
+    def due(self, now=None):
+        if not self.values:
+            return False
+        if len(self.values) >= self.max_size:
+            return True
+        if now is None:
+            now = time.ticks_ms()
+        return time.ticks_diff(now, self._first_time) >= self.max_age
+
+    def clear(self):
+        self.timestamps.clear()
+        self.values.clear()
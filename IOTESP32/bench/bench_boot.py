@@ -0,0 +1,137 @@
+# 启动时间基准
+# 1. 模块导入: 在新进程中导入main.py的耗时(硬件替身预先导入，不计入)，以及按需导入的模块
+#    (asyncio、异步MQTT客户端、定时器采样、运行指标)在新进程中单独导入的耗时，即不用时省下的时间
+#    (主机CPython的数值，设备上从flash加载.py/.mpy的耗时不同，只用于比较)
+# 2. 仿真: 各模式分别以常规启动、快速启动首次(还没有网络参数缓存)和快速启动(使用上次写入的缓存)运行，
+#    输出启动计时记录中各阶段耗时和启动到第一次发布的总耗时，以及第一次发布之后补做的工作(finish_boot)耗时。
+#    WiFi的关联、扫描、DHCP和DNS耗时由network替身按--associate/--scan/--dhcp/--dns模拟(常规连接需要扫描、
+#    DHCP和DNS，快速启动用缓存的BSSID、静态IP和代理IP跳过)，MQTT CONNECT往返为--connect毫秒
+# 用法: python3 bench/bench_boot.py [--associate 150] [--scan 700] [--dhcp 400] [--dns 80] [--connect 50]
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HOST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host')
+sys.path.insert(0, HOST_DIR)
+from sim import Simulation
+
+import network
+from broker import BROKER
+from bench_e2e import VARIANTS
+from fast_boot import PHASES
+
+DEFERRED = (
+    ('asyncio', 'import asyncio'),
+    ('mqtt_async', 'import mqtt_async'),
+    ('timer_sampler', 'import timer_sampler'),
+    ('metrics', 'import metrics'),
+    ('tls', 'import tls'),
+)
+
+# 在新进程中执行一条导入语句，输出耗时(毫秒)；preload为True时先导入硬件替身(替身本身的导入不计入)
+IMPORT_SCRIPT = '''
+import sys, time
+sys.path.insert(0, {host!r})
+import hostenv
+hostenv.install()
+import config
+config.DEBUG = False
+if {preload}:
+    import broker, esp32, machine, micropython, neopixel, network, umqtt.simple
+import contextlib, io
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    {statement}
+print((time.perf_counter() - start) * 1000)
+'''
+
+STARTS = (
+    ('常规', False, False),
+    ('快速(首次)', True, False),
+    ('快速', True, True),
+)
+
+
+def import_ms(statement, runs, preload=False):
+    script = IMPORT_SCRIPT.format(host=HOST_DIR, statement=statement, preload=preload)
+    return min(float(subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                    check=True).stdout) for _ in range(runs))
+
+
+def boot(mode, args, fast, cache_file):
+    sim_mode, extra = VARIANTS[mode]
+    with Simulation(sim_mode, FAST_BOOT=fast, NET_CACHE_FILE=cache_file, BOOT_TOPIC=b'esp32/s3/boot', WIFI_CONNECT_TIMEOUT=10000,
+                    TEMP_SAMPLE_INTERVAL=1000, **extra) as sim:
+        main = sim.load()
+        network.connect_delay_ms = args.associate
+        network.scan_delay_ms = args.scan
+        network.dhcp_delay_ms = args.dhcp
+        network.dns_delay_ms = args.dns
+        BROKER.connect_latency = args.connect / 1000
+        finish_boot = main.finish_boot
+        after = []
+
+        def timed_finish_boot():
+            start = time.perf_counter()
+            result = finish_boot()
+            after.append((time.perf_counter() - start) * 1000)
+            return result
+
+        main.finish_boot = timed_finish_boot
+        sim.run(args.duration)
+        records = [json.loads(p) for _, _, p in BROKER.messages(main.BOOT_TOPIC)]
+        if not records:
+            raise RuntimeError(f'{mode}: 运行{args.duration}s内没有第一次发布')
+        record = records[0]
+        record['after_ms'] = after[0] if after else float('nan')
+        return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动到第一次发布的分阶段耗时基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--duration', type=float, default=3.0, help='每次启动的仿真运行时长(秒)')
+    parser.add_argument('--associate', type=int, default=150, help='WiFi关联耗时(毫秒)')
+    parser.add_argument('--scan', type=int, default=700, help='全信道扫描耗时(毫秒)，未指定BSSID的连接和刷新缓存时计入')
+    parser.add_argument('--dhcp', type=int, default=400, help='DHCP耗时(毫秒)，未使用静态IP时计入')
+    parser.add_argument('--dns', type=int, default=80, help='解析代理主机名的耗时(毫秒)')
+    parser.add_argument('--connect', type=int, default=50, help='MQTT CONNECT往返耗时(毫秒)')
+    parser.add_argument('--runs', type=int, default=5, help='导入耗时测量的进程数(取最小值)')
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    print(f'导入main.py: {import_ms("import main", args.runs, preload=True):.1f}ms (新进程，{args.runs}次取最小)')
+    print('按需导入的模块(单独导入的耗时，不用时省下):')
+    for name, statement in DEFERRED:
+        print(f'  {name:<16}{import_ms(statement, args.runs):>8.1f}ms')
+
+    print(f'\n仿真: 关联{args.associate}ms, 扫描{args.scan}ms, DHCP {args.dhcp}ms, DNS {args.dns}ms, '
+          f'MQTT连接{args.connect}ms')
+    print('{:<12}{:<12}'.format('模式', '启动') + ''.join(f'{p:>9}' for p in PHASES)
+          + '{:>9}{:>10}{:>10}'.format('总计', '快速WiFi', '之后ms'))
+    for mode in modes:
+        workdir = tempfile.mkdtemp(prefix='iotesp32-boot-')
+        try:
+            cache_file = os.path.join(workdir, 'net.bin')
+            for label, fast, cached in STARTS:
+                if not cached:
+                    for path in (cache_file, cache_file + '.tmp'):
+                        if os.path.exists(path):
+                            os.remove(path)
+                r = boot(mode, args, fast, cache_file)
+                phases = r['phases']
+                print(f'{mode:<12}{label:<12}' + ''.join(f'{phases.get(p, "-"):>9}' for p in PHASES)
+                      + f'{r["total"]:>9}{r["wifi_fast"]!s:>10}{r["after_ms"]:>10.1f}')
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print('(各阶段单位为毫秒，"-"表示并入下一阶段；之后ms: 第一次发布后finish_boot的耗时，'
+          '快速启动时含推迟的初始化和刷新缓存的扫描与DNS)')
+
+
+if __name__ == '__main__':
+    main()
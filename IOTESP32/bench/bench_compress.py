@@ -0,0 +1,132 @@
+# 压缩块(compress.py)的压缩率和编码耗时基准
+# 用接近实际运行的温度轨迹对比JSON批量消息、二进制帧和两种压缩块(delta/xor)的每样本字节数和编码耗时，
+# 并检查解码结果与编码前逐位一致(delta还原为0.01°C量化值，xor还原为float32值)。轨迹:
+#   定时器滤波: 定时器采样，间隔精确；片内温度读数(0.1°C分辨率、带噪声)经5点滑动平均
+#   主循环滤波: 主循环采样，每次间隔比设定值晚0~12ms；读数同上
+#   预热升温:   开机后芯片温度按指数曲线从25°C升到45°C，主循环采样、5点滑动平均
+#   未滤波:     主循环采样，不滤波的原始读数
+#   恒温变化报: 按变化上报时死区内的样本不发布，时间戳间隔不规则、数值按死区跳变
+# 编码耗时为主机CPython的数值，设备上的绝对值不同，只用于比较各格式的相对开销。
+# 用法: python3 bench/bench_compress.py [--batch 32] [--samples 20000] [--interval 15000]
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import compress
+import payload
+from temp_filter import build_chain
+
+DEVICE_ID = 'esp32_s3_temp_sensor'
+
+
+# 片内温度传感器读数: 真实温度加噪声，按0.1°C分辨率量化
+def reading(rng, true_temp):
+    return round(true_temp + rng.gauss(0, 0.15), 1)
+
+
+# 生成(时间戳列表, 温度列表)；jitter为主循环每次采样比设定间隔晚的最大毫秒数
+def trace(kind, n, interval, seed):
+    rng = random.Random(seed)
+    chain = build_chain('ma', 5) if kind != 'raw' else None
+    timestamps = []
+    values = []
+    t = rng.randrange(0, 1 << 30)
+    last = None
+    for i in range(n):
+        if kind == 'warmup':
+            true_temp = 45.0 - 20.0 * math.exp(-i * interval / 600000)
+        else:
+            true_temp = 38.0 + 1.5 * math.sin(i * interval / 86400000 * 2 * math.pi)
+        value = reading(rng, true_temp)
+        if chain is not None:
+            value = chain.update(value)
+        if kind == 'timer':
+            t += interval
+        else:
+            t += interval + rng.randrange(0, 13)
+        if kind == 'deadband':
+            # 死区0.2°C，心跳20个采样周期
+            if last is not None and abs(value - last[1]) < 0.2 and i - last[0] < 20:
+                continue
+            last = (i, value)
+        timestamps.append(t & 0xFFFFFFFF)
+        values.append(value)
+    return timestamps, values
+
+
+TRACES = (
+    ('定时器滤波', 'timer'),
+    ('主循环滤波', 'loop'),
+    ('预热升温', 'warmup'),
+    ('未滤波', 'raw'),
+    ('恒温变化报', 'deadband'),
+)
+
+
+def blocks(timestamps, values, batch):
+    return [(timestamps[i:i + batch], values[i:i + batch]) for i in range(0, len(values), batch)]
+
+
+# 编码全部批次，返回(总字节数, 每批编码耗时us)
+def measure(encode, batches, repeat):
+    total = sum(encode(ts, vs) for ts, vs in batches)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for ts, vs in batches:
+            encode(ts, vs)
+    elapsed = time.perf_counter() - start
+    return total, elapsed / (repeat * len(batches)) * 1e6
+
+
+def check_roundtrip(batches, mode):
+    for ts, vs in batches:
+        decoded = payload.decode(compress.encode_block(ts, vs, mode), b'esp32/s3/temperature/bin/' + DEVICE_ID.encode())
+        if decoded['timestamps'] != ts:
+            raise AssertionError('时间戳解码不一致')
+        if mode == compress.MODE_DELTA:
+            expected = [int(round(v * 100)) / 100 for v in vs]
+        else:
+            expected = [struct.unpack('!f', struct.pack('!f', v))[0] for v in vs]
+        if decoded['temperatures'] != expected:
+            raise AssertionError('数值解码不一致')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='时间序列压缩块的压缩率和编码耗时基准')
+    parser.add_argument('--batch', type=int, default=32, help='每条消息的样本数(与REPLAY_BATCH_SIZE一致，<=255)')
+    parser.add_argument('--samples', type=int, default=20000, help='每条轨迹的样本数')
+    parser.add_argument('--interval', type=int, default=15000, help='采样间隔(毫秒)')
+    parser.add_argument('--repeat', type=int, default=3, help='编码耗时的重复次数')
+    args = parser.parse_args()
+
+    buf = bytearray(max(compress.block_max_size(args.batch), payload.binary_frame_size(args.batch)))
+    formats = (
+        ('json', lambda ts, vs: len(payload.encode_json_batch(DEVICE_ID, ts, vs))),
+        ('binary', lambda ts, vs: payload.encode_binary_into(buf, ts, vs)),
+        ('delta', lambda ts, vs: compress.encode_block_into(buf, ts, vs, compress.MODE_DELTA)),
+        ('xor', lambda ts, vs: compress.encode_block_into(buf, ts, vs, compress.MODE_XOR)),
+    )
+
+    print(f'每条消息{args.batch}个样本，采样间隔{args.interval}ms，每条轨迹{args.samples}个样本')
+    print('{:<10}{:<8}{:>10}{:>12}{:>12}{:>14}'.format('轨迹', '格式', '字节/样本', '对JSON', '对二进制', '编码us/批'))
+    for label, kind in TRACES:
+        timestamps, values = trace(kind, args.samples, args.interval, 1)
+        batches = blocks(timestamps, values, args.batch)
+        for mode in (compress.MODE_DELTA, compress.MODE_XOR):
+            check_roundtrip(batches, mode)
+        sizes = {}
+        for name, encode in formats:
+            size, us = measure(encode, batches, args.repeat)
+            sizes[name] = size
+            print(f'{label:<10}{name:<8}{size / len(values):>10.2f}{sizes["json"] / size:>12.1f}x'
+                  f'{sizes.get("binary", size) / size:>11.1f}x{us:>14.1f}')
+    print('(对JSON/对二进制: 压缩比，编码耗时为主机CPython的数值；解码已逐位校验)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# 运行时配置基准
+# 1. 启动加载: ConfigStore.load()读取保存了全部运行时配置项的文件，对比从源码编译并执行config.py
+#    (设备上没有预编译.mpy时import config的主要开销)和导入已缓存字节码的config
+# 2. 保存: 一次原子保存(写临时文件再rename)的耗时和文件字节数
+# 3. 仿真: 各模式运行中经CONFIG_TOPIC/set把采样间隔从--from改为--to，统计消息到达代理到按新间隔采样的延迟、
+#    之后的平均采样间隔和期间的MQTT连接次数；对比重启的代价: init()耗时(WiFi关联耗时设为--associate毫秒)
+# 用法: python3 bench/bench_config.py [--duration 4] [--from 1000] [--to 200] [--associate 800]
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation
+
+import esp32
+import network
+from broker import BROKER
+from bench_e2e import VARIANTS
+import config
+from config_store import ConfigStore, SETTINGS
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+def bench_store(iterations):
+    values = {name: getattr(config, name) for name, _ in SETTINGS}
+    workdir = tempfile.mkdtemp(prefix='iotesp32-config-')
+    store = ConfigStore(os.path.join(workdir, 'config.bin'))
+    save_us = per_call_us(lambda: store.save(values), iterations)
+    size = os.path.getsize(store.path)
+    load_us = per_call_us(store.load, iterations)
+    assert store.load() == values
+    store.clear()
+    os.rmdir(workdir)
+
+    with open(config.__file__.replace('.pyc', '.py'), encoding='utf-8') as f:
+        source = f.read()
+    source_us = per_call_us(lambda: exec(compile(source, 'config.py', 'exec'), {}), iterations)
+    cached_us = per_call_us(lambda: importlib.reload(config), iterations)
+    return {'settings': len(values), 'bytes': size, 'load_us': load_us, 'save_us': save_us,
+            'source_us': source_us, 'cached_us': cached_us, 'source_bytes': len(source.encode())}
+
+
+def run(mode, args):
+    sim_mode, extra = VARIANTS[mode]
+    change_at = 1500
+    with Simulation(sim_mode, TEMP_SAMPLE_INTERVAL=args.interval_from, CONFIG_TOPIC=b'esp32/s3/config', **extra) as sim:
+        main = sim.load()
+        network.connect_delay_ms = args.associate
+        sim.configure(change_at, TEMP_SAMPLE_INTERVAL=args.interval_to)
+        begin = time.ticks_ms()
+        sim.run(args.duration)
+        init_ms = time.ticks_diff(sim.start, begin)
+        connects = BROKER.connects
+        reads = [sim.elapsed(t) for t in esp32.read_times]
+        after = [t for t in reads if t >= change_at]
+        gaps = [b - a for a, b in zip(after, after[1:])]
+        reports = [json.loads(p) for _, _, p in BROKER.messages(main.CONFIG_TOPIC)]
+        return {
+            'mode': mode,
+            'init_ms': init_ms,
+            'applied_ms': after[0] - change_at if after else float('nan'),
+            'interval': sum(gaps) / len(gaps) if gaps else float('nan'),
+            'ok': bool(reports) and reports[-1]['ok'],
+            'connects': connects,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行时配置加载、保存和在线生效基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--duration', type=float, default=4.0, help='每种配置的仿真运行时长(秒)')
+    parser.add_argument('--from', dest='interval_from', type=int, default=1000, help='修改前的采样间隔(毫秒)')
+    parser.add_argument('--to', dest='interval_to', type=int, default=200, help='修改后的采样间隔(毫秒)')
+    parser.add_argument('--associate', type=int, default=800, help='仿真WiFi关联耗时(毫秒，需小于仿真的WIFI_CONNECT_TIMEOUT)，计入重启代价')
+    parser.add_argument('--iterations', type=int, default=2000, help='加载和保存的循环次数')
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    r = bench_store(args.iterations)
+    print(f'配置文件: {r["settings"]}项 {r["bytes"]}字节, 加载 {r["load_us"]:.1f}us, 原子保存 {r["save_us"]:.1f}us')
+    print(f'config.py({r["source_bytes"]}字节): 编译并执行源码 {r["source_us"]:.1f}us, 导入已缓存字节码 {r["cached_us"]:.1f}us')
+
+    print(f'\n仿真: 第1.5s把采样间隔从{args.interval_from}ms改为{args.interval_to}ms，WiFi关联{args.associate}ms，'
+          f'每种配置运行{args.duration}s')
+    print('{:<12}{:>10}{:>12}{:>14}{:>8}{:>10}'.format('模式', '重启ms', '生效ms', '之后间隔ms', '成功', 'MQTT连接'))
+    for mode in modes:
+        r = run(mode, args)
+        print('{mode:<12}{init_ms:>10}{applied_ms:>12}{interval:>14.1f}{ok!s:>8}{connects:>10}'.format(**r))
+    print('(重启: init()耗时，含WiFi关联和MQTT连接；生效: 配置消息到达代理到第一次按新间隔采样)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# MQTT连接开销基准: 统计每小时(设备时间)的网络往返次数
+#   - 稳态: 代理收到的PINGREQ数、CONNECT尝试数和发布数，QoS1和QoS0分别统计
+#   - 代理宕机: 宕机期间的CONNECT尝试数(重连风暴)，以及宕机期间的采样数(主循环是否被重连拖住)
+# 时间按--scale压缩: 采样间隔、MQTT_PING_INTERVAL、MQTT重连退避(默认1s~60s)和宕机时长都乘以scale后在仿真中运行，
+# 结果再折算回设备时间。主循环中写死的时间常数不随之压缩。
+# 用法: python3 bench/bench_connection.py [--duration 15] [--scale 0.05] [--mode main_loop]
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation
+
+import esp32
+from broker import BROKER
+from bench_e2e import VARIANTS
+
+
+def simulation(mode, args, **overrides):
+    sim_mode, extra = VARIANTS[mode]
+    overrides.update(extra)
+    sim = Simulation(sim_mode, TEMP_SAMPLE_INTERVAL=max(100, int(args.sample_interval * args.scale)),
+                     MQTT_PING_INTERVAL=args.ping_interval * args.scale,
+                     MQTT_BACKOFF_MIN=max(1, int(1000 * args.scale)),
+                     MQTT_BACKOFF_MAX=max(1, int(60000 * args.scale)), **overrides)
+    sim.load()
+    BROKER.publish_latency = args.rtt
+    BROKER.ping_latency = args.rtt
+    return sim
+
+
+def per_hour(count, args):
+    return count * 3600 / (args.duration / args.scale)
+
+
+def bench_steady(mode, args, qos):
+    with simulation(mode, args, MQTT_QOS=qos) as sim:
+        sim.run(args.duration)
+        return {
+            'mode': mode,
+            'qos': qos,
+            'pings': per_hour(BROKER.pings, args),
+            'connects': per_hour(BROKER.connects + BROKER.refused, args),
+            'publishes': per_hour(len(BROKER.log), args),
+        }
+
+
+def bench_outage(mode, args):
+    outage_at = 1000
+    outage = int(args.outage * 1000 * args.scale)
+    with simulation(mode, args) as sim:
+        sim.broker_outage(outage_at, outage)
+        counts = {}
+        sim.at(outage_at, lambda: counts.update(before=BROKER.connects + BROKER.refused, reads=len(esp32.read_times)))
+        sim.at(outage_at + outage, lambda: counts.update(after=BROKER.connects + BROKER.refused,
+                                                         reads_after=len(esp32.read_times)))
+        sim.run((outage_at + outage) / 1000 + 3.0)
+        expected = outage / max(100, int(args.sample_interval * args.scale))
+        return {
+            'mode': mode,
+            'attempts': counts['after'] - counts['before'],
+            'reads': counts['reads_after'] - counts['reads'],
+            'expected': expected,
+            'connects': BROKER.connects,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MQTT连接往返开销基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--duration', type=float, default=15.0, help='稳态场景的仿真运行时长(秒)')
+    parser.add_argument('--scale', type=float, default=0.05, help='时间压缩系数: 仿真秒数/设备秒数')
+    parser.add_argument('--sample-interval', type=int, default=15000, help='设备上的采样间隔(毫秒)')
+    parser.add_argument('--ping-interval', type=float, default=30, help='设备上的MQTT_PING_INTERVAL(秒)')
+    parser.add_argument('--outage', type=float, default=120, help='代理宕机时长(设备秒数)')
+    parser.add_argument('--rtt', type=float, default=0.02, help='PUBACK和PINGRESP往返时长(秒)')
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    print(f'采样间隔{args.sample_interval}ms, ping间隔{args.ping_interval}s, 时间压缩{args.scale}, '
+          f'往返{args.rtt * 1000:.0f}ms (数值折算为每设备小时)')
+    print('{:<12}{:>6}{:>10}{:>10}{:>10}{:>10}'.format('模式', 'QoS', 'PINGREQ', 'CONNECT', '发布', '往返合计'))
+    for mode in modes:
+        for qos in (1, 0):
+            r = bench_steady(mode, args, qos)
+            # QoS0发布不等待确认，不计入往返
+            r['total'] = r['pings'] + r['connects'] + (r['publishes'] if qos else 0)
+            print('{mode:<12}{qos:>6}{pings:>10.0f}{connects:>10.0f}{publishes:>10.0f}{total:>10.0f}'.format(**r))
+
+    print(f'\n[代理宕机{args.outage:.0f}s] 宕机期间的CONNECT尝试数和采样数')
+    print('{:<12}{:>10}{:>10}{:>10}{:>10}'.format('模式', 'CONNECT', '采样数', '应采样', 'MQTT连接'))
+    for mode in modes:
+        r = bench_outage(mode, args)
+        print('{mode:<12}{attempts:>10}{reads:>10}{expected:>10.0f}{connects:>10}'.format(**r))
+
+
+if __name__ == '__main__':
+    main()
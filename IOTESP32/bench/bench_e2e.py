@@ -0,0 +1,199 @@
+# 端到端基准: 在仿真运行器(host/sim.py)上运行未修改的main.py，按三种配置分别统计
+#   main_loop / asyncio 为两种调度模式(umqtt.simple客户端)，mqtt_async 为asyncio模式加异步MQTT客户端，
+#   threads 为双线程模式(网络线程加实时线程，umqtt.simple客户端)
+#   - 发布吞吐: 稳态下代理每秒收到的样本数和消息数，以及断网积压样本恢复后的补发速率
+#   - 控制到LED延迟: 控制消息到达代理到LED写出对应颜色的时间
+#   - 控制突发: 模拟App滑块连续发送，统计每段突发最后一条消息生效的延迟和LED写出帧数
+#   - 断线恢复: WiFi掉线和代理宕机恢复后，到第一条样本送达和积压补发完毕各需多久，以及未送达的样本数
+# 用法: python3 bench/bench_e2e.py [--duration 6] [--publish-delay 0.02] [--mode mqtt_async] [--window 8]
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation, percentile
+
+import esp32
+from broker import BROKER
+
+
+# 配置名 -> (仿真调度模式, 额外配置)
+VARIANTS = {
+    'main_loop': ('main_loop', {}),
+    'asyncio': ('asyncio', {}),
+    'mqtt_async': ('asyncio', {'MQTT_CLIENT': 'async'}),
+    'threads': ('threads', {}),
+}
+
+
+def simulation(mode, args, **overrides):
+    sim_mode, extra = VARIANTS[mode]
+    overrides.update(extra)
+    if extra:
+        overrides['MQTT_INFLIGHT_WINDOW'] = args.window
+    sim = Simulation(sim_mode, **overrides)
+    sim.load()
+    BROKER.publish_latency = args.publish_delay
+    return sim
+
+
+# 稳态吞吐与积压补发速率: 采样间隔取下限100ms，中途断网outage毫秒
+def bench_throughput(mode, args):
+    outage_at = 1000
+    outage = 2000
+    with simulation(mode, args, TEMP_SAMPLE_INTERVAL=100, PUBLISH_BATCH_SIZE=args.batch_size,
+                    PUBLISH_BATCH_INTERVAL=1000) as sim:
+        sim.wifi_outage(outage_at, outage)
+        sim.run(args.duration)
+        samples = sim.samples()
+        messages = sim.messages()
+        restored = outage_at + outage
+        steady = [s for s in samples if sim.elapsed(s[0]) < outage_at or sim.elapsed(s[0]) > restored + 1000]
+        steady_time = outage_at / 1000 + max(0.0, args.duration - restored / 1000 - 1.0)
+        backlog = [s for s in samples if outage_at <= sim.elapsed(s[1]) < restored]
+        drain_ms = max((sim.elapsed(s[0]) - restored for s in backlog), default=0)
+        return {
+            'mode': mode,
+            'taken': len(esp32.read_times),
+            'delivered': len({s[1] for s in samples}),
+            'msgs': len(messages),
+            'bytes': sum(len(m[2]) for m in messages),
+            'rate': len(steady) / steady_time if steady_time else float('nan'),
+            'backlog': len(backlog),
+            'drain_rate': len(backlog) / (drain_ms / 1000) if drain_ms > 0 else float('nan'),
+        }
+
+
+def bench_latency(mode, args):
+    with simulation(mode, args, TEMP_SAMPLE_INTERVAL=500) as sim:
+        rng = random.Random(args.seed)
+        at_ms = 200
+        value = 1
+        while at_ms < args.duration * 1000 - 200 and value < 256:
+            sim.control(int(at_ms), r=value)
+            value += 1
+            at_ms += rng.expovariate(args.control_rate) * 1000
+        sim.run(args.duration)
+        latencies, lost = sim.control_latencies()
+        return {
+            'mode': mode,
+            'controls': len(sim.controls),
+            'lost': lost,
+            'mean': sum(latencies) / len(latencies) if latencies else float('nan'),
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else float('nan'),
+        }
+
+
+# 滑块拖动: 每秒一段突发，段内按burst_rate条/秒连续发送burst_size条消息
+def bench_burst(mode, args):
+    with simulation(mode, args, TEMP_SAMPLE_INTERVAL=500) as sim:
+        finals = []
+        value = 1
+        at_ms = 200.0
+        while at_ms < args.duration * 1000 - 500 and value + args.burst_size < 256:
+            for _ in range(args.burst_size):
+                sim.control(int(at_ms), r=value)
+                value += 1
+                at_ms += 1000 / args.burst_rate
+            finals.append(value - 1)
+            at_ms += 1000
+        frames_before = len(sim.frames())
+        sim.run(args.duration)
+        sent = dict((r, at) for at, r in sim.controls)
+        settle = []
+        for r in finals:
+            for t, pixels in sim.frames():
+                if r in sent and pixels[0][0] == r and sim.elapsed(t) >= sim.elapsed(sent[r]):
+                    settle.append(sim.elapsed(t) - sim.elapsed(sent[r]))
+                    break
+        return {
+            'mode': mode,
+            'msgs': len(sim.controls),
+            'frames': len(sim.frames()) - frames_before,
+            'settle_mean': sum(settle) / len(settle) if settle else float('nan'),
+            'settle_max': max(settle) if settle else float('nan'),
+            'stale': len(finals) - len(settle),
+        }
+
+
+# 故障恢复: kind为'wifi'或'broker'，outage_at毫秒处开始，持续outage毫秒
+def bench_recovery(mode, args, kind):
+    outage_at = 1000
+    outage = args.outage
+    restored = outage_at + outage
+    with simulation(mode, args, TEMP_SAMPLE_INTERVAL=200) as sim:
+        if kind == 'wifi':
+            sim.wifi_outage(outage_at, outage)
+        else:
+            sim.broker_outage(outage_at, outage)
+        sim.run(restored / 1000 + args.recovery_window)
+        samples = sim.samples()
+        after = [sim.elapsed(s[0]) - restored for s in samples if sim.elapsed(s[0]) >= restored]
+        backlog = [sim.elapsed(s[0]) - restored for s in samples if outage_at <= sim.elapsed(s[1]) < restored]
+        # 运行结束时仍在发布途中的样本不计入未送达: 只统计结束前500ms以前的采样，
+        # 采样时间戳记在读取温度之前，按50ms内有送达样本视为已送达
+        cutoff = int((restored / 1000 + args.recovery_window) * 1000) - 500
+        stamps = sorted(sim.elapsed(s[1]) for s in samples)
+        reads = [sim.elapsed(t) for t in esp32.read_times if sim.elapsed(t) < cutoff]
+        lost = sum(1 for r in reads if not any(r - 50 <= ts <= r for ts in stamps))
+        return {
+            'mode': mode,
+            'kind': kind,
+            'first': min(after) if after else float('nan'),
+            'drain': max(backlog) if backlog else float('nan'),
+            'taken': len(esp32.read_times),
+            'lost': lost,
+            'connects': BROKER.connects,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='固件端到端基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--duration', type=float, default=6.0, help='吞吐和延迟场景运行时长(秒)')
+    parser.add_argument('--publish-delay', type=float, default=0.02, help='PUBACK往返时长(秒)，umqtt客户端每次publish阻塞这么久')
+    parser.add_argument('--window', type=int, default=8, help='mqtt_async配置的在途QoS1消息窗口')
+    parser.add_argument('--batch-size', type=int, default=1, help='吞吐场景的PUBLISH_BATCH_SIZE')
+    parser.add_argument('--control-rate', type=float, default=5.0, help='控制消息平均速率(条/秒)')
+    parser.add_argument('--burst-size', type=int, default=20, help='控制突发场景每段的消息数')
+    parser.add_argument('--burst-rate', type=float, default=50.0, help='控制突发场景段内的发送速率(条/秒)')
+    parser.add_argument('--outage', type=int, default=2000, help='断线场景的故障持续时间(毫秒)')
+    parser.add_argument('--recovery-window', type=float, default=6.0, help='故障恢复后继续观察的时长(秒)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    print(f'PUBACK往返 {args.publish_delay * 1000:.0f}ms, 异步客户端窗口 {args.window}')
+    print(f'\n[发布吞吐] 采样间隔100ms, 批量{args.batch_size}, 第1s起断网2s, 运行{args.duration}s')
+    print('{:<12}{:>8}{:>8}{:>8}{:>10}{:>12}{:>8}{:>12}'.format(
+        '模式', '采样数', '送达数', '消息数', '字节数', '稳态样本/s', '积压', '补发样本/s'))
+    for mode in modes:
+        r = bench_throughput(mode, args)
+        print('{mode:<12}{taken:>8}{delivered:>8}{msgs:>8}{bytes:>10}{rate:>12.1f}{backlog:>8}{drain_rate:>12.1f}'.format(**r))
+
+    print(f'\n[控制到LED延迟] 控制消息 {args.control_rate}/s, 运行{args.duration}s')
+    print('{:<12}{:>8}{:>6}{:>10}{:>8}{:>8}{:>8}'.format('模式', '控制数', '丢失', '均值', 'p50', 'p99', '最大'))
+    for mode in modes:
+        r = bench_latency(mode, args)
+        print('{mode:<12}{controls:>8}{lost:>6}{mean:>10.1f}{p50:>8}{p99:>8}{max:>8}'.format(**r))
+
+    print(f'\n[控制突发] 每段{args.burst_size}条, 段内{args.burst_rate}条/秒, 运行{args.duration}s')
+    print('{:<12}{:>8}{:>8}{:>12}{:>10}{:>8}'.format('模式', '消息数', '写LED', '末条生效均值', '最大', '未生效'))
+    for mode in modes:
+        r = bench_burst(mode, args)
+        print('{mode:<12}{msgs:>8}{frames:>8}{settle_mean:>12.1f}{settle_max:>10}{stale:>8}'.format(**r))
+
+    print(f'\n[断线恢复] 采样间隔200ms, 第1s起故障{args.outage}ms, 恢复后观察{args.recovery_window}s')
+    print('{:<12}{:<8}{:>12}{:>12}{:>8}{:>8}{:>8}'.format('模式', '故障', '首条送达', '补发完毕', '采样数', '未送达', 'MQTT连接'))
+    for mode in modes:
+        for kind in ('wifi', 'broker'):
+            r = bench_recovery(mode, args, kind)
+            print('{mode:<12}{kind:<8}{first:>12}{drain:>12}{taken:>8}{lost:>8}{connects:>8}'.format(**r))
+    print('(时间单位: 毫秒，从故障恢复时刻起算)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# 温度滤波微基准，可在CPython和MicroPython unix移植上运行:
+#   python3 bench/bench_filter.py [--count 20000] [--seed 12345] [--windows 5 32] [--spike-every 97]
+#   micropython bench/bench_filter.py [--count 20000] ...
+# 对比原有的列表实现(append + pop(0) + sum)与temp_filter中各滤波器的单次更新耗时；
+# 在MicroPython上同时统计每次更新的堆分配字节数。MicroPython需安装micropython-lib的argparse。
+import argparse
+import sys
+import time
+
+try:
+    _here = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+except NameError:
+    _here = 'bench'
+sys.path.insert(0, _here + '/..')
+
+import gc
+import temp_filter
+
+if hasattr(time, 'ticks_us'):
+    def now_us():
+        return time.ticks_us()
+
+    def elapsed_us(start):
+        return time.ticks_diff(time.ticks_us(), start)
+else:
+    def now_us():
+        return time.perf_counter()
+
+    def elapsed_us(start):
+        return (time.perf_counter() - start) * 1000000
+
+
+# 原read_internal_temperature中的滑动平均实现，作为对照
+class ListMovingAverage:
+    def __init__(self, samples):
+        self.samples = samples
+        self.values = []
+
+    def reset(self):
+        self.values = []
+
+    def update(self, x):
+        self.values.append(x)
+        if len(self.values) > self.samples:
+            self.values.pop(0)
+        if len(self.values) >= self.samples:
+            return sum(self.values) / len(self.values)
+        return x
+
+
+def make_input(n, seed=12345, spike_every=97):
+    # 确定性的带尖峰温度序列，不依赖random模块；spike_every为0时不加尖峰
+    values = []
+    for i in range(n):
+        seed = (seed * 1103515245 + 12345) & 0x7FFFFFFF
+        noise = (seed % 1000) / 1000 - 0.5
+        value = 42.0 + noise * 0.4
+        if spike_every and i % spike_every == 0:
+            value += 8.0
+        values.append(value)
+    return values
+
+
+def bench(name, f, values):
+    f.reset()
+    # 预热，使环形缓冲区进入稳态
+    for v in values[:64]:
+        f.update(v)
+    has_mem = hasattr(gc, 'mem_alloc')
+    gc.collect()
+    if has_mem:
+        gc.disable()
+        before = gc.mem_alloc()
+    start = now_us()
+    for v in values:
+        f.update(v)
+    us = elapsed_us(start)
+    alloc = None
+    if has_mem:
+        alloc = gc.mem_alloc() - before
+        gc.enable()
+    per_update = us / len(values)
+    alloc_text = '{:.1f}'.format(alloc / len(values)) if alloc is not None else 'n/a'
+    print('{:<20}{:>12.3f}{:>14}'.format(name, per_update, alloc_text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='温度滤波器单次更新耗时与堆分配微基准')
+    parser.add_argument('--count', type=int, default=20000, help='每个滤波器的更新次数')
+    parser.add_argument('--seed', type=int, default=12345, help='输入序列的随机种子')
+    parser.add_argument('--windows', type=int, nargs='+', default=[5, 32], help='滑动平均的窗口大小')
+    parser.add_argument('--spike-every', type=int, default=97, help='每隔多少个样本加一个+8°C尖峰，0表示不加')
+    args = parser.parse_args()
+    values = make_input(args.count, args.seed, args.spike_every)
+    print('{}次更新, 种子{}, 尖峰间隔{}'.format(args.count, args.seed, args.spike_every))
+    print('{:<20}{:>12}{:>14}'.format('滤波器', 'us/次', '分配B/次'))
+    for window in args.windows:
+        bench('list ma n={}'.format(window), ListMovingAverage(window), values)
+        bench('ring ma n={}'.format(window), temp_filter.MovingAverage(window), values)
+    bench('ema', temp_filter.ExponentialMovingAverage(0.3), values)
+    bench('median n=5', temp_filter.Median(5), values)
+    bench('kalman', temp_filter.Kalman(0.01, 0.5), values)
+    bench('median,ema', temp_filter.build_chain('median,ema'), values)
+
+
+main()
@@ -0,0 +1,96 @@
+# 虚拟设备集群负载基准
+# 用host/fleet.py在一个进程中运行N台虚拟设备(载荷、控制处理和重连逻辑与固件相同)，
+# 一个订阅全部温度主题的消费者代替看板，统计:
+#   - 吞吐: 消费者每秒收到的样本数和消息数
+#   - 端到端延迟: 设备采样到消费者收到的p50/p90/p99/最大值(毫秒)，含在途窗口等待、断线积压和补发
+#   - PUBACK往返(QoS1)、控制消息从发出到设备合并生效的延迟、重连次数、重复和未到达的样本数
+# 先按--devices中的各设备数运行稳态，再以最后一个设备数运行故障场景:
+# 第--drop-at秒断开--drop比例的设备，第--outage-at秒代理宕机--outage毫秒(仅进程内代理)。
+# 默认使用进程内代理替身；--broker host:port连接外部代理(如mosquitto，看板经WebSocket连接同一代理)，
+# 此时跳过代理宕机。单进程单核运行，设备数和采样率很高时瓶颈是本进程的CPU，结果应与CPU占用一起看。
+# 用法: python3 bench/bench_fleet.py [--devices 100,500,1000] [--interval 1000] [--duration 10]
+#                                    [--qos 1] [--format json] [--control-rate 50] [--broker 127.0.0.1:1883]
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from fleet import Fleet
+
+
+# 每台设备一个TCP连接(进程内代理时两端都在本进程，占两个文件描述符)
+def raise_nofile(devices):
+    need = devices * 2 + 256
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < need:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (need if hard == resource.RLIM_INFINITY else min(need, hard), hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0] >= need
+
+
+def run(args, devices, faults=False):
+    host, port = None, 1883
+    if args.broker:
+        host, _, port = args.broker.partition(':')
+        port = int(port or 1883)
+    fleet = Fleet(devices=devices, interval=args.interval, jitter=args.jitter, qos=args.qos,
+                  payload_format=args.format, control_rate=args.control_rate, ramp=args.ramp,
+                  host=host, port=port, seed=args.seed)
+    if faults:
+        fleet.drop_devices(args.drop_at * 1000, args.drop)
+        if not args.broker:
+            fleet.broker_outage(args.outage_at * 1000, args.outage)
+    cpu = time.process_time()
+    report = asyncio.run(fleet.run(args.duration, args.drain))
+    report['cpu'] = (time.process_time() - cpu) / report['elapsed'] * 100
+    report['scenario'] = '故障' if faults else '稳态'
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='虚拟设备集群的吞吐和端到端延迟基准')
+    parser.add_argument('--devices', default='100,500,1000', help='设备数，逗号分隔')
+    parser.add_argument('--interval', type=int, default=1000, help='每台设备的采样间隔(毫秒)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='采样间隔的相对抖动(0.2表示±20%%)')
+    parser.add_argument('--duration', type=float, default=10.0, help='每个场景的运行时长(秒)')
+    parser.add_argument('--drain', type=float, default=3.0, help='停止采样后等待积压到达的最长时间(秒)')
+    parser.add_argument('--ramp', type=int, default=1000, help='设备随机错开上线的时间范围(毫秒)')
+    parser.add_argument('--qos', type=int, choices=(0, 1), default=1, help='温度消息的QoS')
+    parser.add_argument('--format', choices=('json', 'binary'), default='json', help='载荷格式')
+    parser.add_argument('--control-rate', type=float, default=50, help='每秒发给随机设备的控制消息数，0表示不发')
+    parser.add_argument('--drop', type=float, default=0.2, help='故障场景中强制断开的设备比例')
+    parser.add_argument('--drop-at', type=float, default=3.0, help='强制断开的时刻(秒)')
+    parser.add_argument('--outage', type=int, default=1000, help='故障场景中代理宕机时长(毫秒)，0表示不宕机')
+    parser.add_argument('--outage-at', type=float, default=6.0, help='代理宕机的时刻(秒)')
+    parser.add_argument('--no-faults', action='store_true', help='不运行故障场景')
+    parser.add_argument('--broker', help='外部代理host:port，缺省使用进程内代理替身')
+    parser.add_argument('--seed', type=int, default=1, help='随机数种子')
+    args = parser.parse_args()
+    counts = [int(n) for n in args.devices.split(',')]
+    if not raise_nofile(max(counts)):
+        print(f'警告: 文件描述符上限不足{max(counts) * 2 + 256}，部分设备可能无法连接')
+    if not args.outage:
+        args.outage_at = args.duration + 1
+
+    print(f'采样间隔{args.interval}ms±{args.jitter:.0%}, QoS{args.qos}, {args.format}, '
+          f'控制消息{args.control_rate:g}条/s, 每个场景{args.duration:g}s, '
+          f'代理: {args.broker or "进程内替身"}')
+    print('{:<6}{:>7}{:>10}{:>9}{:>8}{:>8}{:>8}{:>8}{:>8}{:>9}{:>9}{:>7}{:>6}{:>7}{:>6}'.format(
+        '场景', '设备', '样本/s', '消息/s', 'p50', 'p90', 'p99', 'max', 'ack', '控制p50', '控制p99',
+        '重连', '重复', '未到达', 'CPU%'))
+    scenarios = [(n, False) for n in counts]
+    if not args.no_faults:
+        scenarios.append((counts[-1], True))
+    for devices, faults in scenarios:
+        r = run(args, devices, faults)
+        print('{scenario:<6}{devices:>7}{samples_per_s:>10.0f}{messages_per_s:>9.0f}{p50:>8.1f}{p90:>8.1f}'
+              '{p99:>8.1f}{max:>8.0f}{ack_avg:>8.1f}{control_p50:>9.1f}{control_p99:>9.1f}'
+              '{reconnects:>7}{duplicates:>6}{lost:>7}{cpu:>6.0f}'.format(**r))
+    print('(延迟单位为毫秒；ack: QoS1平均PUBACK往返；控制: 发出到设备合并生效，受CONTROL_POLL_INTERVAL影响；'
+          '未到达: 排空后仍未被消费者收到的样本，代理宕机时消费者同样断开，宕机前后转发的消息会丢失)')
+
+
+if __name__ == '__main__':
+    main()
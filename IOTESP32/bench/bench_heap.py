@@ -0,0 +1,76 @@
+# 稳态堆分配与GC基准
+# 在仿真中以tracemalloc近似gc.mem_alloc()，运行采样发布和持续的LED控制消息，统计main.heap的:
+#   - 主循环每轮分配的字节数(平均/最大)和零分配轮数，以及全程分配速率
+#   - 显式GC(GC_MODE='idle'时在休眠前回收)的次数和暂停时长、检测到的自动GC次数、已用堆高水位
+# CPython的浮点数、元组和小字典经空闲链表复用，不计入分配；设备上请以monitor_network_status输出的堆统计为准。
+# 有主循环轮次的配置(main_loop、threads)按--budget检查每轮平均分配，任一配置超出预算时以非零状态退出，可作为分配回归检查。
+# 用法: python3 bench/bench_heap.py [--duration 5] [--format json] [--budget 1024]
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation
+
+from broker import BROKER
+from bench_e2e import VARIANTS
+
+
+def run(mode, args):
+    sim_mode, extra = VARIANTS[mode]
+    budget = args.budget if args.budget and sim_mode != 'asyncio' else None
+    with Simulation(sim_mode, trace_heap=True, heap_budget=budget, TEMP_SAMPLE_INTERVAL=args.sample_interval,
+                    PAYLOAD_FORMAT=args.format, GC_COLLECT_THRESHOLD=args.threshold, **extra) as sim:
+        sim.load()
+        BROKER.publish_latency = args.publish_delay
+        at_ms = 300
+        value = 1
+        while at_ms < args.duration * 1000 - 300:
+            sim.control(at_ms, r=value, g=255 - value, b=value * 3 % 256, brightness=0.5)
+            value = value % 254 + 1
+            at_ms += 1000 / args.control_rate
+        failure = None
+        try:
+            sim.run(args.duration)
+        except AssertionError as e:
+            failure = f'{mode}: {e}'
+        stats = sim.main.heap.stats()
+        stats['failure'] = failure
+        stats['mode'] = mode
+        stats['samples'] = len(sim.samples())
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='稳态堆分配与GC基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--duration', type=float, default=5.0, help='每种配置的仿真运行时长(秒)')
+    parser.add_argument('--sample-interval', type=int, default=200, help='采样间隔(毫秒)')
+    parser.add_argument('--control-rate', type=float, default=4.0, help='LED控制消息速率(条/秒)')
+    parser.add_argument('--publish-delay', type=float, default=0.0, help='QoS1发布等待PUBACK的时长(秒)')
+    parser.add_argument('--format', choices=('json', 'binary'), default='json', help='载荷格式')
+    parser.add_argument('--threshold', type=int, default=16384, help='GC_COLLECT_THRESHOLD(字节)')
+    parser.add_argument('--budget', type=int, default=1024, help='主循环每轮平均分配的上限(字节)，0表示不检查')
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    print(f'采样间隔{args.sample_interval}ms, 控制消息{args.control_rate}/s, {args.format}载荷, '
+          f'回收阈值{args.threshold}B, 每种配置运行{args.duration}s')
+    print('{:<12}{:>8}{:>10}{:>10}{:>10}{:>10}{:>8}{:>10}{:>10}{:>8}{:>10}'.format(
+        '模式', '轮数', '零分配', '每轮均值', '每轮最大', '速率B/s', '显式GC', '暂停均值', '暂停最大', '自动GC', '样本'))
+    failures = []
+    for mode in modes:
+        r = run(mode, args)
+        print('{mode:<12}{iterations:>8}{clean:>10}{alloc_avg:>10}{alloc_max:>10}{alloc_rate:>10}{collects:>8}'
+              '{pause_avg:>10}{pause_max:>10}{auto_gcs:>8}{samples:>10}'.format(**r))
+        if r['failure']:
+            failures.append(r['failure'])
+    print('(分配单位: 字节，暂停单位: 微秒；轮数只统计main_loop和threads的实时线程)')
+    if failures:
+        raise SystemExit('分配超出预算:\n' + '\n'.join(failures))
+    if args.budget:
+        print(f'每轮平均分配均未超出预算{args.budget}B')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# 入库服务和时序存储基准
+# 1. 追加: --devices个序列共--points个点，按每次1点(逐条消息)和--batch点(补发批次)追加，统计点/秒；
+#    段写满时的封存(计算并写出各分辨率汇总)计入耗时
+# 2. 解码入库: IngestService.handle处理预先编码的消息(JSON单条、二进制单条、JSON批量)，不经网络，统计消息/秒和点/秒
+# 3. 经MQTT: 发布端以QoS0向进程内代理替身连续发布--mqtt条JSON单条消息，入库服务经TCP接收，统计到全部入库的速率
+# 4. 查询: 单个序列--series-points个点(间隔--step毫秒)，不同时间跨度按--width像素降采样，
+#    对比使用汇总和强制读取原始点的耗时(各--queries次随机窗口的中位数和最大值)，以及重新打开序列的耗时
+# 用法: python3 bench/bench_ingest.py [--points 5000000] [--devices 100] [--series-points 2000000] [--width 800]
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+import hostenv
+hostenv.install()
+
+import network
+from broker import BROKER
+from ingest import IngestService, TEMP_TOPIC
+from mqtt_async import MQTTClient
+from payload import encode_binary, encode_json_batch
+from sim import percentile
+from tsdb import TimeSeriesStore, Series, SEGMENT_CAPACITY
+
+START = 1700000000000  # 模拟数据的起始时刻(毫秒)
+SPANS = (
+    ('10分钟', 600000),
+    ('1小时', 3600000),
+    ('1天', 86400000),
+    ('7天', 7 * 86400000),
+    ('全部', None),
+)
+
+
+def walk(n, seed=0):
+    rand = random.Random(seed)
+    values = []
+    v = 25.0
+    for _ in range(n):
+        v += rand.gauss(0, 0.05)
+        values.append(round(v, 2))
+    return values
+
+
+def bench_append(args, batch):
+    workdir = tempfile.mkdtemp(prefix='iotesp32-tsdb-')
+    per_device = args.points // args.devices
+    values = walk(per_device)
+    timestamps = [START + i * args.step for i in range(per_device)]
+    names = [f'dev{i:05d}' for i in range(args.devices)]
+    try:
+        with TimeSeriesStore(workdir) as store:
+            begin = time.perf_counter()
+            # 各设备轮流写入，与多台设备同时在线一致
+            for i in range(0, per_device, batch):
+                ts = timestamps[i:i + batch]
+                vs = values[i:i + batch]
+                for name in names:
+                    store.append(name, ts, vs)
+            store.flush()
+            elapsed = time.perf_counter() - begin
+        size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(workdir) for f in files)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return per_device * args.devices / elapsed, size
+
+
+def bench_decode(args):
+    rows = []
+    t0 = 1000
+    cases = (
+        ('JSON单条', lambda i: (TEMP_TOPIC, json.dumps({'temperature': 25.5, 'timestamp': t0 + i,
+                                                        'device_id': f'dev{i % args.devices:05d}',
+                                                        'unit': '°C'}).encode()), 1),
+        ('二进制单条', lambda i: (TEMP_TOPIC + f'/bin/dev{i % args.devices:05d}'.encode(),
+                                encode_binary([t0 + i], [25.5])), 1),
+        (f'JSON批量{args.batch}条', lambda i: (TEMP_TOPIC, encode_json_batch(
+            f'dev{i % args.devices:05d}', [t0 + i * args.batch + k for k in range(args.batch)],
+            [25.5] * args.batch)), args.batch),
+    )
+    for label, make, per_message in cases:
+        count = max(1, args.decode_points // per_message)
+        messages = [make(i) for i in range(count)]
+        workdir = tempfile.mkdtemp(prefix='iotesp32-ingest-')
+        try:
+            with TimeSeriesStore(workdir) as store:
+                service = IngestService(store)
+                begin = time.perf_counter()
+                for topic, msg in messages:
+                    service.handle(topic, msg)
+                elapsed = time.perf_counter() - begin
+                assert service.samples == count * per_message
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        rows.append((label, count / elapsed, count * per_message / elapsed))
+    return rows
+
+
+async def bench_mqtt(args):
+    network.reset()
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    wlan.connect()
+    BROKER.reset()
+    server = await BROKER.serve()
+    host, port = server.sockets[0].getsockname()[:2]
+    workdir = tempfile.mkdtemp(prefix='iotesp32-ingest-')
+    store = TimeSeriesStore(workdir)
+    service = IngestService(store, host, port)
+    task = asyncio.create_task(service.run())
+    publisher = MQTTClient(b'bench-publisher', host, port)
+    try:
+        while not service.client.isconnected():
+            await asyncio.sleep(0.01)
+        await publisher.connect()
+        messages = [json.dumps({'temperature': 25.5, 'timestamp': 1000 + i, 'device_id': f'dev{i % args.devices:05d}',
+                                'unit': '°C'}).encode() for i in range(args.mqtt)]
+        begin = time.perf_counter()
+        for i, msg in enumerate(messages):
+            publisher.publish(TEMP_TOPIC, msg)
+            if i % 256 == 255:
+                await publisher._writer.drain()
+                await asyncio.sleep(0)
+        deadline = time.perf_counter() + 60
+        while service.samples < args.mqtt and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - begin
+        return service.samples, service.samples / elapsed
+    finally:
+        publisher.disconnect()
+        task.cancel()
+        service.client.disconnect()
+        server.close()
+        store.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        BROKER.log.clear()
+
+
+def bench_query(args):
+    workdir = tempfile.mkdtemp(prefix='iotesp32-tsdb-')
+    path = os.path.join(workdir, 'dev')
+    n = args.series_points
+    rand = random.Random(1)
+    try:
+        series = Series(path)
+        values = walk(n, 1)
+        for i in range(0, n, 4096):
+            series.append([START + j * args.step for j in range(i, min(n, i + 4096))], values[i:i + 4096])
+        series.close()
+        begin = time.perf_counter()
+        series = Series(path)
+        open_ms = (time.perf_counter() - begin) * 1000
+        end_all = START + n * args.step
+        rows = []
+        for label, span in SPANS:
+            span = min(span or end_all - START, end_all - START)
+            timings = {'auto': [], 'raw': []}
+            resolution = returned = 0
+            for _ in range(args.queries):
+                start = START + rand.randrange(0, end_all - START - span + 1)
+                for mode in timings:
+                    begin = time.perf_counter()
+                    resolution_used, points = series.query(start, start + span, args.width,
+                                                           0 if mode == 'raw' else None)
+                    timings[mode].append((time.perf_counter() - begin) * 1000)
+                    if mode == 'auto':
+                        resolution, returned = resolution_used, len(points)
+            rows.append((label, span // args.step, resolution, returned,
+                         percentile(timings['auto'], 50), max(timings['auto']),
+                         percentile(timings['raw'], 50)))
+        series.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return open_ms, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='入库服务和时序存储的写入速率与降采样查询延迟基准')
+    parser.add_argument('--points', type=int, default=5000000, help='追加基准的总点数')
+    parser.add_argument('--devices', type=int, default=100, help='设备(序列)数')
+    parser.add_argument('--batch', type=int, default=32, help='批量追加/批量消息的点数(与REPLAY_BATCH_SIZE一致)')
+    parser.add_argument('--step', type=int, default=1000, help='模拟数据的采样间隔(毫秒)')
+    parser.add_argument('--decode-points', type=int, default=500000, help='解码入库基准每种消息的点数')
+    parser.add_argument('--mqtt', type=int, default=100000, help='经MQTT入库的消息数，0表示跳过')
+    parser.add_argument('--series-points', type=int, default=2000000, help='查询基准序列的点数')
+    parser.add_argument('--width', type=int, default=800, help='图表像素宽度')
+    parser.add_argument('--queries', type=int, default=20, help='每种时间跨度的查询次数')
+    args = parser.parse_args()
+
+    print(f'追加: {args.devices}个序列共{args.points}点，每段{SEGMENT_CAPACITY}点')
+    for batch in (1, args.batch):
+        rate, size = bench_append(args, batch)
+        print(f'  每次{batch:>3}点: {rate:>12,.0f} 点/s, 磁盘 {size / args.points:.1f} 字节/点')
+
+    print('\n解码入库(IngestService.handle，不经网络):')
+    for label, msg_rate, point_rate in bench_decode(args):
+        print(f'  {label:<12}{msg_rate:>12,.0f} 消息/s{point_rate:>12,.0f} 点/s')
+
+    if args.mqtt:
+        received, rate = asyncio.run(bench_mqtt(args))
+        print(f'\n经MQTT(进程内代理替身，QoS0): {received}/{args.mqtt}条入库, {rate:,.0f} 消息/s')
+
+    open_ms, rows = bench_query(args)
+    print(f'\n查询: 单序列{args.series_points}点(间隔{args.step}ms)，宽度{args.width}像素，重新打开序列 {open_ms:.1f}ms')
+    print('{:<8}{:>10}{:>10}{:>8}{:>12}{:>12}{:>14}'.format('跨度', '原始点数', '分辨率ms', '像素点', '耗时p50 ms',
+                                                            '最大 ms', '读原始点 ms'))
+    for label, points, resolution, returned, p50, worst, raw in rows:
+        print(f'{label:<8}{points:>10}{resolution:>10}{returned:>8}{p50:>12.2f}{worst:>12.2f}{raw:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# LED动画引擎基准
+# 1. 单帧渲染耗时: 灯带长度1-300，各效果(solid/breathe/rainbow/chase和过渡)由LedAnimator查表写入buf的耗时，
+#    对比逐像素浮点计算加gamma、再以元组赋值led[i]的朴素实现(原update_led的写法)；只计渲染，不含驱动写出
+# 2. 仿真: 各模式在呼吸效果下运行，统计实际动画帧率与目标帧率、迟到帧数、单帧耗时，
+#    以及采样间隔相对配置周期的抖动(与不开动画对比)
+# 用法: python3 bench/bench_leds.py [--fps 30] [--duration 4] [--frames 200]
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation
+
+import esp32
+import neopixel
+from bench_e2e import VARIANTS
+from bench_scheduler import sample_jitter
+from led_effects import LedAnimator
+
+LENGTHS = (1, 8, 30, 60, 150, 300)
+EFFECTS = ('solid', 'breathe', 'rainbow', 'chase', 'fade')
+
+
+# 只填充buf、不记录帧的灯带，用于测量纯渲染耗时
+class Strip(neopixel.NeoPixel):
+    def write(self):
+        pass
+
+
+# 朴素实现: 每帧每个像素用浮点计算颜色、gamma和亮度，再以元组写入
+def naive_frame(strip, n, effect, t, period, gamma=2.2, brightness=0.5):
+    phase = (t % period) / period
+    for i in range(n):
+        r, g, b = 255, 64, 0
+        if effect == 'breathe':
+            level = (1 - math.cos(2 * math.pi * phase)) / 2
+            r, g, b = r * level, g * level, b * level
+        elif effect == 'rainbow':
+            h = (phase + i / n) % 1.0 * 3
+            sector = int(h)
+            x = (h - sector) * 255
+            r, g, b = ((255 - x, x, 0), (0, 255 - x, x), (x, 0, 255 - x))[sector]
+        elif effect == 'chase':
+            dist = (int(phase * n) - i) % n
+            level = (255, 96, 32, 8)[dist] / 255 if dist < 4 else 0
+            r, g, b = r * level, g * level, b * level
+        elif effect == 'fade':
+            r, g, b = r * phase, g * phase, b * phase
+        strip[i] = (int(((r / 255) ** gamma) * 255 * brightness),
+                    int(((g / 255) ** gamma) * 255 * brightness),
+                    int(((b / 255) ** gamma) * 255 * brightness))
+
+
+def animator_for(n, effect, period):
+    animator = LedAnimator(Strip(None, n), n, fps=0)
+    animator.set({'r': 0, 'g': 0, 'b': 0, 'brightness': 0.5}, 0)
+    animator.render(0)
+    state = {'r': 255, 'g': 64, 'b': 0, 'brightness': 0.5, 'period': period}
+    if effect == 'fade':
+        # 每帧都处于过渡中: 时长远大于测量窗口
+        state['duration'] = 60000
+    else:
+        state['effect'] = effect
+    animator.set(state, 0)
+    return animator
+
+
+def render_us(n, effect, frames, period=2000):
+    animator = animator_for(n, effect, period)
+    start = time.perf_counter()
+    for f in range(frames):
+        animator.render(f * 33)
+    engine = (time.perf_counter() - start) * 1e6 / frames
+    strip = Strip(None, n)
+    start = time.perf_counter()
+    for f in range(frames):
+        naive_frame(strip, n, effect, f * 33, period)
+    naive = (time.perf_counter() - start) * 1e6 / frames
+    return engine, naive
+
+
+def run(mode, args, effect):
+    sim_mode, extra = VARIANTS[mode]
+    with Simulation(sim_mode, TEMP_SAMPLE_INTERVAL=args.sample_interval, NUM_LEDS=args.leds,
+                    LED_ANIMATION_FPS=args.fps, **extra) as sim:
+        sim.load()
+        start_ms = 200
+        if effect:
+            sim.control(start_ms, r=255, g=64, effect=effect, period=1000)
+        sim.run(args.duration)
+        frames = [t for t, _ in sim.frames() if sim.elapsed(t) >= start_ms + 100]
+        window = args.duration - (start_ms + 100) / 1000
+        deviations = sample_jitter(args.sample_interval)
+        stats = sim.main.led_animator.stats()
+        return {
+            'mode': mode,
+            'fps': len(frames) / window if effect else 0.0,
+            'late': stats['late'],
+            'frame_avg': stats['frame_us_avg'],
+            'frame_max': stats['frame_us_max'],
+            'samples': len(esp32.read_times),
+            'jit_mean': sum(deviations) / len(deviations) if deviations else float('nan'),
+            'jit_max': max(deviations) if deviations else float('nan'),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LED动画引擎渲染耗时与仿真帧率基准(主机CPython)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--frames', type=int, default=200, help='单帧耗时测量的帧数')
+    parser.add_argument('--fps', type=int, default=30, help='LED_ANIMATION_FPS')
+    parser.add_argument('--leds', type=int, default=60, help='仿真中的NUM_LEDS')
+    parser.add_argument('--duration', type=float, default=4.0, help='每种配置的仿真运行时长(秒)')
+    parser.add_argument('--sample-interval', type=int, default=200, help='采样间隔(毫秒)')
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    print(f'单帧渲染耗时(us): 引擎/朴素，{args.frames}帧平均，不含驱动写出')
+    print('{:<8}'.format('LED数') + ''.join(f'{e:>18}' for e in EFFECTS))
+    for n in LENGTHS:
+        cells = []
+        for effect in EFFECTS:
+            engine, naive = render_us(n, effect, args.frames)
+            cells.append(f'{engine:.1f}/{naive:.1f}')
+        print(f'{n:<8}' + ''.join(f'{c:>18}' for c in cells))
+
+    print(f'\n仿真: 呼吸效果，{args.leds}个LED，目标{args.fps}fps，采样间隔{args.sample_interval}ms，'
+          f'每种配置运行{args.duration}s')
+    print('{:<12}{:<8}{:>8}{:>6}{:>12}{:>12}{:>8}{:>12}{:>12}'.format(
+        '模式', '动画', '帧率', '迟到', '单帧avg us', '单帧max us', '采样', '抖动avg ms', '抖动max ms'))
+    for mode in modes:
+        for effect in (None, 'breathe'):
+            r = run(mode, args, effect)
+            print('{mode:<12}{0:<8}{fps:>8.1f}{late:>6}{frame_avg:>12}{frame_max:>12}{samples:>8}'
+                  '{jit_mean:>12.1f}{jit_max:>12}'.format(effect or '关', **r))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# 日志开销基准
+#   1. 单次调用: 原有的print(f'...')与logger.Logger在被级别过滤、正常输出、被限速省略时的耗时
+#   2. 循环开销: 在仿真运行器上以main_loop运行固件(100ms采样 + 连续控制消息)，
+#      对比不同日志配置下每秒占用的CPU时间和串口输出字节数；串口时间按115200波特率(每字节10位)估算
+# 用法: python3 bench/bench_logging.py [--duration 5]
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation
+
+from logger import Logger
+
+UART_BAUD = 115200
+
+
+# 统计写入字节数的stdout替身，模拟串口
+class UartSink:
+    def __init__(self):
+        self.bytes = 0
+        self.lines = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode())
+        self.lines += text.count('\n')
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def uart_ms(nbytes):
+    return nbytes * 10 * 1000 / UART_BAUD
+
+
+def per_call_us(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) * 1000000 / n
+
+
+def bench_calls(n):
+    sink = UartSink()
+    temperature = 42.123456
+    quiet = Logger('INFO', 0, 64, out=lambda line: print(line, file=sink))
+    loud = Logger('DEBUG', 0, 64, out=lambda line: print(line, file=sink))
+    limited = Logger('DEBUG', 5000, 64, out=lambda line: print(line, file=sink))
+
+    cases = (
+        ('原有print(f-string)', lambda i: print(f'[DEBUG] 温度数据已发布: {temperature:.2f}°C', file=sink)),
+        ('级别过滤(惰性参数)', lambda i: quiet.log('温度数据已发布: {:.2f}°C', 'DEBUG', temperature)),
+        ('级别过滤(f-string)', lambda i: quiet.log(f'温度数据已发布: {temperature:.2f}°C', 'DEBUG')),
+        ('正常输出', lambda i: loud.log('温度数据已发布: {:.2f}°C', 'DEBUG', temperature)),
+        ('限速省略', lambda i: limited.log('温度数据已发布: {:.2f}°C', 'DEBUG', temperature)),
+    )
+    print('{:<24}{:>10}{:>14}'.format('单次调用', 'us/次', '串口B/次'))
+    for name, fn in cases:
+        before = sink.bytes
+        us = per_call_us(fn, n)
+        print('{:<24}{:>10.3f}{:>14.1f}'.format(name, us, (sink.bytes - before) / n))
+
+
+def bench_loop(name, duration, **overrides):
+    sink = UartSink()
+    with contextlib.redirect_stdout(sink), Simulation('main_loop', quiet=False, TEMP_SAMPLE_INTERVAL=100,
+                                                       **overrides) as sim:
+        at_ms = 100
+        value = 1
+        while at_ms < duration * 1000 and value < 256:
+            sim.control(at_ms, r=value)
+            value += 1
+            at_ms += 50
+        sim.load()
+        cpu = time.process_time()
+        sim.run(duration)
+        cpu = time.process_time() - cpu
+        written = sink.bytes
+        stats = sim.main.logger.stats()
+    per_s = written / duration
+    print('{:<20}{:>10.1f}{:>10.0f}{:>12.1f}{:>8}{:>8}{:>8}'.format(
+        name, cpu * 1000 / duration, per_s, uart_ms(per_s) / 10,
+        stats['emitted'], stats['filtered'], stats['suppressed']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志开销基准')
+    parser.add_argument('--duration', type=float, default=5.0, help='每种配置运行时长(秒)')
+    parser.add_argument('-n', type=int, default=100000, help='单次调用测试的次数')
+    args = parser.parse_args()
+
+    bench_calls(args.n)
+    print(f'\n[main_loop] 采样100ms, 控制消息20条/秒, 每种配置运行{args.duration}s')
+    print('{:<20}{:>10}{:>10}{:>12}{:>8}{:>8}{:>8}'.format(
+        '日志配置', 'CPU ms/s', '串口B/s', '串口占用%', '输出', '过滤', '省略'))
+    bench_loop('DEBUG 不限速', args.duration, DEBUG=True, LOG_LEVEL='DEBUG', LOG_INTERVAL=0)
+    bench_loop('INFO 不限速', args.duration, DEBUG=True, LOG_LEVEL='INFO', LOG_INTERVAL=0)
+    bench_loop('DEBUG 限速5s', args.duration, DEBUG=True, LOG_LEVEL='DEBUG', LOG_INTERVAL=5000)
+    bench_loop('INFO 限速5s', args.duration, DEBUG=True, LOG_LEVEL='INFO', LOG_INTERVAL=5000)
+
+
+if __name__ == '__main__':
+    main()
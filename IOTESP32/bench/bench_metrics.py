@@ -0,0 +1,112 @@
+# 运行指标基准
+# 1. 单次记录开销: Metrics.inc/observe的平均耗时，以及一次快照(collect+snapshot+json)的耗时和消息字节数
+# 2. 仿真: 各模式按--interval发布运行指标，中途代理宕机--outage毫秒，汇总代理在STATS_TOPIC上收到的快照:
+#    快照数、主循环耗时或调度延迟、发布耗时、PUBACK往返和重连时长的中位数/最大值(按分桶上界估计)、MQTT重连次数
+# 用法: python3 bench/bench_metrics.py [--duration 6] [--interval 1000] [--outage 1500]
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation
+
+from broker import BROKER
+from bench_e2e import VARIANTS
+from metrics import Metrics, US_BUCKETS, MS_BUCKETS
+
+
+def micro(iterations):
+    metrics = Metrics()
+    metrics.counter('publishes')
+    metrics.histogram('publish_us', US_BUCKETS)
+    metrics.histogram('puback_ms', MS_BUCKETS)
+    start = time.perf_counter()
+    for i in range(iterations):
+        metrics.inc('publishes')
+    inc_us = (time.perf_counter() - start) * 1e6 / iterations
+    start = time.perf_counter()
+    for i in range(iterations):
+        metrics.observe('publish_us', i & 0x3FFFF)
+    observe_us = (time.perf_counter() - start) * 1e6 / iterations
+    return inc_us, observe_us
+
+
+# 合并多个快照中同名直方图，返回(次数, 中位数所在桶上界, 最大值)
+def merge(snapshots, name):
+    bounds = None
+    counts = None
+    peak = None
+    for snapshot in snapshots:
+        h = snapshot['h'].get(name)
+        if h is None:
+            continue
+        bounds = h['le']
+        counts = [a + b for a, b in zip(counts, h['n'])] if counts else list(h['n'])
+        peak = h['max'] if peak is None else max(peak, h['max'])
+    if not counts:
+        return 0, '-', '-'
+    total = sum(counts)
+    seen = 0
+    for i, n in enumerate(counts):
+        seen += n
+        if seen * 2 >= total:
+            return total, f'<={bounds[i]}' if i < len(bounds) else f'>{bounds[-1]}', peak
+    return total, '-', peak
+
+
+def run(mode, args):
+    sim_mode, extra = VARIANTS[mode]
+    with Simulation(sim_mode, STATS_TOPIC=b'esp32/s3/stats', STATS_INTERVAL=args.interval, TEMP_SAMPLE_INTERVAL=args.sample_interval,
+                    **extra) as sim:
+        main = sim.load()
+        BROKER.publish_latency = args.publish_delay
+        sim.broker_outage(args.duration * 400, args.outage)
+        sim.run(args.duration)
+        snapshots = [json.loads(payload) for _, _, payload in BROKER.messages(main.STATS_TOPIC)]
+        start = time.perf_counter()
+        for _ in range(100):
+            main.collect_metrics()
+            payload = json.dumps(main.metrics.snapshot())
+        snapshot_us = (time.perf_counter() - start) * 1e4
+        r = {
+            'mode': mode,
+            'snapshots': len(snapshots),
+            'bytes': max((len(json.dumps(s)) for s in snapshots), default=0),
+            'snapshot_us': snapshot_us,
+            'reconnects': snapshots[-1]['c']['mqtt_reconnects'] if snapshots else 0,
+        }
+        for name in ('loop_us', 'lag_ms', 'publish_us', 'puback_ms', 'reconnect_ms'):
+            r[name] = merge(snapshots, name)
+        return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行指标开销与快照内容基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--duration', type=float, default=6.0, help='每种配置的仿真运行时长(秒)')
+    parser.add_argument('--interval', type=int, default=1000, help='STATS_INTERVAL(毫秒)')
+    parser.add_argument('--sample-interval', type=int, default=200, help='采样间隔(毫秒)')
+    parser.add_argument('--publish-delay', type=float, default=0.02, help='QoS1发布等待PUBACK的时长(秒)')
+    parser.add_argument('--outage', type=int, default=1500, help='中途代理宕机时长(毫秒)')
+    parser.add_argument('--iterations', type=int, default=200000, help='单次记录开销的循环次数')
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    inc_us, observe_us = micro(args.iterations)
+    print(f'单次记录: inc {inc_us:.3f}us, observe {observe_us:.3f}us')
+    print(f'指标间隔{args.interval}ms, 发布往返{args.publish_delay * 1000:.0f}ms, 代理宕机{args.outage}ms, '
+          f'每种配置运行{args.duration}s')
+    print('{:<12}{:>6}{:>8}{:>10}{:>6}  {:<20}{:<20}{:<20}{:<20}{:<20}'.format(
+        '模式', '快照', '字节', '生成us', '重连', '主循环us', '调度延迟ms', '发布us', 'PUBACK ms', '重连ms'))
+    for mode in modes:
+        r = run(mode, args)
+        cells = ['{}次 {} 最大{}'.format(*r[name]) for name in ('loop_us', 'lag_ms', 'publish_us', 'puback_ms', 'reconnect_ms')]
+        print('{mode:<12}{snapshots:>6}{bytes:>8}{snapshot_us:>10.0f}{reconnects:>6}  '.format(**r)
+              + ''.join(f'{c:<20}' for c in cells))
+    print('(直方图列: 次数、中位数所在分桶、最大值)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# JSON与二进制载荷格式的大小和编码耗时基准
+# JSON单条消息按publish_temperature原有方式构造(dict -> json.dumps -> encode)，
+# 二进制帧使用payload.encode_binary_*_into写入预分配缓冲区。
+# 用法: python3 bench/bench_payload.py [--batch 32] [--iterations 20000]
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import payload
+
+DEVICE_ID = 'esp32_s3_temp_sensor'
+
+
+def json_single(timestamp, value):
+    message_data = {
+        'temperature': round(value, 2),
+        'timestamp': timestamp,
+        'device_id': DEVICE_ID,
+        'unit': '°C'
+    }
+    return json.dumps(message_data).encode()
+
+
+def measure(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    elapsed = time.perf_counter() - start
+    return result, elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON与二进制载荷格式对比基准')
+    parser.add_argument('--batch', type=int, default=32, help='批量消息的样本数(<=255)')
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    timestamps = [1000000 + i * 15000 for i in range(args.batch)]
+    values = [round(42.0 + rng.uniform(-0.5, 0.5), 2) for _ in range(args.batch)]
+    buf = bytearray(payload.binary_frame_size(args.batch))
+    n = args.iterations
+
+    cases = [
+        ('json 单条', lambda: json_single(timestamps[0], values[0]), n),
+        ('binary 单条', lambda: payload.encode_binary_sample_into(buf, timestamps[0], values[0]), n),
+        (f'json 批量x{args.batch}', lambda: payload.encode_json_batch(DEVICE_ID, timestamps, values), n // 10),
+        (f'binary 批量x{args.batch}', lambda: payload.encode_binary_into(buf, timestamps, values), n // 10),
+    ]
+
+    print('{:<16}{:>10}{:>14}{:>14}'.format('格式', '字节', '字节/样本', '编码us'))
+    for name, func, iterations in cases:
+        result, us = measure(func, iterations)
+        size = result if isinstance(result, int) else len(result)
+        samples = args.batch if '批量' in name else 1
+        print(f'{name:<16}{size:>10}{size / samples:>14.1f}{us:>14.2f}')
+
+    # 解码往返校验
+    frame = payload.encode_binary(timestamps, values)
+    decoded = payload.decode_binary(frame, b'esp32/s3/temperature/bin/' + DEVICE_ID.encode())
+    assert decoded['timestamps'] == timestamps
+    assert all(abs(a - b) < 0.006 for a, b in zip(decoded['temperatures'], values))
+    assert decoded['device_id'] == DEVICE_ID
+    print('二进制帧解码往返校验通过')
+
+
+if __name__ == '__main__':
+    main()
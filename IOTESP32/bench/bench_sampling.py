@@ -0,0 +1,74 @@
+# 采样均匀性基准: 网络劣化时主循环/任务调度采样(SAMPLE_MODE='loop')与硬件定时器采样(SAMPLE_MODE='timer')对比
+# 劣化场景: 每次QoS1发布阻塞--publish-delay秒，运行中途代理宕机--outage毫秒。
+# 统计运行期间每次读取温度的间隔相对子采样周期的偏差(均值/p99/最大)、实际读取数与应读取数之差(错过的采样点)，
+# 以及代理收到和留在断网缓冲区中的样本数；timer模式另输出定时器的错过触发数和调度延迟。
+# 用法: python3 bench/bench_sampling.py [--duration 6] [--publish-delay 0.3] [--oversample 1]
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation, percentile
+
+import time
+import esp32
+from broker import BROKER
+from bench_e2e import VARIANTS
+
+
+def run(mode, sample_mode, args):
+    sim_mode, extra = VARIANTS[mode]
+    with Simulation(sim_mode, TEMP_SAMPLE_INTERVAL=args.sample_interval, SAMPLE_MODE=sample_mode,
+                    SAMPLE_OVERSAMPLE=args.oversample if sample_mode == 'timer' else 1, **extra) as sim:
+        sim.load()
+        BROKER.publish_latency = args.publish_delay
+        sim.broker_outage(args.duration * 500, args.outage)
+        sim.run(args.duration)
+        end = time.ticks_add(sim.start, int(args.duration * 1000))
+        reads = [t for t in esp32.read_times if time.ticks_diff(t, sim.start) >= 0 and time.ticks_diff(t, end) < 0]
+        period = args.sample_interval // (args.oversample if sample_mode == 'timer' else 1)
+        deviations = [abs(time.ticks_diff(b, a) - period) for a, b in zip(reads, reads[1:])]
+        main = sim.main
+        r = {
+            'mode': mode,
+            'sample_mode': sample_mode,
+            'reads': len(reads),
+            'expected': int(args.duration * 1000 / period),
+            'dev_mean': sum(deviations) / len(deviations) if deviations else float('nan'),
+            'dev_p99': percentile(deviations, 99),
+            'dev_max': max(deviations) if deviations else float('nan'),
+            'delivered': len(sim.samples()),
+            'buffered': len(main.sample_buffer) if main.sample_buffer is not None else 0,
+            'timer': '',
+        }
+        if main.sampler is not None:
+            stats = main.sampler.stats()
+            r['timer'] = f'错过{stats["missed"]} 溢出{stats["overflows"]} 调度延迟最大{stats["latency_max"]}ms'
+        return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description='网络劣化时的采样均匀性基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--duration', type=float, default=6.0, help='每种配置的仿真运行时长(秒)')
+    parser.add_argument('--sample-interval', type=int, default=200, help='采样间隔(毫秒)')
+    parser.add_argument('--oversample', type=int, default=1, help='timer模式下每个样本的子样本数')
+    parser.add_argument('--publish-delay', type=float, default=0.3, help='每次QoS1发布阻塞时长(秒)')
+    parser.add_argument('--outage', type=int, default=1500, help='中途代理宕机时长(毫秒)')
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    print(f'采样间隔{args.sample_interval}ms, 发布阻塞{args.publish_delay * 1000:.0f}ms, '
+          f'代理宕机{args.outage}ms, 过采样x{args.oversample}, 每种配置运行{args.duration}s')
+    print('{:<12}{:<7}{:>7}{:>7}{:>10}{:>8}{:>8}{:>8}{:>8}  {}'.format(
+        '模式', '采样', '读取', '应读', '间隔偏差', 'p99', '最大', '已送达', '缓存', '定时器'))
+    for mode in modes:
+        for sample_mode in ('loop', 'timer'):
+            r = run(mode, sample_mode, args)
+            print('{mode:<12}{sample_mode:<7}{reads:>7}{expected:>7}{dev_mean:>10.1f}{dev_p99:>8}{dev_max:>8}'
+                  '{delivered:>8}{buffered:>8}  {timer}'.format(**r))
+    print('(间隔偏差单位: 毫秒，相对子采样周期)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# 主循环(main_loop)与asyncio任务调度模式(async_main_loop)的对比基准
+# 在主机端替身(host/)上运行未修改的main.py，统计:
+#   - 控制消息到LED写出的延迟(control-to-LED latency)
+#   - 采样间隔相对配置周期的抖动(loop jitter)
+# 用法: python3 bench/bench_scheduler.py [--duration 10] [--publish-delay 0.05]
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation, percentile
+
+import time
+import esp32
+from broker import BROKER
+
+
+# 在运行窗口内按泊松过程排入控制消息，每条消息使用唯一的红色分量以便识别
+def schedule_control(sim, args):
+    rng = random.Random(args.seed)
+    at_ms = 200
+    value = 1
+    while at_ms < args.duration * 1000 - 200 and value < 256:
+        sim.control(int(at_ms), r=value)
+        value += 1
+        at_ms += rng.expovariate(args.control_rate) * 1000
+
+
+def sample_jitter(interval):
+    times = esp32.read_times
+    deviations = [abs(time.ticks_diff(b, a) - interval) for a, b in zip(times, times[1:])]
+    return deviations
+
+
+def run(mode, args):
+    with Simulation(mode, TEMP_SAMPLE_INTERVAL=args.sample_interval) as sim:
+        sim.load()
+        BROKER.publish_latency = args.publish_delay
+        schedule_control(sim, args)
+        sim.run(args.duration)
+
+        latencies, lost = sim.control_latencies()
+        deviations = sample_jitter(args.sample_interval)
+        return {
+            'mode': mode,
+            'controls': len(sim.controls),
+            'lost': lost,
+            'lat_mean': sum(latencies) / len(latencies) if latencies else float('nan'),
+            'lat_p50': percentile(latencies, 50),
+            'lat_p99': percentile(latencies, 99),
+            'lat_max': max(latencies) if latencies else float('nan'),
+            'samples': len(esp32.read_times),
+            'jit_mean': sum(deviations) / len(deviations) if deviations else float('nan'),
+            'jit_max': max(deviations) if deviations else float('nan'),
+            'published': len(sim.messages()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='main_loop与asyncio调度模式对比基准')
+    parser.add_argument('--duration', type=float, default=10.0, help='每种模式运行时长(秒)')
+    parser.add_argument('--sample-interval', type=int, default=500, help='采样间隔(毫秒)')
+    parser.add_argument('--publish-delay', type=float, default=0.05, help='每次publish阻塞时长(秒)')
+    parser.add_argument('--control-rate', type=float, default=5.0, help='控制消息平均速率(条/秒)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f'采样间隔 {args.sample_interval}ms, publish阻塞 {args.publish_delay * 1000:.0f}ms, '
+          f'控制消息 {args.control_rate}/s, 每种模式运行 {args.duration}s')
+    header = ('模式', '控制数', '丢失', '延迟均值', 'p50', 'p99', '最大', '采样数', '抖动均值', '抖动最大', '发布数')
+    print('{:<12}{:>6}{:>6}{:>10}{:>8}{:>8}{:>8}{:>8}{:>10}{:>10}{:>8}'.format(*header))
+    for mode in ('main_loop', 'asyncio'):
+        r = run(mode, args)
+        print('{mode:<12}{controls:>6}{lost:>6}{lat_mean:>10.1f}{lat_p50:>8}{lat_p99:>8}{lat_max:>8}'
+              '{samples:>8}{jit_mean:>10.1f}{jit_max:>10}{published:>8}'.format(**r))
+    print('(延迟与抖动单位: 毫秒)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# 网络劣化时的控制响应基准: 对比单线程主循环、asyncio和双线程模式(THREAD_MODE)
+# 劣化场景(--scenario):
+#   stall:     每次QoS1发布阻塞--publish-delay秒
+#   reconnect: 代理每--kick-every毫秒踢掉一次连接，每次重新连接阻塞--connect-delay秒
+#   both:      两者同时
+# 每种配置运行两次:
+#   1. 控制消息按平均--control-rate条/秒随机到达(纯色)，统计到达代理到LED写出该颜色的延迟(被更新消息覆盖的不计入)，
+#      同时统计采样次数与应采样次数、采样间隔偏差
+#   2. 呼吸效果下统计动画实际帧率和相邻两帧的最大间隔(LED停顿)
+# 用法: python3 bench/bench_threads.py [--scenario both] [--duration 6] [--publish-delay 0.3] [--connect-delay 1.0]
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation, percentile
+
+import time
+import esp32
+from broker import BROKER
+from bench_e2e import VARIANTS
+from bench_scheduler import sample_jitter
+
+
+def degrade(sim, args):
+    if args.scenario in ('stall', 'both'):
+        BROKER.publish_latency = args.publish_delay
+    if args.scenario in ('reconnect', 'both'):
+        # 首次连接不阻塞，保证开机后已订阅控制主题
+        sim.at(args.kick_every - 1, setattr, BROKER, 'connect_latency', args.connect_delay)
+        at = args.kick_every
+        while at < args.duration * 1000:
+            sim.at(at, BROKER.kick)
+            at += args.kick_every
+
+
+def run_control(mode, args):
+    sim_mode, extra = VARIANTS[mode]
+    with Simulation(sim_mode, TEMP_SAMPLE_INTERVAL=args.sample_interval, **extra) as sim:
+        sim.load()
+        degrade(sim, args)
+        rng = random.Random(args.seed)
+        at_ms = 300.0
+        value = 1
+        while at_ms < args.duration * 1000 - 300 and value < 256:
+            sim.control(int(at_ms), r=value)
+            value += 1
+            at_ms += rng.expovariate(args.control_rate) * 1000
+        sim.run(args.duration)
+        latencies, lost = sim.control_latencies()
+        deviations = sample_jitter(args.sample_interval)
+        return {
+            'mode': mode,
+            'controls': len(sim.controls),
+            'applied': len(latencies),
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else float('nan'),
+            'reads': len(esp32.read_times),
+            'expected': int(args.duration * 1000 / args.sample_interval),
+            'dev_max': max(deviations) if deviations else float('nan'),
+            'connects': BROKER.connects,
+        }
+
+
+def run_animation(mode, args):
+    sim_mode, extra = VARIANTS[mode]
+    with Simulation(sim_mode, TEMP_SAMPLE_INTERVAL=args.sample_interval, LED_ANIMATION_FPS=args.fps, **extra) as sim:
+        sim.load()
+        degrade(sim, args)
+        start_ms = 200
+        sim.control(start_ms, r=255, g=64, effect='breathe', period=1000)
+        sim.run(args.duration)
+        end = time.ticks_add(sim.start, int(args.duration * 1000))
+        frames = [t for t, _ in sim.frames() if sim.elapsed(t) >= start_ms + 300 and time.ticks_diff(end, t) > 0]
+        gaps = [time.ticks_diff(b, a) for a, b in zip(frames, frames[1:])]
+        window = args.duration - (start_ms + 300) / 1000
+        return {
+            'fps': len(frames) / window,
+            'gap_p99': percentile(gaps, 99),
+            'gap_max': max(gaps) if gaps else float('nan'),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='网络劣化时的控制延迟、采样和LED动画基准(主机仿真)')
+    parser.add_argument('--mode', choices=tuple(VARIANTS), help='只运行一种配置')
+    parser.add_argument('--scenario', choices=('stall', 'reconnect', 'both'), default='both', help='网络劣化方式')
+    parser.add_argument('--duration', type=float, default=6.0, help='每次仿真的运行时长(秒)')
+    parser.add_argument('--sample-interval', type=int, default=500, help='采样间隔(毫秒)')
+    parser.add_argument('--publish-delay', type=float, default=0.3, help='每次QoS1发布阻塞时长(秒)')
+    parser.add_argument('--connect-delay', type=float, default=1.0, help='每次MQTT重新连接阻塞时长(秒)')
+    parser.add_argument('--kick-every', type=int, default=2000, help='代理踢掉连接的间隔(毫秒)')
+    parser.add_argument('--control-rate', type=float, default=4.0, help='控制消息平均速率(条/秒)')
+    parser.add_argument('--fps', type=int, default=30, help='动画目标帧率')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    modes = (args.mode,) if args.mode else tuple(VARIANTS)
+
+    print(f'劣化: {args.scenario}, 发布阻塞{args.publish_delay * 1000:.0f}ms, 重连阻塞{args.connect_delay * 1000:.0f}ms'
+          f'(每{args.kick_every}ms踢一次), 采样间隔{args.sample_interval}ms, 控制{args.control_rate}条/s, '
+          f'每次运行{args.duration}s')
+    print('{:<12}{:>8}{:>8}{:>8}{:>8}{:>8}{:>8}{:>8}{:>10}{:>8}{:>10}{:>10}'.format(
+        '模式', '控制数', '生效', 'p50', 'p99', '最大', '采样', '应采', '间隔偏差', '动画fps', '停顿p99', '最长停顿'))
+    for mode in modes:
+        r = run_control(mode, args)
+        r.update(run_animation(mode, args))
+        print('{mode:<12}{controls:>8}{applied:>8}{p50:>8}{p99:>8}{max:>8}{reads:>8}{expected:>8}{dev_max:>10}'
+              '{fps:>8.1f}{gap_p99:>10}{gap_max:>10}'.format(**r))
+    print('(单位: 毫秒；生效: 写出过该颜色的控制消息数，其余被之后的消息覆盖；间隔偏差为采样间隔相对配置周期的最大偏差)')
+
+
+if __name__ == '__main__':
+    main()
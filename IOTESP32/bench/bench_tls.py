@@ -0,0 +1,236 @@
+# MQTT over TLS的握手和重连基准
+# 1. 握手: 代理替身以TLS监听本机端口(测试证书见host/tlscerts.py)，客户端与umqtt.simple一样用阻塞socket连接、
+#    经tls.TLSContext握手后发送CONNECT并等待CONNACK，每种组合连续连接--count次:
+#      新建上下文: 每次连接都新建SSL上下文并重新读取CA证书(不复用，也不恢复会话)
+#      完整握手:   复用同一个TLSContext，不恢复会话
+#      会话恢复:   复用同一个TLSContext并带上次的会话
+#    统计握手耗时、从TCP连接到收到CONNACK的总耗时，以及握手阶段双向传输的字节数。
+#    客户端与代理之间经过一个转发代理，双向各延迟--rtt的一半，模拟设备到代理的网络往返；
+#    主机CPU远快于ESP32，设备上完整握手的签名验证和密钥交换要慢得多，表中耗时主要体现往返次数和传输字节数的差别。
+# 2. 重连: 仿真中异步MQTT客户端经TLS连接代理替身，代理每--kick-every毫秒踢掉一次连接，
+#    对比不恢复和恢复会话时固件统计的完整握手与会话恢复次数、断线时长和送达样本数。
+# 用法: python3 bench/bench_tls.py [--count 20] [--rtt 30] [--duration 6]
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+from sim import Simulation, percentile
+
+import network
+import tlscerts
+from broker import BROKER
+from tls import TLSContext
+
+CLIENT_ID = b'bench-tls'
+VERSIONS = (('TLS1.2', ssl.TLSVersion.TLSv1_2), ('TLS1.3', ssl.TLSVersion.TLSv1_3))
+MODES = ('新建上下文', '完整握手', '会话恢复')
+
+
+def connect_packet(client_id, keepalive=60):
+    body = b'\x00\x04MQTT\x04\x02' + bytes((keepalive >> 8, keepalive & 0xFF)) + len(client_id).to_bytes(2, 'big') + client_id
+    return bytes((0x10, len(body))) + body
+
+
+# 转发代理: 双向各延迟delay秒后转发，统计转发的字节数
+class DelayProxy:
+    def __init__(self, target, delay):
+        self.target = target
+        self.delay = delay
+        self.up = 0  # 客户端到代理的字节数
+        self.down = 0  # 代理到客户端的字节数
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._accept, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def _accept(self, reader, writer):
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            writer.close()
+            return
+        await asyncio.gather(self._pipe(reader, upstream_writer, 'up'),
+                             self._pipe(upstream_reader, writer, 'down'))
+
+    # 每段数据按到达时刻加delay转发，保持顺序且不因前一段的延迟推迟后一段
+    async def _pipe(self, reader, writer, direction):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def send():
+            while True:
+                due, data = await queue.get()
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if not data:
+                    break
+                writer.write(data)
+            writer.close()
+
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                data = await reader.read(65536)
+                if direction == 'up':
+                    self.up += len(data)
+                else:
+                    self.down += len(data)
+                queue.put_nowait((loop.time() + self.delay, data))
+                if not data:
+                    break
+        except ConnectionError:
+            queue.put_nowait((loop.time(), b''))
+        await sender
+
+
+# 结束后台事件循环前取消仍在运行的会话和转发任务
+async def cancel_tasks():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# 与umqtt.simple.connect()相同的顺序: TCP连接、TLS握手、CONNECT/CONNACK；返回(握手ms, 总耗时ms, 握手字节数, 是否恢复)
+def connect_once(addr, tls, proxy):
+    start = time.perf_counter()
+    sock = socket.socket()
+    sock.settimeout(5)
+    sock.connect(addr)
+    proxy.up = proxy.down = 0
+    begin = time.perf_counter()
+    conn = tls.wrap_socket(sock)
+    handshake = time.perf_counter() - begin
+    handshake_bytes = proxy.up + proxy.down
+    try:
+        conn.sendall(connect_packet(CLIENT_ID))
+        ack = b''
+        while len(ack) < 4:
+            chunk = conn.recv(4 - len(ack))
+            if not chunk:
+                raise OSError('代理关闭了连接')
+            ack += chunk
+        if ack[3] != 0:
+            raise OSError(f'CONNACK返回码{ack[3]}')
+        total = time.perf_counter() - start
+        resumed = conn.session_reused
+        tls.save_session()
+        conn.sendall(b'\xe0\x00')
+    finally:
+        conn.close()
+    return handshake * 1000, total * 1000, handshake_bytes, resumed
+
+
+def bench_handshake(addr, proxy, certs, mode, count):
+    handshakes, totals, sizes, setups = [], [], [], []
+    resumed = 0
+    tls = None
+    if mode != '新建上下文':
+        tls = TLSContext('localhost', certs.ca, resume=mode == '会话恢复')
+        if mode == '会话恢复':
+            connect_once(addr, tls, proxy)  # 第一次连接是完整握手，之后带会话
+    for _ in range(count):
+        if mode == '新建上下文':
+            begin = time.perf_counter()
+            tls = TLSContext('localhost', certs.ca, resume=False)
+            setups.append((time.perf_counter() - begin) * 1000)
+        handshake, total, size, reused = connect_once(addr, tls, proxy)
+        handshakes.append(handshake)
+        totals.append(total + (setups[-1] if setups else 0))
+        sizes.append(size)
+        resumed += bool(reused)
+    return {
+        'setup': percentile(setups, 50) if setups else 0.0,
+        'hs_p50': percentile(handshakes, 50),
+        'hs_p99': percentile(handshakes, 99),
+        'total_p50': percentile(totals, 50),
+        'bytes': sum(sizes) / len(sizes),
+        'resumed': resumed,
+    }
+
+
+def run_handshakes(args, workdir):
+    network.reset()
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    wlan.connect()
+    BROKER.reset()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    call = lambda coro: asyncio.run_coroutine_threadsafe(coro, loop).result()
+    print(f'握手: 每种组合连续连接{args.count}次，往返延迟{args.rtt}ms')
+    print('{:<6}{:<8}{:<10}{:>10}{:>10}{:>10}{:>12}{:>10}{:>8}'.format(
+        '证书', '版本', '方式', '上下文ms', '握手p50', '握手p99', '到CONNACK', '握手字节', '恢复'))
+    try:
+        for key in args.keys:
+            certs = tlscerts.generate(workdir, key)
+            for label, version in VERSIONS:
+                server = call(BROKER.serve(ssl=certs.server_context(version)))
+                proxy = DelayProxy(server.sockets[0].getsockname()[:2], args.rtt / 2000)
+                addr = call(proxy.start())
+                for mode in MODES:
+                    r = bench_handshake(addr, proxy, certs, mode, args.count)
+                    print(f'{key:<8}{label:<10}{mode:<8}{r["setup"]:>10.2f}{r["hs_p50"]:>10.2f}{r["hs_p99"]:>10.2f}'
+                          f'{r["total_p50"]:>12.2f}{r["bytes"]:>10.0f}{r["resumed"]:>6}/{args.count}')
+                proxy.server.close()
+                server.close()
+    finally:
+        call(cancel_tasks())
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(1)
+        loop.close()
+    print('(耗时单位: 毫秒；上下文: 新建SSL上下文并读取CA证书；到CONNACK: 从TCP连接开始，新建上下文时含上下文耗时)')
+
+
+def run_reconnects(args):
+    print(f'\n重连: 仿真中异步MQTT客户端经TLS连接，代理每{args.kick_every}ms踢掉一次连接，运行{args.duration}s')
+    print('{:<10}{:>8}{:>10}{:>10}{:>12}{:>10}{:>10}'.format('会话恢复', '连接', '完整握手', '会话恢复', '断线最长ms',
+                                                            '送达样本', '应采'))
+    for resume in (False, True):
+        with Simulation('asyncio', MQTT_CLIENT='async', MQTT_TLS=True, MQTT_TLS_RESUME=resume,
+                        TEMP_SAMPLE_INTERVAL=args.sample_interval) as sim:
+            sim.load()
+            at = args.kick_every
+            while at < args.duration * 1000:
+                sim.at(at, BROKER.kick)
+                at += args.kick_every
+            sim.run(args.duration)
+            tls = sim.main.tls_context.stats()
+            supervisor = sim.main.get_mqtt_supervisor().stats()
+            print(f'{"是" if resume else "否":<12}{supervisor["connects"]:>8}{tls["full"]:>10}{tls["resumed"]:>10}'
+                  f'{supervisor["downtime_max"]:>14}{len(sim.samples()):>10}'
+                  f'{int(args.duration * 1000 / args.sample_interval):>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MQTT over TLS的完整握手与会话恢复耗时基准(本机TLS代理替身)')
+    parser.add_argument('--count', type=int, default=20, help='每种组合的连接次数')
+    parser.add_argument('--rtt', type=float, default=30, help='模拟的网络往返延迟(毫秒)')
+    parser.add_argument('--keys', nargs='+', choices=('ec', 'rsa'), default=['ec', 'rsa'], help='代理证书的密钥类型')
+    parser.add_argument('--duration', type=float, default=6.0, help='重连仿真的运行时长(秒)，0表示跳过')
+    parser.add_argument('--kick-every', type=int, default=1000, help='重连仿真中代理踢掉连接的间隔(毫秒)')
+    parser.add_argument('--sample-interval', type=int, default=200, help='重连仿真的采样间隔(毫秒)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='iotesp32-tls-')
+    try:
+        run_handshakes(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.duration:
+        run_reconnects(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+# 温度样本块压缩(Gorilla风格)
+# 一批样本编码为一个自描述的数据块，写入预分配缓冲区，网络字节序:
+#   uint8 版本号(2) | uint8 数值模式 | uint16 样本数N | uint32 首个时间戳 | 4字节首个数值 | 位流
+# 版本号与二进制帧(1)和JSON('{')区分，payload.decode据此自动识别；device_id同二进制帧一样由主题携带。
+# 位流依次为第2..N条样本，每条先写时间戳再写数值，最后一个字节不足8位时低位补0:
+#   时间戳: 与上一间隔的差(二阶差分，按uint32取模，兼容ticks回绕)
+#     '0' 差为0 | '10'+7位 [-64,63] | '110'+9位 [-256,255] | '1110'+12位 [-2048,2047] | '1111'+32位
+#   数值模式0(MODE_DELTA): 温度量化为0.01°C(与二进制帧相同)，首个数值为int32，之后写与上一条的差
+#     '0' 差为0 | '10'+4位 [-8,7] | '110'+8位 [-128,127] | '1110'+12位 [-2048,2047] | '1111'+32位
+#   数值模式1(MODE_XOR): 数值按float32保存，首个数值为float32，之后写与上一条位模式的异或
+#     '0' 相同 | '10'+有效位(前导零和末尾零不少于上一次时沿用上一次的窗口) | '11'+5位前导零+5位长度-1+有效位
+# 固定间隔采样的时间戳每条只占1位，温度不变时数值也只占1位。
+# 编码只用整数运算和预分配缓冲区，可在设备上运行；decode_block供消费端(CPython)使用，结果与编码前逐位一致
+# (MODE_DELTA还原为量化后的值，MODE_XOR还原为float32的值)。
+import struct
+
+BLOCK_VERSION = 2
+MODE_DELTA = 0
+MODE_XOR = 1
+BLOCK_HEADER = '!BBHI'
+BLOCK_HEADER_SIZE = struct.calcsize(BLOCK_HEADER)
+MAX_BLOCK_SAMPLES = 65535
+_MASK32 = 0xFFFFFFFF
+_scratch = bytearray(4)  # float32与位模式互转的预分配缓冲区
+# 每条样本最多占用的位数: 时间戳36位，数值36位(MODE_DELTA)或44位(MODE_XOR)
+_MAX_SAMPLE_BITS = 80
+# 时间戳二阶差分和数值差分的分档: (前缀, 前缀位数, 数值位数)，差为0时单独写'0'
+_TIME_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+_DELTA_BUCKETS = ((0b10, 2, 4), (0b110, 3, 8), (0b1110, 4, 12))
+
+
+# 给定样本数的数据块最大长度，用于确定预分配缓冲区大小
+def block_max_size(count):
+    return BLOCK_HEADER_SIZE + 4 + (max(count - 1, 0) * _MAX_SAMPLE_BITS + 7) // 8
+
+
+# 温度量化为int32的百分之一摄氏度
+def _centi(value):
+    return int(round(value * 100))
+
+
+# 把uint32按int32解释
+def _signed32(value):
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+# float32的位模式
+def _float_bits(value):
+    struct.pack_into('!f', _scratch, 0, value)
+    return struct.unpack_from('!I', _scratch, 0)[0]
+
+
+# 把位写入预分配缓冲区；累加器只保留不足一个字节的位
+class _BitWriter:
+    def __init__(self, buf, offset):
+        self.buf = buf
+        self.offset = offset
+        self.acc = 0
+        self.bits = 0
+
+    # 写出value的低n位(高位在前)
+    def write(self, value, n):
+        while n > 8:
+            n -= 8
+            self._push((value >> n) & 0xFF, 8)
+        self._push(value & ((1 << n) - 1), n)
+
+    def _push(self, value, n):
+        acc = (self.acc << n) | value
+        bits = self.bits + n
+        if bits >= 8:
+            bits -= 8
+            self.buf[self.offset] = acc >> bits
+            self.offset += 1
+            acc &= (1 << bits) - 1
+        self.acc = acc
+        self.bits = bits
+
+    # 写出最后不足一个字节的位，返回已写入的总长度
+    def finish(self):
+        if self.bits:
+            self.buf[self.offset] = (self.acc << (8 - self.bits)) & 0xFF
+            self.offset += 1
+            self.acc = self.bits = 0
+        return self.offset
+
+
+# 按位读取数据块的位流
+class _BitReader:
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+        self.bit = 0
+
+    # 读出n位无符号整数；位流不足时抛出ValueError
+    def read(self, n):
+        data = self.data
+        value = 0
+        while n:
+            if self.offset >= len(data):
+                raise ValueError('压缩块数据不完整')
+            take = min(8 - self.bit, n)
+            shift = 8 - self.bit - take
+            value = (value << take) | ((data[self.offset] >> shift) & ((1 << take) - 1))
+            n -= take
+            self.bit += take
+            if self.bit == 8:
+                self.bit = 0
+                self.offset += 1
+        return value
+
+    # 读出前缀中连续的1(最多limit个)，遇到0或达到limit时停止
+    def ones(self, limit):
+        count = 0
+        while count < limit and self.read(1):
+            count += 1
+        return count
+
+
+# 按分档写出有符号差值：0只写'0'，其余写所在档的前缀和补码，超出各档时写'1111'+32位
+def _write_signed(writer, value, buckets):
+    if value == 0:
+        writer.write(0, 1)
+        return
+    for prefix, prefix_bits, bits in buckets:
+        limit = 1 << (bits - 1)
+        if -limit <= value < limit:
+            writer.write(prefix, prefix_bits)
+            writer.write(value & ((1 << bits) - 1), bits)
+            return
+    writer.write(0b1111, 4)
+    writer.write(value & _MASK32, 32)
+
+
+# 读出_write_signed写出的差值
+def _read_signed(reader, buckets):
+    ones = reader.ones(4)
+    if ones == 0:
+        return 0
+    bits = buckets[ones - 1][2] if ones < 4 else 32
+    value = reader.read(bits)
+    if value & (1 << (bits - 1)):
+        value -= 1 << bits
+    return value
+
+
+# 32位整数的前导零个数(x不为0)
+def _leading_zeros(x):
+    n = 0
+    while not x & 0x80000000:
+        x <<= 1
+        n += 1
+    return n
+
+
+# 32位整数的末尾零个数(x不为0)
+def _trailing_zeros(x):
+    n = 0
+    while not x & 1:
+        x >>= 1
+        n += 1
+    return n
+
+
+# 把一批样本编码为数据块写入buf的offset处，返回数据块长度；buf至少block_max_size(len(values))字节
+def encode_block_into(buf, timestamps, values, mode=MODE_DELTA, offset=0):
+    count = len(values)
+    if count > MAX_BLOCK_SAMPLES:
+        raise ValueError(f'单个压缩块最多{MAX_BLOCK_SAMPLES}条样本')
+    if mode not in (MODE_DELTA, MODE_XOR):
+        raise ValueError(f'不支持的压缩模式: {mode}')
+    if not count:
+        struct.pack_into(BLOCK_HEADER, buf, offset, BLOCK_VERSION, mode, 0, 0)
+        struct.pack_into('!i', buf, offset + BLOCK_HEADER_SIZE, 0)
+        return BLOCK_HEADER_SIZE + 4
+    prev_time = timestamps[0] & _MASK32
+    struct.pack_into(BLOCK_HEADER, buf, offset, BLOCK_VERSION, mode, count, prev_time)
+    if mode == MODE_DELTA:
+        prev_value = _centi(values[0])
+        struct.pack_into('!i', buf, offset + BLOCK_HEADER_SIZE, prev_value)
+    else:
+        prev_value = _float_bits(values[0])
+        struct.pack_into('!I', buf, offset + BLOCK_HEADER_SIZE, prev_value)
+    writer = _BitWriter(buf, offset + BLOCK_HEADER_SIZE + 4)
+    prev_delta = 0
+    # MODE_XOR上一次有效位窗口的前导零和末尾零，-1表示还没有窗口
+    lead = trail = -1
+    for i in range(1, count):
+        timestamp = timestamps[i] & _MASK32
+        delta = (timestamp - prev_time) & _MASK32
+        _write_signed(writer, _signed32((delta - prev_delta) & _MASK32), _TIME_BUCKETS)
+        prev_time = timestamp
+        prev_delta = delta
+        if mode == MODE_DELTA:
+            value = _centi(values[i])
+            _write_signed(writer, value - prev_value, _DELTA_BUCKETS)
+            prev_value = value
+            continue
+        value = _float_bits(values[i])
+        x = value ^ prev_value
+        prev_value = value
+        if not x:
+            writer.write(0, 1)
+            continue
+        leading = min(_leading_zeros(x), 31)
+        trailing = _trailing_zeros(x)
+        if lead >= 0 and leading >= lead and trailing >= trail:
+            writer.write(0b10, 2)
+            writer.write(x >> trail, 32 - lead - trail)
+        else:
+            lead = leading
+            trail = trailing
+            writer.write(0b11, 2)
+            writer.write(lead, 5)
+            writer.write(32 - lead - trail - 1, 5)
+            writer.write(x >> trail, 32 - lead - trail)
+    return writer.finish() - offset
+
+
+# 编码一批样本为新的bytes对象(参考实现，设备上优先使用encode_block_into)
+def encode_block(timestamps, values, mode=MODE_DELTA):
+    buf = bytearray(block_max_size(len(values)))
+    return bytes(buf[:encode_block_into(buf, timestamps, values, mode)])
+
+
+# 解码数据块，返回(时间戳列表, 数值列表)；数据块无效时抛出ValueError
+def decode_block(data):
+    data = bytes(data)
+    if len(data) < BLOCK_HEADER_SIZE + 4:
+        raise ValueError('压缩块过短')
+    version, mode, count, timestamp = struct.unpack_from(BLOCK_HEADER, data, 0)
+    if version != BLOCK_VERSION:
+        raise ValueError(f'不支持的压缩块版本: {version}')
+    if mode not in (MODE_DELTA, MODE_XOR):
+        raise ValueError(f'不支持的压缩模式: {mode}')
+    if not count:
+        return [], []
+    value = struct.unpack_from('!i' if mode == MODE_DELTA else '!I', data, BLOCK_HEADER_SIZE)[0]
+    timestamps = [timestamp]
+    raw = [value]
+    reader = _BitReader(data, BLOCK_HEADER_SIZE + 4)
+    delta = 0
+    lead = trail = -1
+    for _ in range(1, count):
+        delta = (delta + _read_signed(reader, _TIME_BUCKETS)) & _MASK32
+        timestamp = (timestamp + delta) & _MASK32
+        timestamps.append(timestamp)
+        if mode == MODE_DELTA:
+            value += _read_signed(reader, _DELTA_BUCKETS)
+        elif reader.read(1):
+            if reader.read(1):
+                lead = reader.read(5)
+                trail = 32 - lead - reader.read(5) - 1
+            elif lead < 0:
+                raise ValueError('压缩块缺少有效位窗口')
+            value ^= reader.read(32 - lead - trail) << trail
+        raw.append(value)
+    if reader.offset < len(data) - (1 if reader.bit else 0):
+        raise ValueError('压缩块末尾有多余数据')
+    if mode == MODE_DELTA:
+        return timestamps, [v / 100 for v in raw]
+    return timestamps, [struct.unpack('!f', struct.pack('!I', v))[0] for v in raw]
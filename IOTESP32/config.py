@@ -4,6 +4,10 @@
 # WiFi配置
 WIFI_SSID = 'your_wifi_ssid'
 WIFI_PASSWORD = 'your_wifi_password'
+WIFI_CONNECT_TIMEOUT = 15000  # 单次WiFi连接尝试超时(毫秒)
+WIFI_BACKOFF_MIN = 1000  # 连接失败后的最短退避时间(毫秒)，之后按指数增长
+WIFI_BACKOFF_MAX = 60000  # 最长退避时间(毫秒)
+WIFI_POLL_INTERVAL = 200  # asyncio模式下WiFi状态机轮询间隔(毫秒)
 
 # MQTT配置
 MQTT_CLIENT_ID = b'esp32_s3_temp_sensor'
@@ -11,6 +15,13 @@ MQTT_BROKER = 'mqtt.eclipseprojects.io'  # MQTT代理地址
 MQTT_PORT = 1883
 MQTT_USER = b''  # MQTT用户名
 MQTT_PASSWORD = b''  # MQTT密码
+MQTT_KEEPALIVE = 60  # MQTT保活时间(秒)，代理在1.5倍保活时间内收不到报文即断开；MQTT_PING_INTERVAL不能超过它的3/4
+MQTT_TLS = False  # 是否经TLS连接MQTT代理(MQTT_PORT通常改为8883)，需要ssl参数接受SSLContext的umqtt.simple
+MQTT_TLS_CA_FILE = None  # 验证代理证书的CA证书文件，None表示不验证(仅用于测试)
+MQTT_TLS_CERT_FILE = None  # 双向认证的客户端证书文件，None表示不使用
+MQTT_TLS_KEY_FILE = None  # 双向认证的客户端私钥文件
+MQTT_TLS_SERVER_HOSTNAME = None  # 证书验证和SNI使用的主机名，None表示使用MQTT_BROKER
+MQTT_TLS_RESUME = True  # 重连时用上次连接的TLS会话恢复握手，省去证书验证和密钥交换
 
 # 主题配置
 TEMP_TOPIC = b'esp32/s3/temperature'  # 温度数据发布主题
@@ -23,11 +34,74 @@ NUM_LEDS = 1  # LED数量
 # 性能配置
 TEMP_SAMPLE_INTERVAL = 15000  # 温度采样间隔(毫秒)
 MQTT_QOS = 1  # MQTT服务质量等级
+PUBLISH_BATCH_SIZE = 1  # 每条消息合并的样本数，1表示逐条发布；大于1启用批量发布
+PUBLISH_BATCH_INTERVAL = 60000  # 批量模式下批内最早样本的最长等待时间(毫秒)，到期即使未满也发出
+PAYLOAD_FORMAT = 'json'  # 载荷格式: 'json'(默认)、'binary'(紧凑二进制帧，见payload.py) 或 'compressed'(批量消息为压缩块，见compress.py)
+COMPRESS_VALUE_MODE = 'delta'  # 压缩块的数值编码: 'delta'(0.01°C量化后写差值) 或 'xor'(float32异或)
+BINARY_TOPIC = None  # 二进制格式发布主题，None表示使用 TEMP_TOPIC + '/bin/<设备ID>'
+
+# 按变化上报配置(report-by-exception)
+REPORT_BY_EXCEPTION = False  # 启用后仅在温度变化超过死区或心跳到期时发布
+DEADBAND_ABS = 0.2  # 绝对死区(°C)，0表示不使用
+DEADBAND_REL = 0.0  # 相对死区(相对上次发布值的比例，例如0.01表示1%)，0表示不使用
+HEARTBEAT_INTERVAL = 300000  # 最长静默时间(毫秒)，到期即使无变化也发布一次，0表示不发心跳
+
+# 低功耗配置
+POWER_MODE = 'always_on'  # 'always_on'(常开), 'lightsleep' 或 'deepsleep'(采样间隙睡眠，TEMP_SAMPLE_INTERVAL为唤醒周期)
+DUTY_PUBLISH_EVERY = 4  # 低功耗模式下累计多少条样本联网发布一次
+DUTY_MAX_PENDING = 128  # 低功耗模式下RTC内存中最多保留的待发样本数
+
+# 调度配置
+ASYNC_MODE = False  # 是否启用asyncio任务调度模式(设备上为uasyncio)
+THREAD_MODE = False  # 双线程模式: 网络线程负责WiFi/MQTT和发布，实时线程负责采样和LED(需要_thread，不能与ASYNC_MODE同时启用)
+THREAD_STACK_SIZE = 16384  # 双线程模式下实时线程的栈大小(字节)，0表示使用平台默认值
+CONTROL_POLL_INTERVAL = 10  # asyncio和双线程模式下控制消息轮询间隔(毫秒)
+CONTROL_DRAIN_MAX = 32  # 每个控制周期最多取出的控制消息数，只应用其中最新的状态
+LED_MAX_FPS = 50  # LED每秒最多写出的帧数，0表示不限制
+LED_ANIMATION_FPS = 30  # 过渡和动态效果(呼吸、彩虹、追逐)的渲染帧率，0表示只在状态变化时写出
+NETWORK_CHECK_INTERVAL = 30000  # asyncio模式下网络状态检查间隔(毫秒)
+MQTT_PING_INTERVAL = 30  # MQTT保活检查间隔(秒)，期间有收发流量时不发送ping
+MQTT_BACKOFF_MIN = 1000  # MQTT重连失败后的初始退避时间(毫秒)，断开后的第一次重连不等待
+MQTT_BACKOFF_MAX = 60000  # MQTT重连退避时间上限(毫秒)
+MAX_PENDING_SAMPLES = 20  # asyncio模式下待发布样本队列上限(双线程模式下为实时线程到网络线程的样本队列容量)
+SAMPLE_MODE = 'loop'  # 片内温度采样方式: 'loop'(主循环/采样任务按周期读取) 或 'timer'(硬件定时器触发，不受发布和重连阻塞影响)
+SAMPLE_OVERSAMPLE = 1  # timer模式下每个温度样本的子样本数，定时器按TEMP_SAMPLE_INTERVAL/SAMPLE_OVERSAMPLE触发，子样本取平均
+SAMPLE_TIMER_ID = 0  # timer模式使用的硬件定时器编号
+SAMPLE_RING_SIZE = 32  # timer模式下定时器与主循环之间的样本环形缓冲区条数
+GC_MODE = 'idle'  # 'idle'(在主循环休眠前/空闲任务中按分配量显式回收) 或 'auto'(只依赖MicroPython的自动GC)
+GC_COLLECT_THRESHOLD = 16384  # idle模式下自上次回收以来分配达到该字节数时回收
+MQTT_CLIENT = 'umqtt'  # 'umqtt'(umqtt.simple，每次QoS1发布阻塞等待PUBACK) 或 'async'(mqtt_async.py，仅asyncio模式)
+MQTT_INFLIGHT_WINDOW = 8  # 异步客户端最多同时在途(未收到PUBACK)的QoS1消息数
+MQTT_BUFFER_SIZE = 1024  # 异步客户端每个报文缓冲区的字节数，占用RAM约为(窗口+2)倍
+
+# 断网缓存配置(store-and-forward)
+STORE_FORWARD_ENABLED = True  # 发布失败的样本是否写入flash缓冲区，恢复连接后补发
+STORE_FORWARD_FILE = 'samples.buf'  # 缓冲区文件(预分配，每条样本8字节)
+STORE_FORWARD_CAPACITY = 1024  # 缓冲区最多保存的样本数
+STORE_FORWARD_DROP = 'oldest'  # 缓冲区满时的策略: 'oldest'覆盖最旧样本, 'newest'丢弃新样本
+REPLAY_BATCH_SIZE = 32  # 补发时每条消息合并的样本数
 
 # 调试配置
 DEBUG = True  # 是否启用调试日志
-LOG_INTERVAL = 5000  # 日志输出间隔(毫秒)，0表示每次都输出
+LOG_INTERVAL = 5000  # 同一条日志的最短输出间隔(毫秒)，间隔内的重复日志只计数不输出，0表示每次都输出
 LOG_LEVEL = 'INFO'  # 日志级别: DEBUG, INFO, WARNING, ERROR
+LOG_RING_SIZE = 64  # 内存中保留的最近日志条数，可通过MQTT取回
+LOG_TOPIC = None  # 日志缓冲区发布主题(如b'esp32/s3/log')，向该主题加'/get'发送任意消息即可取回；None表示关闭。
+# 日志含网络和配置信息，只应在启用认证或TLS、限制了主题访问权限的代理上开启
+STATS_TOPIC = None  # 运行指标快照发布主题(如b'esp32/s3/stats'，含计数器、测量值和耗时直方图)，None表示关闭；
+# 快照暴露连接和运行状态，只应在启用认证或TLS、限制了主题访问权限的代理上开启
+STATS_INTERVAL = 60000  # 运行指标快照发布间隔(毫秒)
+
+# 运行时配置(经MQTT修改采样间隔、滤波、QoS、日志等，无需重启，见README)
+CONFIG_TOPIC = None  # 如b'esp32/s3/config'，向该主题加'/set'发送JSON修改配置，设备把结果和当前配置发布到该主题；None表示关闭。
+# 任何能向代理发布的客户端都能改写配置，只应在启用认证或TLS、限制了主题访问权限的代理上开启
+CONFIG_STORE_FILE = 'config.bin'  # 运行时修改的配置项保存文件，启动时覆盖本文件中的同名项
+
+# 快速启动(缩短上电/看门狗复位到第一次发布的时间，见README)
+FAST_BOOT = False  # 用缓存的BSSID、信道、IP和代理地址连接，系统信息、附加传感器和运行指标推迟到第一次发布之后
+NET_CACHE_FILE = 'net.bin'  # 快速启动使用的网络参数缓存文件
+BOOT_TOPIC = None  # 启动各阶段耗时记录的发布主题(如b'esp32/s3/boot'，第一次发布后发一条)，None表示只输出到日志；
+# 只应在启用认证或TLS、限制了主题访问权限的代理上开启
 
 # 安全配置
 ENABLE_AUTH = False  # 是否启用MQTT认证
@@ -36,8 +110,27 @@ AUTH_TOKEN = ''  # 认证令牌
 # LED默认配置
 DEFAULT_LED_COLOR = {'r': 0, 'g': 0, 'b': 0}
 DEFAULT_LED_BRIGHTNESS = 0.5
+LED_GAMMA = 1.0  # LED颜色gamma校正系数，1.0表示不校正(与原输出一致)；2.2使低亮度颜色过渡更均匀，但同一控制消息写出的值会变暗
+LED_TRANSITION_MS = 0  # 颜色变化的默认过渡时长(毫秒)，0表示立即切换；控制消息的duration字段可修改
 
 # 温度传感器配置
 TEMP_CALIBRATION_OFFSET = 0.0  # 温度校准偏移量
+TEMP_VALID_MIN = -40.0  # 有效温度下限(°C)，NaN或超出上下限的读数视为传感器故障，计数后丢弃
+TEMP_VALID_MAX = 125.0  # 有效温度上限(°C)
 TEMP_FILTER_ENABLED = True  # 是否启用温度滤波
-TEMP_FILTER_SAMPLES = 5  # 温度滤波样本数
\ No newline at end of file
+TEMP_FILTER_SAMPLES = 5  # 滑动平均(ma)样本数
+TEMP_FILTER_CHAIN = 'ma'  # 滤波链，逗号分隔按顺序执行: ma(滑动平均), ema, median(中值去尖峰), kalman
+TEMP_FILTER_EMA_ALPHA = 0.3  # EMA平滑系数(0-1]，越小越平滑
+TEMP_FILTER_MEDIAN_SAMPLES = 5  # 中值滤波窗口大小
+TEMP_FILTER_KALMAN_Q = 0.01  # 卡尔曼滤波过程噪声方差
+TEMP_FILTER_KALMAN_R = 0.5  # 卡尔曼滤波测量噪声方差
+
+# 附加传感器配置(与片内温度由同一个调度器按各自周期采样，见README)
+# 每项: name, driver('adc'或'sht3x'), period(毫秒), 可选filter/topic/unit/offset；
+# adc需要pin，可选scale(乘数)和atten；sht3x需要scl、sda和channel('temperature'或'humidity')，可选bus、addr
+SENSORS = []
+SENSOR_TOPIC_PREFIX = None  # 附加传感器默认主题前缀，None表示使用TEMP_TOPIC的上一级(esp32/s3)
+INCLUDE_BATTERY_STATUS = False  # 是否注册电池电压传感器(主题<前缀>/battery)，并在单条温度消息中附带battery字段
+BATTERY_ADC_PIN = 1  # 电池分压后接入的ADC引脚
+BATTERY_DIVIDER = 2.0  # 分压系数，电池电压 = ADC电压 x 分压系数
+BATTERY_SAMPLE_INTERVAL = 60000  # 电池电压采样间隔(毫秒)
\ No newline at end of file
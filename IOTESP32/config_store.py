@@ -0,0 +1,188 @@
+# 运行时配置的持久化存储
+# 经MQTT修改的配置项以紧凑的二进制记录保存在flash文件中，启动时一次读出并覆盖config.py中的同名项，
+# 不需要编译和执行Python源码:
+#   文件头(8字节): 魔数 'CFG1', 版本, 记录数, 记录区长度(uint16)
+#   记录区: 每条为配置项编号(uint8，即在SETTINGS中的序号) + 值；
+#          整数为int32，小数为float64，布尔值为uint8，字符串为长度(uint8) + UTF-8字节
+#   文件尾: 文件头和记录区的CRC32(uint32)
+# 保存时先完整写入临时文件再用rename替换，掉电时旧文件或新文件二者必有其一完整可用；
+# 校验失败、版本不符或含未知编号的文件整体忽略(回退到config.py)。
+import struct
+
+try:
+    import os
+except ImportError:
+    import uos as os
+
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+
+MAGIC = b'CFG1'
+VERSION = 1
+HEADER_FORMAT = '<4sBBH'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CRC_FORMAT = '<I'
+CRC_SIZE = struct.calcsize(CRC_FORMAT)
+
+# 可在运行时修改的配置项及其类型: 'i'整数, 'f'小数, 'b'布尔, 's'字符串
+# 编号即序号，写入文件后不能改变，新增配置项只能追加到末尾
+SETTINGS = (
+    ('TEMP_SAMPLE_INTERVAL', 'i'),
+    ('MQTT_QOS', 'i'),
+    ('LOG_LEVEL', 's'),
+    ('LOG_INTERVAL', 'i'),
+    ('TEMP_CALIBRATION_OFFSET', 'f'),
+    ('TEMP_FILTER_ENABLED', 'b'),
+    ('TEMP_FILTER_CHAIN', 's'),
+    ('TEMP_FILTER_SAMPLES', 'i'),
+    ('TEMP_FILTER_EMA_ALPHA', 'f'),
+    ('TEMP_FILTER_MEDIAN_SAMPLES', 'i'),
+    ('TEMP_FILTER_KALMAN_Q', 'f'),
+    ('TEMP_FILTER_KALMAN_R', 'f'),
+    ('REPORT_BY_EXCEPTION', 'b'),
+    ('DEADBAND_ABS', 'f'),
+    ('DEADBAND_REL', 'f'),
+    ('HEARTBEAT_INTERVAL', 'i'),
+    ('STATS_INTERVAL', 'i'),
+)
+NAMES = tuple(name for name, _ in SETTINGS)
+
+
+def _setting(name):
+    for i in range(len(SETTINGS)):
+        if SETTINGS[i][0] == name:
+            return i, SETTINGS[i][1]
+    raise ValueError(f'不支持在运行时修改: {name}')
+
+
+# 把MQTT消息中的值转换为配置项的类型，类型不符时抛出ValueError
+def coerce(name, value):
+    kind = _setting(name)[1]
+    if kind == 'b':
+        if isinstance(value, bool):
+            return value
+    elif kind == 's':
+        if isinstance(value, str) and len(value.encode()) < 256:
+            return value
+    elif not isinstance(value, bool) and isinstance(value, (int, float)):
+        if kind == 'f':
+            return float(value)
+        if value == int(value) and -0x80000000 <= value <= 0x7FFFFFFF:
+            return int(value)
+    raise ValueError(f'{name}的值类型无效: {value!r}')
+
+
+# 把配置项编码为文件内容
+def encode(values):
+    records = bytearray()
+    for name in values:
+        index, kind = _setting(name)
+        value = values[name]
+        records.append(index)
+        if kind == 'i':
+            records += struct.pack('<i', value)
+        elif kind == 'f':
+            records += struct.pack('<d', value)
+        elif kind == 'b':
+            records.append(1 if value else 0)
+        else:
+            data = value.encode()
+            records.append(len(data))
+            records += data
+    data = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(values), len(records)) + records
+    return data + struct.pack(CRC_FORMAT, crc32(data) & 0xFFFFFFFF)
+
+
+# 解析文件内容，格式不对时抛出ValueError
+def decode(data):
+    if len(data) < HEADER_SIZE + CRC_SIZE:
+        raise ValueError('配置文件不完整')
+    magic, version, count, size = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC or version != VERSION or HEADER_SIZE + size + CRC_SIZE != len(data):
+        raise ValueError('配置文件头无效')
+    end = HEADER_SIZE + size
+    if struct.unpack_from(CRC_FORMAT, data, end)[0] != crc32(memoryview(data)[:end]) & 0xFFFFFFFF:
+        raise ValueError('配置文件校验失败')
+    values = {}
+    i = HEADER_SIZE
+    for _ in range(count):
+        if i >= end or data[i] >= len(SETTINGS):
+            raise ValueError('配置文件含未知配置项')
+        name, kind = SETTINGS[data[i]]
+        i += 1
+        if kind == 'i':
+            values[name] = struct.unpack_from('<i', data, i)[0]
+            i += 4
+        elif kind == 'f':
+            values[name] = struct.unpack_from('<d', data, i)[0]
+            i += 8
+        elif kind == 'b':
+            values[name] = bool(data[i])
+            i += 1
+        else:
+            n = data[i]
+            values[name] = bytes(data[i + 1:i + 1 + n]).decode()
+            i += 1 + n
+    if i != end:
+        raise ValueError('配置文件记录区长度不符')
+    return values
+
+
+# 先完整写入临时文件再rename替换path，失败时抛出OSError(网络参数缓存也使用)
+def write_atomic(path, tmp_path, data):
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # 部分文件系统(如FAT)不能rename到已存在的文件，先删除旧文件；读取方应在此间隙使用临时文件
+        os.remove(path)
+        os.rename(tmp_path, path)
+
+
+class ConfigStore:
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.loads = 0
+        self.saves = 0
+        self.error = None  # 最近一次加载或保存失败的原因
+
+    # 读取已保存的配置项；文件不存在时返回空字典，损坏时记录原因并返回空字典
+    # 替换过程中掉电可能只剩临时文件，此时使用临时文件
+    def load(self):
+        self.error = None
+        for path in (self.path, self.tmp_path):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            try:
+                values = decode(data)
+            except (ValueError, UnicodeError) as e:
+                self.error = e
+                continue
+            self.loads += 1
+            return values
+        return {}
+
+    # 原子地保存全部配置项(覆盖之前保存的内容)
+    def save(self, values):
+        try:
+            write_atomic(self.path, self.tmp_path, encode(values))
+        except OSError as e:
+            self.error = e
+            return False
+        self.saves += 1
+        return True
+
+    # 删除已保存的配置，下次启动只使用config.py
+    def clear(self):
+        for path in (self.path, self.tmp_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
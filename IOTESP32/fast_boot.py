@@ -0,0 +1,152 @@
+# 快速启动支持
+# BootTimer记录从main.py开始执行到第一次发布的各阶段耗时，用于跟踪启动时间的变化。
+# NetCache把最近一次常规连接得到的网络参数保存在flash文件中，上电或看门狗复位后直接用来连接，
+# 跳过扫描、DHCP和DNS(低功耗模式的RTC缓存只在深度睡眠唤醒时有效):
+#   文件头(9字节): 魔数 'NET1', 版本, 配置指纹(uint32，WiFi SSID和MQTT代理地址的CRC32，修改配置后缓存自动失效)
+#   网络参数: BSSID、信道、IP/掩码/网关/DNS和代理IP，格式与RTC缓存相同(power.NET_FORMAT)
+#   文件尾: 文件头和网络参数的CRC32(uint32)
+import struct
+import time
+
+from power import NET_SIZE, pack_net, unpack_net
+from config_store import write_atomic
+
+try:
+    import os
+except ImportError:
+    import uos as os
+
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+
+MAGIC = b'NET1'
+VERSION = 1
+HEADER_FORMAT = '<4sBI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CRC_FORMAT = '<I'
+CRC_SIZE = struct.calcsize(CRC_FORMAT)
+FILE_SIZE = HEADER_SIZE + NET_SIZE + CRC_SIZE
+
+# 启动阶段，按发生顺序: 模块导入、配置加载和校验、LED初始化、其余初始化、WiFi连接、MQTT连接、第一次发布
+PHASES = ('import', 'config', 'led', 'init', 'wifi', 'mqtt', 'publish')
+
+
+# 配置指纹: 各部分(字符串或字节串)依次计算CRC32
+def fingerprint(*parts):
+    crc = 0
+    for part in parts:
+        crc = crc32(part.encode() if isinstance(part, str) else part, crc)
+    return crc & 0xFFFFFFFF
+
+
+# 把网络参数(bssid, channel, ifconfig, broker_ip)编码为文件内容
+def encode(key, net):
+    buf = bytearray(FILE_SIZE)
+    struct.pack_into(HEADER_FORMAT, buf, 0, MAGIC, VERSION, key)
+    pack_net(buf, HEADER_SIZE, net)
+    end = HEADER_SIZE + NET_SIZE
+    struct.pack_into(CRC_FORMAT, buf, end, crc32(memoryview(buf)[:end]) & 0xFFFFFFFF)
+    return bytes(buf)
+
+
+# 解析文件内容，格式不对或指纹不符时抛出ValueError
+def decode(data, key):
+    if len(data) != FILE_SIZE:
+        raise ValueError('网络参数缓存不完整')
+    magic, version, saved_key = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('网络参数缓存文件头无效')
+    end = HEADER_SIZE + NET_SIZE
+    if struct.unpack_from(CRC_FORMAT, data, end)[0] != crc32(memoryview(data)[:end]) & 0xFFFFFFFF:
+        raise ValueError('网络参数缓存校验失败')
+    if saved_key != key:
+        raise ValueError('WiFi或MQTT代理配置已修改')
+    return unpack_net(data, HEADER_SIZE)
+
+
+class BootTimer:
+    def __init__(self, start=None):
+        self.start = time.ticks_ms() if start is None else start
+        self.phases = {}  # 阶段名 -> 耗时(毫秒)
+        self.finished = False  # 最后一个阶段(第一次发布)已记录
+        self._last = self.start
+        self._next = 0  # 下一个可记录阶段在PHASES中的序号
+
+    # 记录一个阶段在此刻结束，耗时为距上一次记录的毫秒数；
+    # 已记录过的阶段和排在已记录阶段之前的阶段不再记录，没有单独记录的阶段并入下一个阶段
+    def mark(self, phase, now=None):
+        i = PHASES.index(phase)
+        if i < self._next:
+            return False
+        if now is None:
+            now = time.ticks_ms()
+        self.phases[phase] = time.ticks_diff(now, self._last)
+        self._last = now
+        self._next = i + 1
+        self.finished = self._next == len(PHASES)
+        return True
+
+    # 从上一次记录到此刻的时间不计入任何阶段(如模块导入完成到调用init()之间)
+    def skip(self, now=None):
+        self._last = time.ticks_ms() if now is None else now
+
+    def total(self):
+        return sum(self.phases.values())
+
+    def record(self):
+        return {'phases': dict(self.phases), 'total': self.total()}
+
+    # 按阶段顺序格式化，用于日志
+    def summary(self):
+        return ', '.join(f'{phase} {self.phases[phase]}' for phase in PHASES if phase in self.phases)
+
+
+class NetCache:
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.saves = 0
+        self.error = None  # 最近一次加载或保存失败的原因
+
+    # 读取缓存的(bssid, channel, ifconfig, broker_ip)；文件不存在、损坏或指纹不符时返回None
+    # 替换过程中掉电可能只剩临时文件，此时使用临时文件
+    def load(self, key):
+        self.error = None
+        for path in (self.path, self.tmp_path):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            try:
+                return decode(data, key)
+            except ValueError as e:
+                self.error = e
+        return None
+
+    # 原子地保存网络参数；与已保存的内容相同时不写flash
+    def save(self, key, net):
+        data = encode(key, net)
+        try:
+            with open(self.path, 'rb') as f:
+                if f.read() == data:
+                    return True
+        except OSError:
+            pass
+        try:
+            write_atomic(self.path, self.tmp_path, data)
+        except OSError as e:
+            self.error = e
+            return False
+        self.saves += 1
+        return True
+
+    # 删除缓存，下次启动走常规连接
+    def clear(self):
+        for path in (self.path, self.tmp_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,111 @@
+# 堆内存与GC监控
+# 基于gc.mem_alloc()的读数(上次回收以来的已用堆，包括尚未回收的垃圾):
+#   - begin()/end()包住主循环的一轮，两次读数之差即本轮分配的字节数；读数变小说明期间发生了自动GC，该轮不计入分配统计
+#   - account()在任意时刻累计自上次读数以来的分配量，asyncio模式下用于统计分配速率
+#   - collect()执行一次显式GC并记录暂停时长(微秒)；idle()在空闲窗口中调用，自上次回收以来分配超过threshold字节才回收，
+#     使回收发生在主循环休眠前而不是某次发布或LED写出的中途
+#   - 高水位为观察到的最大已用堆(回收前)，mem_free的最小值一并记录
+# 所有计数都是小整数，读数和统计本身不分配堆内存。
+import gc
+import time
+
+
+class HeapMonitor:
+    def __init__(self, threshold=16384):
+        self.threshold = threshold  # idle()触发回收的分配量(字节)，0表示每次idle()都回收
+        self._start = 0
+        self._last = gc.mem_alloc()
+        self._collected_at = self._last  # 上次显式回收后的已用堆
+        self._since = time.ticks_ms()
+        self.iterations = 0
+        self.clean = 0  # 零分配的轮数
+        self.alloc_last = 0
+        self.alloc_max = 0
+        self.alloc_iterations = 0  # begin()/end()之间累计分配的字节数
+        self.alloc_total = 0  # 全部读数累计的分配字节数
+        self.auto_gcs = 0  # 检测到的自动GC次数
+        self.collects = 0  # 显式GC次数
+        self.pause_last = 0
+        self.pause_max = 0
+        self.pause_total = 0
+        self.high_water = self._last
+        self.free_min = gc.mem_free()
+
+    def _observe(self, used):
+        if used > self.high_water:
+            self.high_water = used
+            free = gc.mem_free()
+            if free < self.free_min:
+                self.free_min = free
+
+    # 累计自上次读数以来的分配量
+    def account(self):
+        used = gc.mem_alloc()
+        if used >= self._last:
+            self.alloc_total += used - self._last
+        else:
+            self.auto_gcs += 1
+        self._last = used
+        self._observe(used)
+        return used
+
+    def begin(self):
+        self._start = self.account()
+
+    def end(self):
+        used = self.account()
+        self.iterations += 1
+        if used < self._start:
+            return
+        alloc = used - self._start
+        self.alloc_last = alloc
+        self.alloc_iterations += alloc
+        if alloc > self.alloc_max:
+            self.alloc_max = alloc
+        if not alloc:
+            self.clean += 1
+
+    # 执行一次GC，返回暂停时长(微秒)
+    def collect(self):
+        self.account()
+        start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), start)
+        self.collects += 1
+        self.pause_last = pause
+        self.pause_total += pause
+        if pause > self.pause_max:
+            self.pause_max = pause
+        used = gc.mem_alloc()
+        self._last = used
+        self._collected_at = used
+        return pause
+
+    # 空闲窗口: 自上次回收以来分配达到threshold时回收，返回是否回收
+    def idle(self):
+        used = self.account()
+        if used < self._collected_at:
+            # 期间已发生自动GC
+            self._collected_at = used
+            return False
+        if used - self._collected_at < self.threshold:
+            return False
+        self.collect()
+        return True
+
+    def stats(self):
+        iterations = self.iterations or 1
+        elapsed = time.ticks_diff(time.ticks_ms(), self._since) or 1
+        return {
+            'iterations': self.iterations,
+            'clean': self.clean,
+            'alloc_avg': self.alloc_iterations // iterations,
+            'alloc_max': self.alloc_max,
+            'alloc_rate': self.alloc_total * 1000 // elapsed,
+            'auto_gcs': self.auto_gcs,
+            'collects': self.collects,
+            'pause_avg': self.pause_total // self.collects if self.collects else 0,
+            'pause_max': self.pause_max,
+            'high_water': self.high_water,
+            'free_min': self.free_min,
+        }
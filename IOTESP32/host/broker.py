@@ -0,0 +1,283 @@
+# 进程内MQTT代理替身
+# umqtt替身的所有客户端都连到同一个Broker实例(BROKER)，按主题过滤器(支持+和#通配符)互相投递消息。
+# 仿真测试或基准脚本可以:
+#   - 以"外部客户端"身份调用publish()向设备发送控制消息，at参数指定投递时刻
+#   - 通过messages()读取设备发布的全部消息及到达时刻
+#   - 用stop()/start()模拟代理宕机和恢复，kick()强制断开某个客户端
+#   - 用serve()在本机端口上提供真实的MQTT 3.1.1服务(可选TLS)，供基于asyncio流的客户端(mqtt_async.py)连接
+# 延迟参数(秒)模拟网络往返: connect_latency、publish_latency(QoS1等待PUBACK)、ping_latency。
+# umqtt替身在调用方阻塞这段时间；TCP会话则延迟回复CONNACK/PUBACK/PINGRESP，不阻塞事件循环。
+# 每个主题的接收方在第一次路由时算出并缓存，会话或订阅变化时清空，上千个会话时每条消息不必逐个匹配。
+import asyncio
+import time
+
+import network
+
+# ECONNREFUSED，代理不可用时connect()抛出
+ECONNREFUSED = 111
+
+
+def topic_matches(topic_filter, topic):
+    if isinstance(topic_filter, bytes):
+        topic_filter = topic_filter.decode()
+    if isinstance(topic, bytes):
+        topic = topic.decode()
+    if topic_filter == topic:
+        return True
+    f_parts = topic_filter.split('/')
+    t_parts = topic.split('/')
+    for i, part in enumerate(f_parts):
+        if part == '#':
+            return True
+        if i >= len(t_parts):
+            return False
+        if part != '+' and part != t_parts[i]:
+            return False
+    return len(f_parts) == len(t_parts)
+
+
+class Broker:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.up = True
+        self.connect_latency = 0.0
+        self.publish_latency = 0.0
+        self.ping_latency = 0.0
+        self.sessions = {}  # client_id -> 客户端对象
+        self.log = []  # 代理收到的所有消息: (ticks_ms, client_id, topic, payload, qos)
+        self.connects = 0
+        self.refused = 0
+        self.kicks = 0
+        self.pings = 0
+        self._routes = {}  # 主题 -> 订阅了该主题的会话列表
+
+    # 会话或订阅有变化: 清空路由缓存(客户端在订阅后调用)
+    def routes_changed(self):
+        self._routes.clear()
+
+    # 代理宕机: 拒绝新连接并断开所有现有会话
+    def stop(self):
+        self.up = False
+        self.kick()
+
+    def start(self):
+        self.up = True
+
+    # 强制断开客户端(client_id为None时断开全部)，客户端在下一次收发时发现连接已断
+    def kick(self, client_id=None):
+        for cid in list(self.sessions):
+            if client_id is None or cid == client_id:
+                self.sessions.pop(cid).drop()
+                self.kicks += 1
+        self._routes.clear()
+
+    def connect(self, client):
+        if not self.up:
+            self.refused += 1
+            raise OSError(ECONNREFUSED)
+        # 同一client_id重复连接时踢掉旧会话(与真实代理一致)
+        old = self.sessions.get(client.client_id)
+        if old is not None and old is not client:
+            old.drop()
+        self.sessions[client.client_id] = client
+        self.connects += 1
+        self._routes.clear()
+
+    def disconnect(self, client):
+        if self.sessions.get(client.client_id) is client:
+            del self.sessions[client.client_id]
+            self._routes.clear()
+
+    def ping(self, client):
+        self.pings += 1
+
+    # 路由一条消息: sender为None表示来自外部客户端；at为投递时刻(ticks_ms)，缺省为立即
+    def publish(self, topic, payload, qos=0, sender=None, at=None):
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        now = time.ticks_ms()
+        if sender is not None:
+            self.log.append((now, sender.client_id, topic, bytes(payload), qos))
+        at = now if at is None else at
+        clients = self._routes.get(topic)
+        if clients is None:
+            clients = self._routes[topic] = [client for client in self.sessions.values()
+                                             if any(topic_matches(f, topic) for f, _ in client.subscriptions)]
+        for client in clients:
+            if client is not sender:
+                client.deliver(at, topic, bytes(payload))
+
+    # 设备发布到匹配主题的消息: [(ticks_ms, topic, payload), ...]
+    def messages(self, topic_filter='#'):
+        return [(t, topic, payload) for t, _, topic, payload, _ in self.log if topic_matches(topic_filter, topic)]
+
+    # 在host:port上监听MQTT连接(port为0时由系统分配)，返回asyncio服务器对象，实际端口见server.sockets
+    # ssl为代理端的SSLContext时监听MQTT over TLS(测试证书见tlscerts.py)
+    async def serve(self, host='127.0.0.1', port=0, ssl=None):
+        async def accept(reader, writer):
+            try:
+                await TCPSession(self, reader, writer).run()
+            except asyncio.CancelledError:
+                pass
+        return await asyncio.start_server(accept, host, port, ssl=ssl)
+
+
+# 经TCP连接的MQTT会话: 解析客户端报文并交给Broker路由，把投递给它的消息编码为PUBLISH发回
+# 故障注入可能来自后台定时线程，所以对连接的写入和关闭都转到事件循环线程中执行
+class TCPSession:
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.client_id = None
+        self.connected = False
+        self.subscriptions = []
+
+    def _write(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def _close(self):
+        self.connected = False
+        if self.drop in network.on_drop:
+            network.on_drop.remove(self.drop)
+        self.writer.close()
+
+    # 由代理(踢出/宕机)或网络替身(掉线)调用
+    def drop(self):
+        self.connected = False
+        self.loop.call_soon_threadsafe(self._close)
+
+    def deliver(self, at, topic, msg):
+        delay = max(0, time.ticks_diff(at, time.ticks_ms())) / 1000
+        if not delay and self._in_loop():
+            self._send_publish(topic, msg)
+        else:
+            self.loop.call_soon_threadsafe(self.loop.call_later, delay, self._send_publish, topic, msg)
+
+    # 是否在本会话的事件循环线程中(会话之间转发消息时可直接写出，不经过线程安全的调度)
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _send_publish(self, topic, msg):
+        if self.connected:
+            self._write(_packet(0x30, _string(topic) + msg))
+
+    def _later(self, delay, fn, *args):
+        if delay:
+            self.loop.call_later(delay, fn, *args)
+        else:
+            fn(*args)
+
+    async def _read_packet(self):
+        header = (await self.reader.readexactly(1))[0]
+        length = 0
+        shift = 0
+        while True:
+            b = (await self.reader.readexactly(1))[0]
+            length |= (b & 0x7F) << shift
+            shift += 7
+            if not b & 0x80:
+                break
+        body = await self.reader.readexactly(length) if length else b''
+        return header, body
+
+    async def run(self):
+        try:
+            while True:
+                header, body = await self._read_packet()
+                ptype = header & 0xF0
+                if ptype == 0x10:
+                    await self._on_connect(body)
+                    if not self.connected:
+                        break
+                elif not self.connected:
+                    break
+                elif ptype == 0x30:
+                    self._on_publish(header, body)
+                elif ptype == 0x80:
+                    pid = body[:2]
+                    i = 2
+                    codes = b''
+                    while i < len(body):
+                        n = (body[i] << 8) | body[i + 1]
+                        self.subscriptions.append((body[i + 2:i + 2 + n], body[i + 2 + n]))
+                        self.broker.routes_changed()
+                        codes += bytes((min(body[i + 2 + n], 1),))
+                        i += 3 + n
+                    self._write(_packet(0x90, pid + codes))
+                elif ptype == 0xC0:
+                    self.broker.ping(self)
+                    self._later(self.broker.ping_latency, self._write, b'\xd0\x00')
+                elif ptype == 0xE0:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError):
+            pass
+        finally:
+            if self.connected:
+                self.broker.disconnect(self)
+            self._close()
+
+    async def _on_connect(self, body):
+        n = (body[0] << 8) | body[1]
+        o = 2 + n + 4  # 协议名, 级别, 标志, 保活
+        n = (body[o] << 8) | body[o + 1]
+        self.client_id = body[o + 2:o + 2 + n]
+        if self.broker.connect_latency:
+            await asyncio.sleep(self.broker.connect_latency)
+        try:
+            if not network.link_up():
+                raise OSError(ECONNREFUSED)
+            self.broker.connect(self)
+        except OSError:
+            self._write(b'\x20\x02\x00\x03')  # 服务不可用
+            return
+        self.connected = True
+        network.on_drop.append(self.drop)
+        self._write(b'\x20\x02\x00\x00')
+
+    def _on_publish(self, header, body):
+        qos = (header >> 1) & 0x03
+        n = (body[0] << 8) | body[1]
+        topic = body[2:2 + n]
+        o = 2 + n
+        pid = None
+        if qos:
+            pid = body[o:o + 2]
+            o += 2
+        self._later(self.broker.publish_latency, self._complete_publish, topic, body[o:], qos, pid)
+
+    # PUBACK往返结束: 消息记入代理日志并回复PUBACK(与umqtt替身一致，到达时刻记为确认时刻)
+    def _complete_publish(self, topic, payload, qos, pid):
+        if not self.connected:
+            return
+        self.broker.publish(topic, payload, qos, sender=self)
+        if pid is not None:
+            self._write(b'\x40\x02' + pid)
+
+
+def _string(s):
+    return bytes((len(s) >> 8, len(s) & 0xFF)) + s
+
+
+def _packet(header, body):
+    length = len(body)
+    encoded = bytearray()
+    while True:
+        b = length & 0x7F
+        length >>= 7
+        encoded.append(b | 0x80 if length else b)
+        if not length:
+            break
+    return bytes((header,)) + bytes(encoded) + body
+
+
+BROKER = Broker()
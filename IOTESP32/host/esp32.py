@@ -0,0 +1,60 @@
+# esp32模块的主机端替身
+# 片内温度由可替换的温度源提供，并记录每次读取的时刻
+# sequence()/ramp()/noisy()用于构造可复现的温度脚本
+import random
+import time
+
+from hostenv import check_deadline
+
+# 温度源：无参可调用对象，返回摄氏度
+temperature_source = lambda: 25.0
+# 每次读取温度的时刻(ticks_ms)
+read_times = []
+
+
+def set_temperature_source(source):
+    global temperature_source
+    temperature_source = source
+
+
+# 按顺序依次返回values中的温度；用完后repeat为True时从头循环，否则保持最后一个值
+def sequence(values, repeat=False):
+    values = list(values)
+    state = {'i': 0}
+
+    def source():
+        i = state['i']
+        if i >= len(values):
+            i = 0 if repeat else len(values) - 1
+        state['i'] = i + 1
+        return values[i]
+    return source
+
+
+# 从start开始按每秒slope摄氏度线性变化
+def ramp(start=25.0, slope=0.1):
+    origin = time.ticks_ms()
+    return lambda: start + slope * time.ticks_diff(time.ticks_ms(), origin) / 1000
+
+
+# 在基础温度源上叠加均匀噪声，seed固定时结果可复现
+def noisy(source, amplitude=0.2, seed=1):
+    rng = random.Random(seed)
+    return lambda: source() + rng.uniform(-amplitude, amplitude)
+
+
+def reset():
+    global temperature_source
+    temperature_source = lambda: 25.0
+    read_times.clear()
+
+
+def mcu_temperature():
+    check_deadline()
+    read_times.append(time.ticks_ms())
+    return temperature_source()
+
+
+def raw_temperature():
+    # 华氏度原始值，与真实固件一致
+    return mcu_temperature() * 9 / 5 + 32
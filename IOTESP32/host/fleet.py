@@ -0,0 +1,487 @@
+# 虚拟设备集群(负载生成器)
+# 在一个asyncio事件循环中运行N台虚拟设备，压测MQTT代理和订阅温度数据的看板。
+# 每台设备复用固件的模块，行为与main.py的asyncio模式一致:
+#   - 载荷: payload.py编码，单条样本与publish_temperature相同(JSON或二进制帧)，
+#     断线期间积压的样本按REPLAY_BATCH_SIZE合并补发(与replay_buffered_samples相同)
+#   - 连接: mqtt_async.MQTTClient + ConnectionSupervisor，连接任务与mqtt_task相同，
+#     收发错误按mqtt_failed的规则报告(网络错误立即重连，其他错误累计)，退避带随机抖动
+#   - 控制: 订阅控制主题，回调与mqtt_callback相同只入队，控制周期取出消息后由ControlCoalescer合并
+# 每台设备的控制主题为 CONTROL_TOPIC/<设备ID>，便于逐台发送控制消息。
+# 看板由一个订阅全部温度主题的消费者客户端代替，以它解析到消息的时刻计算端到端延迟(采样到消费者收到)。
+# 控制消息的延迟从控制端发出算到设备合并生效(颜色r/g/b中编码了消息序号)。
+#
+#     fleet = Fleet(devices=500, interval=1000, jitter=0.2)
+#     fleet.drop_devices(5000, 0.1)
+#     fleet.broker_outage(10000, 2000)
+#     report = asyncio.run(fleet.run(20))
+#
+# 不指定host时在同一事件循环中启动进程内代理替身(broker.py)；指定host/port时连接外部代理(如mosquitto)，
+# 此时不能模拟代理宕机。
+import hostenv
+hostenv.install()
+
+import asyncio
+import random
+import time
+
+import config
+import network
+from broker import BROKER
+from mqtt_async import MQTTClient, PUBLISH
+from mqtt_supervisor import ConnectionSupervisor
+from led_control import ControlCoalescer
+from payload import (encode_json_sample_into, encode_json_batch, encode_binary_sample_into, encode_binary_into,
+                     binary_frame_size, json_string, decode, JSON_SAMPLE_SIZE)
+from sim import percentile
+
+TEMP_TOPIC = config.TEMP_TOPIC
+CONTROL_TOPIC = config.CONTROL_TOPIC
+REPLAY_BATCH_SIZE = getattr(config, 'REPLAY_BATCH_SIZE', 32)
+CONTROL_DRAIN_MAX = getattr(config, 'CONTROL_DRAIN_MAX', 32)
+
+
+def _quiet_log(message, level='INFO', *args):
+    pass
+
+
+# 样本和控制消息的发出时刻，按消费者收到的时刻计算延迟
+class Tracker:
+    def __init__(self):
+        self.created = {}  # (设备ID, 时间戳) -> 采样时刻(perf_counter)
+        self.latencies = []  # 端到端延迟(毫秒)
+        self.samples = 0  # 产生的样本数
+        self.received = 0  # 消费者收到的样本数(不含重复)
+        self.messages = 0  # 消费者收到的消息数
+        self.duplicates = 0  # 重复收到的样本数(断线重发)
+        self.dropped = 0  # 设备积压满后丢弃的样本数
+        self.invalid = 0  # 无法解码的消息数
+        self.controls = {}  # 控制序号 -> 发出时刻(被合并掉的消息不会生效，留在这里)
+        self.controls_sent = 0
+        self.control_latencies = []
+
+    def sample(self, device_id, timestamp):
+        self.created[(device_id, timestamp)] = time.perf_counter()
+        self.samples += 1
+
+    def drop(self, device_id, timestamp):
+        if self.created.pop((device_id, timestamp), None) is not None:
+            self.dropped += 1
+
+    def arrived(self, device_id, timestamp, now):
+        sent = self.created.pop((device_id, timestamp), None)
+        if sent is None:
+            self.duplicates += 1
+            return
+        self.received += 1
+        self.latencies.append((now - sent) * 1000)
+
+    def control_applied(self, seq, now):
+        sent = self.controls.pop(seq, None)
+        if sent is not None:
+            self.control_latencies.append((now - sent) * 1000)
+
+
+class VirtualDevice:
+    def __init__(self, fleet, device_id):
+        self.fleet = fleet
+        self.device_id = device_id
+        self.control_topic = CONTROL_TOPIC + b'/' + device_id.encode()
+        self.binary_topic = TEMP_TOPIC + b'/bin/' + device_id.encode()
+        self.device_id_json = json_string(device_id)
+        self.client = MQTTClient(device_id, fleet.host, fleet.port, keepalive=fleet.keepalive,
+                                 window=fleet.window, bufsize=fleet.bufsize, inbox_size=CONTROL_DRAIN_MAX)
+        self.client.set_callback(self.mqtt_callback)
+        self.supervisor = ConnectionSupervisor(None, self.client.disconnect, self.client.ping,
+                                               ping_interval=fleet.keepalive * 1000 // 2,
+                                               backoff_min=fleet.backoff_min, backoff_max=fleet.backoff_max,
+                                               log=_quiet_log)
+        self.control = ControlCoalescer(0, CONTROL_DRAIN_MAX)
+        self.led_state = {'r': 0, 'g': 0, 'b': 0, 'brightness': 1.0, 'effect': 'solid', 'duration': 0, 'period': 2000}
+        self.backlog = []  # 待发布的(时间戳, 温度)，连接断开期间积压，上限fleet.buffer条
+        self.payload_buf = bytearray(max(JSON_SAMPLE_SIZE, binary_frame_size(REPLAY_BATCH_SIZE)))
+        self.payload_mv = memoryview(self.payload_buf)
+        self.temperature = 20 + fleet.random.random() * 10
+        self.last_timestamp = 0
+        self.unknown = 0  # 收到的未知主题消息数
+        self._event = asyncio.Event()
+        self._tasks = []
+
+    def start(self, delay):
+        self._tasks = [asyncio.create_task(self._mqtt_task(delay)),
+                       asyncio.create_task(self._sample_task(delay)),
+                       asyncio.create_task(self._publish_task())]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self.client.disconnect()
+
+    # 与mqtt_callback相同: 控制消息只入队，由控制周期合并
+    def mqtt_callback(self, topic, msg):
+        if topic != self.control_topic:
+            self.unknown += 1
+            return
+        self.control.push(msg)
+
+    # 与mqtt_failed相同: 网络错误说明连接已断，其他错误(包括窗口已满)累计多次后才重连
+    def mqtt_failed(self, e):
+        err = e.args[0] if isinstance(e, OSError) and e.args else None
+        if isinstance(e, OSError) and err not in (-1, 11, 105):
+            self.supervisor.lost(e)
+        else:
+            self.supervisor.error(e)
+
+    # 连接任务(与mqtt_task相同): 退避到期时连接并订阅控制主题，连接关闭后报告给监督器
+    async def _mqtt_task(self, delay):
+        await asyncio.sleep(delay)
+        fleet = self.fleet
+        while True:
+            if self.client.isconnected():
+                await self.client.wait_closed()
+                self.supervisor.lost('连接已关闭')
+                continue
+            if not self.supervisor.should_attempt():
+                await asyncio.sleep(fleet.poll_interval / 1000)
+                continue
+            try:
+                await self.client.connect(timeout=fleet.connect_timeout)
+                self.client.subscribe(self.control_topic, fleet.qos)
+                ok = True
+            except Exception:
+                ok = False
+            if ok and self.supervisor.disconnects:
+                fleet.reconnects += 1
+            self.supervisor.attempt_done(ok)
+            if ok:
+                self._event.set()
+
+    # 采样任务: 按周期(加随机抖动)产生温度样本，温度随机游走；积压满时丢弃最旧的
+    async def _sample_task(self, delay):
+        await asyncio.sleep(delay)
+        fleet = self.fleet
+        rand = fleet.random
+        while True:
+            await asyncio.sleep(fleet.interval * (1 + fleet.jitter * (2 * rand.random() - 1)) / 1000)
+            if not fleet.sampling:
+                continue
+            timestamp = time.ticks_ms()
+            if timestamp <= self.last_timestamp:
+                timestamp = self.last_timestamp + 1
+            self.last_timestamp = timestamp
+            self.temperature = min(60.0, max(-10.0, self.temperature + rand.gauss(0, 0.05)))
+            if len(self.backlog) >= fleet.buffer:
+                fleet.tracker.drop(self.device_id, self.backlog.pop(0)[0])
+            self.backlog.append((timestamp, self.temperature))
+            fleet.tracker.sample(self.device_id, timestamp)
+            self._event.set()
+
+    # 发布任务(与publish_task相同): 有积压时按批补发，否则逐条发布；失败时样本留在积压中等待重连
+    async def _publish_task(self):
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            while self.backlog and self.supervisor.isconnected():
+                await self.client.wait_window()
+                if not self._publish_next():
+                    break
+                await asyncio.sleep(0)
+
+    def _publish_next(self):
+        fleet = self.fleet
+        count = min(len(self.backlog), REPLAY_BATCH_SIZE)
+        try:
+            if count == 1:
+                timestamp, value = self.backlog[0]
+                if fleet.payload_format == 'binary':
+                    topic = self.binary_topic
+                    msg = self.payload_mv[:encode_binary_sample_into(self.payload_buf, timestamp, value)]
+                else:
+                    topic = TEMP_TOPIC
+                    msg = self.payload_mv[:encode_json_sample_into(self.payload_buf, self.device_id_json,
+                                                                   timestamp, value)]
+            else:
+                timestamps = [t for t, _ in self.backlog[:count]]
+                values = [v for _, v in self.backlog[:count]]
+                if fleet.payload_format == 'binary':
+                    topic = self.binary_topic
+                    msg = self.payload_mv[:encode_binary_into(self.payload_buf, timestamps, values)]
+                else:
+                    topic = TEMP_TOPIC
+                    msg = encode_json_batch(self.device_id, timestamps, values)
+            self.client.publish(topic, msg, qos=fleet.qos)
+        except Exception as e:
+            fleet.publish_errors += 1
+            self.mqtt_failed(e)
+            return False
+        self.supervisor.sent(fleet.qos > 0)
+        del self.backlog[:count]
+        fleet.published += 1
+        return True
+
+    # 控制周期(与drain_control_messages和apply_control相同): 取出已到达的控制消息，只应用其中最新的状态
+    def poll(self, now):
+        if not self.supervisor.isconnected():
+            return
+        start = received = self.control.received
+        try:
+            for _ in range(CONTROL_DRAIN_MAX):
+                self.client.check_msg()
+                if self.control.received == received:
+                    break
+                received = self.control.received
+        except Exception as e:
+            self.mqtt_failed(e)
+            return
+        if received != start:
+            self.supervisor.received()
+        if self.control.pending() and self.control.merge_into(self.led_state):
+            state = self.led_state
+            self.fleet.tracker.control_applied(state['r'] | state['g'] << 8 | state['b'] << 16, now)
+        self.supervisor.keepalive()
+
+    # 强制断开连接(模拟设备掉线)，连接任务随即重连，在途的QoS1消息重连后重发
+    def drop(self):
+        writer = self.client._writer
+        if writer is not None:
+            writer.transport.abort()
+
+
+# 看板替身: 订阅全部温度主题，解析到PUBLISH报文时即记录到达时刻
+class Consumer(MQTTClient):
+    def __init__(self, fleet):
+        super().__init__(b'fleet-consumer', fleet.host, fleet.port, keepalive=60, bufsize=8192)
+        self.tracker = fleet.tracker
+
+    def _handle(self, header, mv, length):
+        if header & 0xF0 != PUBLISH:
+            return super()._handle(header, mv, length)
+        now = time.perf_counter()
+        tlen = (mv[0] << 8) | mv[1]
+        o = 2 + tlen + (2 if (header >> 1) & 0x03 else 0)
+        tracker = self.tracker
+        tracker.messages += 1
+        try:
+            message = decode(mv[o:length], bytes(mv[2:2 + tlen]))
+        except (ValueError, UnicodeError):
+            tracker.invalid += 1
+            return
+        device_id = message['device_id']
+        for timestamp in message['timestamps']:
+            tracker.arrived(device_id, timestamp, now)
+
+    # 连接并订阅，只收不发，按保活时间的一半发送PINGREQ；
+    # 断开后(如代理宕机)尽快重连，尽量不错过设备补发的消息
+    async def run(self, poll_interval):
+        while True:
+            try:
+                await self.connect()
+                self.subscribe(TEMP_TOPIC, 0)
+                self.subscribe(TEMP_TOPIC + b'/bin/+', 0)
+                while self.isconnected():
+                    try:
+                        await asyncio.wait_for(self.wait_closed(), self.keepalive / 2)
+                    except asyncio.TimeoutError:
+                        self.ping()
+            except Exception:
+                await asyncio.sleep(poll_interval / 1000)
+
+
+class Fleet:
+    # devices: 设备数；interval/jitter: 采样周期(毫秒)和相对抖动(0.2表示±20%)；
+    # control_rate: 控制端每秒发给随机设备的控制消息数；ramp: 设备在这段时间(毫秒)内随机错开上线
+    # buffer: 每台设备断线期间最多积压的样本数；host为None时使用进程内代理替身
+    def __init__(self, devices=100, interval=1000, jitter=0.2, qos=1, payload_format='json', control_rate=0,
+                 ramp=1000, window=None, bufsize=None, buffer=256, keepalive=60, host=None, port=1883, seed=None,
+                 backoff_min=None, backoff_max=None, control_interval=None, prefix='vdev'):
+        if payload_format not in ('json', 'binary'):
+            raise ValueError(f'不支持的载荷格式: {payload_format}')
+        self.count = devices
+        self.interval = interval
+        self.jitter = jitter
+        self.qos = qos
+        self.payload_format = payload_format
+        self.control_rate = control_rate
+        self.ramp = ramp
+        self.window = getattr(config, 'MQTT_INFLIGHT_WINDOW', 8) if window is None else window
+        self.bufsize = getattr(config, 'MQTT_BUFFER_SIZE', 1024) if bufsize is None else bufsize
+        self.buffer = buffer
+        self.keepalive = keepalive
+        self.local = host is None
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        self.backoff_min = getattr(config, 'MQTT_BACKOFF_MIN', 1000) if backoff_min is None else backoff_min
+        self.backoff_max = getattr(config, 'MQTT_BACKOFF_MAX', 60000) if backoff_max is None else backoff_max
+        self.control_interval = (getattr(config, 'CONTROL_POLL_INTERVAL', 10) if control_interval is None
+                                 else control_interval)
+        self.poll_interval = 50  # 未连接时检查退避是否到期的间隔(毫秒)
+        self.connect_timeout = 5000
+        self.prefix = prefix
+        self.tracker = Tracker()
+        self.devices = []
+        self.events = []  # 故障时间线: (毫秒, 函数, 参数)
+        self.churn_rate = 0
+        self.sampling = True
+        self.received_in_window = 0  # 运行时长内消费者收到的样本数(不含排空阶段)
+        self.published = 0
+        self.publish_errors = 0
+        self.reconnects = 0
+        self.faults = {'drops': 0, 'outages': 0}
+
+    # 在运行开始后ms毫秒调用fn(*args)
+    def at(self, ms, fn, *args):
+        self.events.append((ms, fn, args))
+
+    # 在at_ms时刻强制断开fraction比例的设备
+    def drop_devices(self, at_ms, fraction):
+        self.at(at_ms, self._drop, fraction)
+
+    def _drop(self, fraction):
+        for device in self.random.sample(self.devices, int(len(self.devices) * fraction)):
+            device.drop()
+            self.faults['drops'] += 1
+
+    # 持续掉线: 每秒随机断开rate台设备
+    def churn(self, rate):
+        self.churn_rate = rate
+
+    # 代理宕机duration_ms毫秒(仅进程内代理)
+    def broker_outage(self, at_ms, duration_ms):
+        if not self.local:
+            raise ValueError('外部代理不能模拟宕机')
+        self.at(at_ms, self._outage)
+        self.at(at_ms + duration_ms, BROKER.start)
+
+    def _outage(self):
+        BROKER.stop()
+        self.faults['outages'] += 1
+
+    async def _churn_task(self, rate):
+        while True:
+            await asyncio.sleep(1)
+            for device in self.random.sample(self.devices, min(rate, len(self.devices))):
+                device.drop()
+                self.faults['drops'] += 1
+
+    async def _control_task(self):
+        interval = self.control_interval / 1000
+        while True:
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            for device in self.devices:
+                device.poll(now)
+
+    # 控制端: 按control_rate向随机设备发送控制消息，颜色中编码序号
+    async def _controller_task(self, controller):
+        seq = 0
+        interval = 1 / self.control_rate
+        tracker = self.tracker
+        while True:
+            await asyncio.sleep(interval)
+            if not controller.isconnected():
+                try:
+                    await controller.connect()
+                except Exception:
+                    continue
+            seq = seq % 0xFFFFFF + 1
+            device = self.random.choice(self.devices)
+            msg = b'{"r": %d, "g": %d, "b": %d, "brightness": 1.0}' % (seq & 0xFF, seq >> 8 & 0xFF, seq >> 16)
+            try:
+                controller.publish(device.control_topic, msg, qos=0)
+            except Exception:
+                continue
+            tracker.controls[seq] = time.perf_counter()
+            tracker.controls_sent += 1
+
+    # 运行duration秒后停止采样，再等待最多drain秒让积压和在途消息到达，返回报告(延迟单位为毫秒)
+    async def run(self, duration, drain=2.0):
+        server = None
+        if self.local:
+            # 进程内代理要求网络替身的STA接口已连接
+            BROKER.reset()
+            network.reset()
+            wlan = network.WLAN(network.STA_IF)
+            wlan.active(True)
+            wlan.connect()
+            server = await BROKER.serve()
+            self.host, self.port = server.sockets[0].getsockname()[:2]
+        loop = asyncio.get_running_loop()
+        consumer = Consumer(self)
+        # 消费者比设备更快重连(设备按退避等待)，代理恢复后先于设备补发订阅好
+        tasks = [asyncio.create_task(consumer.run(10))]
+        while not consumer.isconnected():
+            await asyncio.sleep(0.01)
+
+        self.devices = [VirtualDevice(self, f'{self.prefix}{i:05d}') for i in range(self.count)]
+        for device in self.devices:
+            device.start(self.random.random() * self.ramp / 1000)
+        tasks.append(asyncio.create_task(self._control_task()))
+        controller = None
+        if self.control_rate:
+            controller = MQTTClient(b'fleet-controller', self.host, self.port, keepalive=60)
+            tasks.append(asyncio.create_task(self._controller_task(controller)))
+        if self.churn_rate:
+            tasks.append(asyncio.create_task(self._churn_task(self.churn_rate)))
+        handles = [loop.call_later(ms / 1000, fn, *args) for ms, fn, args in self.events]
+
+        start = time.perf_counter()
+        try:
+            await asyncio.sleep(duration)
+            elapsed = time.perf_counter() - start
+            self.sampling = False
+            self.received_in_window = self.tracker.received
+            deadline = time.perf_counter() + drain
+            while self.tracker.created and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            return self.report(elapsed)
+        finally:
+            for handle in handles:
+                handle.cancel()
+            for task in tasks:
+                task.cancel()
+            for device in self.devices:
+                device.stop()
+            if controller is not None:
+                controller.disconnect()
+            consumer.disconnect()
+            if server is not None:
+                server.close()
+            await asyncio.sleep(0)
+
+    def report(self, elapsed):
+        tracker = self.tracker
+        latencies = tracker.latencies
+        controls = tracker.control_latencies
+        acked = sum(d.client.acked for d in self.devices)
+        ack_sum = sum(d.client.ack_ms_sum for d in self.devices)
+        return {
+            'devices': self.count,
+            'elapsed': elapsed,
+            'samples': tracker.samples,
+            'published': self.published,
+            'acked': acked,
+            'received': tracker.received,
+            'messages': tracker.messages,
+            'samples_per_s': self.received_in_window / elapsed,
+            'messages_per_s': tracker.messages / elapsed,
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else float('nan'),
+            'ack_avg': ack_sum / acked if acked else float('nan'),
+            'ack_max': max((d.client.ack_ms_max for d in self.devices), default=0),
+            'resent': sum(d.client.resent for d in self.devices),
+            'controls_sent': tracker.controls_sent,
+            'controls': len(controls),
+            'control_p50': percentile(controls, 50),
+            'control_p99': percentile(controls, 99),
+            'coalesced': sum(d.control.coalesced for d in self.devices),
+            'reconnects': self.reconnects,
+            'drops': self.faults['drops'],
+            'outages': self.faults['outages'],
+            'publish_errors': self.publish_errors,
+            'dropped': tracker.dropped,
+            'duplicates': tracker.duplicates,
+            'lost': len(tracker.created),
+            'invalid': tracker.invalid,
+        }
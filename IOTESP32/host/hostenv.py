@@ -0,0 +1,161 @@
+# 主机端(CPython)运行环境补丁
+# 为标准库time模块补充MicroPython特有的ticks_*/sleep_ms接口，
+# 使IOTESP32下的固件代码可以不加修改地在Linux上运行和测试。
+import os
+import sys
+import threading
+import time
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+FIRMWARE_DIR = os.path.dirname(HOST_DIR)
+
+# 与ESP32移植一致：ticks值在2^30处回绕
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+# 仿真结束信号：继承BaseException，不会被固件中的except Exception吞掉
+class SimulationDone(BaseException):
+    pass
+
+
+# machine.deepsleep()的仿真：芯片复位，参数为睡眠毫秒数
+class SimulatedDeepSleep(BaseException):
+    pass
+
+
+# 仿真截止时刻(ticks_ms)，由替身模块在被调用时检查
+_deadline = None
+
+
+def set_deadline(ticks):
+    global _deadline
+    _deadline = ticks
+
+
+# 到达截止时刻后抛出SimulationDone，结束阻塞式主循环；
+# 只在主线程中生效，定时器线程中的回调(如定时采样读取温度)不受影响
+def check_deadline():
+    if (_deadline is not None and ticks_diff(ticks_ms(), _deadline) >= 0
+            and threading.current_thread() is threading.main_thread()):
+        raise SimulationDone()
+
+
+def ticks_ms():
+    return (time.monotonic_ns() // 1000000) & TICKS_MAX
+
+
+def ticks_us():
+    return (time.monotonic_ns() // 1000) & TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & TICKS_MAX
+    return ((diff + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    time.sleep(us / 1000000)
+
+
+def print_exception(e, file=None):
+    import traceback
+    traceback.print_exception(type(e), e, e.__traceback__, file=file)
+
+
+# gc.mem_alloc()/mem_free()的主机端近似(MicroPython的gc模块才有这两个接口)
+# 设备上已用堆在两次回收之间只增不减；CPython靠引用计数即时释放，这里用tracemalloc的峰值还原这一语义:
+# 每次读数累加自上次读数以来超出当时已用量的峰值，gc.collect()后回落到当前实际占用(开始跟踪以来)。
+# 未调用trace_heap()时读数恒为0。CPython的浮点数、元组和小字典有空闲链表，复用时不经过分配器，不计入。
+HOST_HEAP_SIZE = 256 * 1024
+_heap = {'alloc': 0, 'current': 0, 'overhead': 0}
+
+
+def trace_heap(enable=True):
+    import tracemalloc
+    if enable and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enable and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _heap['current'] = tracemalloc.get_traced_memory()[0] if enable else 0
+    _heap['alloc'] = _heap['current']
+    _heap['overhead'] = 0
+    if enable:
+        # 读数本身(get_traced_memory返回的元组和大整数)产生的峰值，之后每次读数扣除
+        overhead = []
+        for _ in range(8):
+            start = mem_alloc()
+            overhead.append(mem_alloc() - start)
+        _heap['overhead'] = min(overhead)
+
+
+def mem_alloc():
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        return 0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    _heap['alloc'] += max(0, peak - _heap['current'] - _heap['overhead'])
+    _heap['current'] = current
+    return _heap['alloc']
+
+
+def mem_free():
+    return max(0, HOST_HEAP_SIZE - mem_alloc())
+
+
+def _gc_collect(collect):
+    def wrapper(*args):
+        result = collect(*args)
+        mem_alloc()
+        _heap['alloc'] = _heap['current']
+        return result
+    return wrapper
+
+
+# socket.getaddrinfo的仿真: network替身hosts表中登记的主机名按仿真DNS(network.resolve)解析，其余交给真实实现
+def _getaddrinfo(real):
+    def getaddrinfo(host, port, *args, **kwargs):
+        import network
+        import socket
+        if host not in network.hosts:
+            return real(host, port, *args, **kwargs)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (network.resolve(host), port))]
+    getaddrinfo.simulated = True
+    return getaddrinfo
+
+
+def install():
+    # 将host目录(硬件模块替身)和固件目录加入模块搜索路径
+    for path in (FIRMWARE_DIR, HOST_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    for name, func in (('ticks_ms', ticks_ms), ('ticks_us', ticks_us),
+                       ('ticks_add', ticks_add), ('ticks_diff', ticks_diff),
+                       ('sleep_ms', sleep_ms), ('sleep_us', sleep_us)):
+        if not hasattr(time, name):
+            setattr(time, name, func)
+
+    if not hasattr(sys, 'print_exception'):
+        sys.print_exception = print_exception
+
+    import socket
+    if not getattr(socket.getaddrinfo, 'simulated', False):
+        socket.getaddrinfo = _getaddrinfo(socket.getaddrinfo)
+
+    import gc
+    if not hasattr(gc, 'mem_alloc'):
+        gc.mem_alloc = mem_alloc
+        gc.mem_free = mem_free
+        gc.threshold = lambda amount=None: -1
+        gc.collect = _gc_collect(gc.collect)
@@ -0,0 +1,202 @@
+# 温度数据入库服务
+# 订阅设备的温度主题(JSON: TEMP_TOPIC，二进制帧: TEMP_TOPIC/bin/+)，解码后写入tsdb.TimeSeriesStore，
+# 每台设备一个序列；并响应历史查询，看板不必一直在线接收原始数据流:
+#   请求: 向 <前缀>/history/get 发布 {"device_id": ..., "start": ..., "end": ..., "width": 800, "id": ...}
+#         start/end为毫秒时间戳(缺省为最近24小时)，width为图表的像素宽度
+#   响应: 发布到 <前缀>/history/<设备ID>，
+#         {"id": ..., "device_id": ..., "start": ..., "end": ..., "resolution": 60000,
+#          "points": [[像素起点, 最小, 最大, 平均, 点数], ...]}，resolution为0表示由原始点计算
+# 设备的时间戳是ticks_ms(开机后的毫秒数)，入库前换算为墙上时间: 每台设备记录"收到时刻 - 时间戳"的最小值
+# 作为时钟偏移(网络延迟最小的那条消息最接近真实偏移)；单条实时样本的偏移比记录值大出REBASE_MS以上时
+# 视为设备重启或ticks回绕，改用新偏移。补发的积压样本沿用记录的偏移，保持原来的采样时刻。
+# 与固件的mqtt_callback一样，收到的历史查询只入队，由服务任务按周期处理，不阻塞接收。
+# 用法: python3 host/ingest.py --broker 127.0.0.1:1883 --data ./tsdb
+import hostenv
+hostenv.install()
+
+import argparse
+import asyncio
+import json
+import time
+
+import config
+from mqtt_async import MQTTClient, PUBLISH
+from payload import decode
+from tsdb import TimeSeriesStore
+
+TEMP_TOPIC = config.TEMP_TOPIC
+HISTORY_TOPIC = TEMP_TOPIC.rsplit(b'/', 1)[0] + b'/history'
+REBASE_MS = 600000
+DAY_MS = 86400000
+
+
+def wall_ms():
+    return int(time.time() * 1000)
+
+
+# 设备时钟偏移估计: 墙上时间 = ticks + offset
+class ClockSync:
+    def __init__(self):
+        self.offset = None
+        self.rebases = 0
+
+    # ticks为消息中最新的时间戳，now为收到时刻；live表示单条实时样本(不是补发的批次)
+    def update(self, ticks, now, live=True):
+        candidate = now - ticks
+        if self.offset is None or candidate < self.offset:
+            self.offset = candidate
+        elif live and candidate - self.offset > REBASE_MS:
+            self.offset = candidate
+            self.rebases += 1
+        return self.offset
+
+
+# 入库服务的MQTT连接: 在接收任务解析到PUBLISH报文时直接交给服务处理，不经过容量有限的收件队列
+class IngestClient(MQTTClient):
+    def __init__(self, service, client_id, server, port, bufsize):
+        super().__init__(client_id, server, port, keepalive=60, window=1, bufsize=bufsize)
+        self.service = service
+
+    def _handle(self, header, mv, length):
+        if header & 0xF0 != PUBLISH:
+            return super()._handle(header, mv, length)
+        tlen = (mv[0] << 8) | mv[1]
+        o = 2 + tlen + (2 if (header >> 1) & 0x03 else 0)
+        self.service.handle(bytes(mv[2:2 + tlen]), bytes(mv[o:length]))
+
+
+class IngestService:
+    def __init__(self, store, host='127.0.0.1', port=1883, client_id=b'iot-ingest', history_topic=HISTORY_TOPIC,
+                 max_width=2000, flush_interval=1000, poll_interval=10, bufsize=131072):
+        self.store = store
+        self.history_topic = history_topic
+        self.request_topic = history_topic + b'/get'
+        self.max_width = max_width
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.client = IngestClient(self, client_id, host, port, bufsize)
+        self.clocks = {}  # 设备ID -> ClockSync
+        self.requests = []  # 收到的历史查询，由服务任务处理
+        self.messages = 0
+        self.samples = 0
+        self.invalid = 0
+        self.queries = 0
+        self.query_ms_sum = 0.0
+        self.query_ms_max = 0.0
+
+    # 处理一条温度消息或历史查询；now为收到时刻(墙上时间毫秒)，缺省为当前时间
+    def handle(self, topic, msg, now=None):
+        if topic == self.request_topic:
+            if len(self.requests) < 64:
+                self.requests.append(msg)
+            return
+        self.messages += 1
+        try:
+            message = decode(msg, topic)
+        except (ValueError, UnicodeError):
+            self.invalid += 1
+            return
+        device_id = message['device_id']
+        timestamps = message['timestamps']
+        if not device_id or not timestamps or None in timestamps:
+            self.invalid += 1
+            return
+        if now is None:
+            now = wall_ms()
+        clock = self.clocks.get(device_id)
+        if clock is None:
+            clock = self.clocks[device_id] = ClockSync()
+        offset = clock.update(max(timestamps), now, len(timestamps) == 1)
+        self.store.append(device_id, [t + offset for t in timestamps], message['temperatures'])
+        self.samples += len(timestamps)
+
+    # 执行一条历史查询，返回(响应主题, 响应消息)；请求无效时抛出ValueError
+    def answer(self, msg):
+        request = json.loads(msg)
+        if not isinstance(request, dict) or not isinstance(request.get('device_id'), str):
+            raise ValueError('历史查询缺少device_id')
+        device_id = request['device_id']
+        end = int(request.get('end') or wall_ms())
+        start = int(request.get('start') or end - DAY_MS)
+        width = max(1, min(int(request.get('width') or 800), self.max_width))
+        begin = time.perf_counter()
+        resolution, points = self.store.query(device_id, start, end, width)
+        elapsed = (time.perf_counter() - begin) * 1000
+        self.queries += 1
+        self.query_ms_sum += elapsed
+        if elapsed > self.query_ms_max:
+            self.query_ms_max = elapsed
+        response = {
+            'id': request.get('id'),
+            'device_id': device_id,
+            'start': start,
+            'end': end,
+            'resolution': resolution,
+            'points': [[t, round(lo, 2), round(hi, 2), round(avg, 2), n] for t, lo, hi, avg, n in points],
+        }
+        return self.history_topic + b'/' + device_id.encode(), json.dumps(response).encode()
+
+    def process_requests(self):
+        while self.requests:
+            msg = self.requests.pop(0)
+            try:
+                topic, response = self.answer(msg)
+                self.client.publish(topic, response, qos=0)
+            except (ValueError, TypeError) as e:
+                self.invalid += 1
+                print(f'[WARNING] 历史查询无效: {e}')
+
+    # 连接代理并订阅，断开后重连；连接期间按周期处理历史查询，按flush_interval把点数写回段文件头
+    async def run(self):
+        client = self.client
+        while True:
+            try:
+                await client.connect()
+                client.subscribe(TEMP_TOPIC, 0)
+                client.subscribe(TEMP_TOPIC + b'/bin/+', 0)
+                client.subscribe(self.request_topic, 0)
+                last_flush = last_ping = time.ticks_ms()
+                while client.isconnected():
+                    await asyncio.sleep(self.poll_interval / 1000)
+                    self.process_requests()
+                    now = time.ticks_ms()
+                    if time.ticks_diff(now, last_flush) >= self.flush_interval:
+                        last_flush = now
+                        self.store.flush()
+                    if time.ticks_diff(now, last_ping) >= client.keepalive * 500:
+                        last_ping = now
+                        client.ping()
+            except Exception as e:
+                print(f'[WARNING] 入库服务连接断开: {e}')
+                await asyncio.sleep(1)
+            finally:
+                self.store.flush()
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'samples': self.samples,
+            'invalid': self.invalid,
+            'devices': len(self.clocks),
+            'queries': self.queries,
+            'query_avg': self.query_ms_sum / self.queries if self.queries else 0,
+            'query_max': self.query_ms_max,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='温度数据入库和历史查询服务')
+    parser.add_argument('--broker', default='127.0.0.1:1883', help='MQTT代理host:port')
+    parser.add_argument('--data', default='tsdb', help='时序数据目录')
+    args = parser.parse_args()
+    host, _, port = args.broker.partition(':')
+    with TimeSeriesStore(args.data) as store:
+        service = IngestService(store, host, int(port or 1883))
+        try:
+            asyncio.run(service.run())
+        except KeyboardInterrupt:
+            print(service.stats())
+
+
+if __name__ == '__main__':
+    main()
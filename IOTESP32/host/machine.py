@@ -0,0 +1,208 @@
+# machine模块的主机端替身(仅实现固件用到的接口)
+# RTC内存和复位原因保存在模块级变量中，重新导入main.py即可模拟深度睡眠唤醒
+import threading
+import time
+
+from hostenv import SimulatedDeepSleep
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+_rtc_memory = b''
+_reset_cause = PWRON_RESET
+sleeps = []  # (模式, 毫秒)
+adc_voltage = {}  # 引脚号 -> ADC输入电压(伏)，未设置的引脚为1.65V
+i2c_devices = {}  # I2C地址 -> 模拟器件(提供write(data)和read(n))
+_timers = []  # 运行中的Timer，上电复位时全部停止
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._value = value or 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+
+class ADC:
+    VOLTAGE = 0
+    ATTN_0DB = 0
+    ATTN_2_5DB = 1
+    ATTN_6DB = 2
+    ATTN_11DB = 3
+
+    def __init__(self, pin, **kwargs):
+        self.pin = pin
+
+    def atten(self, value):
+        pass
+
+    def _volts(self):
+        return adc_voltage.get(getattr(self.pin, 'id', self.pin), 1.65)
+
+    def read(self):
+        return min(4095, int(self._volts() / 3.3 * 4096))
+
+    def read_u16(self):
+        return min(65535, int(self._volts() / 3.3 * 65536))
+
+    def read_uv(self):
+        return int(self._volts() * 1000000)
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+
+    def _device(self, addr):
+        device = i2c_devices.get(addr)
+        if device is None:
+            raise OSError(19)  # ENODEV: 器件无应答
+        return device
+
+    def scan(self):
+        return sorted(i2c_devices)
+
+    def writeto(self, addr, buf, stop=True):
+        self._device(addr).write(bytes(buf))
+        return len(buf)
+
+    def readfrom(self, addr, n, stop=True):
+        return self._device(addr).read(n)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self._device(addr).read(len(buf))
+
+
+SoftI2C = I2C
+
+
+# SHT3x温湿度传感器的模拟器件: 收到测量命令后返回带CRC的温湿度帧
+class SHT3xDevice:
+    def __init__(self, temperature=22.5, humidity=45.0):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.measurements = 0
+
+    @staticmethod
+    def _crc8(data):
+        crc = 0xFF
+        for byte in data:
+            crc ^= byte
+            for _ in range(8):
+                crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        return crc
+
+    def write(self, data):
+        if data[:1] in (b'\x24', b'\x2c'):
+            self.measurements += 1
+
+    def read(self, n):
+        t = int((self.temperature + 45) * 65535 / 175)
+        h = int(self.humidity * 65535 / 100)
+        frame = bytearray()
+        for word in (t, h):
+            pair = bytes((word >> 8, word & 0xFF))
+            frame += pair + bytes((self._crc8(pair),))
+        return bytes(frame[:n])
+
+
+# 硬件定时器: 后台线程按绝对时间表周期调用callback(timer)，与主线程的阻塞收发互不影响
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self._stop = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=None):
+        self.deinit()
+        if freq is not None:
+            period = 1000 / freq
+        stop = self._stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(mode, period / 1000, callback, stop), daemon=True)
+        _timers.append(self)
+        thread.start()
+
+    def _run(self, mode, period, callback, stop):
+        deadline = time.monotonic() + period
+        while not stop.wait(max(0.0, deadline - time.monotonic())):
+            if callback is not None:
+                callback(self)
+            if mode == self.ONE_SHOT:
+                break
+            deadline += period
+
+    def deinit(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if self in _timers:
+            _timers.remove(self)
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+def unique_id():
+    return b'\x24\x0a\xc4\x00\x00\x01'
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def idle():
+    time.sleep(0)
+
+
+class RTC:
+    def memory(self, data=None):
+        global _rtc_memory
+        if data is None:
+            return _rtc_memory
+        if len(data) > 2048:
+            raise ValueError('RTC memory too large')
+        _rtc_memory = bytes(data)
+
+
+def reset_cause():
+    return _reset_cause
+
+
+# 恢复上电状态(清空RTC内存、睡眠记录和模拟的ADC输入、I2C器件，停止定时器)
+def power_on():
+    global _rtc_memory, _reset_cause
+    _rtc_memory = b''
+    _reset_cause = PWRON_RESET
+    sleeps.clear()
+    adc_voltage.clear()
+    i2c_devices.clear()
+    for timer in list(_timers):
+        timer.deinit()
+
+
+def deepsleep(ms=0):
+    global _reset_cause
+    sleeps.append(('deepsleep', ms))
+    _reset_cause = DEEPSLEEP_RESET
+    raise SimulatedDeepSleep(ms)
+
+
+def lightsleep(ms=0):
+    sleeps.append(('lightsleep', ms))
+    time.sleep(ms / 1000)
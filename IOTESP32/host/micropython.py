@@ -0,0 +1,18 @@
+# micropython模块的主机端替身
+# 设备上定时器中断只记录时刻并用schedule()把采样交给解释器在字节码之间执行(包括阻塞收发的等待期间)；
+# 主机上定时器回调运行在独立线程中，schedule()直接在该线程调用，效果与设备上阻塞期间照常执行调度回调一致。
+scheduled = 0  # schedule()被调用的次数
+
+
+def const(value):
+    return value
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    global scheduled
+    scheduled += 1
+    func(arg)
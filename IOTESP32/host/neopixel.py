@@ -0,0 +1,39 @@
+# neopixel模块的主机端替身
+# 每次write()都会把当前帧和写入时刻记录到frames中
+import time
+
+# 所有实例写出的帧: (ticks_ms, (像素元组, ...))
+frames = []
+
+
+def reset():
+    frames.clear()
+
+
+class NeoPixel:
+    ORDER = (1, 0, 2, 3)
+
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.buf = bytearray(n * bpp)
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, i, v):
+        offset = i * self.bpp
+        for j in range(self.bpp):
+            self.buf[offset + self.ORDER[j]] = v[j]
+
+    def __getitem__(self, i):
+        offset = i * self.bpp
+        return tuple(self.buf[offset + self.ORDER[j]] for j in range(self.bpp))
+
+    def fill(self, v):
+        for i in range(self.n):
+            self[i] = v
+
+    def write(self):
+        frames.append((time.ticks_ms(), tuple(self[i] for i in range(self.n))))
@@ -0,0 +1,179 @@
+# network模块的主机端替身
+# 所有WLAN实例共享同一个仿真无线环境，可通过模块级参数注入故障:
+#   ap_up            AP是否在线，置为False时已连接的接口立即掉线，新的连接尝试一直停留在连接中
+#   connect_delay_ms connect()之后经过多少毫秒才关联成功
+#   reject_status    非None时connect()立即失败并报告该状态码(如STAT_WRONG_PASSWORD)
+#   scan_delay_ms    一次全信道扫描的耗时: scan()阻塞这么久，connect()未指定bssid时关联耗时加上这么久
+#   dhcp_delay_ms    DHCP获取地址的耗时: 未用ifconfig()设置静态IP时关联耗时加上这么久
+#   dns_delay_ms     resolve()解析主机名的耗时；hosts为主机名到IP的登记表(hostenv据此仿真socket.getaddrinfo)
+# drop_link()/restore_link()模拟AP掉线和恢复；link_up()和link_epoch供umqtt替身判断TCP连接是否还有效
+# (掉线前建立的连接在恢复后也不再可用)，经真实socket连接的会话通过on_drop回调在掉线时关闭。
+import time
+
+from hostenv import check_deadline
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_WRONG_PASSWORD = 202
+STAT_NO_AP_FOUND = 201
+STAT_CONNECT_FAIL = 203
+STAT_GOT_IP = 1010
+
+SSID = b'your_wifi_ssid'
+BSSID = b'\x11\x22\x33\x44\x55\x66'
+CHANNEL = 6
+
+ap_up = True
+connect_delay_ms = 0
+reject_status = None
+scan_delay_ms = 0
+dhcp_delay_ms = 0
+dns_delay_ms = 0
+hosts = {}
+connects = 0  # connect()调用次数
+drops = 0  # drop_link()造成的掉线次数
+link_epoch = 0  # 每次掉线加一
+on_drop = []  # 掉线时依次调用的回调
+_interfaces = []
+
+
+def reset():
+    global ap_up, connect_delay_ms, reject_status, connects, drops, link_epoch
+    global scan_delay_ms, dhcp_delay_ms, dns_delay_ms
+    ap_up = True
+    connect_delay_ms = 0
+    reject_status = None
+    scan_delay_ms = 0
+    dhcp_delay_ms = 0
+    dns_delay_ms = 0
+    hosts.clear()
+    connects = 0
+    drops = 0
+    link_epoch = 0
+    on_drop.clear()
+    _interfaces.clear()
+
+
+# AP掉线: 所有已连接接口断开
+def drop_link():
+    global ap_up, drops, link_epoch
+    ap_up = False
+    link_epoch += 1
+    for wlan in _interfaces:
+        if wlan._connected:
+            drops += 1
+        wlan._connected = False
+        wlan._connected_at = None
+    for fn in list(on_drop):
+        fn()
+
+
+def restore_link():
+    global ap_up
+    ap_up = True
+
+
+def _is_ip(host):
+    parts = host.split('.')
+    return len(parts) == 4 and all(part.isdigit() for part in parts)
+
+
+# 仿真DNS: IP地址原样返回，主机名经dns_delay_ms后返回hosts中登记的地址(未登记时为None)
+def resolve(host):
+    if isinstance(host, bytes):
+        host = host.decode()
+    if _is_ip(host):
+        return host
+    if dns_delay_ms:
+        time.sleep(dns_delay_ms / 1000)
+    return hosts.get(host)
+
+
+# 是否有STA接口处于已连接状态
+def link_up():
+    for wlan in _interfaces:
+        if wlan.interface_id == STA_IF and wlan.isconnected():
+            return True
+    return False
+
+
+class WLAN:
+    def __init__(self, interface_id=STA_IF):
+        self.interface_id = interface_id
+        self._active = False
+        self._connected = False
+        self._connected_at = None  # 关联成功的时刻(ticks_ms)，None表示没有进行中的连接
+        self._status = STAT_IDLE
+        self._ifconfig = ('192.168.1.50', '255.255.255.0', '192.168.1.1', '192.168.1.1')
+        self._static = False  # 是否用ifconfig()设置了静态IP(跳过DHCP)
+        _interfaces.append(self)
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._connected = False
+            self._connected_at = None
+            self._status = STAT_IDLE
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        global connects
+        if not self._active:
+            raise OSError('STA interface not active')
+        connects += 1
+        self._connected = False
+        if reject_status is not None:
+            self._connected_at = None
+            self._status = reject_status
+            return
+        delay = connect_delay_ms
+        if not kwargs.get('bssid'):
+            delay += scan_delay_ms
+        if not self._static:
+            delay += dhcp_delay_ms
+        self._connected_at = time.ticks_add(time.ticks_ms(), delay)
+        self._status = STAT_CONNECTING
+
+    def scan(self):
+        # (ssid, bssid, channel, RSSI, security, hidden)
+        if scan_delay_ms:
+            time.sleep(scan_delay_ms / 1000)
+        if not ap_up:
+            return []
+        return [(SSID, BSSID, CHANNEL, -50, 3, False)]
+
+    def config(self, *args, **kwargs):
+        if args:
+            return {'mac': b'\x24\x0a\xc4\x00\x00\x01', 'channel': CHANNEL}.get(args[0])
+
+    def disconnect(self):
+        self._connected = False
+        self._connected_at = None
+        self._status = STAT_IDLE
+
+    def isconnected(self):
+        check_deadline()
+        if not self._connected and self._connected_at is not None and ap_up:
+            if time.ticks_diff(time.ticks_ms(), self._connected_at) >= 0:
+                self._connected = True
+                self._status = STAT_GOT_IP
+        return self._connected and ap_up
+
+    def ifconfig(self, config=None):
+        if config == 'dhcp':
+            self._static = False
+            return None
+        if config is not None:
+            self._ifconfig = tuple(config)
+            self._static = True
+        return self._ifconfig
+
+    def status(self, param=None):
+        if param == 'rssi':
+            return -55
+        self.isconnected()
+        return self._status
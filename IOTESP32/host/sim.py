@@ -0,0 +1,275 @@
+# 固件仿真运行器
+# 在host/下的硬件替身和进程内代理上加载并运行未修改的main.py，供基准脚本和pytest复用:
+#
+#     sys.path.insert(0, 'IOTESP32/host')
+#     from sim import Simulation
+#
+#     def test_led_follows_control():
+#         with Simulation(TEMP_SAMPLE_INTERVAL=200) as sim:
+#             sim.control(300, r=255)
+#             sim.wifi_outage(500, 1000)
+#             sim.run(3.0)
+#             assert sim.frames()[-1][1][0][0] > 0
+#             assert sim.samples()
+#
+# 每个Simulation使用独立的临时目录保存断网缓冲、运行时配置和网络参数缓存文件，运行前重置所有替身的状态；
+# 配置通过关键字参数覆盖config模块中的同名项，close()时恢复。
+# 故障和控制消息按相对运行开始的毫秒数排入时间线，由后台定时线程触发，与固件的执行互不阻塞。
+# asyncio模式下配置MQTT_CLIENT='async'时，代理替身在同一事件循环中监听本机端口，
+# 固件的异步MQTT客户端经真实TCP连接收发报文；MQTT_TLS=True时代理替身用测试证书(tlscerts.py)监听TLS。
+# threads模式以THREAD_MODE=True运行thread_main_loop: 实时线程是CPython的真实线程(_thread)，
+# 仿真截止时刻只在网络线程(主线程)中生效，网络线程退出时通知实时线程结束。
+import hostenv
+hostenv.install()
+
+import asyncio
+import contextlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import config
+import esp32
+import machine
+import network
+import neopixel
+import payload
+import tlscerts
+from broker import BROKER
+
+MODES = ('main_loop', 'asyncio', 'threads')
+BROKER_IP = '192.168.1.10'  # 仿真DNS中代理主机名对应的地址
+
+# 仿真默认配置: 缩短超时和退避，使故障恢复在秒级内可观测
+DEFAULTS = {
+    'DEBUG': False,
+    'WIFI_CONNECT_TIMEOUT': 1000,
+    'WIFI_BACKOFF_MIN': 100,
+    'WIFI_BACKOFF_MAX': 1000,
+    'WIFI_POLL_INTERVAL': 50,
+    'MQTT_BACKOFF_MIN': 100,
+    'MQTT_BACKOFF_MAX': 1000,
+    'THREAD_STACK_SIZE': 0,  # CPython的线程栈下限为32KB，使用平台默认值
+}
+
+_MISSING = object()
+_DEVNULL = open(os.devnull, 'w')
+
+
+class Simulation:
+    # trace_heap为True时用tracemalloc近似gc.mem_alloc()，供main.heap统计每轮分配(会拖慢仿真)
+    # heap_budget为主循环每轮平均分配的上限(字节)，设置后自动开启trace_heap，run()结束时超出则抛出AssertionError；
+    # asyncio模式没有主循环轮次，不能设置
+    def __init__(self, mode='main_loop', quiet=True, trace_heap=False, heap_budget=None, **overrides):
+        if mode not in MODES:
+            raise ValueError(f'未知的仿真模式: {mode}')
+        if heap_budget is not None and mode == 'asyncio':
+            raise ValueError('asyncio模式没有主循环轮次，不能检查每轮分配')
+        self.mode = mode
+        self.quiet = quiet  # 屏蔽固件的串口输出
+        self.trace_heap = trace_heap or heap_budget is not None
+        self.heap_budget = heap_budget
+        self.workdir = tempfile.mkdtemp(prefix='iotesp32-sim-')
+        self.overrides = dict(DEFAULTS)
+        self.overrides['STORE_FORWARD_FILE'] = os.path.join(self.workdir, 'samples.buf')
+        self.overrides['CONFIG_STORE_FILE'] = os.path.join(self.workdir, 'config.bin')
+        self.overrides['NET_CACHE_FILE'] = os.path.join(self.workdir, 'net.bin')
+        self.overrides['ASYNC_MODE'] = mode == 'asyncio'
+        self.overrides['THREAD_MODE'] = mode == 'threads'
+        self.overrides.update(overrides)
+        self.main = None
+        self.start = None  # 运行开始时刻(ticks_ms)
+        self.duration = 0.0
+        self.events = []  # (相对开始的毫秒数, 函数, 参数)
+        self.controls = []  # (投递时刻ticks_ms, 红色分量)
+        self._saved = {}
+        self._timers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _output(self):
+        if self.quiet:
+            return contextlib.redirect_stdout(_DEVNULL)
+        return contextlib.nullcontext()
+
+    # 重置替身并以覆盖后的配置重新导入main.py
+    def load(self):
+        esp32.reset()
+        neopixel.reset()
+        network.reset()
+        machine.power_on()
+        BROKER.reset()
+        hostenv.set_deadline(None)
+        hostenv.trace_heap(self.trace_heap)
+        for name, value in self.overrides.items():
+            if name not in self._saved:
+                self._saved[name] = getattr(config, name, _MISSING)
+            setattr(config, name, value)
+        # 代理主机名登记到仿真DNS，main.resolve_broker()不会发出真实的DNS查询
+        network.hosts[config.MQTT_BROKER] = BROKER_IP
+        with self._output():
+            if 'main' in sys.modules:
+                self.main = importlib.reload(sys.modules['main'])
+            else:
+                self.main = importlib.import_module('main')
+        return self.main
+
+    # 在运行开始后ms毫秒调用fn(*args)
+    def at(self, ms, fn, *args):
+        self.events.append((ms, fn, args))
+
+    def wifi_outage(self, at_ms, duration_ms):
+        self.at(at_ms, network.drop_link)
+        self.at(at_ms + duration_ms, network.restore_link)
+
+    def broker_outage(self, at_ms, duration_ms):
+        self.at(at_ms, BROKER.stop)
+        self.at(at_ms + duration_ms, BROKER.start)
+
+    # 在at_ms时刻以外部客户端身份发送一条LED控制消息，fields为附加字段(如effect、duration、period)
+    def control(self, at_ms, r=0, g=0, b=0, brightness=1.0, **fields):
+        msg = json.dumps({'r': r, 'g': g, 'b': b, 'brightness': brightness, **fields}).encode()
+        self.at(at_ms, self._send_control, at_ms, r, msg)
+
+    def _send_control(self, at_ms, r, msg):
+        at = time.ticks_add(self.start, int(at_ms))
+        self.controls.append((at, r))
+        BROKER.publish(self.main.CONTROL_TOPIC, msg, at=at)
+
+    # 在at_ms时刻发送一条运行时配置修改消息(发到CONFIG_TOPIC/set)；CONFIG_TOPIC默认关闭，需在覆盖项中设置
+    def configure(self, at_ms, **settings):
+        self.at(at_ms, lambda: BROKER.publish(self.main.CONFIG_SET_TOPIC, json.dumps(settings).encode()))
+
+    def _start_timers(self):
+        for ms, fn, args in self.events:
+            timer = threading.Timer(ms / 1000, fn, args)
+            timer.daemon = True
+            self._timers.append(timer)
+            timer.start()
+
+    def _cancel_timers(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
+
+    # 初始化固件并运行duration秒；初始化失败时抛出RuntimeError
+    def run(self, duration):
+        main = self.main or self.load()
+        self.duration = duration
+        with self._output():
+            if not main.init():
+                raise RuntimeError('固件初始化失败')
+            self.start = time.ticks_ms()
+            self._start_timers()
+            try:
+                if self.mode != 'asyncio':
+                    hostenv.set_deadline(time.ticks_add(self.start, int(duration * 1000)))
+                    try:
+                        main.thread_main_loop() if self.mode == 'threads' else main.main_loop()
+                    except hostenv.SimulationDone:
+                        pass
+                else:
+                    asyncio.run(self._run_async(main, duration))
+            finally:
+                hostenv.set_deadline(None)
+                self._cancel_timers()
+        if self.heap_budget is not None:
+            self.check_heap(self.heap_budget)
+        return self
+
+    # 检查主循环每轮平均分配不超过budget字节，超出或没有运行任何一轮时抛出AssertionError；返回堆统计
+    def check_heap(self, budget):
+        stats = self.main.heap.stats()
+        if not stats['iterations']:
+            raise AssertionError('主循环没有完成任何一轮，无法检查每轮分配')
+        if stats['alloc_avg'] > budget:
+            raise AssertionError(f'主循环每轮平均分配{stats["alloc_avg"]}B，超出预算{budget}B'
+                                 f'(最大{stats["alloc_max"]}B，共{stats["iterations"]}轮)')
+        return stats
+
+    async def _run_async(self, main, duration):
+        server = None
+        if main.ASYNC_MQTT:
+            context = None
+            if main.MQTT_TLS:
+                # 代理替身改为TLS监听，未指定MQTT_TLS_CA_FILE时固件用测试CA验证代理证书
+                certs = tlscerts.generate(self.workdir)
+                context = certs.server_context()
+                main.MQTT_TLS_CA_FILE = main.MQTT_TLS_CA_FILE or certs.ca
+            server = await BROKER.serve(ssl=context)
+            main.MQTT_BROKER, main.MQTT_PORT = server.sockets[0].getsockname()[:2]
+        try:
+            await asyncio.wait_for(main.async_main_loop(), duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if server is not None:
+                if main.mqtt_client is not None:
+                    main.mqtt_client.disconnect()
+                server.close()
+
+    # 相对运行开始的毫秒数
+    def elapsed(self, ticks):
+        return time.ticks_diff(ticks, self.start)
+
+    # 代理收到的温度样本: [(到达时刻ticks_ms, 采样时间戳, 温度), ...]，批量消息展开为多条
+    def samples(self):
+        result = []
+        for topic_filter in (self.main.TEMP_TOPIC, self.main.BINARY_TOPIC):
+            for t, topic, data in BROKER.messages(topic_filter):
+                decoded = payload.decode(data, topic)
+                for ts, value in zip(decoded['timestamps'], decoded['temperatures']):
+                    result.append((t, ts, value))
+        result.sort(key=lambda item: item[0])
+        return result
+
+    def messages(self):
+        return BROKER.messages(self.main.TEMP_TOPIC) + BROKER.messages(self.main.BINARY_TOPIC)
+
+    def frames(self):
+        return neopixel.frames
+
+    # 每条控制消息从投递到LED写出对应颜色的延迟(毫秒)，未生效的消息不计入；返回(延迟列表, 丢失数)
+    def control_latencies(self):
+        latencies = []
+        for at, value in self.controls:
+            for t, pixels in neopixel.frames:
+                if pixels[0][0] == value and time.ticks_diff(t, at) >= 0:
+                    latencies.append(time.ticks_diff(t, at))
+                    break
+        return latencies, len(self.controls) - len(latencies)
+
+    def close(self):
+        self._cancel_timers()
+        main = self.main
+        if main is not None:
+            with self._output():
+                if main.sample_buffer is not None:
+                    main.sample_buffer.close()
+                main.cleanup()
+        for name, value in self._saved.items():
+            if value is _MISSING:
+                delattr(config, name)
+            else:
+                setattr(config, name, value)
+        self._saved = {}
+        if self.trace_heap:
+            hostenv.trace_heap(False)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
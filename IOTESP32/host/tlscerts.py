@@ -0,0 +1,60 @@
+# 主机端测试用的TLS证书
+# 用openssl命令行生成自签名CA和由它签发的代理证书(CN为localhost，SAN包含localhost和127.0.0.1)，
+# 供代理替身的TLS监听(broker.serve(ssl=...))和固件的MQTT_TLS_CA_FILE使用。同一目录和密钥类型只生成一次。
+#   key: 'ec'(ECDSA P-256) 或 'rsa'(RSA 2048)
+import os
+import ssl
+import subprocess
+
+_KEY_ARGS = {
+    'ec': ['-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1'],
+    'rsa': ['-newkey', 'rsa:2048'],
+}
+_SERVER_EXT = ('basicConstraints=CA:FALSE\n'
+               'keyUsage=critical,digitalSignature,keyEncipherment\n'
+               'extendedKeyUsage=serverAuth\n'
+               'subjectAltName=DNS:localhost,IP:127.0.0.1\n'
+               'authorityKeyIdentifier=keyid,issuer\n')
+
+
+class Certs:
+    def __init__(self, directory, key):
+        self.ca = os.path.join(directory, f'ca-{key}.pem')
+        self.cert = os.path.join(directory, f'server-{key}.pem')
+        self.key = os.path.join(directory, f'server-{key}.key')
+
+    # 代理端的SSL上下文；version为ssl.TLSVersion时只使用该版本
+    def server_context(self, version=None):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cert, self.key)
+        if version is not None:
+            context.minimum_version = version
+            context.maximum_version = version
+        return context
+
+
+def _openssl(*args):
+    try:
+        subprocess.run(('openssl',) + args, check=True, capture_output=True)
+    except FileNotFoundError:
+        raise RuntimeError('生成测试证书需要openssl命令行工具')
+
+
+def generate(directory, key='ec'):
+    if key not in _KEY_ARGS:
+        raise ValueError(f'不支持的密钥类型: {key}')
+    certs = Certs(directory, key)
+    if os.path.exists(certs.cert):
+        return certs
+    ca_key = os.path.join(directory, f'ca-{key}.key')
+    csr = os.path.join(directory, f'server-{key}.csr')
+    ext = os.path.join(directory, f'server-{key}.ext')
+    _openssl('req', '-x509', *_KEY_ARGS[key], '-nodes', '-keyout', ca_key, '-out', certs.ca, '-days', '3650',
+             '-subj', '/CN=iotesp32 test CA', '-addext', 'basicConstraints=critical,CA:TRUE',
+             '-addext', 'keyUsage=critical,keyCertSign,cRLSign')
+    _openssl('req', *_KEY_ARGS[key], '-nodes', '-keyout', certs.key, '-out', csr, '-subj', '/CN=localhost')
+    with open(ext, 'w') as f:
+        f.write(_SERVER_EXT)
+    _openssl('x509', '-req', '-in', csr, '-CA', certs.ca, '-CAkey', ca_key, '-CAcreateserial',
+             '-out', certs.cert, '-days', '3650', '-extfile', ext)
+    return certs
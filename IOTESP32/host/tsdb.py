@@ -0,0 +1,419 @@
+# 温度时序存储
+# 每个序列(设备)一个目录，数据只追加，按固定容量切分为段文件，用mmap读写:
+#   <序列目录>/<段号>.seg: 文件头(32字节): 魔数 'TSG1', 版本, 标志(bit0已封存, bit1段内时间戳乱序),
+#                          保留, 容量N(uint32), 点数(uint32), 最早/最晚时间戳(int64)
+#                          时间戳列: int64 x N(毫秒)，数值列: float32 x N
+#   <序列目录>/<段号>.rol: 段写满封存时生成的各分辨率汇总(只读):
+#                          文件头: 魔数 'TSR1', 版本, 分辨率数，每个分辨率(毫秒, 桶数, 偏移)
+#                          每个分辨率按列保存: 桶起点int64、最小float32、最大float32、和float64、点数uint32
+# 活动段(未写满)的汇总只在内存中维护最细一级，更粗的分辨率查询时由它合并；重新打开时扫描活动段重建。
+# 点数和时间范围在flush()/封存时写回文件头，之前写入的数据若进程退出会丢失(数据本身已在mmap页中)。
+# 查询按图表的像素宽度降采样: 每个像素对应的时长不小于某一级汇总的桶宽时直接合并该级汇总，
+# 否则读取原始点；每个像素返回最小、最大、平均值和点数，曲线的尖峰不会因降采样消失。
+# 允许乱序追加(如设备补发断网期间的样本): 段内乱序时查询改为全段扫描，汇总与顺序无关。
+import bisect
+import mmap
+import os
+import struct
+from array import array
+from urllib.parse import quote, unquote
+
+from config_store import write_atomic
+
+SEGMENT_MAGIC = b'TSG1'
+ROLLUP_MAGIC = b'TSR1'
+VERSION = 1
+HEADER_FORMAT = '<4sBBHIIqq'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ROLLUP_HEADER = '<4sBB'
+ROLLUP_LEVEL = '<qII'
+FLAG_SEALED = 0x01
+FLAG_UNSORTED = 0x02
+
+SEGMENT_CAPACITY = 65536  # 每段点数，约768KB
+RESOLUTIONS = (60000, 600000, 3600000, 86400000)  # 汇总分辨率(毫秒): 1分钟、10分钟、1小时、1天
+
+
+class Segment:
+    # capacity不为None且文件不存在时创建新段
+    def __init__(self, path, capacity=None):
+        self.path = path
+        if not os.path.exists(path):
+            if capacity is None:
+                raise FileNotFoundError(path)
+            with open(path, 'wb') as f:
+                f.write(struct.pack(HEADER_FORMAT, SEGMENT_MAGIC, VERSION, 0, 0, capacity, 0, 0, 0))
+                f.truncate(HEADER_SIZE + capacity * 12)
+        with open(path, 'r+b') as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        magic, version, self.flags, _, self.capacity, self.count, self.t_min, self.t_max = \
+            struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+        if magic != SEGMENT_MAGIC or version != VERSION or len(self._mm) != HEADER_SIZE + self.capacity * 12:
+            self._mm.close()
+            raise ValueError(f'段文件无效: {path}')
+        mv = memoryview(self._mm)
+        end = HEADER_SIZE + self.capacity * 8
+        self.ts = mv[HEADER_SIZE:end].cast('q')
+        self.values = mv[end:].cast('f')
+        self._mv = mv
+
+    @property
+    def sealed(self):
+        return bool(self.flags & FLAG_SEALED)
+
+    @property
+    def sorted(self):
+        return not self.flags & FLAG_UNSORTED
+
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, t, value):
+        n = self.count
+        self.ts[n] = t
+        self.values[n] = value
+        if not n:
+            self.t_min = self.t_max = t
+        elif t >= self.t_max:
+            self.t_max = t
+        else:
+            self.flags |= FLAG_UNSORTED
+            if t < self.t_min:
+                self.t_min = t
+        self.count = n + 1
+
+    # 时间范围[start, end)内的点的下标范围；乱序段返回整段，由调用方逐点判断
+    def index_range(self, start, end):
+        if not self.sorted:
+            return 0, self.count
+        ts = self.ts
+        return bisect.bisect_left(ts, start, 0, self.count), bisect.bisect_left(ts, end, 0, self.count)
+
+    def flush(self):
+        struct.pack_into(HEADER_FORMAT, self._mm, 0, SEGMENT_MAGIC, VERSION, self.flags, 0,
+                         self.capacity, self.count, self.t_min, self.t_max)
+        self._mm.flush()
+
+    def seal(self):
+        self.flags |= FLAG_SEALED
+        self.flush()
+
+    def close(self):
+        if self._mm.closed:
+            return
+        self.ts.release()
+        self.values.release()
+        self._mv.release()
+        self._mm.close()
+
+
+# 把点按最细分辨率汇总到rollup字典: 桶起点 -> [最小, 最大, 和, 点数]
+def rollup_points(rollup, resolution, ts, values, start, end):
+    for i in range(start, end):
+        t = ts[i]
+        v = values[i]
+        b = t - t % resolution
+        r = rollup.get(b)
+        if r is None:
+            rollup[b] = [v, v, v, 1]
+        else:
+            if v < r[0]:
+                r[0] = v
+            elif v > r[1]:
+                r[1] = v
+            r[2] += v
+            r[3] += 1
+
+
+# 把按桶起点排序的汇总[(桶起点, [最小, 最大, 和, 点数]), ...]合并到更粗的分辨率
+def coarsen(items, resolution):
+    result = []
+    last = None
+    for b, (lo, hi, total, n) in items:
+        b -= b % resolution
+        if last is not None and last[0] == b:
+            r = last[1]
+            if lo < r[0]:
+                r[0] = lo
+            if hi > r[1]:
+                r[1] = hi
+            r[2] += total
+            r[3] += n
+        else:
+            last = (b, [lo, hi, total, n])
+            result.append(last)
+    return result
+
+
+# 编码封存段的汇总文件；levels为[(分辨率, 按桶起点排序的汇总), ...]
+def encode_rollups(levels):
+    offset = struct.calcsize(ROLLUP_HEADER) + len(levels) * struct.calcsize(ROLLUP_LEVEL)
+    table = bytearray(struct.pack(ROLLUP_HEADER, ROLLUP_MAGIC, VERSION, len(levels)))
+    body = bytearray()
+    for resolution, items in levels:
+        table += struct.pack(ROLLUP_LEVEL, resolution, len(items), offset + len(body))
+        body += array('q', [b for b, _ in items]).tobytes()
+        body += array('f', [r[0] for _, r in items]).tobytes()
+        body += array('f', [r[1] for _, r in items]).tobytes()
+        body += array('d', [r[2] for _, r in items]).tobytes()
+        body += array('I', [r[3] for _, r in items]).tobytes()
+    return bytes(table + body)
+
+
+# 封存段的汇总: 每个分辨率为(桶起点, 最小, 最大, 和, 点数)五列，都是mmap上的memoryview
+class Rollups:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = struct.unpack_from(ROLLUP_HEADER, self._mm, 0)
+        if magic != ROLLUP_MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f'汇总文件无效: {path}')
+        mv = memoryview(self._mm)
+        self._views = [mv]
+        self.levels = {}
+        o = struct.calcsize(ROLLUP_HEADER)
+        for _ in range(count):
+            resolution, n, offset = struct.unpack_from(ROLLUP_LEVEL, self._mm, o)
+            o += struct.calcsize(ROLLUP_LEVEL)
+            columns = []
+            for code, size in (('q', 8), ('f', 4), ('f', 4), ('d', 8), ('I', 4)):
+                column = mv[offset:offset + n * size].cast(code)
+                self._views.append(column)
+                columns.append(column)
+                offset += n * size
+            self.levels[resolution] = columns
+
+    def close(self):
+        if self._mm.closed:
+            return
+        for view in reversed(self._views):
+            view.release()
+        self._mm.close()
+
+
+class Series:
+    def __init__(self, path, capacity=SEGMENT_CAPACITY, resolutions=RESOLUTIONS):
+        self.path = path
+        self.capacity = capacity
+        self.resolutions = tuple(sorted(resolutions))
+        os.makedirs(path, exist_ok=True)
+        self.segments = []
+        self.rollups = []  # 与segments对应，活动段为None
+        self._active_rollup = {}  # 活动段的最细一级汇总
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.seg'):
+                self.segments.append(Segment(os.path.join(path, name)))
+        for segment in self.segments[:-1]:
+            if not segment.sealed:
+                segment.seal()
+        for segment in self.segments:
+            self.rollups.append(self._load_rollups(segment) if segment.sealed else None)
+        if self.segments and not self.segments[-1].sealed:
+            segment = self.segments[-1]
+            rollup_points(self._active_rollup, self.resolutions[0], segment.ts, segment.values, 0, segment.count)
+        self.appended = 0
+
+    def __len__(self):
+        return sum(segment.count for segment in self.segments)
+
+    def _rollup_path(self, segment):
+        return segment.path[:-4] + '.rol'
+
+    # 读取封存段的汇总文件；缺失或损坏(如封存中途退出)时重新计算
+    def _load_rollups(self, segment):
+        path = self._rollup_path(segment)
+        try:
+            return Rollups(path)
+        except (OSError, ValueError, struct.error):
+            rollup = {}
+            rollup_points(rollup, self.resolutions[0], segment.ts, segment.values, 0, segment.count)
+            self._write_rollups(segment, rollup)
+            return Rollups(path)
+
+    def _write_rollups(self, segment, rollup):
+        items = sorted(rollup.items())
+        levels = [(self.resolutions[0], items)]
+        for resolution in self.resolutions[1:]:
+            items = coarsen(items, resolution)
+            levels.append((resolution, items))
+        path = self._rollup_path(segment)
+        write_atomic(path, path + '.tmp', encode_rollups(levels))
+
+    def _new_segment(self):
+        if self.segments and not self.segments[-1].sealed:
+            segment = self.segments[-1]
+            self._write_rollups(segment, self._active_rollup)
+            segment.seal()
+            self.rollups[-1] = Rollups(self._rollup_path(segment))
+            self._active_rollup = {}
+        number = int(os.path.basename(self.segments[-1].path)[:-4]) + 1 if self.segments else 0
+        segment = Segment(os.path.join(self.path, f'{number:08d}.seg'), self.capacity)
+        self.segments.append(segment)
+        self.rollups.append(None)
+        return segment
+
+    # 追加一批点(时间戳毫秒, 数值)，段写满时封存并开始新段
+    def append(self, timestamps, values):
+        resolution = self.resolutions[0]
+        segment = self.segments[-1] if self.segments and not self.segments[-1].sealed else None
+        i = 0
+        n = len(timestamps)
+        while i < n:
+            if segment is None or segment.full():
+                segment = self._new_segment()
+            end = min(n, i + segment.capacity - segment.count)
+            start = segment.count
+            for j in range(i, end):
+                segment.append(timestamps[j], values[j])
+            rollup_points(self._active_rollup, resolution, segment.ts, segment.values, start, segment.count)
+            i = end
+        self.appended += n
+
+    # 查询[start, end)并降采样为width个像素，返回(所用分辨率, [(像素起点, 最小, 最大, 平均, 点数), ...])
+    # 分辨率为0表示由原始点计算；resolution缺省时取桶宽不超过一个像素的最粗一级，可指定(如0强制读原始点)
+    # 没有数据的像素不返回
+    def query(self, start, end, width, resolution=None):
+        if end <= start or width < 1:
+            return 0, []
+        pixel = (end - start) / width
+        if resolution is None:
+            resolution = 0
+            for r in self.resolutions:
+                if r <= pixel:
+                    resolution = r
+        elif resolution and resolution not in self.resolutions:
+            raise ValueError(f'没有该分辨率的汇总: {resolution}')
+        mins = [None] * width
+        maxs = [0.0] * width
+        sums = [0.0] * width
+        counts = [0] * width
+        for segment, rollups in zip(self.segments, self.rollups):
+            if not segment.count or segment.t_max < start - resolution or segment.t_min >= end:
+                continue
+            if not resolution:
+                self._query_points(segment, start, end, pixel, mins, maxs, sums, counts)
+            elif rollups is not None:
+                self._merge_buckets(*rollups.levels[resolution], start, end, resolution, pixel,
+                                    mins, maxs, sums, counts)
+            else:
+                items = sorted(self._active_rollup.items())
+                if resolution != self.resolutions[0]:
+                    items = coarsen(items, resolution)
+                columns = [b for b, _ in items], [r[0] for _, r in items], [r[1] for _, r in items], \
+                    [r[2] for _, r in items], [r[3] for _, r in items]
+                self._merge_buckets(*columns, start, end, resolution, pixel, mins, maxs, sums, counts)
+        points = []
+        for i in range(width):
+            if counts[i]:
+                points.append((start + int(i * pixel), mins[i], maxs[i], sums[i] / counts[i], counts[i]))
+        return resolution, points
+
+    @staticmethod
+    def _query_points(segment, start, end, pixel, mins, maxs, sums, counts):
+        lo, hi = segment.index_range(start, end)
+        ts = segment.ts
+        values = segment.values
+        check = not segment.sorted
+        last = len(counts) - 1
+        for j in range(lo, hi):
+            t = ts[j]
+            if check and (t < start or t >= end):
+                continue
+            v = values[j]
+            i = min(int((t - start) / pixel), last)
+            lo_v = mins[i]
+            if lo_v is None:
+                mins[i] = maxs[i] = v
+            elif v < lo_v:
+                mins[i] = v
+            elif v > maxs[i]:
+                maxs[i] = v
+            sums[i] += v
+            counts[i] += 1
+
+    # 合并与[start, end)重叠的桶，桶按起点归入像素(起点早于start的桶归入第一个像素)
+    @staticmethod
+    def _merge_buckets(starts, bmins, bmaxs, bsums, bcounts, start, end, resolution, pixel,
+                       mins, maxs, sums, counts):
+        first = bisect.bisect_right(starts, start - resolution)
+        last = len(counts) - 1
+        for j in range(first, bisect.bisect_left(starts, end)):
+            i = min(int((starts[j] - start) / pixel), last) if starts[j] > start else 0
+            lo = bmins[j]
+            hi = bmaxs[j]
+            if mins[i] is None:
+                mins[i] = lo
+                maxs[i] = hi
+            else:
+                if lo < mins[i]:
+                    mins[i] = lo
+                if hi > maxs[i]:
+                    maxs[i] = hi
+            sums[i] += bsums[j]
+            counts[i] += bcounts[j]
+
+    # 最早和最晚的时间戳，没有数据时返回None
+    def time_range(self):
+        segments = [segment for segment in self.segments if segment.count]
+        if not segments:
+            return None
+        return min(s.t_min for s in segments), max(s.t_max for s in segments)
+
+    def flush(self):
+        if self.segments and not self.segments[-1].sealed:
+            self.segments[-1].flush()
+
+    def close(self):
+        self.flush()
+        for rollups in self.rollups:
+            if rollups is not None:
+                rollups.close()
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+        self.rollups = []
+
+
+class TimeSeriesStore:
+    def __init__(self, root, capacity=SEGMENT_CAPACITY, resolutions=RESOLUTIONS):
+        self.root = root
+        self.capacity = capacity
+        self.resolutions = resolutions
+        self._series = {}
+        os.makedirs(root, exist_ok=True)
+
+    # 获取序列，不存在时创建；序列名编码为目录名
+    def series(self, name):
+        series = self._series.get(name)
+        if series is None:
+            series = Series(os.path.join(self.root, quote(name, safe='')), self.capacity, self.resolutions)
+            self._series[name] = series
+        return series
+
+    def names(self):
+        return sorted(set(self._series) | {unquote(name) for name in os.listdir(self.root)
+                                           if os.path.isdir(os.path.join(self.root, name))})
+
+    def append(self, name, timestamps, values):
+        self.series(name).append(timestamps, values)
+
+    def query(self, name, start, end, width, resolution=None):
+        if name not in self._series and not os.path.isdir(os.path.join(self.root, quote(name, safe=''))):
+            return 0, []
+        return self.series(name).query(start, end, width, resolution)
+
+    def flush(self):
+        for series in self._series.values():
+            series.flush()
+
+    def close(self):
+        for series in self._series.values():
+            series.close()
+        self._series = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,110 @@
+# umqtt.simple的主机端替身
+# 客户端连接到进程内代理替身(broker.BROKER)，收发都经过它路由；
+# 网络替身的链路断开(包括断开后又恢复)或代理宕机时，与真实socket一样在下一次收发时抛出OSError。
+# 投递给本客户端的消息按投递时刻排队，到期后由check_msg()每次交给回调一条。
+import time
+
+import network
+from broker import BROKER
+from hostenv import check_deadline
+
+ECONNRESET = 104
+EHOSTUNREACH = 113
+ENOTCONN = 128
+
+
+class MQTTException(Exception):
+    pass
+
+
+class MQTTClient:
+    # ssl与新版umqtt.simple一样是SSLContext；替身在进程内路由，不建立TLS连接，只保存该参数
+    # (真实的TLS握手用broker.serve(ssl=...)测量，见bench/bench_tls.py)
+    def __init__(self, client_id, server, port=0, user=None, password=None,
+                 keepalive=0, ssl=None):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.ssl = ssl
+        self.cb = None
+        self.connected = False
+        self.subscriptions = []
+        self.inbox = []  # 待投递消息: [ticks_ms, topic, msg]
+        self.broker = BROKER
+        self._epoch = None  # 建立连接时的链路代数
+
+    def set_callback(self, f):
+        self.cb = f
+
+    # 由代理调用: 代理端关闭了会话
+    def drop(self):
+        self.connected = False
+
+    # 由代理调用，把消息按投递时刻插入收件队列
+    def deliver(self, at, topic, msg):
+        inbox = self.inbox
+        i = len(inbox)
+        while i > 0 and time.ticks_diff(inbox[i - 1][0], at) > 0:
+            i -= 1
+        inbox.insert(i, [at, topic, msg])
+
+    # 收发前检查连接: 链路断开时本端也随之失效
+    def _check_link(self):
+        if not self.connected:
+            raise OSError(ENOTCONN)
+        if not network.link_up() or self._epoch != network.link_epoch:
+            self.connected = False
+            self.broker.disconnect(self)
+            raise OSError(ECONNRESET)
+
+    def connect(self, clean_session=True):
+        check_deadline()
+        if not network.link_up():
+            raise OSError(EHOSTUNREACH)
+        # 与umqtt.simple一样在连接时解析代理地址(主机名的解析耗时见network.dns_delay_ms)，地址本身不影响路由
+        network.resolve(self.server)
+        if self.broker.connect_latency:
+            time.sleep(self.broker.connect_latency)
+        self.broker.connect(self)
+        self._epoch = network.link_epoch
+        self.connected = True
+        self.subscriptions = []
+        self.inbox = []
+        return 0
+
+    def disconnect(self):
+        if self.connected:
+            self.broker.disconnect(self)
+        self.connected = False
+
+    def subscribe(self, topic, qos=0):
+        self._check_link()
+        self.subscriptions.append((topic, qos))
+        self.broker.routes_changed()
+
+    def ping(self):
+        self._check_link()
+        if self.broker.ping_latency:
+            time.sleep(self.broker.ping_latency)
+        self.broker.ping(self)
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        check_deadline()
+        self._check_link()
+        if self.broker.publish_latency:
+            time.sleep(self.broker.publish_latency)
+        self.broker.publish(topic, msg, qos, sender=self)
+
+    def check_msg(self):
+        check_deadline()
+        self._check_link()
+        inbox = self.inbox
+        if inbox and time.ticks_diff(time.ticks_ms(), inbox[0][0]) >= 0:
+            _, topic, msg = inbox.pop(0)
+            if self.cb:
+                self.cb(topic, msg)
+        return None
+
+    def wait_msg(self):
+        return self.check_msg()
@@ -0,0 +1,324 @@
+# LED控制消息合并与限帧
+# MQTT回调只把原始消息放入队列；每个控制周期取出全部已到达的消息，
+# 从最新一条开始向前解析，直到r/g/b/brightness都已确定为止(通常只需解析最新一条)，
+# 中间状态不再逐条写LED。LED写出按max_fps限速，多余的帧推迟到下一个帧间隔合并写出。
+# 常见的扁平数值消息(如 {"r": 255, "g": 0, "b": 0, "brightness": 0.5})由_scan直接在原始字节上解析，
+# 不创建字典和字符串；嵌套、转义、字符串值(如effect)、指数形式等其余情况仍交给json.loads。
+import json
+import time
+
+from led_effects import EFFECTS
+
+# 控制字段: 颜色、亮度、动画效果(led_effects.EFFECTS)、过渡时长和效果周期(毫秒)
+CONTROL_KEYS = ('r', 'g', 'b', 'brightness', 'effect', 'duration', 'period')
+_KEY_BYTES = tuple(key.encode() for key in CONTROL_KEYS)
+_BRIGHTNESS = 3
+_COLOR_KEYS = 4  # CONTROL_KEYS中前4个为颜色和亮度，其余为动画字段
+_ANIMATION_MARKERS = tuple(b'"' + key + b'"' for key in _KEY_BYTES[_COLOR_KEYS:])
+MAX_ANIMATION_MS = 60000
+MIN_PERIOD_MS = 100
+_LITERALS = (b'true', b'false', b'null')
+_BYTES_TYPES = (bytes, bytearray, memoryview)
+_MAX_DIGITS = 9  # 快速路径最多解析的数字位数，保证中间结果是小整数
+
+
+# 把控制字段规范到合法范围，类型不对时抛出ValueError/TypeError
+def _clamp(key, value):
+    if key == 'brightness':
+        return max(0, min(1.0, float(value)))
+    if key == 'effect':
+        if value not in EFFECTS:
+            raise ValueError(f'未知的LED效果: {value}')
+        return value
+    if key == 'duration':
+        return max(0, min(MAX_ANIMATION_MS, int(value)))
+    if key == 'period':
+        return max(MIN_PERIOD_MS, min(MAX_ANIMATION_MS, int(value)))
+    return max(0, min(255, int(value)))
+
+
+def _skip_ws(msg, i, n):
+    while i < n:
+        c = msg[i]
+        if c != 32 and c != 9 and c != 10 and c != 13:
+            break
+        i += 1
+    return i
+
+
+# 识别msg[start:end]中的字段名，返回在CONTROL_KEYS中的序号，其余字段返回-1
+def _key_index(msg, start, end):
+    size = end - start
+    for k in range(len(_KEY_BYTES)):
+        key = _KEY_BYTES[k]
+        if len(key) != size:
+            continue
+        for j in range(size):
+            if msg[start + j] != key[j]:
+                break
+        else:
+            return k
+    return -1
+
+
+# 跳过不含转义和非ASCII字符的字符串，i指向开头的引号，返回结尾引号的位置；不满足条件时返回-1
+def _skip_string(msg, i, n):
+    i += 1
+    while i < n:
+        c = msg[i]
+        if c == 34:  # '"'
+            return i
+        if c == 92 or c < 32 or c > 126:
+            return -1
+        i += 1
+    return -1
+
+
+# 消息中是否可能含有动画字段(只做子串查找，不解析)
+def _mentions_animation(msg):
+    if not isinstance(msg, _BYTES_TYPES):
+        return True
+    for marker in _ANIMATION_MARKERS:
+        if marker in msg:
+            return True
+    return False
+
+
+class ControlCoalescer:
+    def __init__(self, max_fps=50, max_pending=32):
+        if max_fps < 0 or max_pending < 1:
+            raise ValueError('LED帧率上限不能为负数，待处理消息上限必须大于0')
+        self.frame_interval = 1000 // max_fps if max_fps else 0  # 两次LED写出的最小间隔(毫秒)
+        self.max_pending = max_pending
+        self._messages = []  # 本周期到达的原始消息
+        self._newest_at = 0  # 最新一条已应用消息的到达时刻
+        self._last_write = None
+        self._deferring = False  # 当前这一帧是否已计入deferred
+        self.dirty = False  # LED状态已变化但尚未写出
+        self.received = 0  # 收到的控制消息总数
+        self.parsed = 0  # 实际解析的消息数
+        self.coalesced = 0  # 未单独生效(被更新的消息覆盖)的消息数
+        self.invalid = 0  # 格式错误的消息数
+        self.fallbacks = 0  # 快速路径无法解析而交给json.loads的消息数
+        # 合并过程使用的预分配状态，按CONTROL_KEYS的顺序
+        self._seen = bytearray(len(CONTROL_KEYS))  # 当前消息包含的字段
+        self._values = [None] * len(CONTROL_KEYS)  # 当前消息的字段值
+        self._found = bytearray(len(CONTROL_KEYS))  # 本周期已确定的字段
+        self._merged = [None] * len(CONTROL_KEYS)  # 本周期已确定的字段值(已规范)
+        self.frames = 0  # LED写出次数
+        self.deferred = 0  # 因帧率上限推迟写出的帧数
+        self.latency_sum = 0  # 消息到达到LED写出的累计延迟(毫秒)
+        self.latency_max = 0
+
+    # MQTT回调中调用: 只保存消息引用，不做解析；队列满时丢弃最旧的
+    def push(self, msg, now=None):
+        if len(self._messages) >= self.max_pending:
+            self._messages.pop(0)
+            self.coalesced += 1
+        self._messages.append(msg)
+        self._newest_at = time.ticks_ms() if now is None else now
+        self.received += 1
+
+    def pending(self):
+        return len(self._messages)
+
+    # 在原始字节上解析扁平JSON对象中的控制字段，结果写入_seen/_values；
+    # 返回False表示消息超出快速路径的范围(不论是否合法)，需要用json.loads重新解析
+    def _scan(self, msg):
+        if not isinstance(msg, _BYTES_TYPES):
+            return False
+        seen = self._seen
+        values = self._values
+        for k in range(len(seen)):
+            seen[k] = 0
+        n = len(msg)
+        i = _skip_ws(msg, 0, n)
+        if i >= n or msg[i] != 123:  # '{'
+            return False
+        i = _skip_ws(msg, i + 1, n)
+        if i < n and msg[i] == 125:  # '}'
+            return _skip_ws(msg, i + 1, n) == n
+        while i < n:
+            # 字段名
+            if msg[i] != 34:
+                return False
+            end = _skip_string(msg, i, n)
+            if end < 0:
+                return False
+            k = _key_index(msg, i + 1, end)
+            i = _skip_ws(msg, end + 1, n)
+            if i >= n or msg[i] != 58:  # ':'
+                return False
+            i = _skip_ws(msg, i + 1, n)
+            if i >= n:
+                return False
+            c = msg[i]
+            if c == 45 or 48 <= c <= 57:  # 数字
+                negative = c == 45
+                if negative:
+                    i += 1
+                whole = 0
+                digits = 0
+                start = i
+                while i < n and 48 <= msg[i] <= 57:
+                    whole = whole * 10 + msg[i] - 48
+                    digits += 1
+                    i += 1
+                if not digits or (digits > 1 and msg[start] == 48):
+                    return False
+                fraction = 0
+                scale = 1
+                if i < n and msg[i] == 46:  # '.'
+                    i += 1
+                    start = i
+                    while i < n and 48 <= msg[i] <= 57:
+                        fraction = fraction * 10 + msg[i] - 48
+                        scale *= 10
+                        digits += 1
+                        i += 1
+                    if i == start:
+                        return False
+                if digits > _MAX_DIGITS or (i < n and (msg[i] == 101 or msg[i] == 69)):  # 指数形式
+                    return False
+                if k >= 0:
+                    if k == _BRIGHTNESS:
+                        # 整数运算后只做一次除法，结果与float()解析十进制文本一致
+                        value = (whole * scale + fraction) / scale
+                    else:
+                        value = whole
+                    seen[k] = 1
+                    values[k] = -value if negative else value
+            elif k >= 0:
+                # 控制字段的非数值写法(字符串、布尔值等)交给json.loads处理
+                return False
+            elif c == 34:
+                i = _skip_string(msg, i, n)
+                if i < 0:
+                    return False
+                i += 1
+            else:
+                for literal in _LITERALS:
+                    size = len(literal)
+                    if n - i >= size and msg[i] == literal[0]:
+                        for j in range(1, size):
+                            if msg[i + j] != literal[j]:
+                                return False
+                        i += size
+                        break
+                else:
+                    return False
+            i = _skip_ws(msg, i, n)
+            if i >= n:
+                return False
+            if msg[i] == 125:
+                return _skip_ws(msg, i + 1, n) == n
+            if msg[i] != 44:  # ','
+                return False
+            i = _skip_ws(msg, i + 1, n)
+        return False
+
+    # 用json.loads解析一条消息，结果写入_seen/_values，格式错误时抛出ValueError/TypeError
+    def _parse_json(self, msg):
+        data = json.loads(msg)
+        if not isinstance(data, dict):
+            raise ValueError('不是字典类型')
+        for k in range(len(CONTROL_KEYS)):
+            key = CONTROL_KEYS[k]
+            self._seen[k] = key in data
+            self._values[k] = data.get(key)
+
+    # 把本周期的消息合并进state(就地修改)，返回LED状态是否变化
+    def merge_into(self, state):
+        messages = self._messages
+        if not messages:
+            return False
+        seen = self._seen
+        values = self._values
+        found = self._found
+        merged = self._merged
+        for k in range(len(found)):
+            found[k] = 0
+        remaining = len(CONTROL_KEYS)
+        colors = _COLOR_KEYS  # 尚未确定的颜色和亮度字段数
+        used = 0
+        invalid = 0
+        for i in range(len(messages) - 1, -1, -1):
+            msg = messages[i]
+            if not colors and not _mentions_animation(msg):
+                # 颜色和亮度已确定，更早的消息只有含动画字段时才需要解析
+                continue
+            self.parsed += 1
+            try:
+                if not self._scan(msg):
+                    self.fallbacks += 1
+                    self._parse_json(msg)
+                for k in range(len(seen)):
+                    if seen[k] and not found[k]:
+                        merged[k] = _clamp(CONTROL_KEYS[k], values[k])
+                        found[k] = 1
+                        remaining -= 1
+                        if k < _COLOR_KEYS:
+                            colors -= 1
+            except (ValueError, TypeError):
+                invalid += 1
+                continue
+            used += 1
+            if not remaining:
+                break
+        # 除最终生效的最新一条有效消息外，其余有效消息都被合并掉了
+        self.invalid += invalid
+        if used:
+            self.coalesced += len(messages) - invalid - 1
+        messages.clear()
+
+        changed = False
+        for k in range(len(found)):
+            if found[k]:
+                key = CONTROL_KEYS[k]
+                if state.get(key) != merged[k]:
+                    state[key] = merged[k]
+                    changed = True
+        if changed:
+            self.dirty = True
+        return changed
+
+    # 是否应当写LED: 有未写出的变化且距上次写出已满一个帧间隔
+    def frame_due(self, now=None):
+        if not self.dirty:
+            return False
+        if self._last_write is None or not self.frame_interval:
+            return True
+        if now is None:
+            now = time.ticks_ms()
+        if time.ticks_diff(now, self._last_write) >= self.frame_interval:
+            return True
+        if not self._deferring:
+            self._deferring = True
+            self.deferred += 1
+        return False
+
+    # 记录一次LED写出
+    def frame_written(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        latency = time.ticks_diff(now, self._newest_at)
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        self._last_write = now
+        self.frames += 1
+        self.dirty = False
+        self._deferring = False
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'parsed': self.parsed,
+            'coalesced': self.coalesced,
+            'invalid': self.invalid,
+            'fallbacks': self.fallbacks,
+            'frames': self.frames,
+            'deferred': self.deferred,
+            'latency_avg': self.latency_sum // self.frames if self.frames else 0,
+            'latency_max': self.latency_max,
+        }
@@ -0,0 +1,245 @@
+# LED动画引擎
+# 由调度器按固定帧率调用render()，每次只渲染当前时刻的一帧并直接写入NeoPixel的buf字节数组，从不阻塞等待:
+#   - 颜色查找表: 256项的gamma校正表乘以全局亮度，亮度或gamma变化时重建一次；帧内只查表和做小整数运算，不分配内存
+#   - 过渡: duration大于0时基色在duration毫秒内从当前颜色线性过渡到目标颜色(淡入淡出即过渡到目标色或黑色)
+#   - 效果: solid(常亮)、breathe(呼吸，升余弦波形表)、rainbow(彩虹流动，预计算色轮)、chase(追逐，带拖尾)，
+#     动态效果的周期为period毫秒
+# 没有过渡且效果为solid时引擎处于空闲状态，只有状态变化才写出新的一帧。
+# 每帧分别统计渲染(填充buf)和写出(驱动发送数据)的耗时(微秒)，比上一帧晚一个帧间隔以上的动画帧计为迟到。
+import math
+import time
+
+EFFECTS = ('solid', 'breathe', 'rainbow', 'chase')
+_SOLID = 0
+_BREATHE = 1
+_RAINBOW = 2
+_CHASE = 3
+_TAIL = (255, 96, 32, 8)  # 追逐效果的拖尾亮度
+
+
+# 生成gamma校正加亮度缩放的查找表: 输入0-255的线性值，输出写入LED的值
+def gamma_table(gamma=2.2, brightness=1.0, table=None):
+    if table is None:
+        table = bytearray(256)
+    for i in range(256):
+        table[i] = int(((i / 255) ** gamma) * 255 * brightness + 0.5)
+    return table
+
+
+# 色轮: 256个色相，每个色相3字节(r, g, b)
+def _color_wheel():
+    wheel = bytearray(768)
+    for i in range(256):
+        if i < 85:
+            r, g, b = 255 - i * 3, i * 3, 0
+        elif i < 170:
+            j = i - 85
+            r, g, b = 0, 255 - j * 3, j * 3
+        else:
+            j = i - 170
+            r, g, b = j * 3, 0, 255 - j * 3
+        wheel[i * 3] = r
+        wheel[i * 3 + 1] = g
+        wheel[i * 3 + 2] = b
+    return wheel
+
+
+# 呼吸波形: 一个周期256点的升余弦，取值0-255
+def _breathe_wave():
+    wave = bytearray(256)
+    for i in range(256):
+        wave[i] = int((1 - math.cos(2 * math.pi * i / 256)) * 127.5 + 0.5)
+    return wave
+
+
+class LedAnimator:
+    # strip: neopixel.NeoPixel(使用其buf、ORDER、bpp和write())，fps: 动画帧率，0表示只在状态变化时写出
+    def __init__(self, strip, n, fps=30, gamma=2.2):
+        if n < 1 or fps < 0 or gamma <= 0:
+            raise ValueError('LED数量必须大于0，帧率不能为负数，gamma必须大于0')
+        self.strip = strip
+        self.n = n
+        self.frame_interval = 1000 // fps if fps else 0
+        self.gamma = gamma
+        self.brightness = None
+        self._lut = bytearray(256)
+        self._wave = _breathe_wave()
+        self._wheel = _color_wheel()
+        # 彩虹效果中每个像素的色相偏移，使整条灯带铺满一圈色轮
+        self._spread = bytearray(n)
+        for i in range(n):
+            self._spread[i] = i * 256 // n
+        self._color = bytearray(3)  # 当前基色(线性值)
+        self._from = bytearray(3)
+        self._to = bytearray(3)
+        self._start = 0  # 过渡开始时刻
+        self._duration = 0
+        self._transition = False
+        self._effect = _SOLID
+        self.period = 2000
+        self._epoch = 0  # 动态效果的相位起点
+        self._last = None  # 上一帧写出时刻
+        self._due = 0  # 下一帧动画的计划时刻，按固定帧间隔递推，轮询周期不整除帧间隔时平均帧率不下降
+        self._animating = False  # 上一帧是否为动画帧(用于判断迟到)
+        self.frames = 0
+        self.late = 0
+        self.render_us = 0  # 累计渲染耗时
+        self.render_us_max = 0
+        self.frame_us = 0  # 累计单帧耗时(渲染加写出)
+        self.frame_us_max = 0
+
+    # 是否需要继续按帧率渲染(过渡进行中或动态效果)
+    def active(self):
+        return self._transition or self._effect != _SOLID
+
+    def effect_name(self):
+        return EFFECTS[self._effect]
+
+    # 应用新的LED状态: r/g/b为目标颜色，brightness为全局亮度，effect/period选择效果，duration为过渡时长
+    def set(self, state, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        brightness = state.get('brightness', 1.0)
+        if brightness != self.brightness:
+            gamma_table(self.gamma, brightness, self._lut)
+            self.brightness = brightness
+        effect = EFFECTS.index(state.get('effect', 'solid'))
+        period = state.get('period', self.period)
+        if effect != self._effect or period != self.period:
+            self._effect = effect
+            self.period = period
+            self._epoch = now
+        self._to[0] = state.get('r', 0)
+        self._to[1] = state.get('g', 0)
+        self._to[2] = state.get('b', 0)
+        duration = state.get('duration', 0)
+        if duration > 0 and self._last is not None:
+            # 从当前显示的基色开始过渡
+            for k in range(3):
+                self._from[k] = self._color[k]
+            self._start = now
+            self._duration = duration
+            self._transition = True
+        else:
+            for k in range(3):
+                self._color[k] = self._to[k]
+            self._transition = False
+
+    # 是否到了下一帧动画的写出时刻
+    def frame_due(self, now=None):
+        if not self.active():
+            return False
+        if self._last is None or not self.frame_interval:
+            return True
+        if now is None:
+            now = time.ticks_ms()
+        return time.ticks_diff(now, self._due) >= 0
+
+    # 推进过渡，更新当前基色
+    def _advance(self, now):
+        color = self._color
+        elapsed = time.ticks_diff(now, self._start)
+        if elapsed >= self._duration:
+            for k in range(3):
+                color[k] = self._to[k]
+            self._transition = False
+            return
+        f = elapsed * 256 // self._duration if elapsed > 0 else 0
+        for k in range(3):
+            a = self._from[k]
+            color[k] = a + (self._to[k] - a) * f // 256
+
+    # 渲染并写出当前时刻的一帧，返回本帧耗时(微秒，渲染加写出)
+    def render(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        start = time.ticks_us()
+        if self._transition:
+            self._advance(now)
+        strip = self.strip
+        buf = strip.buf
+        bpp = strip.bpp
+        order = strip.ORDER
+        o0 = order[0]
+        o1 = order[1]
+        o2 = order[2]
+        lut = self._lut
+        color = self._color
+        effect = self._effect
+        end = self.n * bpp
+        phase = time.ticks_diff(now, self._epoch) % self.period * 256 // self.period
+        if effect == _RAINBOW:
+            wheel = self._wheel
+            spread = self._spread
+            i = 0
+            for offset in range(0, end, bpp):
+                h = ((phase + spread[i]) & 255) * 3
+                buf[offset + o0] = lut[wheel[h]]
+                buf[offset + o1] = lut[wheel[h + 1]]
+                buf[offset + o2] = lut[wheel[h + 2]]
+                i += 1
+        elif effect == _CHASE:
+            n = self.n
+            head = phase * n // 256
+            tail = len(_TAIL)
+            i = 0
+            for offset in range(0, end, bpp):
+                dist = (head - i) % n
+                level = _TAIL[dist] if dist < tail else 0
+                buf[offset + o0] = lut[color[0] * level // 255]
+                buf[offset + o1] = lut[color[1] * level // 255]
+                buf[offset + o2] = lut[color[2] * level // 255]
+                i += 1
+        else:
+            # 整条灯带同一颜色: 每帧只查一次表
+            if effect == _BREATHE:
+                level = self._wave[phase]
+                r = lut[color[0] * level // 255]
+                g = lut[color[1] * level // 255]
+                b = lut[color[2] * level // 255]
+            else:
+                r = lut[color[0]]
+                g = lut[color[1]]
+                b = lut[color[2]]
+            for offset in range(0, end, bpp):
+                buf[offset + o0] = r
+                buf[offset + o1] = g
+                buf[offset + o2] = b
+        rendered = time.ticks_diff(time.ticks_us(), start)
+        strip.write()
+
+        if self._animating and self.frame_interval and time.ticks_diff(now, self._last) >= 2 * self.frame_interval:
+            self.late += 1
+        self._animating = self.active()
+        self._last = now
+        self._due = time.ticks_add(self._due, self.frame_interval)
+        if time.ticks_diff(now, self._due) >= 0:
+            # 落后一帧以上时不补帧，从当前时刻重新计时
+            self._due = time.ticks_add(now, self.frame_interval)
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        self.frames += 1
+        self.render_us += rendered
+        if rendered > self.render_us_max:
+            self.render_us_max = rendered
+        self.frame_us += elapsed
+        if elapsed > self.frame_us_max:
+            self.frame_us_max = elapsed
+        return elapsed
+
+    # 关闭所有LED(不改变当前状态，下次render()时恢复)
+    def off(self):
+        buf = self.strip.buf
+        for i in range(len(buf)):
+            buf[i] = 0
+        self.strip.write()
+
+    def stats(self):
+        return {
+            'effect': self.effect_name(),
+            'frames': self.frames,
+            'late': self.late,
+            'render_us_avg': self.render_us // self.frames if self.frames else 0,
+            'render_us_max': self.render_us_max,
+            'frame_us_avg': self.frame_us // self.frames if self.frames else 0,
+            'frame_us_max': self.frame_us_max,
+        }
@@ -0,0 +1,101 @@
+# 日志子系统
+# - 按级别过滤: 先比较级别再格式化，低于当前级别的调用只做一次字典查找和整数比较
+# - 惰性参数: log('温度: {:.2f}', 'DEBUG', t) 只有真正输出时才调用str.format
+# - 同一调用点(以消息模板为键)在interval毫秒内重复出现时只输出第一条，之后输出时附带省略条数；
+#   可变内容必须经args传入而不是拼进消息(f-string)，不同调用点使用不同的模板，否则会各自占用或共用限速表项
+# - 循环中同一模板对应不同对象(如每个传感器一行)时用key=区分，各自单独限速，互不挤掉
+# - ERROR及以上不限速，错误信息总是输出
+# - 最近capacity条输出保存在预分配的环形缓冲区中，可通过dump()取出(例如经MQTT上报)
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR}
+
+
+class Logger:
+    def __init__(self, level='INFO', interval=0, capacity=64, max_sites=64, out=print):
+        if level not in LEVELS:
+            raise ValueError(f'未知的日志级别: {level}')
+        if interval < 0 or capacity < 0 or max_sites < 1:
+            raise ValueError('日志间隔和缓冲区大小不能为负数')
+        self.level = LEVELS[level]
+        self.interval = interval  # 同一调用点的最短输出间隔(毫秒)，0表示不限速
+        self.capacity = capacity
+        self.max_sites = max_sites  # 限速表最多记录的调用点数，超出后清空重新计
+        self.out = out
+        self._times = [0] * capacity
+        self._levels = [None] * capacity
+        self._lines = [None] * capacity
+        self._index = 0
+        self._count = 0
+        self._sites = {}  # 消息模板或(模板, key) -> [上次输出时刻, 此后被省略的条数]
+        self.emitted = 0
+        self.filtered = 0  # 低于当前级别被丢弃的条数
+        self.suppressed = 0  # 被限速省略的条数
+
+    def set_level(self, level):
+        self.level = LEVELS[level]
+
+    def enabled(self, level):
+        return LEVELS.get(level, INFO) >= self.level
+
+    def log(self, message, level='INFO', *args, key=None):
+        severity = LEVELS.get(level, INFO)
+        if severity < self.level:
+            self.filtered += 1
+            return
+        now = time.ticks_ms()
+        skipped = 0
+        if self.interval and severity < ERROR:
+            site_key = message if key is None else (message, key)
+            site = self._sites.get(site_key)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    self._sites.clear()
+                self._sites[site_key] = [now, 0]
+            elif time.ticks_diff(now, site[0]) < self.interval:
+                site[1] += 1
+                self.suppressed += 1
+                return
+            else:
+                skipped = site[1]
+                site[0] = now
+                site[1] = 0
+        if args:
+            try:
+                message = message.format(*args)
+            except Exception:
+                message = f'{message} {args}'
+        if skipped:
+            message = f'{message} (此前{skipped}条重复已省略)'
+        self.emitted += 1
+        self.out(f'[{level}] {message}')
+        if self.capacity:
+            i = self._index
+            self._times[i] = now
+            self._levels[i] = level
+            self._lines[i] = message
+            i += 1
+            self._index = 0 if i >= self.capacity else i
+            if self._count < self.capacity:
+                self._count += 1
+
+    # 按时间顺序返回缓冲区中的日志: [(ticks_ms, 级别, 消息), ...]
+    def dump(self):
+        start = self._index - self._count
+        entries = []
+        for k in range(self._count):
+            i = (start + k) % self.capacity
+            entries.append((self._times[i], self._levels[i], self._lines[i]))
+        return entries
+
+    def clear(self):
+        self._index = 0
+        self._count = 0
+
+    def stats(self):
+        return {'emitted': self.emitted, 'filtered': self.filtered, 'suppressed': self.suppressed,
+                'buffered': self._count}
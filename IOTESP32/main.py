@@ -1,10 +1,35 @@
-import network
 import time
+# 启动计时的起点: main.py开始执行的时刻(在导入其余模块之前取)
+BOOT_START = time.ticks_ms()
+import network
 import machine
+import micropython
+import gc
 import json
 from machine import Pin, ADC
 import neopixel
 import esp32
+from wifi_manager import WifiManager, STATE_CONNECTED
+from sample_buffer import SampleBuffer
+from payload import (encode_json_batch, encode_json_sample_into, encode_json_reading_into, encode_binary_into,
+                     encode_binary_sample_into, binary_frame_size, json_string, JSON_SAMPLE_SIZE)
+from batcher import SampleBatcher
+from temp_filter import build_chain
+from publish_policy import DeadbandPolicy
+from led_control import ControlCoalescer
+from mqtt_supervisor import ConnectionSupervisor
+from sensors import Sensor, SensorRegistry, create_sensor, check_spec, INVALID_READING
+from heap_monitor import HeapMonitor
+from led_effects import LedAnimator
+from config_store import ConfigStore, coerce, NAMES as CONFIG_NAMES
+from fast_boot import BootTimer, NetCache, fingerprint
+from logger import Logger, LEVELS
+import power
+
+# 只在部分配置下用到的模块在首次使用时才导入，不占用其他配置的启动时间:
+# asyncio(import_asyncio)、异步MQTT客户端(connect_mqtt_async)、定时器采样(init_sampler)、运行指标(init_metrics)、
+# 双线程模式的_thread和线程间队列(thread_main_loop)、TLS传输(get_tls_context)
+asyncio = None
 
 # 尝试导入umqtt库，如果失败则使用自定义MQTT客户端
 from umqtt.simple import MQTTClient
@@ -35,26 +60,155 @@ DEBUG = getattr(config, 'DEBUG', True)
 DEFAULT_LED_COLOR = getattr(config, 'DEFAULT_LED_COLOR', {'r': 0, 'g': 0, 'b': 0})
 DEFAULT_LED_BRIGHTNESS = getattr(config, 'DEFAULT_LED_BRIGHTNESS', 0.5)
 TEMP_CALIBRATION_OFFSET = getattr(config, 'TEMP_CALIBRATION_OFFSET', 0.0)
+TEMP_VALID_MIN = getattr(config, 'TEMP_VALID_MIN', -40.0)
+TEMP_VALID_MAX = getattr(config, 'TEMP_VALID_MAX', 125.0)
 TEMP_FILTER_ENABLED = getattr(config, 'TEMP_FILTER_ENABLED', True)
 TEMP_FILTER_SAMPLES = getattr(config, 'TEMP_FILTER_SAMPLES', 5)
+TEMP_FILTER_CHAIN = getattr(config, 'TEMP_FILTER_CHAIN', 'ma')
+TEMP_FILTER_EMA_ALPHA = getattr(config, 'TEMP_FILTER_EMA_ALPHA', 0.3)
+TEMP_FILTER_MEDIAN_SAMPLES = getattr(config, 'TEMP_FILTER_MEDIAN_SAMPLES', 5)
+TEMP_FILTER_KALMAN_Q = getattr(config, 'TEMP_FILTER_KALMAN_Q', 0.01)
+TEMP_FILTER_KALMAN_R = getattr(config, 'TEMP_FILTER_KALMAN_R', 0.5)
 LOG_LEVEL = getattr(config, 'LOG_LEVEL', 'INFO')
+LOG_INTERVAL = getattr(config, 'LOG_INTERVAL', 0)
+LOG_RING_SIZE = getattr(config, 'LOG_RING_SIZE', 64)
+LOG_TOPIC = getattr(config, 'LOG_TOPIC', None)
+LOG_REQUEST_TOPIC = LOG_TOPIC + b'/get' if LOG_TOPIC else None
+STATS_TOPIC = getattr(config, 'STATS_TOPIC', None)
+STATS_INTERVAL = getattr(config, 'STATS_INTERVAL', 60000)
+CONFIG_TOPIC = getattr(config, 'CONFIG_TOPIC', None)
+CONFIG_SET_TOPIC = CONFIG_TOPIC + b'/set' if CONFIG_TOPIC else None
+CONFIG_STORE_FILE = getattr(config, 'CONFIG_STORE_FILE', 'config.bin')
+FAST_BOOT = getattr(config, 'FAST_BOOT', False)
+NET_CACHE_FILE = getattr(config, 'NET_CACHE_FILE', 'net.bin')
+BOOT_TOPIC = getattr(config, 'BOOT_TOPIC', None)
+ASYNC_MODE = getattr(config, 'ASYNC_MODE', False)
+THREAD_MODE = getattr(config, 'THREAD_MODE', False)
+THREAD_STACK_SIZE = getattr(config, 'THREAD_STACK_SIZE', 16384)
+MQTT_CLIENT = getattr(config, 'MQTT_CLIENT', 'umqtt')
+MQTT_INFLIGHT_WINDOW = getattr(config, 'MQTT_INFLIGHT_WINDOW', 8)
+MQTT_BUFFER_SIZE = getattr(config, 'MQTT_BUFFER_SIZE', 1024)
+MQTT_PING_INTERVAL = getattr(config, 'MQTT_PING_INTERVAL', 30)
+MQTT_KEEPALIVE = getattr(config, 'MQTT_KEEPALIVE', 60)
+MQTT_TLS = getattr(config, 'MQTT_TLS', False)
+MQTT_TLS_CA_FILE = getattr(config, 'MQTT_TLS_CA_FILE', None)
+MQTT_TLS_CERT_FILE = getattr(config, 'MQTT_TLS_CERT_FILE', None)
+MQTT_TLS_KEY_FILE = getattr(config, 'MQTT_TLS_KEY_FILE', None)
+MQTT_TLS_SERVER_HOSTNAME = getattr(config, 'MQTT_TLS_SERVER_HOSTNAME', None)
+MQTT_TLS_RESUME = getattr(config, 'MQTT_TLS_RESUME', True)
+MQTT_BACKOFF_MIN = getattr(config, 'MQTT_BACKOFF_MIN', 1000)
+MQTT_BACKOFF_MAX = getattr(config, 'MQTT_BACKOFF_MAX', 60000)
+ASYNC_MQTT = ASYNC_MODE and MQTT_CLIENT == 'async'  # MQTT连接由mqtt_task维护
+CONTROL_POLL_INTERVAL = getattr(config, 'CONTROL_POLL_INTERVAL', 10)
+CONTROL_DRAIN_MAX = getattr(config, 'CONTROL_DRAIN_MAX', 32)
+LED_MAX_FPS = getattr(config, 'LED_MAX_FPS', 50)
+LED_ANIMATION_FPS = getattr(config, 'LED_ANIMATION_FPS', 30)
+LED_GAMMA = getattr(config, 'LED_GAMMA', 1.0)
+LED_TRANSITION_MS = getattr(config, 'LED_TRANSITION_MS', 0)
+NETWORK_CHECK_INTERVAL = getattr(config, 'NETWORK_CHECK_INTERVAL', 30000)
+MAX_PENDING_SAMPLES = getattr(config, 'MAX_PENDING_SAMPLES', 20)
+WIFI_CONNECT_TIMEOUT = getattr(config, 'WIFI_CONNECT_TIMEOUT', 15000)
+WIFI_BACKOFF_MIN = getattr(config, 'WIFI_BACKOFF_MIN', 1000)
+WIFI_BACKOFF_MAX = getattr(config, 'WIFI_BACKOFF_MAX', 60000)
+WIFI_POLL_INTERVAL = getattr(config, 'WIFI_POLL_INTERVAL', 200)
+STORE_FORWARD_ENABLED = getattr(config, 'STORE_FORWARD_ENABLED', True)
+STORE_FORWARD_FILE = getattr(config, 'STORE_FORWARD_FILE', 'samples.buf')
+STORE_FORWARD_CAPACITY = getattr(config, 'STORE_FORWARD_CAPACITY', 1024)
+STORE_FORWARD_DROP = getattr(config, 'STORE_FORWARD_DROP', 'oldest')
+REPLAY_BATCH_SIZE = getattr(config, 'REPLAY_BATCH_SIZE', 32)
+PUBLISH_BATCH_SIZE = getattr(config, 'PUBLISH_BATCH_SIZE', 1)
+PUBLISH_BATCH_INTERVAL = getattr(config, 'PUBLISH_BATCH_INTERVAL', 60000)
+PAYLOAD_FORMAT = getattr(config, 'PAYLOAD_FORMAT', 'json')
+COMPRESS_VALUE_MODE = getattr(config, 'COMPRESS_VALUE_MODE', 'delta')
+REPORT_BY_EXCEPTION = getattr(config, 'REPORT_BY_EXCEPTION', False)
+DEADBAND_ABS = getattr(config, 'DEADBAND_ABS', 0.2)
+DEADBAND_REL = getattr(config, 'DEADBAND_REL', 0.0)
+HEARTBEAT_INTERVAL = getattr(config, 'HEARTBEAT_INTERVAL', 300000)
+POWER_MODE = getattr(config, 'POWER_MODE', 'always_on')
+DUTY_PUBLISH_EVERY = getattr(config, 'DUTY_PUBLISH_EVERY', 4)
+DUTY_MAX_PENDING = getattr(config, 'DUTY_MAX_PENDING', 128)
+SENSORS = getattr(config, 'SENSORS', [])
+INCLUDE_BATTERY_STATUS = getattr(config, 'INCLUDE_BATTERY_STATUS', False)
+BATTERY_ADC_PIN = getattr(config, 'BATTERY_ADC_PIN', 1)
+BATTERY_DIVIDER = getattr(config, 'BATTERY_DIVIDER', 2.0)
+BATTERY_SAMPLE_INTERVAL = getattr(config, 'BATTERY_SAMPLE_INTERVAL', 60000)
+SAMPLE_MODE = getattr(config, 'SAMPLE_MODE', 'loop')
+SAMPLE_OVERSAMPLE = getattr(config, 'SAMPLE_OVERSAMPLE', 1)
+SAMPLE_TIMER_ID = getattr(config, 'SAMPLE_TIMER_ID', 0)
+SAMPLE_RING_SIZE = getattr(config, 'SAMPLE_RING_SIZE', 32)
+GC_MODE = getattr(config, 'GC_MODE', 'idle')
+GC_COLLECT_THRESHOLD = getattr(config, 'GC_COLLECT_THRESHOLD', 16384)
+DEVICE_ID = MQTT_CLIENT_ID.decode('utf-8') if isinstance(MQTT_CLIENT_ID, bytes) else MQTT_CLIENT_ID
+# 二进制和压缩格式的发布主题，设备ID作为主题最后一段
+BINARY_TOPIC = getattr(config, 'BINARY_TOPIC', None) or TEMP_TOPIC + b'/bin/' + DEVICE_ID.encode()
+DEVICE_ID_JSON = json_string(DEVICE_ID)  # JSON消息中预先编码的设备ID
+_NUMBER_TYPES = (int, float)
+# 附加传感器的默认发布主题为 <前缀>/<传感器名>，前缀缺省为TEMP_TOPIC的上一级
+SENSOR_TOPIC_PREFIX = getattr(config, 'SENSOR_TOPIC_PREFIX', None) or TEMP_TOPIC.rsplit(b'/', 1)[0]
 
 # 全局变量
 wlan = None
+wifi_manager = None
+sample_buffer = None  # 断网期间样本的flash缓冲区
+batcher = SampleBatcher(PUBLISH_BATCH_SIZE, PUBLISH_BATCH_INTERVAL) if PUBLISH_BATCH_SIZE > 1 else None
+# 压缩格式下批量和补发消息编码为压缩块(compress.py)，单条样本仍为二进制帧
+if PAYLOAD_FORMAT == 'compressed':
+    from compress import encode_block_into, block_max_size, MODE_DELTA, MODE_XOR
+    COMPRESS_MODE = MODE_XOR if COMPRESS_VALUE_MODE == 'xor' else MODE_DELTA
+    _batch_size = block_max_size(max(PUBLISH_BATCH_SIZE, REPLAY_BATCH_SIZE, 1))
+else:
+    _batch_size = binary_frame_size(max(PUBLISH_BATCH_SIZE, REPLAY_BATCH_SIZE, 1))
+# 预分配编码缓冲区，容纳最大的一批二进制样本或压缩块，或一条JSON消息
+payload_buf = bytearray(max(_batch_size, JSON_SAMPLE_SIZE + len(DEVICE_ID_JSON)))
+payload_mv = memoryview(payload_buf)
+publish_policy = None  # 按变化上报策略(REPORT_BY_EXCEPTION启用时创建)
+control = ControlCoalescer(LED_MAX_FPS, CONTROL_DRAIN_MAX)  # LED控制消息合并与限帧
 mqtt_client = None
+mqtt_supervisor = None  # MQTT连接监督器，负责所有重连和保活决策
+tls_context = None  # MQTT_TLS启用时第一次连接前创建，之后每次重连复用(保存上次的TLS会话)
 led = None
-last_temp_time = 0
 led_state = DEFAULT_LED_COLOR.copy()
 led_state['brightness'] = DEFAULT_LED_BRIGHTNESS
-temp_samples = []  # 用于温度滤波的样本数组
+led_state['effect'] = 'solid'
+led_state['duration'] = LED_TRANSITION_MS  # 颜色变化的过渡时长(毫秒)
+led_state['period'] = 2000  # 动态效果的周期(毫秒)
+led_animator = None  # LED动画引擎(init_led中创建)
+temp_filter = None  # 温度滤波链(init_temp_filter中按TEMP_FILTER_*配置创建)
+sensor_registry = None  # 传感器注册表(init_sensors中创建)，由同一个调度器按各自周期采样
+temperature_sensor = None  # 主传感器: 片内温度，沿用温度发布、批量和断网缓存路径
+sampler = None  # SAMPLE_MODE为timer时由硬件定时器采样主传感器
+heap = None  # 堆内存与GC监控(init_heap中创建)
+metrics = None  # 运行指标(STATS_TOPIC配置时由init_metrics创建)
+config_store = ConfigStore(CONFIG_STORE_FILE)  # 运行时修改的配置项的持久化存储
+config_overrides = {}  # 当前与config.py不同、已保存到config_store的配置项
+config_requests = []  # 收到的CONFIG_SET_TOPIC消息，由控制周期处理
+net_cache = NetCache(NET_CACHE_FILE)  # 快速启动使用的网络参数缓存
+net_cache_key = None  # 当前WiFi和MQTT代理配置的指纹(init中计算)
+net_cached = None  # 本次启动读到的网络参数缓存(bssid, channel, ifconfig, broker_ip)
+mqtt_server = None  # 快速启动时缓存的代理IP，连接失败后清除并改用MQTT_BROKER
+iteration_start = 0  # main_loop本轮开始时刻(ticks_us)
+pending_samples = []  # asyncio模式下等待发布的(时间戳, 温度)样本
+pending_readings = []  # asyncio模式下等待发布的附加传感器(传感器, 时间戳, 读数)
+sample_queue = None  # 双线程模式下实时线程采到的(传感器, 时间戳, 读数)，由网络线程发布
+control_queue = None  # 双线程模式下网络线程收到的(到达时刻, 控制消息)，由实时线程合并写LED
+sampling_lock = None  # 双线程模式下网络线程修改传感器、滤波和定时采样器时持有，实时线程采样时持有
+realtime_running = False  # 置为False时实时线程退出
+realtime_alive = False  # 实时线程是否仍在运行
+MAX_ERROR_COUNT = 5
+error_counts = {'wifi': 0, 'temp': 0}  # 主循环和asyncio各任务共享的错误计数器(MQTT错误由mqtt_supervisor统计)
 
-# 日志函数 - 简化版
-# 注意：原log函数导致程序异常，已替换为简单的print函数
-def log(message, level='INFO'):
-    print(f'[{level}] {message}')
+# 日志: 级别过滤在格式化之前进行，消息可写成模板加参数，例如 log('温度: {:.2f}°C', 'DEBUG', t)
+# DEBUG = False时即使LOG_LEVEL为DEBUG也不输出调试日志；LOG_INTERVAL内同一调用点的重复日志只输出一条
+_log_level = LOG_LEVEL if LOG_LEVEL in LEVELS else 'INFO'  # 无效级别由validate_config报告
+if _log_level == 'DEBUG' and not DEBUG:
+    _log_level = 'INFO'
+logger = Logger(_log_level, LOG_INTERVAL, LOG_RING_SIZE)
+log = logger.log
+log_dump_requested = False  # 收到LOG_REQUEST_TOPIC消息后置位，由控制周期发布日志缓冲区
+boot_timer = BootTimer(BOOT_START)  # 启动各阶段计时，第一次发布后由finish_boot发出记录并置为None
 
-# 配置验证函数
-def validate_config():
+# 按当前配置值检查配置，返回错误列表(启动时和运行时修改配置时共用)
+def config_errors():
     errors = []
     
     # 验证WiFi配置
@@ -77,18 +231,138 @@ def validate_config():
     if NUM_LEDS < 1:
         errors.append('LED数量必须大于0')
     
+    # 验证日志配置
+    if LOG_LEVEL not in LEVELS:
+        errors.append('LOG_LEVEL必须是DEBUG、INFO、WARNING或ERROR')
+    
+    # 验证LED控制配置
+    if LED_MAX_FPS < 0:
+        errors.append('LED_MAX_FPS不能为负数')
+    if LED_ANIMATION_FPS < 0:
+        errors.append('LED_ANIMATION_FPS不能为负数')
+    if LED_GAMMA <= 0:
+        errors.append('LED_GAMMA必须大于0')
+    if CONTROL_DRAIN_MAX < 1:
+        errors.append('CONTROL_DRAIN_MAX必须大于0')
+    
     # 验证温度采样配置
     if TEMP_SAMPLE_INTERVAL < 100:
         errors.append('温度采样间隔不能小于100ms')
+    if not TEMP_VALID_MIN < TEMP_VALID_MAX:
+        errors.append('TEMP_VALID_MIN必须小于TEMP_VALID_MAX')
+    
+    # 验证温度滤波配置
+    if TEMP_FILTER_ENABLED:
+        try:
+            create_temp_filter()
+        except ValueError as e:
+            errors.append(f'温度滤波配置错误: {e}')
+    
+    # 验证定时采样配置
+    if SAMPLE_MODE not in ('loop', 'timer'):
+        errors.append('SAMPLE_MODE必须是loop或timer')
+    elif SAMPLE_MODE == 'timer':
+        if POWER_MODE != 'always_on':
+            errors.append('定时器采样仅支持POWER_MODE为always_on')
+        if SAMPLE_OVERSAMPLE < 1 or TEMP_SAMPLE_INTERVAL // SAMPLE_OVERSAMPLE < 10:
+            errors.append('SAMPLE_OVERSAMPLE必须大于0，且子采样周期不小于10ms')
+        if SAMPLE_RING_SIZE < 2:
+            errors.append('SAMPLE_RING_SIZE不能小于2')
+    
+    # 验证GC配置
+    if GC_MODE not in ('auto', 'idle'):
+        errors.append('GC_MODE必须是auto或idle')
+    if GC_COLLECT_THRESHOLD < 0:
+        errors.append('GC_COLLECT_THRESHOLD不能为负数')
+    
+    # 验证运行指标配置
+    if STATS_TOPIC and STATS_INTERVAL < 1000:
+        errors.append('运行指标发布间隔不能小于1000ms')
+    
+    # 验证附加传感器配置
+    if BATTERY_SAMPLE_INTERVAL < 100:
+        errors.append('电池采样间隔不能小于100ms')
+    names = ['temperature']
+    for spec in SENSORS:
+        try:
+            check_spec(spec)
+            if spec['name'] in names:
+                raise ValueError(f'传感器名称重复: {spec["name"]}')
+            names.append(spec['name'])
+        except ValueError as e:
+            errors.append(f'传感器配置错误: {e}')
     
     # 验证MQTT QoS
     if MQTT_QOS < 0 or MQTT_QOS > 2:
         errors.append('MQTT QoS必须在0-2之间')
     
+    # 验证MQTT客户端配置
+    if MQTT_CLIENT not in ('umqtt', 'async'):
+        errors.append('MQTT_CLIENT必须是umqtt或async')
+    elif MQTT_CLIENT == 'async':
+        if not ASYNC_MODE or POWER_MODE != 'always_on':
+            errors.append('异步MQTT客户端需要ASYNC_MODE = True且POWER_MODE为always_on')
+        if MQTT_QOS > 1:
+            errors.append('异步MQTT客户端仅支持QoS 0和1')
+        if MQTT_INFLIGHT_WINDOW < 1:
+            errors.append('MQTT_INFLIGHT_WINDOW必须大于0')
+        if MQTT_BUFFER_SIZE < 256:
+            errors.append('MQTT_BUFFER_SIZE不能小于256字节')
+    if MQTT_PING_INTERVAL <= 0:
+        errors.append('MQTT_PING_INTERVAL必须大于0')
+    # 有流量时保活检查跳过ping，两次发送之间最长约2倍检查间隔；代理在1.5倍保活时间内收不到报文就断开
+    if MQTT_KEEPALIVE < 0:
+        errors.append('MQTT_KEEPALIVE不能为负数')
+    elif MQTT_KEEPALIVE and MQTT_PING_INTERVAL * 4 > MQTT_KEEPALIVE * 3:
+        errors.append('MQTT_PING_INTERVAL不能超过MQTT_KEEPALIVE的3/4，否则代理会因保活超时断开连接')
+    if MQTT_TLS and bool(MQTT_TLS_CERT_FILE) != bool(MQTT_TLS_KEY_FILE):
+        errors.append('MQTT_TLS_CERT_FILE和MQTT_TLS_KEY_FILE必须同时配置')
+    if MQTT_BACKOFF_MIN < 1 or MQTT_BACKOFF_MAX < MQTT_BACKOFF_MIN:
+        errors.append('MQTT重连退避时间无效')
+    
+    # 验证按变化上报配置
+    if REPORT_BY_EXCEPTION:
+        if DEADBAND_ABS < 0 or DEADBAND_REL < 0:
+            errors.append('发布死区不能为负数')
+        if HEARTBEAT_INTERVAL and HEARTBEAT_INTERVAL < TEMP_SAMPLE_INTERVAL:
+            errors.append('心跳间隔不能小于温度采样间隔')
+    
+    # 验证低功耗配置
+    if POWER_MODE not in ('always_on', 'lightsleep', 'deepsleep'):
+        errors.append('POWER_MODE必须是always_on、lightsleep或deepsleep')
+    elif POWER_MODE != 'always_on' and DUTY_PUBLISH_EVERY < 1:
+        errors.append('DUTY_PUBLISH_EVERY必须大于0')
+    
+    # 验证双线程模式
+    if THREAD_MODE:
+        if ASYNC_MODE or POWER_MODE != 'always_on':
+            errors.append('THREAD_MODE不能与ASYNC_MODE同时启用，且需要POWER_MODE为always_on')
+        if MAX_PENDING_SAMPLES < 1:
+            errors.append('MAX_PENDING_SAMPLES必须大于0')
+        if THREAD_STACK_SIZE < 0:
+            errors.append('THREAD_STACK_SIZE不能为负数')
+    
+    # 验证载荷格式
+    if PAYLOAD_FORMAT not in ('json', 'binary', 'compressed'):
+        errors.append('PAYLOAD_FORMAT必须是json、binary或compressed')
+    elif PAYLOAD_FORMAT == 'binary' and max(PUBLISH_BATCH_SIZE, REPLAY_BATCH_SIZE) > 255:
+        errors.append('二进制格式下每批样本数不能超过255')
+    elif PAYLOAD_FORMAT == 'compressed' and COMPRESS_VALUE_MODE not in ('delta', 'xor'):
+        errors.append('COMPRESS_VALUE_MODE必须是delta或xor')
+    
+    # 验证运行时配置
+    if CONFIG_TOPIC and not CONFIG_STORE_FILE:
+        errors.append('CONFIG_STORE_FILE未配置')
+    
+    return errors
+
+# 配置验证函数
+def validate_config():
+    errors = config_errors()
     if errors:
         log('配置验证失败:')
         for error in errors:
-            log(f'  - {error}', 'ERROR')
+            log('  - {}', 'ERROR', error)
         return False
     
     log('配置验证通过')
@@ -109,170 +383,535 @@ def monitor_network_status():
         
         # 获取网络信息
         ifconfig = wlan.ifconfig()
-        log(f'网络状态 - IP: {ifconfig[0]}, 子网掩码: {ifconfig[1]}, 网关: {ifconfig[2]}, DNS: {ifconfig[3]}', 'DEBUG')
+        log('网络状态 - IP: {}, 子网掩码: {}, 网关: {}, DNS: {}', 'DEBUG', ifconfig[0], ifconfig[1], ifconfig[2], ifconfig[3])
         
         # 获取WiFi信号强度
         try:
             rssi = wlan.status('rssi')
-            log(f'WiFi信号强度: {rssi} dBm', 'DEBUG')
+            log('WiFi信号强度: {} dBm', 'DEBUG', rssi)
         except:
             pass  # 不是所有MicroPython实现都支持RSSI
         
+        # 按变化上报统计
+        if publish_policy is not None:
+            stats = publish_policy.stats()
+            log('发布统计 - 已发布: {}, 已抑制: {}, 心跳: {}', 'INFO', stats['published'], stats['suppressed'], stats['heartbeats'])
+        
+        # LED控制统计
+        stats = control.stats()
+        if stats['received']:
+            log('控制统计 - 收到: {}, 合并: {}, 无效: {}, 写LED: {}, 限帧推迟: {}, 延迟: 平均{}ms/最大{}ms', 'INFO', stats['received'],
+                stats['coalesced'], stats['invalid'], stats['frames'], stats['deferred'], stats['latency_avg'],
+                stats['latency_max'])
+        
+        # LED动画统计
+        if led_animator is not None and led_animator.frames:
+            stats = led_animator.stats()
+            log('LED统计 - 效果: {}, 帧数: {}, 迟到: {}, 渲染: 平均{}us/最大{}us, 每帧: 平均{}us/最大{}us', 'INFO', stats['effect'],
+                stats['frames'], stats['late'], stats['render_us_avg'], stats['render_us_max'], stats['frame_us_avg'],
+                stats['frame_us_max'])
+        
+        # MQTT连接统计
+        stats = get_mqtt_supervisor().stats()
+        log('MQTT连接 - 状态: {}, 连接: {}/{}次, 断开: {}, ping: {}, 省去ping: {}', 'INFO', stats['state'], stats['connects'],
+            stats['attempts'], stats['disconnects'], stats['pings'], stats['pings_skipped'])
+        if tls_context is not None:
+            stats = tls_context.stats()
+            log('TLS握手 - 完整: {}次(最近{}ms), 会话恢复: {}次(最近{}ms), 被拒: {}, 失败: {}', 'INFO', stats['full'], stats['full_ms'],
+                stats['resumed'], stats['resumed_ms'], stats['rejected'], stats['failures'])
+        
+        # 异步MQTT客户端统计
+        if ASYNC_MQTT and mqtt_client is not None:
+            stats = mqtt_client.stats()
+            log('MQTT统计 - 已发布: {}, 已确认: {}, 在途: {}, 最大在途: {}, 重发: {}, 确认延迟: 平均{}ms/最大{}ms', 'INFO',
+                stats['published'], stats['acked'], stats['inflight'], stats['max_inflight'], stats['resent'],
+                stats['ack_avg'], stats['ack_max'])
+
+        # 定时器采样统计
+        if sampler is not None:
+            stats = sampler.stats()
+            log('定时采样 - 触发: {}, 样本: {}, 错过: {}, 溢出: {}, 间隔抖动: 平均{}ms/最大{}ms, 调度延迟: 最大{}ms', 'INFO', stats['ticks'],
+                stats['samples'], stats['missed'], stats['overflows'], stats['jitter_avg'], stats['jitter_max'],
+                stats['latency_max'])
+        
+        # 双线程模式的线程间队列
+        if sample_queue is not None:
+            log('双线程 - 样本队列: {}/{}, 溢出: {}, 控制队列: {}/{}, 实时线程: {}', 'INFO', len(sample_queue), sample_queue.size,
+                sample_queue.overflows, len(control_queue), control_queue.size, '运行' if realtime_alive else '已退出')
+        
+        # 堆内存与GC统计
+        stats = heap.stats()
+        log('堆统计 - 每轮分配: 平均{}B/最大{}B, 零分配轮数: {}/{}, 分配速率: {}B/s, '
+            'GC: 显式{}次(暂停平均{}us/最大{}us) 自动{}次, 高水位: {}B, 最少空闲: {}B', 'INFO',
+            stats['alloc_avg'], stats['alloc_max'], stats['clean'], stats['iterations'], stats['alloc_rate'],
+            stats['collects'], stats['pause_avg'], stats['pause_max'], stats['auto_gcs'], stats['high_water'],
+            stats['free_min'])
+        
+        # 传感器读取耗时和调度抖动
+        for name, stats in sensor_registry.stats().items():
+            log('传感器{} - 读取: {}, 失败: {}, 无效: {}, 跳过: {}, 耗时: 平均{}us/最大{}us, 抖动: 平均{}ms/最大{}ms', 'INFO', name,
+                stats['reads'], stats['failures'], stats['invalid'], stats['skipped'], stats['read_us_avg'], stats['read_us_max'], stats['jitter_avg'],
+                stats['jitter_max'], key=name)
+        
+        # 日志统计
+        stats = logger.stats()
+        log('日志统计 - 输出: {}, 级别过滤: {}, 限速省略: {}', 'INFO', stats['emitted'], stats['filtered'], stats['suppressed'])
+        
         return True
     except Exception as e:
-        log(f'网络状态监控错误: {e}', 'ERROR')
+        log('网络状态监控错误: {}', 'ERROR', e)
         return False
 
-# WiFi连接功能
+# 获取WiFi连接管理器(首次调用时创建)
+def get_wifi_manager():
+    global wlan, wifi_manager
+    if not wifi_manager:
+        wifi_manager = WifiManager(
+            WIFI_SSID,
+            WIFI_PASSWORD,
+            connect_timeout=WIFI_CONNECT_TIMEOUT,
+            backoff_min=WIFI_BACKOFF_MIN,
+            backoff_max=WIFI_BACKOFF_MAX,
+            reset_after=MAX_ERROR_COUNT,
+            log=log
+        )
+        wlan = wifi_manager.wlan
+    return wifi_manager
+
+# WiFi连接功能(有界等待，超时返回False而不是一直空转)
 def do_connect():
-    global wlan
-    print('connecting to network...')
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
-    if not wlan.isconnected():
-        print('connecting to network...')
-        wlan.connect(WIFI_SSID, WIFI_PASSWORD)
-        while not wlan.isconnected():
-            pass
-    print('network config:', wlan.ifconfig())
+    manager = get_wifi_manager()
+    log('connecting to network...')
+    if not manager.connect(WIFI_CONNECT_TIMEOUT):
+        log('WiFi连接未能在{}ms内完成，状态: {}', 'WARNING', WIFI_CONNECT_TIMEOUT, manager.state_name())
+        return False
+    log('network config: {}', 'INFO', wlan.ifconfig())
+    if boot_timer is not None:
+        boot_timer.mark('wifi')
     return True
 
 # 为了兼容性，添加connect_wifi函数
 def connect_wifi():
     return do_connect()
 
-# 检查WiFi连接状态并自动重连
+# 检查WiFi连接状态并自动重连(非阻塞：只推进一步连接状态机)
 def check_wifi_connection():
-    global wlan
-    if not wlan or not wlan.isconnected():
-        log('WiFi连接断开，尝试重新连接...')
-        return do_connect()
+    return get_wifi_manager().poll() == STATE_CONNECTED
+
+# 按TEMP_FILTER_*配置创建温度滤波链
+def create_temp_filter():
+    return build_chain(
+        TEMP_FILTER_CHAIN,
+        samples=TEMP_FILTER_SAMPLES,
+        ema_alpha=TEMP_FILTER_EMA_ALPHA,
+        median_samples=TEMP_FILTER_MEDIAN_SAMPLES,
+        kalman_q=TEMP_FILTER_KALMAN_Q,
+        kalman_r=TEMP_FILTER_KALMAN_R
+    )
+
+# 初始化温度滤波链
+def init_temp_filter():
+    global temp_filter
+    temp_filter = create_temp_filter() if TEMP_FILTER_ENABLED else None
     return True
 
-# 温度采集功能
-def read_internal_temperature():
-    global temp_samples
+# 读取片内温度传感器(摄氏度，未校准、未滤波)，作为主传感器的读取函数
+def read_mcu_temperature():
     try:
         # 直接使用ESP32片内温度传感器（摄氏度）
         try:
-            temperature = esp32.mcu_temperature()
+            return esp32.mcu_temperature()
         except AttributeError:
             # 某些固件可能不提供mcu_temperature，尝试raw_temperature作为近似
             try:
-                temperature = esp32.raw_temperature()
+                return esp32.raw_temperature()
             except Exception as e:
-                log(f'固件不支持片内温度接口: {e}', 'ERROR')
+                log('固件不支持片内温度接口: {}', 'ERROR', e)
                 return None
+    except Exception as e:
+        log('读取温度错误: {}', 'ERROR', e)
+        return None
+
+# 按SENSORS配置列出附加传感器；INCLUDE_BATTERY_STATUS启用时追加电池电压(ADC，乘分压系数)
+def sensor_specs():
+    specs = list(SENSORS)
+    if INCLUDE_BATTERY_STATUS:
+        specs.append({'name': 'battery', 'driver': 'adc', 'pin': BATTERY_ADC_PIN, 'scale': BATTERY_DIVIDER,
+                      'period': BATTERY_SAMPLE_INTERVAL, 'unit': 'V', 'atten': ADC.ATTN_11DB})
+    return specs
+
+# 创建传感器注册表：片内温度为主传感器(校准偏移和TEMP_FILTER_*滤波链)，附加传感器按各自配置创建；
+# primary_only为True时只注册主传感器(低功耗模式)，defer_extras为True时附加传感器留给init_extra_sensors(快速启动)。
+# SAMPLE_MODE为timer时主传感器只登记不调度，由硬件定时器采样(见init_sampler)
+def init_sensors(primary_only=False, defer_extras=False):
+    global sensor_registry, temperature_sensor
+    sensor_registry = SensorRegistry()
+    temperature_sensor = sensor_registry.add(Sensor('temperature', read_mcu_temperature, TEMP_SAMPLE_INTERVAL,
+                                                    temp_filter, TEMP_TOPIC, '°C', TEMP_CALIBRATION_OFFSET,
+                                                    TEMP_VALID_MIN, TEMP_VALID_MAX),
+                                             scheduled=primary_only or SAMPLE_MODE != 'timer')
+    if primary_only or defer_extras:
+        return True
+    return init_extra_sensors()
+
+# 创建附加传感器并加入注册表(运行中加入的传感器立即采样一次)。单个附加传感器创建失败只跳过该传感器
+def init_extra_sensors():
+    devices = {}
+    for spec in sensor_specs():
+        try:
+            sensor = sensor_registry.add(create_sensor(spec, SENSOR_TOPIC_PREFIX, devices))
+            log('附加传感器{}: {}, 周期{}ms, 主题{}', 'INFO', sensor.name, spec['driver'], sensor.period, sensor.topic.decode(), key=sensor.name)
+        except Exception as e:
+            log('传感器{}初始化失败，已跳过: {}', 'WARNING', spec.get('name'), e)
+    return True
+
+# 创建定时器采样器(SAMPLE_MODE为timer时)；定时器在进入主循环或采样任务时启动
+def init_sampler():
+    global sampler
+    if SAMPLE_MODE != 'timer':
+        sampler = None
+        return False
+    micropython.alloc_emergency_exception_buf(100)
+    from timer_sampler import TimerSampler
+    sampler = TimerSampler(temperature_sensor, TEMP_SAMPLE_INTERVAL, SAMPLE_OVERSAMPLE, SAMPLE_RING_SIZE, SAMPLE_TIMER_ID)
+    log('定时器采样: Timer({}), 子周期{}ms x {}', 'INFO', SAMPLE_TIMER_ID, sampler.sub_period, SAMPLE_OVERSAMPLE)
+    return True
+
+# 创建堆监控；idle模式下先回收一次，并把自动GC阈值调高到剩余堆的一半，正常情况下回收都发生在空闲窗口
+def init_heap():
+    global heap
+    gc.collect()
+    if GC_MODE == 'idle':
+        gc.threshold(gc.mem_free() // 2 + gc.mem_alloc())
+    heap = HeapMonitor(GC_COLLECT_THRESHOLD)
+    return True
+
+# 空闲窗口：主循环休眠前或asyncio的GC任务中调用，idle模式下按阈值显式回收
+def idle_gc():
+    if GC_MODE == 'idle':
+        heap.idle()
+    else:
+        heap.account()
+
+# 创建运行指标；未配置STATS_TOPIC时不创建，各记录点直接跳过
+def init_metrics():
+    global metrics
+    if not STATS_TOPIC:
+        return False
+    from metrics import Metrics, US_BUCKETS, MS_BUCKETS, DOWNTIME_BUCKETS
+    metrics = Metrics(STATS_INTERVAL)
+    for name in ('publishes', 'publish_errors', 'samples_buffered', 'samples_dropped', 'samples_invalid', 'suppressed',
+                 'mqtt_reconnects', 'wifi_disconnects', 'tls_full', 'tls_resumed'):
+        metrics.counter(name)
+    for name in ('heap_free', 'heap_free_min', 'rssi', 'buffered', 'pending'):
+        metrics.gauge(name)
+    metrics.histogram('loop_us', US_BUCKETS)  # main_loop每轮耗时(不含休眠)
+    metrics.histogram('lag_ms', MS_BUCKETS)  # asyncio模式下周期任务被推迟的时长
+    metrics.histogram('publish_us', US_BUCKETS)  # 每次publish()调用的耗时
+    metrics.histogram('puback_ms', MS_BUCKETS)  # QoS1发布到收到PUBACK的往返
+    metrics.histogram('reconnect_ms', DOWNTIME_BUCKETS)  # MQTT断开到重新连上的时长
+    metrics.histogram('tls_handshake_ms', MS_BUCKETS)  # umqtt客户端的TLS握手耗时(完整握手和会话恢复)
+    metrics.histogram('led_frame_us', US_BUCKETS)  # LED一帧的渲染加写出耗时
+    log('运行指标: 每{}ms发布到{}', 'INFO', STATS_INTERVAL, STATS_TOPIC)
+    return True
 
-        # 应用校准偏移量
-        temperature = float(temperature) + TEMP_CALIBRATION_OFFSET
+# MQTT重新连上(连接监督器回调)
+def record_reconnect(downtime):
+    if metrics is not None:
+        metrics.inc('mqtt_reconnects')
+        metrics.observe('reconnect_ms', downtime)
 
-        # 温度滤波（可选）
-        if TEMP_FILTER_ENABLED:
-            temp_samples.append(temperature)
-            # 保持样本数量不超过配置值
-            if len(temp_samples) > TEMP_FILTER_SAMPLES:
-                temp_samples.pop(0)
+# TLS握手完成(TLS上下文回调)；异步客户端的握手在事件循环中进行，ms为None，只计次数
+def record_tls_handshake(resumed, ms):
+    if metrics is not None:
+        metrics.inc('tls_resumed' if resumed else 'tls_full')
+        if ms is not None:
+            metrics.observe('tls_handshake_ms', ms)
 
-            # 计算平均值
-            if len(temp_samples) >= TEMP_FILTER_SAMPLES:
-                temperature = sum(temp_samples) / len(temp_samples)
-                log(f'温度滤波处理，样本数: {len(temp_samples)}, 平均值: {temperature:.2f}°C', 'DEBUG')
+# 异步客户端收到PUBACK：确认报文证明接收方向可用
+def record_puback(ms):
+    get_mqtt_supervisor().received()
+    if metrics is not None:
+        metrics.observe('puback_ms', ms)
 
-        return temperature
+# 同步其他模块累计的计数和当前测量值
+def collect_metrics():
+    metrics.total('wifi_disconnects', get_wifi_manager().disconnects)
+    if temperature_sensor is not None:
+        metrics.total('samples_invalid', temperature_sensor.invalid)
+    if publish_policy is not None:
+        metrics.total('suppressed', publish_policy.suppressed)
+    metrics.set('heap_free', gc.mem_free())
+    metrics.set('heap_free_min', heap.free_min)
+    metrics.set('buffered', len(sample_buffer) if sample_buffer is not None else 0)
+    metrics.set('pending', len(pending_samples) + len(pending_readings))
+    if sample_queue is not None:
+        metrics.set('pending', len(sample_queue))
+        metrics.total('samples_dropped', sample_queue.overflows)
+    rssi = None
+    try:
+        if wlan and wlan.isconnected():
+            rssi = wlan.status('rssi')
+    except:
+        pass  # 不是所有MicroPython实现都支持RSSI
+    metrics.set('rssi', rssi)
+
+# 发布运行指标快照到STATS_TOPIC(QoS0)，成功后开始新的统计周期；未连接时等下一次
+def publish_stats():
+    if metrics is None or mqtt_client is None or not get_mqtt_supervisor().isconnected():
+        return False
+    try:
+        collect_metrics()
+        snapshot = metrics.snapshot()
+        snapshot['device_id'] = DEVICE_ID
+        mqtt_publish(STATS_TOPIC, json.dumps(snapshot).encode(), qos=0)
+        metrics.reset()
+        return True
     except Exception as e:
-        log(f'读取温度错误: {e}', 'ERROR')
-        return None
+        log('发布运行指标失败: {}', 'WARNING', e)
+        mqtt_failed(e)
+        return False
+
+# 启动采样调度：注册表从当前时刻起计时，定时器采样器开始触发
+def start_sampling():
+    sensor_registry.start()
+    if sampler is not None:
+        sampler.start()
+
+# 温度采集功能：读取主传感器一次(校准并滤波)，不经过调度器
+def read_internal_temperature():
+    return temperature_sensor.read()
 
 # MQTT回调函数
 def mqtt_callback(topic, msg):
-    global led_state
     try:
-        log(f'收到MQTT消息: 主题={topic.decode()}, 内容={msg.decode()}', 'DEBUG')
-        
         # 验证主题
         if topic != CONTROL_TOPIC:
-            log(f'收到未知主题消息: {topic.decode()}', 'WARNING')
+            if LOG_REQUEST_TOPIC and topic == LOG_REQUEST_TOPIC:
+                global log_dump_requested
+                log_dump_requested = True
+                return
+            if CONFIG_SET_TOPIC and topic == CONFIG_SET_TOPIC:
+                # 只入队，校验、应用和保存在控制周期中进行
+                if len(config_requests) < 8:
+                    config_requests.append(msg)
+                return
+            log('收到未知主题消息: {}', 'WARNING', topic)
             return
-            
-        # 解析控制消息
+        # 只入队，解析和LED更新在apply_control中按周期合并进行；双线程模式下交给实时线程，附带到达时刻
+        if control_queue is not None:
+            control_queue.push((time.ticks_ms(), msg))
+        else:
+            control.push(msg)
+    except Exception as e:
+        log('MQTT回调错误: {}', 'ERROR', e)
+
+# 已收到的控制消息总数(双线程模式下为放入控制队列的条数)
+def controls_received():
+    return control_queue.pushed if control_queue is not None else control.received
+
+# 取出所有已到达的控制消息(每次最多CONTROL_DRAIN_MAX条)，没有新消息时立即返回；
+# 双线程模式下控制队列已满时暂不读取，消息留在连接中等实时线程取走后再读，不会丢弃
+def drain_control_messages():
+    start = received = controls_received()
+    for _ in range(CONTROL_DRAIN_MAX):
+        if control_queue is not None and control_queue.full():
+            break
+        mqtt_client.check_msg()
+        if controls_received() == received:
+            break
+        received = controls_received()
+    # 收到代理转发的消息说明链路可用，本周期无需ping
+    if received != start:
+        get_mqtt_supervisor().received()
+    if log_dump_requested:
+        publish_log_dump()
+    if config_requests:
+        handle_config_requests()
+
+# 把日志环形缓冲区分批发布到LOG_TOPIC，每条消息最多16行
+def publish_log_dump():
+    global log_dump_requested
+    log_dump_requested = False
+    entries = logger.dump()
+    try:
+        for start in range(0, len(entries), 16):
+            lines = [f'{t} [{level}] {message}' for t, level, message in entries[start:start + 16]]
+            mqtt_publish(LOG_TOPIC, json.dumps({'device_id': DEVICE_ID, 'lines': lines}).encode(), qos=0)
+        log('日志缓冲区已发布: {}条', 'INFO', len(entries))
+    except Exception as e:
+        log('发布日志缓冲区失败: {}', 'WARNING', e)
+        mqtt_failed(e)
+
+# 按LOG_LEVEL和LOG_INTERVAL设置日志(加载已保存的配置后和运行时修改后调用)
+def apply_log_settings():
+    level = LOG_LEVEL if LOG_LEVEL in LEVELS else 'INFO'
+    if level == 'DEBUG' and not DEBUG:
+        level = 'INFO'
+    logger.set_level(level)
+    logger.interval = LOG_INTERVAL
+
+# 启动时读取运行时修改并保存过的配置项，覆盖config.py中的同名项；
+# 与当前config.py组合后校验不通过(例如config.py已修改)时整体忽略
+def load_config_overrides():
+    global config_overrides
+    start = time.ticks_us()
+    values = config_store.load()
+    if config_store.error is not None:
+        log('已保存的运行时配置无效，使用config.py: {}', 'WARNING', config_store.error)
+    if not values:
+        return False
+    old = {name: globals()[name] for name in values}
+    globals().update(values)
+    errors = config_errors()
+    if errors:
+        globals().update(old)
+        log('已保存的运行时配置与config.py组合后无效，已忽略: {}', 'WARNING', '; '.join(errors))
+        return False
+    config_overrides = values
+    apply_log_settings()
+    log('已加载运行时配置{}项({}us): {}', 'INFO', len(values), time.ticks_diff(time.ticks_us(), start), ', '.join(values))
+    return True
+
+# 把修改过的配置项应用到正在运行的各模块，不重新连接网络，也不重建传感器注册表
+def apply_runtime_config(changed):
+    if 'TEMP_SAMPLE_INTERVAL' in changed and temperature_sensor is not None:
+        if sampler is not None:
+            sampler.set_period(TEMP_SAMPLE_INTERVAL)
+        temperature_sensor.set_period(TEMP_SAMPLE_INTERVAL)
+    if any(name.startswith('TEMP_FILTER_') for name in changed):
+        # 滤波链按新参数重新创建，滤波状态从头开始
+        init_temp_filter()
+        if temperature_sensor is not None:
+            temperature_sensor.filter = temp_filter
+    if 'TEMP_CALIBRATION_OFFSET' in changed and temperature_sensor is not None:
+        temperature_sensor.offset = TEMP_CALIBRATION_OFFSET
+    if 'LOG_LEVEL' in changed or 'LOG_INTERVAL' in changed:
+        apply_log_settings()
+    if 'REPORT_BY_EXCEPTION' in changed:
+        init_publish_policy()
+    elif publish_policy is not None:
+        # 保留上次发布值和统计，只更新死区和心跳
+        publish_policy.absolute = DEADBAND_ABS
+        publish_policy.relative = DEADBAND_REL
+        publish_policy.heartbeat = HEARTBEAT_INTERVAL
+    if metrics is not None:
+        metrics.interval = STATS_INTERVAL
+    # MQTT_QOS由mqtt_publish在每次发布时读取；控制主题的订阅QoS在下次连接时生效
+
+# 应用一条配置修改消息(JSON对象，只含要修改的项)：类型由config_store检查，取值按config_errors()的规则校验，
+# 全部通过才生效(任一项无效则整条拒绝)，随后立即应用并原子地保存；返回错误列表，空列表表示成功
+def update_config(msg):
+    global config_overrides
+    try:
+        updates = json.loads(msg)
+        if not isinstance(updates, dict):
+            raise ValueError('配置消息必须是JSON对象')
+        values = {name: coerce(name, value) for name, value in updates.items()}
+    except (ValueError, TypeError) as e:
+        return [str(e)]
+    changed = {name: value for name, value in values.items() if globals()[name] != value}
+    if not changed:
+        return []
+    old = {name: globals()[name] for name in changed}
+    globals().update(changed)
+    errors = config_errors()
+    if errors:
+        globals().update(old)
+        return errors
+    with_sampling_lock(apply_runtime_config, changed)
+    # 只保存与config.py不同的项
+    overrides = dict(config_overrides)
+    for name, value in changed.items():
+        if value == getattr(config, name, None):
+            overrides.pop(name, None)
+        else:
+            overrides[name] = value
+    if config_store.save(overrides):
+        config_overrides = overrides
+    else:
+        log('保存运行时配置失败，重启后不保留: {}', 'WARNING', config_store.error)
+    log('运行时配置已更新: {}', 'INFO', ', '.join(f'{name}={value}' for name, value in changed.items()))
+    return []
+
+# 处理收到的配置消息，把结果和当前生效的运行时配置发布到CONFIG_TOPIC；空对象{}只查询不修改
+def handle_config_requests():
+    while config_requests:
+        errors = update_config(config_requests.pop(0))
+        for error in errors:
+            log('运行时配置被拒绝: {}', 'WARNING', error, key=error)
+        report = {
+            'device_id': DEVICE_ID,
+            'ok': not errors,
+            'errors': errors,
+            'config': {name: globals()[name] for name in CONFIG_NAMES},
+            'saved': list(config_overrides),
+        }
         try:
-            control_data = json.loads(msg.decode())
-            log(f'解析控制消息成功: {control_data}', 'DEBUG')
-            
-            # 验证消息格式
-            if not isinstance(control_data, dict):
-                log('控制消息格式错误: 不是字典类型', 'WARNING')
-                return
-                
-            # 验证颜色值范围
-            valid_keys = ['r', 'g', 'b', 'brightness']
-            for key in control_data:
-                if key not in valid_keys:
-                    log(f'控制消息包含未知键: {key}', 'WARNING')
-                    continue
-                    
-            # 更新LED状态
-            updated = False
-            if 'r' in control_data:
-                new_r = max(0, min(255, int(control_data['r'])))
-                if new_r != led_state['r']:
-                    led_state['r'] = new_r
-                    updated = True
-                    
-            if 'g' in control_data:
-                new_g = max(0, min(255, int(control_data['g'])))
-                if new_g != led_state['g']:
-                    led_state['g'] = new_g
-                    updated = True
-                    
-            if 'b' in control_data:
-                new_b = max(0, min(255, int(control_data['b'])))
-                if new_b != led_state['b']:
-                    led_state['b'] = new_b
-                    updated = True
-                    
-            if 'brightness' in control_data:
-                new_brightness = max(0, min(1.0, float(control_data['brightness'])))
-                if new_brightness != led_state['brightness']:
-                    led_state['brightness'] = new_brightness
-                    updated = True
-            
-            # 更新LED
-            if updated:
-                update_led()
-                log(f'LED状态更新: R={led_state["r"]}, G={led_state["g"]}, B={led_state["b"]}, 亮度={led_state["brightness"]}')
-            else:
-                log('LED状态无变化', 'DEBUG')
-                
-        except json.JSONDecodeError:
-            log('无效的JSON控制消息', 'ERROR')
-        except (ValueError, TypeError) as e:
-            log(f'控制消息值类型错误: {e}', 'ERROR')
+            mqtt_publish(CONFIG_TOPIC, json.dumps(report).encode(), qos=0)
         except Exception as e:
-            log(f'处理控制消息错误: {e}', 'ERROR')
+            log('发布配置状态失败: {}', 'WARNING', e)
+            mqtt_failed(e)
+            return
+
+# 合并本周期的控制消息，只应用最新状态；状态变化引起的LED写出受LED_MAX_FPS限制，推迟的帧在之后的周期写出，
+# 过渡和动态效果按LED_ANIMATION_FPS逐帧渲染
+def apply_control(now=None):
+    if now is None:
+        now = time.ticks_ms()
+    try:
+        if control.pending() and control.merge_into(led_state):
+            if led_animator is not None:
+                led_animator.set(led_state, now)
+            if logger.enabled('DEBUG'):
+                log('LED状态更新: R={}, G={}, B={}, 亮度={}, 效果={}', 'DEBUG', led_state["r"], led_state["g"],
+                    led_state["b"], led_state["brightness"], led_state["effect"])
+        changed = control.frame_due(now)
+        if (changed or (led_animator is not None and led_animator.frame_due(now))) and update_led(now) and control.dirty:
+            control.frame_written(time.ticks_ms())
     except Exception as e:
-        log(f'MQTT回调错误: {e}', 'ERROR')
+        log('处理控制消息错误: {}', 'ERROR', e)
 
-# MQTT连接功能
-def connect_mqtt():
+# 休眠ms毫秒；有过渡或动态效果时在休眠期间按帧率渲染动画帧，不推迟主循环的下一轮
+def led_sleep(ms):
+    deadline = time.ticks_add(time.ticks_ms(), ms)
+    while led_animator is not None and led_animator.active():
+        now = time.ticks_ms()
+        remaining = time.ticks_diff(deadline, now)
+        if remaining <= 0:
+            return
+        if led_animator.frame_due(now):
+            update_led(now)
+            continue
+        time.sleep_ms(min(remaining, led_animator.frame_interval))
+    remaining = time.ticks_diff(deadline, time.ticks_ms())
+    if remaining > 0:
+        time.sleep_ms(remaining)
+
+# MQTT连接功能(server为已解析的代理IP时跳过DNS查询；缺省时使用快速启动缓存的代理IP，没有缓存时用MQTT_BROKER)
+# 常开模式下由连接监督器调用，低功耗模式下每个发布窗口直接调用
+def connect_mqtt(server=None):
     global mqtt_client, USE_UMQTT
+    cached = not server and mqtt_server is not None
     try:
         # 验证配置参数
         if not MQTT_CLIENT_ID or not MQTT_BROKER:
             log('MQTT配置参数缺失', 'ERROR')
             return False
+        server = server or mqtt_server or MQTT_BROKER
             
-        log(f'尝试连接MQTT代理: {MQTT_BROKER}:{MQTT_PORT}', 'INFO')
+        log('尝试连接MQTT代理: {}:{}', 'INFO', server, MQTT_PORT)
         
-        # 创建MQTT客户端（仅使用umqtt.simple）
+        # 创建MQTT客户端（仅使用umqtt.simple；启用TLS时传入复用的TLS上下文，connect()中完成握手）
+        tls = get_tls_context()
         mqtt_client = MQTTClient(
             MQTT_CLIENT_ID,
-            MQTT_BROKER,
+            server,
             MQTT_PORT,
             MQTT_USER,
             MQTT_PASSWORD,
-            keepalive=getattr(config, 'MQTT_KEEPALIVE', 60)
+            keepalive=MQTT_KEEPALIVE,
+            ssl=tls
         )
         mqtt_client.set_callback(mqtt_callback)
         
@@ -281,246 +920,588 @@ def connect_mqtt():
         
         # 订阅控制主题
         mqtt_client.subscribe(CONTROL_TOPIC, MQTT_QOS)
+        if LOG_REQUEST_TOPIC:
+            mqtt_client.subscribe(LOG_REQUEST_TOPIC, 0)
+        if CONFIG_SET_TOPIC:
+            mqtt_client.subscribe(CONFIG_SET_TOPIC, 1)
+        if tls is not None:
+            tls.save_session()
         
-        log(f'MQTT连接成功: {MQTT_BROKER}:{MQTT_PORT}, 客户端ID: {MQTT_CLIENT_ID}')
+        log('MQTT连接成功: {}:{}, 客户端ID: {}', 'INFO', server, MQTT_PORT, MQTT_CLIENT_ID)
+        if boot_timer is not None:
+            boot_timer.mark('mqtt')
         return True
     except OSError as e:
-        log(f'MQTT网络错误: {e}', 'ERROR')
-        return False
+        log('MQTT网络错误: {}', 'ERROR', e)
     except Exception as e:
-        log(f'MQTT连接错误: {e}', 'ERROR')
-        return False
+        log('MQTT连接错误: {}', 'ERROR', e)
+    if tls_context is not None:
+        tls_context.connect_failed()
+    if cached:
+        drop_cached_broker()
+    return False
 
-# 检查MQTT连接状态（仅使用umqtt.simple）
-def check_mqtt_connection():
+# 获取TLS上下文(MQTT_TLS未启用时为None)：只在第一次连接前创建，证书只读取解析一次，重连时带上次的会话恢复握手
+# 证书验证和SNI使用MQTT_TLS_SERVER_HOSTNAME(缺省为MQTT_BROKER)，连接快速启动缓存的代理IP时也按主机名验证
+def get_tls_context():
+    global tls_context
+    if not MQTT_TLS:
+        return None
+    if tls_context is None:
+        from tls import TLSContext
+        tls_context = TLSContext(
+            MQTT_TLS_SERVER_HOSTNAME or MQTT_BROKER,
+            MQTT_TLS_CA_FILE,
+            MQTT_TLS_CERT_FILE,
+            MQTT_TLS_KEY_FILE,
+            resume=MQTT_TLS_RESUME,
+            on_handshake=record_tls_handshake
+        )
+        if not MQTT_TLS_CA_FILE:
+            log('未配置MQTT_TLS_CA_FILE，不验证MQTT代理的证书', 'WARNING')
+    return tls_context
+
+# 获取MQTT连接监督器(异步客户端由mqtt_task连接，监督器只负责保活和退避)
+def get_mqtt_supervisor():
+    global mqtt_supervisor
+    if not mqtt_supervisor:
+        mqtt_supervisor = ConnectionSupervisor(
+            None if ASYNC_MQTT else connect_mqtt,
+            reset_mqtt_client,
+            ping_mqtt,
+            ping_interval=int(MQTT_PING_INTERVAL * 1000),
+            backoff_min=MQTT_BACKOFF_MIN,
+            backoff_max=MQTT_BACKOFF_MAX,
+            max_errors=MAX_ERROR_COUNT,
+            log=log,
+            on_reconnect=record_reconnect
+        )
+    return mqtt_supervisor
+
+# 发送PINGREQ(由连接监督器在链路空闲时调用)
+def ping_mqtt():
+    if not mqtt_client:
+        raise OSError(128)  # ENOTCONN
+    mqtt_client.ping()
+
+# 丢弃当前MQTT连接，之后由连接监督器重新连接
+# 异步客户端只断开连接、保留客户端对象，未确认的QoS1消息在mqtt_task重连后重发
+def reset_mqtt_client():
     global mqtt_client
-    try:
-        if not mqtt_client:
-            log('MQTT客户端未初始化，尝试连接...')
-            return connect_mqtt()
-        
-        # 使用ping进行连接活性检查
-        ping_interval = getattr(config, 'MQTT_PING_INTERVAL', 30)
-        current_time = time.ticks_ms()
-        last_ping = getattr(mqtt_client, '_last_ping', 0)
-        
-        if time.ticks_diff(current_time, last_ping) > ping_interval * 1000:
-            try:
-                mqtt_client.ping()
-                mqtt_client._last_ping = current_time
-            except Exception as e:
-                log(f'MQTT ping失败: {e}', 'WARNING')
-                return connect_mqtt()
-        
-        return True
-    except Exception as e:
-        log(f'检查MQTT连接状态失败: {e}', 'ERROR')
+    if mqtt_client:
+        try:
+            mqtt_client.disconnect()
+        except:
+            pass
+    if not ASYNC_MQTT:
+        mqtt_client = None
+
+# 检查MQTT连接状态：未连接时由监督器决定是否重连(退避期间直接返回False)，已连接时按需发送ping
+# WiFi未连接时不尝试，避免失败次数累积导致WiFi恢复后还要等待退避
+def check_mqtt_connection():
+    supervisor = get_mqtt_supervisor()
+    if not supervisor.isconnected() and not get_wifi_manager().isconnected():
         return False
+    return supervisor.ensure() and supervisor.keepalive()
+
+# 报告MQTT收发失败：网络错误说明连接已断，其他错误(包括异步客户端窗口已满)累计多次后才重连
+# TLS连接的非阻塞读写暂时无数据时mbedTLS返回WANT_READ/WANT_WRITE，与EAGAIN一样不算断线，避免重新握手
+def mqtt_failed(e):
+    err = e.args[0] if isinstance(e, OSError) and e.args else None
+    if isinstance(e, OSError) and err not in (-1, 11, 105, -26880, -26752):  # EAGAIN, ENOBUFS, WANT_READ/WRITE
+        get_mqtt_supervisor().lost(e)
+    else:
+        get_mqtt_supervisor().error(e)
 
-# 发布温度数据
-def publish_temperature(temperature):
+# 发布一条消息并记录发布耗时；umqtt客户端的QoS1发布阻塞到收到PUBACK，耗时同时计为确认往返，并证明链路可收；
+# 异步客户端的发布写入窗口即返回，收到PUBACK时才由record_puback报告
+# qos缺省时使用当前的MQTT_QOS(可在运行时修改)
+def mqtt_publish(topic, msg, qos=None):
+    if qos is None:
+        qos = MQTT_QOS
+    start = time.ticks_us()
+    try:
+        mqtt_client.publish(topic, msg, retain=False, qos=qos)
+    except Exception:
+        if metrics is not None:
+            metrics.inc('publish_errors')
+        raise
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    get_mqtt_supervisor().sent(qos > 0 and not ASYNC_MQTT)
+    if boot_timer is not None:
+        boot_timer.mark('publish')
+    if metrics is not None:
+        metrics.inc('publishes')
+        metrics.observe('publish_us', elapsed)
+        if qos and not ASYNC_MQTT:
+            metrics.observe('puback_ms', elapsed // 1000)
+
+# 发布温度数据(timestamp为采集时刻，缺省时使用发布时刻)
+def publish_temperature(temperature, timestamp=None):
     global mqtt_client, USE_UMQTT
     try:
         if not check_mqtt_connection():
             return False
 
         # 验证温度值
-        if temperature is None or not isinstance(temperature, (int, float)):
+        if temperature is None or not isinstance(temperature, _NUMBER_TYPES):
             log('无效的温度值', 'ERROR')
             return False
 
-        # 创建消息
-        device_id = MQTT_CLIENT_ID.decode('utf-8') if isinstance(MQTT_CLIENT_ID, bytes) else MQTT_CLIENT_ID
-
-        # 添加额外字段
-        message_data = {
-            'temperature': round(temperature, 2),  # 保留两位小数
-            'timestamp': time.ticks_ms(),
-            'device_id': device_id,
-            'unit': '°C'
-        }
-
-        # 添加电池状态（如果可用）
-        if hasattr(config, 'INCLUDE_BATTERY_STATUS') and config.INCLUDE_BATTERY_STATUS:
-            try:
-                battery_level = machine.ADC(machine.Pin(machine.ADC.VOLTAGE)).read()
-                message_data['battery'] = round(battery_level / 4096 * 3.3, 2)  # 假设3.3V参考电压
-            except Exception as e:
-                log(f'读取电池状态失败: {e}', 'WARNING')
+        if timestamp is None:
+            timestamp = time.ticks_ms()
 
-        message = json.dumps(message_data)
-        msg_payload = message if isinstance(message, bytes) else message.encode()
+        # 创建消息
+        if PAYLOAD_FORMAT != 'json':
+            # 二进制帧(压缩格式下单条样本同样使用): 复用预分配缓冲区，设备ID由主题携带
+            topic = BINARY_TOPIC
+            msg_payload = payload_mv[:encode_binary_sample_into(payload_buf, timestamp, temperature)]
+        else:
+            topic = TEMP_TOPIC
+            # 按变化上报时附带被抑制的样本累计数，便于在服务端统计每台设备的节省量
+            suppressed = publish_policy.suppressed if publish_policy is not None else None
+            # 附带电池传感器最近一次读数(由传感器调度器按BATTERY_SAMPLE_INTERVAL采样，这里不读ADC)
+            battery = sensor_registry.get('battery') if INCLUDE_BATTERY_STATUS else None
+            # 温度保留两位小数，消息直接写入预分配缓冲区
+            msg_payload = payload_mv[:encode_json_sample_into(payload_buf, DEVICE_ID_JSON, timestamp, temperature,
+                                                              suppressed, battery.last if battery is not None else None)]
 
         # 发布消息（仅使用umqtt.simple）
         try:
-            mqtt_client.publish(TEMP_TOPIC, msg_payload, retain=False, qos=MQTT_QOS)
-            log(f'温度数据已发布: {temperature:.2f}°C', 'DEBUG')
+            mqtt_publish(topic, msg_payload)
+            if logger.enabled('DEBUG'):
+                log('温度数据已发布: {:.2f}°C', 'DEBUG', temperature)
             return True
-        except OSError as e:
-            # 处理网络连接错误，尝试重连后重试一次
-            err = e.args[0] if hasattr(e, 'args') and e.args else None
-            if err in (104, 128):  # ECONNRESET, ENOTCONN
-                log(f'发布失败({err})，尝试重连MQTT后重试', 'WARNING')
-                try:
-                    if mqtt_client:
-                        try:
-                            mqtt_client.disconnect()
-                        except:
-                            pass
-                    mqtt_client = None
-                    if connect_mqtt():
-                        try:
-                            mqtt_client.publish(TEMP_TOPIC, msg_payload, retain=False, qos=MQTT_QOS)
-                            log(f'温度数据已发布(重试成功): {temperature:.2f}°C', 'DEBUG')
-                            return True
-                        except Exception as e2:
-                            log(f'重连后发布仍失败: {e2}', 'ERROR')
-                            return False
-                    else:
-                        log('MQTT重连失败，无法发布温度数据', 'ERROR')
-                        return False
-                except Exception as e3:
-                    log(f'处理重连过程异常: {e3}', 'ERROR')
-                    return False
-            else:
-                log(f'发布温度数据失败: {e}', 'ERROR')
-                return False
         except Exception as e:
-            log(f'发布温度数据失败: {e}', 'ERROR')
+            # 不在这里重连：连接断开由监督器处理，样本由调用方转存等待补发
+            log('发布温度数据失败: {}', 'ERROR', e)
+            mqtt_failed(e)
             return False
     except Exception as e:
-        log(f'发布温度数据失败: {e}', 'ERROR')
+        log('发布温度数据异常: {}', 'ERROR', e)
         return False
 
-# WS2812B LED控制功能
-def init_led():
-    global led
+# 初始化断网样本缓冲区
+def init_sample_buffer():
+    global sample_buffer
+    if not STORE_FORWARD_ENABLED:
+        return False
+    try:
+        sample_buffer = SampleBuffer(
+            STORE_FORWARD_FILE,
+            capacity=STORE_FORWARD_CAPACITY,
+            drop_policy=STORE_FORWARD_DROP,
+            batch_size=REPLAY_BATCH_SIZE
+        )
+        log('样本缓冲区就绪: {}, 容量: {}, 待补发: {}', 'INFO', STORE_FORWARD_FILE, STORE_FORWARD_CAPACITY, len(sample_buffer))
+        return True
+    except Exception as e:
+        log('样本缓冲区初始化失败，断网样本将被丢弃: {}', 'WARNING', e)
+        sample_buffer = None
+        return False
+
+# 缓存一条未能发布的样本
+def store_sample(timestamp, temperature):
+    if sample_buffer is None:
+        return False
+    try:
+        if not sample_buffer.push(timestamp, temperature):
+            log('样本缓冲区已满，丢弃最新样本', 'WARNING')
+            if metrics is not None:
+                metrics.inc('samples_dropped')
+            return False
+        if metrics is not None:
+            metrics.inc('samples_buffered')
+        return True
+    except Exception as e:
+        log('写入样本缓冲区失败: {}', 'ERROR', e)
+        return False
+
+# 按配置的载荷格式编码一批样本，返回(主题, 载荷)；extra为JSON格式附加字段
+def encode_samples(timestamps, values, extra=None):
+    if PAYLOAD_FORMAT == 'compressed':
+        return BINARY_TOPIC, payload_mv[:encode_block_into(payload_buf, timestamps, values, COMPRESS_MODE)]
+    if PAYLOAD_FORMAT == 'binary':
+        return BINARY_TOPIC, payload_mv[:encode_binary_into(payload_buf, timestamps, values)]
+    return TEMP_TOPIC, encode_json_batch(DEVICE_ID, timestamps, values, extra=extra)
+
+# 补发缓存的样本：每批REPLAY_BATCH_SIZE条合并为一条消息，每次调用最多发送max_batches批
+def replay_buffered_samples(max_batches=1):
+    if sample_buffer is None or not len(sample_buffer) or not get_mqtt_supervisor().isconnected():
+        return 0
+    sent = 0
+    try:
+        for _ in range(max_batches):
+            timestamps, values = sample_buffer.peek(REPLAY_BATCH_SIZE)
+            if not timestamps:
+                break
+            topic, msg_payload = encode_samples(timestamps, values)
+            mqtt_publish(topic, msg_payload)
+            sample_buffer.pop(len(timestamps))
+            sent += len(timestamps)
+        log('已补发缓存样本{}条，剩余: {}', 'INFO', sent, len(sample_buffer))
+    except Exception as e:
+        log('补发缓存样本失败: {}', 'WARNING', e)
+        mqtt_failed(e)
+    return sent
+
+# 发出当前批次：成功则清空，失败时把批内样本转存到缓冲区等待补发
+def flush_batch():
+    if batcher is None or not len(batcher):
+        return True
+    ok = False
+    try:
+        if check_mqtt_connection():
+            topic, msg_payload = encode_samples(batcher.timestamps, batcher.values)
+            mqtt_publish(topic, msg_payload)
+            log('批量温度数据已发布: {}条', 'DEBUG', len(batcher))
+            ok = True
+    except Exception as e:
+        log('发布批量温度数据失败: {}', 'ERROR', e)
+        mqtt_failed(e)
+    if not ok:
+        for i in range(len(batcher)):
+            store_sample(batcher.timestamps[i], batcher.values[i])
+    batcher.clear()
+    return ok
+
+# 初始化按变化上报策略
+def init_publish_policy():
+    global publish_policy
+    publish_policy = DeadbandPolicy(DEADBAND_ABS, DEADBAND_REL, HEARTBEAT_INTERVAL) if REPORT_BY_EXCEPTION else None
+    return True
+
+# 提交一条样本：先经按变化上报策略过滤，批量模式下加入批次并在到期时发出，否则直接发布
+def submit_sample(timestamp, temperature):
+    if temperature is None or not isinstance(temperature, _NUMBER_TYPES):
+        log('提交的温度样本无效', 'ERROR')
+        return False
+    if publish_policy is not None and not publish_policy.should_publish(temperature, timestamp):
+        if logger.enabled('DEBUG'):
+            log('温度变化未超过死区，跳过发布: {:.2f}°C', 'DEBUG', temperature)
+        return True
+    if batcher is None:
+        ok = publish_temperature(temperature, timestamp)
+    else:
+        batcher.add(timestamp, temperature)
+        ok = flush_batch() if batcher.due() else True
+    if ok and publish_policy is not None:
+        publish_policy.record(temperature, timestamp)
+    return ok
+
+# 确保预分配编码缓冲区至少size字节(只在首次发布某个传感器时可能扩大)
+def reserve_payload(size):
+    global payload_buf, payload_mv
+    if size > len(payload_buf):
+        payload_buf = bytearray(size)
+        payload_mv = memoryview(payload_buf)
+
+# 按配置的载荷格式编码一条附加传感器读数，返回(主题, 载荷)
+def encode_reading(sensor, timestamp, value):
+    if sensor.encoded is None:
+        # 二进制主题和JSON字段只在首次发布时编码一次
+        sensor.encoded = (sensor.topic + b'/bin/' + DEVICE_ID.encode(), json_string(sensor.name), json_string(sensor.unit))
+        reserve_payload(JSON_SAMPLE_SIZE + len(DEVICE_ID_JSON) + len(sensor.encoded[1]) + len(sensor.encoded[2]))
+    binary_topic, name, unit = sensor.encoded
+    if PAYLOAD_FORMAT != 'json':
+        return binary_topic, payload_mv[:encode_binary_sample_into(payload_buf, timestamp, value)]
+    return sensor.topic, payload_mv[:encode_json_reading_into(payload_buf, DEVICE_ID_JSON, name, timestamp, value, unit)]
+
+# 发布一条附加传感器读数到该传感器的主题
+def publish_reading(sensor, timestamp, value):
+    try:
+        if not check_mqtt_connection():
+            return False
+        topic, msg_payload = encode_reading(sensor, timestamp, value)
+        mqtt_publish(topic, msg_payload)
+        if logger.enabled('DEBUG'):
+            log('传感器{}已发布: {:.3f}{}', 'DEBUG', sensor.name, value, sensor.unit, key=sensor.name)
+        return True
+    except Exception as e:
+        log('发布传感器{}读数失败: {}', 'ERROR', sensor.name, e)
+        mqtt_failed(e)
+        return False
+
+# 记录一次读取失败；主传感器连续失败MAX_ERROR_COUNT次时报告
+def sensor_read_failed(sensor):
+    if sensor.last_error is INVALID_READING:
+        log('传感器{}读数无效，已丢弃: {} (累计{}条)', 'WARNING', sensor.name, sensor.last_invalid, sensor.invalid, key=sensor.name)
+        if sensor is not temperature_sensor:
+            return
+    elif sensor is not temperature_sensor:
+        log('读取传感器{}失败: {}', 'WARNING', sensor.name, sensor.last_error, key=sensor.name)
+        return
+    error_counts['temp'] += 1
+    log('读取温度失败 ({}/{})', 'ERROR', error_counts["temp"], MAX_ERROR_COUNT)
+    if error_counts['temp'] >= MAX_ERROR_COUNT:
+        log('温度读取错误次数过多，跳过本次采样', 'ERROR')
+        error_counts['temp'] = 0
+
+# 主循环的读数处理：温度样本走发布、批量和断网缓存路径，附加传感器直接发布到各自主题
+def handle_reading(sensor, timestamp, value):
+    if value is None:
+        sensor_read_failed(sensor)
+    elif sensor is not temperature_sensor:
+        publish_reading(sensor, timestamp, value)
+    elif not submit_sample(timestamp, value):
+        if batcher is None:
+            store_sample(timestamp, value)
+        error_counts['temp'] += 1
+        log('发布温度数据失败 ({}/{})', 'ERROR', error_counts["temp"], MAX_ERROR_COUNT)
+        if error_counts['temp'] >= MAX_ERROR_COUNT:
+            log('温度数据发布连续失败，MQTT连接状态: {}', 'ERROR', get_mqtt_supervisor().state_name())
+            error_counts['temp'] = 0
+    elif error_counts['temp'] > 0:
+        log('温度数据发布已恢复，重置错误计数器(之前: {})', 'INFO', error_counts["temp"])
+        error_counts['temp'] = 0
+
+# 离线读数处理：温度样本写入缓冲区等待补发；附加传感器只更新最近读数，不缓存
+def store_reading(sensor, timestamp, value):
+    if sensor is not temperature_sensor or value is None:
+        return
+    if publish_policy is None or publish_policy.should_publish(value, timestamp):
+        if store_sample(timestamp, value) and publish_policy is not None:
+            publish_policy.record(value, timestamp)
+
+# 离线采样：网络不可用时照常按各传感器的周期采样，定时器采到的样本同样转入缓冲区
+# (双线程模式下采样由实时线程进行，这里只把它采到的读数转入缓冲区)
+def sample_offline(current_time):
+    if sample_queue is not None:
+        drain_sample_queue(store_reading)
+        return
+    if sampler is not None:
+        sampler.drain(store_reading)
+    sensor_registry.poll(current_time, store_reading)
+
+# WS2812B LED控制功能(clear为False时不改写LED当前颜色，用于睡眠唤醒后)
+def init_led(clear=True):
+    global led, led_animator
     try:
         # 验证配置参数
         if LED_PIN is None or NUM_LEDS is None:
             log('LED配置参数缺失', 'ERROR')
             return False
             
-        log(f'初始化LED: PIN={LED_PIN}, 数量={NUM_LEDS}', 'INFO')
+        log('初始化LED: PIN={}, 数量={}', 'INFO', LED_PIN, NUM_LEDS)
         led = neopixel.NeoPixel(Pin(LED_PIN), NUM_LEDS)
+        led_animator = LedAnimator(led, NUM_LEDS, LED_ANIMATION_FPS, LED_GAMMA)
+        led_animator.set(led_state)
         
         # 初始设置为关闭所有LED
-        for i in range(NUM_LEDS):
-            led[i] = (0, 0, 0)
-        led.write()
-        log(f'LED初始化成功，引脚: {LED_PIN}, 数量: {NUM_LEDS}')
+        if clear:
+            led_animator.off()
+        log('LED初始化成功，引脚: {}, 数量: {}', 'INFO', LED_PIN, NUM_LEDS)
         return True
     except ValueError as e:
-        log(f'LED参数值错误: {e}', 'ERROR')
+        log('LED参数值错误: {}', 'ERROR', e)
         return False
     except OSError as e:
-        log(f'LED硬件访问错误: {e}', 'ERROR')
+        log('LED硬件访问错误: {}', 'ERROR', e)
         return False
     except Exception as e:
-        log(f'LED初始化失败: {e}', 'ERROR')
+        log('LED初始化失败: {}', 'ERROR', e)
         return False
 
-# 更新LED状态
-def update_led():
-    global led, led_state
+# 渲染并写出当前时刻的一帧LED(颜色查找表、过渡和动画效果由LedAnimator处理)
+def update_led(now=None):
     try:
         if not led:
             log('LED未初始化', 'WARNING')
             return False
-            
-        # 验证LED状态
-        if not all(key in led_state for key in ['r', 'g', 'b', 'brightness']):
-            log('LED状态数据不完整', 'ERROR')
-            return False
-            
-        # 应用亮度调节
-        r = int(led_state['r'] * led_state['brightness'])
-        g = int(led_state['g'] * led_state['brightness'])
-        b = int(led_state['b'] * led_state['brightness'])
-        
-        # 确保颜色值在有效范围内
-        r = max(0, min(255, r))
-        g = max(0, min(255, g))
-        b = max(0, min(255, b))
-        
-        log(f'设置LED颜色: R={r}, G={g}, B={b}, 亮度={led_state["brightness"]}', 'DEBUG')
-        
-        # 设置所有LED颜色
-        for i in range(NUM_LEDS):
-            led[i] = (r, g, b)
-        led.write()
+        frame_us = led_animator.render(now)
+        if metrics is not None:
+            metrics.observe('led_frame_us', frame_us)
+        return True
+    except Exception as e:
+        log('更新LED失败: {}', 'ERROR', e)
+        return False
+
+# 输出系统信息(快速启动时推迟到第一次发布之后)
+def log_system_info():
+    log('系统信息:')
+    try:
+        import sys
+        log('  - MicroPython版本: {} {}', 'INFO', sys.implementation[0], sys.implementation[1])
+    except Exception as e:
+        log('  - 获取MicroPython版本失败: {}', 'WARNING', e)
+    
+    log('  - 设备ID: {}', 'INFO', DEVICE_ID)
+    log('  - WiFi SSID: {}', 'INFO', WIFI_SSID)
+    log('  - MQTT代理: {}:{}{}', 'INFO', MQTT_BROKER, MQTT_PORT, ' (TLS)' if MQTT_TLS else '')
+    log('  - 温度采样间隔: {}ms', 'INFO', TEMP_SAMPLE_INTERVAL)
+    log('  - LED引脚: {}, 数量: {}', 'INFO', LED_PIN, NUM_LEDS)
+    log('  - 温度滤波: {}', 'INFO', '启用' if TEMP_FILTER_ENABLED else '禁用')
+    if TEMP_FILTER_ENABLED:
+        log('  - 滤波链: {}, 滑动平均样本数: {}', 'INFO', TEMP_FILTER_CHAIN, TEMP_FILTER_SAMPLES)
+    log('  - 温度校准偏移: {}°C', 'INFO', TEMP_CALIBRATION_OFFSET)
+    log('  - 日志级别: {}', 'INFO', LOG_LEVEL)
+
+# 读取网络参数缓存：有效时下一次WiFi连接直接使用缓存的BSSID、信道和IP配置，MQTT先连接缓存的代理IP
+def load_net_cache():
+    global net_cache_key, net_cached, mqtt_server
+    net_cache_key = fingerprint(WIFI_SSID, MQTT_BROKER)
+    net_cached = net_cache.load(net_cache_key)
+    if net_cached is None or net_cached[2][0] == '0.0.0.0':
+        if net_cache.error:
+            log('网络参数缓存无效，使用常规连接: {}', 'WARNING', net_cache.error)
+        net_cached = None
+        return False
+    bssid, channel, ifconfig, broker_ip = net_cached
+    get_wifi_manager().set_fast_params(bssid, channel, ifconfig)
+    mqtt_server = broker_ip
+    log('使用缓存的网络参数: 信道{}, IP {}, 代理{}', 'INFO', channel, ifconfig[0], broker_ip)
+    return True
+
+# 缓存的代理IP连接失败：之后改用MQTT_BROKER(经DNS)，并删除缓存，下次启动走常规连接
+def drop_cached_broker():
+    global mqtt_server, net_cached
+    log('缓存的代理IP {} 连接失败，改用{}', 'WARNING', mqtt_server, MQTT_BROKER)
+    mqtt_server = None
+    net_cached = None
+    net_cache.clear()
+
+# 刷新网络参数缓存：本次不是用缓存参数连上的(常规连接或缓存失效)时，扫描一次记录BSSID和信道并解析代理IP
+# 在第一次发布之后调用，扫描和DNS不计入启动时间
+def refresh_net_cache():
+    manager = get_wifi_manager()
+    if net_cached is not None and manager.last_connect_fast:
+        return False
+    if not manager.isconnected():
+        return False
+    bssid, channel, ifconfig = manager.fast_params()
+    broker_ip = resolve_broker()
+    if not net_cache.save(net_cache_key, (bssid, channel, ifconfig, broker_ip)):
+        log('保存网络参数缓存失败: {}', 'WARNING', net_cache.error)
+        return False
+    log('网络参数已缓存: 信道{}, IP {}, 代理{}', 'INFO', channel, ifconfig[0], broker_ip)
+    return True
+
+# 第一次发布之后：快速启动时补做推迟的初始化和缓存刷新，然后输出并发布启动计时记录
+def finish_boot():
+    global boot_timer
+    timer = boot_timer
+    boot_timer = None
+    if FAST_BOOT:
+        log_system_info()
+        with_sampling_lock(init_extra_sensors)
+        init_metrics()
+        refresh_net_cache()
+    record = timer.record()
+    record['device_id'] = DEVICE_ID
+    record['fast_boot'] = FAST_BOOT
+    record['wifi_fast'] = get_wifi_manager().last_connect_fast
+    record['broker_cached'] = mqtt_server is not None
+    log('启动到第一次发布: {}ms ({})', 'INFO', record['total'], timer.summary())
+    if not BOOT_TOPIC or mqtt_client is None:
+        return False
+    try:
+        mqtt_publish(BOOT_TOPIC, json.dumps(record).encode(), qos=0)
         return True
     except Exception as e:
-        log(f'更新LED失败: {e}', 'ERROR')
+        log('发布启动计时记录失败: {}', 'WARNING', e)
+        mqtt_failed(e)
         return False
 
 # 程序初始化
+# FAST_BOOT为True时跳过系统信息输出，附加传感器和运行指标推迟到第一次发布之后(finish_boot)，
+# WiFi和MQTT使用缓存的网络参数；配置校验不跳过(耗时见启动计时的config阶段)
 def init():
-    log('初始化ESP32-S3 IoT传感器程序')
+    boot_timer.skip()
+    log('初始化ESP32-S3 IoT传感器程序{}', 'INFO', '(快速启动)' if FAST_BOOT else '')
+    
+    # 加载运行时修改过的配置
+    load_config_overrides()
     
     # 验证配置
     if not validate_config():
         log('配置验证失败，程序退出', 'ERROR')
         return False
+    boot_timer.mark('config')
     
     # 显示系统信息
-    log(f'系统信息:')
-    try:
-        import sys
-        log(f'  - MicroPython版本: {sys.implementation[0]} {sys.implementation[1]}')
-    except Exception as e:
-        log(f'  - 获取MicroPython版本失败: {e}', 'WARNING')
-    
-    log(f'  - 设备ID: {MQTT_CLIENT_ID.decode("utf-8") if isinstance(MQTT_CLIENT_ID, bytes) else MQTT_CLIENT_ID}')
-    log(f'  - WiFi SSID: {WIFI_SSID}')
-    log(f'  - MQTT代理: {MQTT_BROKER}:{MQTT_PORT}')
-    log(f'  - 温度采样间隔: {TEMP_SAMPLE_INTERVAL}ms')
-    log(f'  - LED引脚: {LED_PIN}, 数量: {NUM_LEDS}')
-    log(f'  - 温度滤波: {"启用" if TEMP_FILTER_ENABLED else "禁用"}')
-    if TEMP_FILTER_ENABLED:
-        log(f'  - 滤波样本数: {TEMP_FILTER_SAMPLES}')
-    log(f'  - 温度校准偏移: {TEMP_CALIBRATION_OFFSET}°C')
-    log(f'  - 日志级别: {LOG_LEVEL}')
+    if not FAST_BOOT:
+        log_system_info()
     
     # 初始化LED
     if not init_led():
         log('LED初始化失败，程序退出', 'ERROR')
         return False
+    boot_timer.mark('led')
+    
+    # 初始化温度滤波链、传感器注册表、定时器采样和发布策略
+    init_temp_filter()
+    init_sensors(defer_extras=FAST_BOOT)
+    init_sampler()
+    init_publish_policy()
+    init_heap()
+    if not FAST_BOOT:
+        init_metrics()
+    
+    # 初始化断网样本缓冲区(失败不影响运行)
+    init_sample_buffer()
+    if FAST_BOOT:
+        load_net_cache()
+    boot_timer.mark('init')
     
-    # 连接WiFi
+    # 连接WiFi：连接失败不退出(设备可能先于路由器上电)，离线进入主循环，
+    # 由WiFi状态机(asyncio模式下为WiFi任务)在后台继续重连，期间的样本写入断网缓冲区
     if not do_connect():
-        log('WiFi连接失败，程序退出', 'ERROR')
-        return False
+        log('WiFi暂未连接，转入后台重连', 'WARNING')
     
-    # 连接MQTT
-    if not connect_mqtt():
-        log('MQTT连接失败，程序退出', 'ERROR')
-        return False
+    # 连接MQTT(异步客户端在mqtt_task中连接)
+    elif ASYNC_MQTT:
+        log('MQTT将由异步客户端任务连接')
+    elif not get_mqtt_supervisor().ensure():
+        if not ASYNC_MODE:
+            log('MQTT连接失败，程序退出', 'ERROR')
+            return False
+        log('MQTT暂未连接，转入后台重连', 'WARNING')
     
     log('初始化完成')
     return True
 
+# 主循环一轮开始：记录开始时刻和当前堆用量
+def begin_iteration():
+    global iteration_start
+    iteration_start = time.ticks_us()
+    heap.begin()
+
+# 主循环一轮结束：记录本轮耗时和分配的堆内存，在休眠前的空闲窗口中按需回收，然后短暂休眠
+# 第一次发布所在的一轮结束后执行finish_boot(不计入该轮的耗时和分配)
+def end_iteration():
+    if metrics is not None:
+        metrics.observe('loop_us', time.ticks_diff(time.ticks_us(), iteration_start))
+    heap.end()
+    if boot_timer is not None and boot_timer.finished:
+        finish_boot()
+    idle_gc()
+    if sample_queue is not None:
+        # 双线程模式下LED由实时线程渲染，网络线程只按控制消息轮询间隔休眠
+        time.sleep_ms(CONTROL_POLL_INTERVAL)
+    else:
+        led_sleep(100)
+
 # 主循环
 def main_loop():
-    global last_temp_time, mqtt_client
+    global mqtt_client
     
     log('进入主循环')
     
-    # 错误计数器字典
-    error_counts = {
-        'wifi': 0,
-        'mqtt': 0,
-        'temp': 0
-    }
-    max_error_count = 5
-    
     # 状态检查时间跟踪
     last_status_check = 0
-    last_mqtt_ping = 0
+    
+    # 双线程模式下本循环作为网络线程运行，采样和LED由实时线程负责
+    threaded = sample_queue is not None
+    if not threaded:
+        start_sampling()
     
     while True:
         try:
             current_time = time.ticks_ms()
+            begin_iteration()
+            
+            # 推进WiFi连接状态机(非阻塞)，超时、退避和网络接口重启都由WifiManager处理
+            wifi_ok = check_wifi_connection()
             
             # 定期检查网络状态(每30秒)
             if time.ticks_diff(current_time, last_status_check) > 30000:
@@ -529,128 +1510,558 @@ def main_loop():
                 # 监控网络状态
                 monitor_network_status()
                 
-                # 检查WiFi连接
-                if not check_wifi_connection():
+                if not wifi_ok:
                     error_counts['wifi'] += 1
-                    log(f'WiFi连接失败 ({error_counts["wifi"]}/{max_error_count})，等待后重试', 'ERROR')
-                    if error_counts['wifi'] >= max_error_count:
-                        log('WiFi连接错误次数过多，重启网络模块', 'ERROR')
-                        wlan.active(False)
-                        time.sleep(2)
-                        wlan.active(True)
-                        error_counts['wifi'] = 0
-                    time.sleep(5)
-                    continue
-                else:
-                    if error_counts['wifi'] > 0:
-                        log(f'WiFi连接已恢复，重置错误计数器(之前: {error_counts["wifi"]})', 'INFO')
-                        error_counts['wifi'] = 0
+                    log('WiFi连接失败 ({})，状态: {}', 'ERROR', error_counts["wifi"], wifi_manager.state_name())
+                elif error_counts['wifi'] > 0:
+                    log('WiFi连接已恢复，重置错误计数器(之前: {})', 'INFO', error_counts["wifi"])
+                    error_counts['wifi'] = 0
+            
+            # WiFi重连期间跳过MQTT处理，但仍按周期采样并缓存，不阻塞循环
+            if not wifi_ok:
+                sample_offline(current_time)
+                end_iteration()
+                continue
             
-            # 检查MQTT连接
+            # 检查MQTT连接：重连(带退避)和保活ping都由连接监督器决定，未连接时本轮采样转入缓存，不阻塞循环
             if not check_mqtt_connection():
-                error_counts['mqtt'] += 1
-                log(f'MQTT连接失败 ({error_counts["mqtt"]}/{max_error_count})，等待后重试', 'ERROR')
-                if error_counts['mqtt'] >= max_error_count:
-                    log('MQTT连接错误次数过多，尝试重新连接', 'ERROR')
-                    if mqtt_client:
-                        try:
-                            mqtt_client.disconnect()
-                        except:
-                            pass
-                    mqtt_client = None
-                    error_counts['mqtt'] = 0
-                time.sleep(5)
+                sample_offline(current_time)
+                end_iteration()
                 continue
-            else:
-                if error_counts['mqtt'] > 0:
-                    log(f'MQTT连接已恢复，重置错误计数器(之前: {error_counts["mqtt"]})', 'INFO')
-                    error_counts['mqtt'] = 0
             
-            # 定期MQTT ping检查(每分钟)
-            if time.ticks_diff(current_time, last_mqtt_ping) > 60000:
-                last_mqtt_ping = current_time
-                try:
-                    # 使用umqtt.simple：调用ping，如果失败则重连
-                    try:
-                        mqtt_client.ping()
-                        log('MQTT ping成功', 'INFO')
-                        error_counts['mqtt'] = 0
-                    except Exception as e:
-                        log(f'MQTT ping失败: {e}', 'WARNING')
-                        raise
-                except Exception as e:
-                    log(f'MQTT状态检查失败: {e}', 'ERROR')
-                    error_counts['mqtt'] += 1
-                    try:
-                        log('尝试断开并重新连接MQTT', 'INFO')
-                        mqtt_client.disconnect()
-                    except Exception as e2:
-                        log(f'断开MQTT失败: {e2}', 'WARNING')
-                    connect_mqtt()
+            # 连接可用时补发断网期间缓存的样本(每次循环一批，不拖慢控制响应)
+            if sample_buffer is not None and len(sample_buffer):
+                replay_buffered_samples()
             
             # 检查MQTT消息（忽略非阻塞无数据错误）
             try:
-                mqtt_client.check_msg()
+                drain_control_messages()
             except OSError as e:
                 err = e.args[0] if hasattr(e, 'args') and e.args else None
                 # MicroPython 非阻塞读取可能抛出 -1 或 11 (EAGAIN)，此处视为无消息可读
-                if err in (-1, 11):
-                    pass
-                else:
-                    log(f'检查MQTT消息错误: {e}', 'ERROR')
-                    error_counts['mqtt'] += 1
+                if err not in (-1, 11):
+                    log('检查MQTT消息错误: {}', 'ERROR', e)
+                    mqtt_failed(e)
             except Exception as e:
-                log(f'检查MQTT消息错误: {e}', 'ERROR')
-                error_counts['mqtt'] += 1
+                log('处理MQTT消息异常: {}', 'ERROR', e)
+                mqtt_failed(e)
+            if not threaded:
+                apply_control(current_time)
+            
+            # 按STATS_INTERVAL发布运行指标快照
+            if metrics is not None and metrics.due(current_time):
+                publish_stats()
+            
+            # 发布定时器采到的样本，并按各传感器的周期采样并发布(双线程模式下发布实时线程采到的读数)
+            if threaded:
+                # 每轮只发布一条，发布阻塞时每轮之间仍会读取控制消息；发布跟不上采样、积压超过队列一半时
+                # 其余温度样本转入断网缓冲区，由补发按REPLAY_BATCH_SIZE合并发出
+                drain_sample_queue(handle_reading, 1)
+                if len(sample_queue) > sample_queue.size // 2:
+                    drain_sample_queue(store_reading)
+            else:
+                if sampler is not None:
+                    sampler.drain(handle_reading)
+                sensor_registry.poll(current_time, handle_reading)
             
-            # 定时读取和发布温度
-            if time.ticks_diff(current_time, last_temp_time) >= TEMP_SAMPLE_INTERVAL:
-                temperature = read_internal_temperature()
-                if temperature is not None:
-                    if not publish_temperature(temperature):
-                        error_counts['temp'] += 1
-                        log(f'发布温度数据失败 ({error_counts["temp"]}/{max_error_count})', 'ERROR')
-                        if error_counts['temp'] >= max_error_count:
-                            log('温度数据发布错误次数过多，尝试重新连接MQTT', 'ERROR')
-                            if mqtt_client:
-                                try:
-                                    mqtt_client.disconnect()
-                                except:
-                                    pass
-                            mqtt_client = None
-                            error_counts['temp'] = 0
-                    else:
-                        if error_counts['temp'] > 0:
-                            log(f'温度数据发布已恢复，重置错误计数器(之前: {error_counts["temp"]})', 'INFO')
-                            error_counts['temp'] = 0
-                else:
-                    error_counts['temp'] += 1
-                    log(f'读取温度失败 ({error_counts["temp"]}/{max_error_count})', 'ERROR')
-                    if error_counts['temp'] >= max_error_count:
-                        log('温度读取错误次数过多，跳过本次采样', 'ERROR')
-                        error_counts['temp'] = 0
-                        
-                last_temp_time = current_time
+            # 批量模式下最早样本等待超时则发出当前批次
+            if batcher is not None and batcher.due(current_time):
+                flush_batch()
             
             # 短暂休眠以降低CPU使用率
-            time.sleep(0.1)
+            end_iteration()
             
         except Exception as e:
-            log(f'主循环异常: {e}', 'ERROR')
+            log('主循环异常: {}', 'ERROR', e)
             time.sleep(1)
 
+# ---------------- 双线程模式 ----------------
+# THREAD_MODE为True时用_thread分成两个线程: 网络线程(即main_loop)独占MQTT客户端，负责WiFi监督、收发、发布、
+# 补发和运行时配置；实时线程负责采样和LED(控制消息合并、限帧和动画渲染)，不做任何网络收发。
+# 两者只通过两个有界单生产者单消费者队列(ring_queue.RingQueue)交换数据: 读数从实时线程到网络线程，
+# 控制消息从网络线程到实时线程。一次阻塞的publish或connect_mqtt()重连只停住网络线程，LED和采样照常进行。
+# 设备上两个线程都运行在MicroPython所在的核上并共享GIL，阻塞的socket收发和等待期间会释放GIL；
+# WiFi和lwIP协议栈本身运行在另一个核上。
+
+# 实时线程的读数处理: 放入样本队列，队列满(网络线程长时间没有取走)时丢弃该读数并计数
+def enqueue_reading(sensor, timestamp, value):
+    sample_queue.push((sensor, timestamp, value))
+
+# 网络线程取出实时线程采到的读数交给handler(在线时发布，离线时写入缓冲区)，每次最多limit条，None表示全部
+def drain_sample_queue(handler, limit=None):
+    count = 0
+    while limit is None or count < limit:
+        item = sample_queue.pop()
+        if item is None:
+            break
+        handler(item[0], item[1], item[2])
+        count += 1
+    return count
+
+# 双线程模式下在采样锁内调用fn(修改实时线程使用的传感器、滤波和定时采样器)，其他模式直接调用
+def with_sampling_lock(fn, *args):
+    if sampling_lock is None:
+        return fn(*args)
+    with sampling_lock:
+        return fn(*args)
+
+# 实时线程: 按各传感器的周期采样并放入样本队列，取出控制消息合并后写LED，休眠期间渲染过渡和动态效果；
+# 每轮最多休眠CONTROL_POLL_INTERVAL毫秒，控制消息从网络线程收到到写LED不再受发布和重连阻塞的影响
+def realtime_worker():
+    global realtime_alive
+    try:
+        start_sampling()
+        while realtime_running:
+            try:
+                now = time.ticks_ms()
+                with sampling_lock:
+                    if sampler is not None:
+                        sampler.drain(enqueue_reading)
+                    sensor_registry.poll(now, enqueue_reading)
+                item = control_queue.pop()
+                while item is not None:
+                    control.push(item[1], item[0])
+                    item = control_queue.pop()
+                apply_control(now)
+                led_sleep(min(sensor_registry.next_delay(time.ticks_ms()), CONTROL_POLL_INTERVAL))
+            except Exception as e:
+                log('实时线程异常: {}', 'ERROR', e)
+                time.sleep(1)
+    finally:
+        realtime_alive = False
+
+# 双线程模式入口: 创建线程间队列，启动实时线程，当前线程作为网络线程运行main_loop；
+# 固件不支持_thread时退回单线程main_loop
+def thread_main_loop():
+    global sample_queue, control_queue, sampling_lock, realtime_running, realtime_alive
+    try:
+        import _thread
+    except ImportError:
+        log('固件不支持_thread，改用单线程主循环', 'WARNING')
+        main_loop()
+        return
+    from ring_queue import RingQueue
+    sample_queue = RingQueue(MAX_PENDING_SAMPLES)
+    control_queue = RingQueue(CONTROL_DRAIN_MAX)
+    sampling_lock = _thread.allocate_lock()
+    if THREAD_STACK_SIZE:
+        _thread.stack_size(THREAD_STACK_SIZE)
+    realtime_running = realtime_alive = True
+    _thread.start_new_thread(realtime_worker, ())
+    log('进入双线程模式: 网络线程和实时线程')
+    try:
+        main_loop()
+    finally:
+        # 通知实时线程退出并等待它结束当前一轮，之后清理LED不会与它的写出交错
+        realtime_running = False
+        deadline = time.ticks_add(time.ticks_ms(), 1000)
+        while realtime_alive and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            time.sleep_ms(10)
+
+# ---------------- asyncio任务调度模式 ----------------
+# 采样、控制消息、保活、网络监控和发布各自作为独立任务按自己的周期运行，
+# 避免一次慢速发布或重连拖住LED控制，也去掉了主循环固定100ms休眠带来的延迟下限。
+
+# asyncio模式的读数处理：放入待发布队列，队列满时丢弃最旧的一条
+def queue_reading(sensor, timestamp, value):
+    if value is None:
+        sensor_read_failed(sensor)
+        return
+    if sensor is temperature_sensor:
+        queue, item = pending_samples, (timestamp, value)
+    else:
+        queue, item = pending_readings, (sensor, timestamp, value)
+    if len(queue) >= MAX_PENDING_SAMPLES:
+        queue.pop(0)
+        log('待发布样本队列已满，丢弃最旧样本', 'WARNING')
+        if metrics is not None:
+            metrics.inc('samples_dropped')
+    queue.append(item)
+
+# 采样任务：一个任务调度所有传感器，睡眠到最早到期的传感器，按各自的绝对时间表采样；
+# 启用定时器采样时至少每个子周期醒来一次，取出定时器采到的样本
+async def sample_task(publish_event):
+    start_sampling()
+    while True:
+        # 最多睡眠1秒，运行时缩短采样周期后不必等到按旧周期计划的时刻
+        delay = min(sensor_registry.next_delay(time.ticks_ms()), 1000)
+        if sampler is not None and delay > sampler.sub_period:
+            delay = sampler.sub_period
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        count = sampler.drain(queue_reading) if sampler is not None else 0
+        if sensor_registry.poll(time.ticks_ms(), queue_reading) or count:
+            publish_event.set()
+
+# 温度发布任务：有新样本时先补发缓存样本再依次发布；
+# 发布失败时把待发样本转存到flash缓冲区(未启用时保留在内存队列中下次重试)
+async def publish_task(publish_event):
+    global mqtt_client
+    while True:
+        await publish_event.wait()
+        publish_event.clear()
+
+        while sample_buffer is not None and len(sample_buffer) and get_mqtt_supervisor().isconnected():
+            await wait_publish_window()
+            if not replay_buffered_samples():
+                break
+            await asyncio.sleep(0)
+
+        while pending_samples:
+            timestamp, temperature = pending_samples[0]
+            await wait_publish_window()
+            if submit_sample(timestamp, temperature):
+                pending_samples.pop(0)
+                if error_counts['temp'] > 0:
+                    log('温度数据发布已恢复，重置错误计数器(之前: {})', 'INFO', error_counts["temp"])
+                    error_counts['temp'] = 0
+            else:
+                if batcher is not None:
+                    # 批量模式下该样本已随批次转存到缓冲区
+                    pending_samples.pop(0)
+                error_counts['temp'] += 1
+                log('发布温度数据失败 ({}/{})', 'ERROR', error_counts["temp"], MAX_ERROR_COUNT)
+                if error_counts['temp'] >= MAX_ERROR_COUNT:
+                    log('温度数据发布连续失败，MQTT连接状态: {}', 'ERROR', get_mqtt_supervisor().state_name())
+                    error_counts['temp'] = 0
+                if sample_buffer is not None:
+                    for timestamp, temperature in pending_samples:
+                        store_sample(timestamp, temperature)
+                    pending_samples.clear()
+                break
+            # 每发布一条让出一次CPU，保证控制任务及时运行
+            await asyncio.sleep(0)
+
+        # 附加传感器读数不写入缓冲区，发布失败时留在内存队列中等待下次重试
+        while pending_readings and get_mqtt_supervisor().isconnected():
+            sensor, timestamp, value = pending_readings[0]
+            await wait_publish_window()
+            if not publish_reading(sensor, timestamp, value):
+                break
+            pending_readings.pop(0)
+            await asyncio.sleep(0)
+
+        # 第一次发布之后补做推迟的初始化并发出启动计时记录
+        if boot_timer is not None and boot_timer.finished:
+            finish_boot()
+
+# 控制消息任务：以较短周期轮询订阅消息
+async def control_task():
+    while True:
+        if mqtt_client and get_mqtt_supervisor().isconnected():
+            try:
+                drain_control_messages()
+            except OSError as e:
+                err = e.args[0] if hasattr(e, 'args') and e.args else None
+                # MicroPython 非阻塞读取可能抛出 -1 或 11 (EAGAIN)，此处视为无消息可读
+                if err not in (-1, 11):
+                    log('检查MQTT消息错误: {}', 'ERROR', e)
+                    mqtt_failed(e)
+            except Exception as e:
+                log('处理MQTT消息异常: {}', 'ERROR', e)
+                mqtt_failed(e)
+        apply_control()
+        await asyncio.sleep(CONTROL_POLL_INTERVAL / 1000)
+
+# MQTT保活任务：已连接时每秒、未连接时按WiFi轮询间隔交给连接监督器检查，
+# 由它决定是否重连(umqtt客户端)和是否需要ping；重新连上后唤醒发布任务补发缓存样本
+async def keepalive_task(publish_event):
+    supervisor = get_mqtt_supervisor()
+    while True:
+        if supervisor.isconnected():
+            await asyncio.sleep(min(MQTT_PING_INTERVAL, 1))
+        else:
+            await asyncio.sleep(WIFI_POLL_INTERVAL / 1000)
+        if not get_wifi_manager().isconnected():
+            continue
+        was_connected = supervisor.isconnected()
+        if check_mqtt_connection() and not was_connected:
+            publish_event.set()
+
+# 网络监控任务：定期输出网络和各模块的统计
+# WiFi的重连、超时和退避由WifiManager.run任务负责，MQTT由连接监督器负责
+async def network_task(publish_event):
+    while True:
+        await asyncio.sleep(NETWORK_CHECK_INTERVAL / 1000)
+        monitor_network_status()
+        # 有缓存样本时唤醒发布任务进行补发
+        if get_mqtt_supervisor().isconnected() and sample_buffer is not None and len(sample_buffer):
+            publish_event.set()
+
+# GC任务：每100ms在任务间隙统计分配量，idle模式下按阈值显式回收；醒来晚于预期的时长计为调度延迟
+async def gc_task():
+    while True:
+        start = time.ticks_ms()
+        await asyncio.sleep(0.1)
+        if metrics is not None:
+            metrics.observe('lag_ms', max(0, time.ticks_diff(time.ticks_ms(), start) - 100))
+        idle_gc()
+
+# 运行指标任务：每STATS_INTERVAL发布一次快照
+async def stats_task():
+    while True:
+        await asyncio.sleep(STATS_INTERVAL / 1000)
+        publish_stats()
+
+# 异步客户端的在途窗口已满时等待PUBACK腾出空位；umqtt客户端每次发布都会等待确认，无需等待
+async def wait_publish_window():
+    if ASYNC_MQTT and mqtt_client is not None:
+        await mqtt_client.wait_window()
+
+# 用异步客户端连接MQTT代理并订阅；客户端对象只创建一次，重连时复用以保留在途消息
+async def connect_mqtt_async(server=None):
+    global mqtt_client
+    cached = not server and mqtt_server is not None
+    try:
+        if not MQTT_CLIENT_ID or not MQTT_BROKER:
+            log('MQTT配置参数缺失', 'ERROR')
+            return False
+        server = server or mqtt_server or MQTT_BROKER
+        if mqtt_client is None:
+            from mqtt_async import MQTTClient as AsyncMQTTClient
+            mqtt_client = AsyncMQTTClient(
+                MQTT_CLIENT_ID,
+                server,
+                MQTT_PORT,
+                MQTT_USER,
+                MQTT_PASSWORD,
+                keepalive=MQTT_KEEPALIVE,
+                ssl=get_tls_context() or False,
+                window=MQTT_INFLIGHT_WINDOW,
+                bufsize=MQTT_BUFFER_SIZE
+            )
+            mqtt_client.set_callback(mqtt_callback)
+            mqtt_client.on_ack = record_puback
+        mqtt_client.server = server  # 缓存的代理IP失效后重连改用MQTT_BROKER
+        log('尝试连接MQTT代理: {}:{}', 'INFO', server, MQTT_PORT)
+        resent = mqtt_client.resent
+        await mqtt_client.connect()
+        mqtt_client.subscribe(CONTROL_TOPIC, MQTT_QOS)
+        if LOG_REQUEST_TOPIC:
+            mqtt_client.subscribe(LOG_REQUEST_TOPIC, 0)
+        if CONFIG_SET_TOPIC:
+            mqtt_client.subscribe(CONFIG_SET_TOPIC, 1)
+        if tls_context is not None:
+            tls_context.save_session()
+        log('MQTT连接成功: {}:{}, 重发未确认消息{}条', 'INFO', server, MQTT_PORT, mqtt_client.resent - resent)
+        if boot_timer is not None:
+            boot_timer.mark('mqtt')
+        return True
+    except OSError as e:
+        log('MQTT网络错误: {}', 'ERROR', e)
+    except Exception as e:
+        log('MQTT连接错误: {}', 'ERROR', e)
+    if tls_context is not None:
+        tls_context.connect_failed()
+    if cached:
+        drop_cached_broker()
+    return False
+
+# MQTT连接任务(异步客户端)：WiFi可用且连接监督器的退避到期时建立连接，连接关闭后报告给监督器
+async def mqtt_task(publish_event):
+    supervisor = get_mqtt_supervisor()
+    while True:
+        if mqtt_client is not None and mqtt_client.isconnected():
+            await mqtt_client.wait_closed()
+            supervisor.lost('连接已关闭')
+            log('在途消息{}条等待重连后重发', 'INFO', mqtt_client.inflight())
+            continue
+        if not get_wifi_manager().isconnected() or not supervisor.should_attempt():
+            await asyncio.sleep(WIFI_POLL_INTERVAL / 1000)
+            continue
+        ok = await connect_mqtt_async()
+        supervisor.attempt_done(ok)
+        if ok:
+            # 唤醒发布任务补发断线期间缓存的样本
+            publish_event.set()
+
+# 导入asyncio：设备上使用uasyncio，CPython上使用asyncio便于测试
+def import_asyncio():
+    global asyncio
+    if asyncio is None:
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+    return asyncio
+
+# asyncio主循环：创建并运行所有任务
+async def async_main_loop():
+    import_asyncio()
+    log('进入asyncio任务调度模式')
+    publish_event = asyncio.Event()
+    tasks = [
+        asyncio.create_task(get_wifi_manager().run(WIFI_POLL_INTERVAL)),
+        asyncio.create_task(sample_task(publish_event)),
+        asyncio.create_task(publish_task(publish_event)),
+        asyncio.create_task(control_task()),
+        asyncio.create_task(keepalive_task(publish_event)),
+        asyncio.create_task(network_task(publish_event)),
+        asyncio.create_task(gc_task()),
+    ]
+    if STATS_TOPIC:
+        # 快速启动时运行指标在第一次发布后才创建，创建之前publish_stats直接跳过
+        tasks.append(asyncio.create_task(stats_task()))
+    if ASYNC_MQTT:
+        tasks.append(asyncio.create_task(mqtt_task(publish_event)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# ---------------- 低功耗占空比模式 ----------------
+# 每个采样周期唤醒一次：采样后若累计满DUTY_PUBLISH_EVERY条才联网批量发布，随后关闭WiFi并睡眠。
+# deepsleep模式下RAM被清空，滤波器、待发样本、计数器和网络缓存保存在RTC内存中；
+# 唤醒后直接使用缓存的BSSID、信道、静态IP和代理IP重连，跳过init()/validate_config()和扫描。
+
+# 解析MQTT代理IP，供下次唤醒时跳过DNS
+def resolve_broker():
+    try:
+        import socket
+        return socket.getaddrinfo(MQTT_BROKER, MQTT_PORT)[0][-1][0]
+    except Exception as e:
+        log('解析MQTT代理地址失败: {}', 'WARNING', e)
+        return None
+
+# 把滤波器和发布策略状态写回保留状态
+def capture_retained_state(state):
+    state.filter_state = temp_filter.state() if temp_filter is not None else []
+    if publish_policy is not None and publish_policy.last_value is not None:
+        state.policy = (publish_policy.last_value, publish_policy.last_time & 0xFFFFFFFF,
+                        publish_policy.published, publish_policy.suppressed, publish_policy.heartbeats)
+
+# 从保留状态恢复滤波器和发布策略
+def restore_retained_state(state):
+    if temp_filter is not None and state.filter_state:
+        try:
+            temp_filter.restore(state.filter_state)
+        except Exception as e:
+            log('恢复滤波器状态失败，重新开始滤波: {}', 'WARNING', e)
+            temp_filter.reset()
+    if publish_policy is not None and state.policy:
+        (publish_policy.last_value, publish_policy.last_time, publish_policy.published,
+         publish_policy.suppressed, publish_policy.heartbeats) = state.policy
+
+# 发布窗口：连接网络并把待发样本批量发出，返回是否全部发出
+def duty_cycle_publish(state, wake_time):
+    global mqtt_client
+    phase_start = time.ticks_ms()
+    manager = get_wifi_manager()
+    if state.net and state.net[2][0] != '0.0.0.0':
+        manager.set_fast_params(state.net[0], state.net[1], state.net[2])
+    if not manager.connect(WIFI_CONNECT_TIMEOUT, poll_interval=10):
+        log('WiFi连接失败，{}条样本留待下次发布', 'WARNING', len(state.pending_values))
+        return False
+    wifi_ms = time.ticks_diff(time.ticks_ms(), phase_start)
+
+    # 常规连接成功后记录快速重连参数
+    if not manager.last_connect_fast or not state.net:
+        bssid, channel, ifconfig = manager.fast_params()
+        state.net = (bssid, channel, ifconfig, resolve_broker())
+
+    phase_start = time.ticks_ms()
+    broker_ip = state.net[3] if state.net else None
+    if not connect_mqtt(broker_ip) and not (broker_ip and connect_mqtt()):
+        return False
+    mqtt_ms = time.ticks_diff(time.ticks_ms(), phase_start)
+
+    phase_start = time.ticks_ms()
+    sent = 0
+    # JSON消息附带上一次发布窗口的唤醒到发布耗时和累计唤醒次数
+    extra = {'wake_ms': state.last_wake_ms, 'wakes': state.wakes}
+    try:
+        while state.pending_values:
+            n = min(len(state.pending_values), REPLAY_BATCH_SIZE)
+            topic, msg_payload = encode_samples(state.pending_timestamps[:n], state.pending_values[:n], extra)
+            mqtt_client.publish(topic, msg_payload, retain=False, qos=MQTT_QOS)
+            state.clear_pending(n)
+            sent += n
+        # 处理联网期间到达的控制消息
+        drain_control_messages()
+        apply_control()
+    except Exception as e:
+        log('占空比模式发布失败: {}', 'ERROR', e)
+    publish_ms = time.ticks_diff(time.ticks_ms(), phase_start)
+
+    try:
+        mqtt_client.disconnect()
+    except Exception:
+        pass
+    mqtt_client = None
+
+    if sent:
+        state.publishes += 1
+        state.last_wake_ms = time.ticks_diff(time.ticks_ms(), wake_time)
+        log('唤醒到发布完成: {}ms (WiFi {}ms{}, MQTT {}ms, 发布{}条 {}ms)', 'INFO', state.last_wake_ms, wifi_ms,
+            '(快速)' if manager.last_connect_fast else '', mqtt_ms, sent, publish_ms)
+    return not state.pending_values
+
+# 占空比主循环：deepsleep模式下每次唤醒都从头执行，lightsleep模式下在本函数内循环
+def duty_cycle_main():
+    wake_time = time.ticks_ms()
+    load_config_overrides()
+    state = power.RetainedState(DUTY_MAX_PENDING)
+    restored = power.woke_from_deepsleep() and state.load()
+
+    if not restored:
+        # 冷启动: 完整校验配置并清空LED
+        log('低功耗模式冷启动: {}', 'INFO', POWER_MODE)
+        if not validate_config():
+            return False
+        init_led()
+    else:
+        init_led(clear=False)
+    init_temp_filter()
+    init_sensors(primary_only=True)
+    init_publish_policy()
+    if restored:
+        restore_retained_state(state)
+
+    while True:
+        state.wakes += 1
+        timestamp = (state.clock_ms + time.ticks_diff(time.ticks_ms(), wake_time)) & 0xFFFFFFFF
+        temperature = read_internal_temperature()
+        if temperature is not None:
+            if publish_policy is None or publish_policy.should_publish(temperature, timestamp):
+                state.add_pending(timestamp, temperature)
+                if publish_policy is not None:
+                    publish_policy.record(temperature, timestamp)
+
+        if len(state.pending_values) >= DUTY_PUBLISH_EVERY:
+            duty_cycle_publish(state, wake_time)
+            # 发布后立即关闭WiFi以节省电量
+            get_wifi_manager().power_off()
+
+        # 计算睡眠时长并推进虚拟时钟，保存状态后睡眠
+        awake_ms = time.ticks_diff(time.ticks_ms(), wake_time)
+        sleep_ms = max(0, TEMP_SAMPLE_INTERVAL - awake_ms)
+        state.clock_ms = (state.clock_ms + awake_ms + sleep_ms) & 0xFFFFFFFF
+        capture_retained_state(state)
+        state.save()
+        log('第{}次唤醒，待发{}条，清醒{}ms，睡眠{}ms', 'DEBUG', state.wakes, len(state.pending_values), awake_ms, sleep_ms)
+        power.sleep(POWER_MODE, sleep_ms)
+        wake_time = time.ticks_ms()
+
 # 主函数
 def main():
     try:
-        if init():
-            main_loop()
+        if POWER_MODE != 'always_on':
+            duty_cycle_main()
+        elif init():
+            if ASYNC_MODE:
+                import_asyncio().run(async_main_loop())
+            elif THREAD_MODE:
+                thread_main_loop()
+            else:
+                main_loop()
         else:
             log('初始化失败，程序退出', 'ERROR')
             return
     except KeyboardInterrupt:
         log('用户中断程序', 'INFO')
     except Exception as e:
-        log(f'程序异常: {e}', 'ERROR')
+        log('程序异常: {}', 'ERROR', e)
         # 打印异常堆栈
         try:
             import sys
@@ -662,7 +2073,7 @@ def main():
         try:
             cleanup()
         except Exception as e:
-            log(f'资源清理失败: {e}', 'ERROR')
+            log('资源清理失败: {}', 'ERROR', e)
         log('程序结束', 'INFO')
 
 # 资源清理函数
@@ -671,6 +2082,10 @@ def cleanup():
     
     log('开始清理资源')
     
+    # 停止定时器采样
+    if sampler is not None:
+        sampler.stop()
+    
     # 清理LED资源
     try:
         if led:
@@ -683,7 +2098,7 @@ def cleanup():
         else:
             log('LED未初始化，跳过', 'DEBUG')
     except Exception as e:
-        log(f'关闭LED失败: {e}', 'ERROR')
+        log('关闭LED失败: {}', 'ERROR', e)
     
     # 清理MQTT连接
     try:
@@ -693,13 +2108,13 @@ def cleanup():
                 mqtt_client.disconnect()
                 log('MQTT连接已断开', 'DEBUG')
             except Exception as e:
-                log(f'MQTT断开操作失败: {e}', 'WARNING')
+                log('MQTT断开操作失败: {}', 'WARNING', e)
             finally:
                 mqtt_client = None
         else:
             log('MQTT客户端未初始化，跳过', 'DEBUG')
     except Exception as e:
-        log(f'清理MQTT连接失败: {e}', 'ERROR')
+        log('清理MQTT连接失败: {}', 'ERROR', e)
     
     # 清理WiFi连接
     try:
@@ -711,11 +2126,11 @@ def cleanup():
                 wlan.active(False)
                 log('WiFi模块已禁用', 'DEBUG')
             except Exception as e:
-                log(f'WiFi断开操作失败: {e}', 'WARNING')
+                log('WiFi断开操作失败: {}', 'WARNING', e)
         else:
             log('WiFi未初始化，跳过', 'DEBUG')
     except Exception as e:
-        log(f'清理WiFi连接失败: {e}', 'ERROR')
+        log('清理WiFi连接失败: {}', 'ERROR', e)
     
     # 清理其他资源
     try:
@@ -724,10 +2139,13 @@ def cleanup():
         gc.collect()
         log('垃圾回收完成', 'DEBUG')
     except Exception as e:
-        log(f'垃圾回收失败: {e}', 'WARNING')
+        log('垃圾回收失败: {}', 'WARNING', e)
     
     log('资源清理完成')
 
+# 模块导入(包括以上所有定义)到此完成
+boot_timer.mark('import')
+
 # 程序入口
 if __name__ == '__main__':
     try:
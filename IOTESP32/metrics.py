@@ -0,0 +1,109 @@
+# 运行时性能指标
+# 三类指标都在初始化时注册，记录时只做一次字典查找和小整数运算，不分配内存，可在生产环境常开:
+#   - 计数器(counter): 累计值，设备重启后从0开始；由其他模块累计的计数(如MQTT重连次数)在快照前用total()同步
+#   - 测量值(gauge): 最近一次的值(如空闲堆、RSSI)，None表示本周期不可用，快照中省略
+#   - 直方图(histogram): 固定分桶，每桶记录落入(上一桶上界, 本桶上界]的次数，最后一桶为溢出桶；
+#     同时记录次数、总和与最大值。直方图按发布周期统计，快照成功发出后清零；快照中省略末尾的空桶
+# snapshot()生成紧凑快照，空直方图省略:
+#   {"seq": 3, "dt": 60000, "c": {...}, "g": {...}, "h": {"loop_us": {"le": [...], "n": [...], "sum": ..., "max": ...}}}
+import time
+from array import array
+
+# 常用分桶上界
+US_BUCKETS = (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000)  # 微秒级耗时
+MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # 毫秒级延迟
+DOWNTIME_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 30000, 60000, 300000)  # 断线时长(毫秒)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        if not bounds or any(bounds[i] >= bounds[i + 1] for i in range(len(bounds) - 1)):
+            raise ValueError('直方图分桶上界必须非空且严格递增')
+        self.bounds = tuple(bounds)
+        self.counts = array('L', [0] * (len(bounds) + 1))
+        self.count = 0
+        self.total = 0
+        self.max = None
+
+    def observe(self, value):
+        bounds = self.bounds
+        i = 0
+        n = len(bounds)
+        while i < n and value > bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.max = None
+
+    # n中末尾为0的桶省略，长度不足len(le)+1的部分按0计
+    def snapshot(self):
+        last = len(self.counts)
+        while last and not self.counts[last - 1]:
+            last -= 1
+        return {'le': list(self.bounds), 'n': list(self.counts[:last]), 'sum': self.total, 'max': self.max}
+
+
+class Metrics:
+    # interval: 快照发布周期(毫秒)
+    def __init__(self, interval=60000):
+        self.interval = interval
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.seq = 0  # 已发出的快照数
+        self._since = time.ticks_ms()  # 当前统计周期的起点
+
+    def counter(self, name):
+        self.counters[name] = 0
+
+    def gauge(self, name):
+        self.gauges[name] = None
+
+    def histogram(self, name, bounds):
+        self.histograms[name] = Histogram(bounds)
+
+    def inc(self, name, n=1):
+        self.counters[name] += n
+
+    # 同步由其他模块累计的计数器
+    def total(self, name, value):
+        self.counters[name] = value
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, value):
+        self.histograms[name].observe(value)
+
+    # 距上次快照是否已满一个发布周期
+    def due(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        return time.ticks_diff(now, self._since) >= self.interval
+
+    def snapshot(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        return {
+            'seq': self.seq,
+            'dt': time.ticks_diff(now, self._since),
+            'c': dict(self.counters),
+            'g': {name: value for name, value in self.gauges.items() if value is not None},
+            'h': {name: h.snapshot() for name, h in self.histograms.items() if h.count},
+        }
+
+    # 快照已发出: 清零直方图，开始新的统计周期
+    def reset(self, now=None):
+        for h in self.histograms.values():
+            h.reset()
+        self.seq += 1
+        self._since = time.ticks_ms() if now is None else now
@@ -0,0 +1,499 @@
+# 基于uasyncio流(CPython上为asyncio)的MQTT 3.1.1客户端
+# 与umqtt.simple相比:
+#   - QoS1发布不等待PUBACK: 报文写入在途窗口后立即返回，最多window条同时在途，由接收任务按报文ID确认
+#   - 未确认的QoS1报文保存在预分配的槽位中，断线重连后自动重发(DUP)，不因断线丢失
+#   - check_msg()只从接收任务已解析好的队列中取消息，不再每次发起socket调用
+#   - 发送报文在预分配的bytearray中组装，接收端用增量解析器逐字节推进状态，报文体写入预分配缓冲区
+# 同步方法(publish/subscribe/ping/check_msg/disconnect)与umqtt.simple同名同参，可直接替换；
+# connect()是协程，需在asyncio任务中await。
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+ECONNRESET = 104
+ENOBUFS = 105
+ENOTCONN = 128
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x82
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+_PINGREQ = b'\xc0\x00'
+_DISCONNECT = b'\xe0\x00'
+
+
+class MQTTException(Exception):
+    pass
+
+
+# 写入MQTT剩余长度(变长编码)，返回新的偏移
+def _put_length(buf, offset, n):
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            buf[offset] = b | 0x80
+        else:
+            buf[offset] = b
+            return offset + 1
+        offset += 1
+
+
+def _length_size(n):
+    size = 1
+    while n > 127:
+        n >>= 7
+        size += 1
+    return size
+
+
+# 写入2字节长度前缀的字符串，返回新的偏移
+def _put_str(buf, offset, s):
+    n = len(s)
+    buf[offset] = n >> 8
+    buf[offset + 1] = n & 0xFF
+    buf[offset + 2:offset + 2 + n] = s
+    return offset + 2 + n
+
+
+def _to_bytes(s):
+    return s.encode() if isinstance(s, str) else s
+
+
+# 增量报文解析器: feed()可以传入任意切分的字节流，每凑齐一个完整报文调用handler(首字节, 报文体, 长度)
+# 报文体位于预分配缓冲区中，handler返回后即被覆盖；超过缓冲区大小的报文被跳过并计数
+class PacketParser:
+    def __init__(self, size, handler):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.handler = handler
+        self.oversized = 0
+        self.reset()
+
+    def reset(self):
+        self._state = 0  # 0: 首字节, 1: 剩余长度, 2: 报文体, 3: 跳过超长报文
+        self._header = 0
+        self._length = 0
+        self._shift = 0
+        self._got = 0
+
+    def feed(self, data, n):
+        i = 0
+        while i < n:
+            state = self._state
+            if state == 0:
+                self._header = data[i]
+                self._length = 0
+                self._shift = 0
+                self._state = 1
+                i += 1
+            elif state == 1:
+                b = data[i]
+                i += 1
+                self._length |= (b & 0x7F) << self._shift
+                self._shift += 7
+                if b & 0x80:
+                    if self._shift > 21:
+                        raise MQTTException('剩余长度编码错误')
+                    continue
+                self._got = 0
+                if self._length == 0:
+                    self._state = 0
+                    self.handler(self._header, self.mv, 0)
+                elif self._length > len(self.buf):
+                    self.oversized += 1
+                    self._state = 3
+                else:
+                    self._state = 2
+            else:
+                k = min(n - i, self._length - self._got)
+                if state == 2:
+                    self.buf[self._got:self._got + k] = data[i:i + k]
+                self._got += k
+                i += k
+                if self._got >= self._length:
+                    self._state = 0
+                    if state == 2:
+                        self.handler(self._header, self.mv, self._length)
+
+
+class MQTTClient:
+    def __init__(self, client_id, server, port=1883, user=None, password=None,
+                 keepalive=0, ssl=False, ssl_params={}, window=8, bufsize=1024, inbox_size=16):
+        if window < 1 or bufsize < 64:
+            raise ValueError('在途窗口必须大于0，缓冲区不能小于64字节')
+        self.client_id = _to_bytes(client_id)
+        self.server = server
+        self.port = port or (8883 if ssl else 1883)
+        self.user = _to_bytes(user) if user else None
+        self.password = _to_bytes(password) if password else None
+        self.keepalive = keepalive
+        self.ssl = ssl
+        self.ssl_params = ssl_params
+        self.cb = None
+        self.window = window
+        self.bufsize = bufsize
+        self.inbox_size = inbox_size
+
+        self._sbuf = bytearray(bufsize)  # QoS0报文和控制报文的发送缓冲区
+        self._smv = memoryview(self._sbuf)
+        self._ack = bytearray(b'\x40\x02\x00\x00')  # 对收到的QoS1消息回复PUBACK
+        # 在途QoS1报文: 每个槽位保存完整报文，断线后可原样重发
+        self._slots = bytearray(window * bufsize)
+        self._slots_mv = memoryview(self._slots)
+        self._slot_pid = [0] * window  # 0表示空闲
+        self._slot_len = [0] * window
+        self._slot_time = [0] * window
+        self._inflight = 0
+        self._next_pid = 0
+        self._parser = PacketParser(bufsize, self._handle)
+        self._rbuf = bytearray(256)
+        self._rmv = memoryview(self._rbuf)
+        self._inbox = []  # 已解析、等待check_msg()投递的(topic, msg)
+
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+        self._flush = asyncio.Event()
+        self._window_free = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._connack = asyncio.Event()
+        self._connack_rc = None
+        self._ping_sent = None  # 未收到PINGRESP的PINGREQ发送时刻
+        self.connected = False
+
+        self.published = 0
+        self.acked = 0
+        self.resent = 0
+        self.inbox_dropped = 0
+        self.max_inflight = 0
+        self.ack_ms_sum = 0
+        self.ack_ms_max = 0
+        self.on_ack = None  # 收到PUBACK时调用on_ack(往返毫秒数)
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def isconnected(self):
+        return self.connected
+
+    def inflight(self):
+        return self._inflight
+
+    # ---------------- 连接 ----------------
+
+    async def connect(self, clean_session=True, timeout=5000):
+        self._close_stream()
+        self._parser.reset()
+        self._connack.clear()
+        self._closed.clear()
+        self._connack_rc = None
+        self._ping_sent = None
+        if self.ssl:
+            # ssl可以是SSLContext(或接口相同的tls.TLSContext)，为True时按ssl_params创建
+            ssl = (self.ssl_params or True) if self.ssl is True else self.ssl
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.server, self.port, ssl=ssl), timeout / 1000)
+        else:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.server, self.port), timeout / 1000)
+
+        # CONNECT: 协议名MQTT, 级别4, 连接标志, 保活秒数, 客户端ID[, 用户名, 密码]
+        flags = 0x02 if clean_session else 0
+        body = 10 + 2 + len(self.client_id)
+        if self.user:
+            flags |= 0x80
+            body += 2 + len(self.user)
+            if self.password:
+                flags |= 0x40
+                body += 2 + len(self.password)
+        if 1 + _length_size(body) + body > self.bufsize:
+            raise MQTTException('CONNECT报文超过缓冲区')
+        buf = self._sbuf
+        buf[0] = CONNECT
+        o = _put_length(buf, 1, body)
+        o = _put_str(buf, o, b'MQTT')
+        buf[o] = 4
+        buf[o + 1] = flags
+        buf[o + 2] = self.keepalive >> 8
+        buf[o + 3] = self.keepalive & 0xFF
+        o = _put_str(buf, o + 4, self.client_id)
+        if self.user:
+            o = _put_str(buf, o, self.user)
+            if self.password:
+                o = _put_str(buf, o, self.password)
+        self._writer.write(self._smv[:o])
+        await self._writer.drain()
+
+        self._tasks = [asyncio.create_task(self._read_loop())]
+        try:
+            await asyncio.wait_for(self._connack.wait(), timeout / 1000)
+        except asyncio.TimeoutError:
+            self._close_stream()
+            raise OSError(ECONNRESET)
+        if self._connack_rc != 0:
+            self._close_stream()
+            raise MQTTException(self._connack_rc)
+
+        self.connected = True
+        self._tasks.append(asyncio.create_task(self._write_loop()))
+        # 重发上次连接中未确认的QoS1报文
+        for i in range(self.window):
+            if self._slot_pid[i]:
+                start = i * self.bufsize
+                self._slots[start] |= 0x08  # DUP
+                self._slot_time[i] = time.ticks_ms()
+                self._writer.write(self._slots_mv[start:start + self._slot_len[i]])
+                self.resent += 1
+        self._flush.set()
+        return 0
+
+    def disconnect(self):
+        if self.connected:
+            try:
+                self._writer.write(_DISCONNECT)
+            except Exception:
+                pass
+        self._close_stream()
+
+    def _close_stream(self):
+        was_connected = self.connected
+        self.connected = False
+        for task in self._tasks:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        self._tasks = []
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._reader = None
+        self._writer = None
+        if was_connected:
+            self._closed.set()
+        # 唤醒等待窗口的任务，让其发现连接已断开
+        self._window_free.set()
+
+    # 等待连接断开
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    # ---------------- 发送 ----------------
+
+    def _check_connected(self):
+        if not self.connected:
+            raise OSError(ENOTCONN)
+
+    def _send(self, data):
+        self._writer.write(data)
+        self._flush.set()
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._flush.wait()
+                self._flush.clear()
+                await self._writer.drain()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._close_stream()
+
+    # 分配报文ID: 1-65535循环，跳过仍在在途窗口中等待PUBACK的ID(回绕后不能与未确认的消息重号)
+    def _alloc_pid(self):
+        pid = self._next_pid
+        while True:
+            pid = pid + 1 if pid < 0xFFFF else 1
+            if pid not in self._slot_pid:
+                break
+        self._next_pid = pid
+        return pid
+
+    # 发布消息: QoS0直接写出；QoS1写入在途窗口后立即返回报文ID，窗口已满时抛出OSError(ENOBUFS)
+    def publish(self, topic, msg, retain=False, qos=0):
+        self._check_connected()
+        if qos not in (0, 1):
+            raise ValueError('仅支持QoS 0和1')
+        body = 2 + len(topic) + len(msg) + (2 if qos else 0)
+        size = 1 + _length_size(body) + body
+        if size > self.bufsize:
+            raise ValueError(f'消息过长: {size}字节，缓冲区{self.bufsize}字节')
+
+        if qos:
+            if self._inflight >= self.window:
+                raise OSError(ENOBUFS)
+            slot = self._slot_pid.index(0)
+            start = slot * self.bufsize
+            buf = self._slots
+        else:
+            start = 0
+            buf = self._sbuf
+
+        buf[start] = PUBLISH | (qos << 1) | (1 if retain else 0)
+        o = _put_length(buf, start + 1, body)
+        o = _put_str(buf, o, topic)
+        pid = 0
+        if qos:
+            pid = self._alloc_pid()
+            buf[o] = pid >> 8
+            buf[o + 1] = pid & 0xFF
+            o += 2
+        buf[o:o + len(msg)] = msg
+        o += len(msg)
+
+        if qos:
+            self._slot_pid[slot] = pid
+            self._slot_len[slot] = o - start
+            self._slot_time[slot] = time.ticks_ms()
+            self._inflight += 1
+            if self._inflight > self.max_inflight:
+                self.max_inflight = self._inflight
+            self._send(self._slots_mv[start:o])
+        else:
+            self._send(self._smv[:o])
+        self.published += 1
+        return pid
+
+    # 等待在途窗口有空位(连接断开时立即返回，由随后的publish抛出错误)
+    async def wait_window(self):
+        while self.connected and self._inflight >= self.window:
+            self._window_free.clear()
+            await self._window_free.wait()
+
+    # 等待所有在途QoS1消息被确认
+    async def flush(self):
+        while self.connected and self._inflight:
+            self._window_free.clear()
+            await self._window_free.wait()
+
+    def subscribe(self, topic, qos=0):
+        self._check_connected()
+        topic = _to_bytes(topic)
+        body = 2 + 2 + len(topic) + 1
+        buf = self._sbuf
+        buf[0] = SUBSCRIBE
+        o = _put_length(buf, 1, body)
+        pid = self._alloc_pid()
+        buf[o] = pid >> 8
+        buf[o + 1] = pid & 0xFF
+        o = _put_str(buf, o + 2, topic)
+        buf[o] = qos
+        self._send(self._smv[:o + 1])
+
+    # 发送PINGREQ；上一次PINGREQ在保活时间内仍未得到响应时判定连接已断开
+    def ping(self):
+        self._check_connected()
+        now = time.ticks_ms()
+        if self._ping_sent is not None:
+            limit = (self.keepalive or 60) * 1000
+            if time.ticks_diff(now, self._ping_sent) > limit:
+                self._close_stream()
+                raise OSError(ECONNRESET)
+            return
+        self._ping_sent = now
+        self._send(_PINGREQ)
+
+    # ---------------- 接收 ----------------
+
+    async def _readinto(self, mv):
+        reader = self._reader
+        if hasattr(reader, 'readinto'):
+            return await reader.readinto(mv)
+        data = await reader.read(len(mv))
+        n = len(data)
+        mv[:n] = data
+        return n
+
+    async def _read_loop(self):
+        mv = self._rmv
+        try:
+            while True:
+                n = await self._readinto(mv)
+                if not n:
+                    break
+                self._parser.feed(mv, n)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        self._close_stream()
+
+    def _handle(self, header, mv, length):
+        ptype = header & 0xF0
+        if ptype == PUBLISH:
+            qos = (header >> 1) & 0x03
+            tlen = (mv[0] << 8) | mv[1]
+            topic = bytes(mv[2:2 + tlen])
+            o = 2 + tlen
+            if qos:
+                pid_hi = mv[o]
+                pid_lo = mv[o + 1]
+                o += 2
+                if self._writer is not None:
+                    self._ack[2] = pid_hi
+                    self._ack[3] = pid_lo
+                    self._send(bytes(self._ack))
+            if len(self._inbox) >= self.inbox_size:
+                self._inbox.pop(0)
+                self.inbox_dropped += 1
+            self._inbox.append((topic, bytes(mv[o:length])))
+        elif ptype == PUBACK:
+            pid = (mv[0] << 8) | mv[1]
+            pids = self._slot_pid
+            for i in range(self.window):
+                if pids[i] == pid:
+                    pids[i] = 0
+                    self._inflight -= 1
+                    self.acked += 1
+                    ms = time.ticks_diff(time.ticks_ms(), self._slot_time[i])
+                    self.ack_ms_sum += ms
+                    if ms > self.ack_ms_max:
+                        self.ack_ms_max = ms
+                    if self.on_ack is not None:
+                        self.on_ack(ms)
+                    self._window_free.set()
+                    break
+        elif ptype == CONNACK:
+            self._connack_rc = mv[1]
+            self._connack.set()
+        elif ptype == PINGRESP:
+            self._ping_sent = None
+        # SUBACK等其他报文无需处理
+
+    # 投递一条已收到的消息给回调；连接断开且没有待投递消息时抛出OSError
+    def check_msg(self):
+        if self._inbox:
+            topic, msg = self._inbox.pop(0)
+            if self.cb:
+                self.cb(topic, msg)
+            return None
+        self._check_connected()
+        return None
+
+    def wait_msg(self):
+        return self.check_msg()
+
+    def stats(self):
+        return {
+            'published': self.published,
+            'acked': self.acked,
+            'inflight': self._inflight,
+            'max_inflight': self.max_inflight,
+            'resent': self.resent,
+            'ack_avg': self.ack_ms_sum // self.acked if self.acked else 0,
+            'ack_max': self.ack_ms_max,
+            'oversized': self._parser.oversized,
+            'inbox_dropped': self.inbox_dropped,
+        }
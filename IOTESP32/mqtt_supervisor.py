@@ -0,0 +1,191 @@
+# MQTT连接监督器
+# 统一负责MQTT连接的建立、保活和重连决策，替代原先分散在主循环、发布和错误计数中的各自重连:
+#   - 状态: 未连接(disconnected) -> 已连接(connected)，连接失败后进入退避(backoff)，
+#     退避时间按指数增长并带随机抖动；连接断开后的第一次重连不等待
+#   - 保活: 最近ping_interval内既发送过报文又收到过代理的报文(如QoS1的PUBACK、订阅消息)时，
+#     链路已被证明可用，跳过PINGREQ；只有空闲时才发送
+#   - 发布、收消息等路径只报告结果: sent()/received()记录流量，lost()报告连接已断，
+#     error()报告非致命错误(连续max_errors次视为连接已断)
+# ensure()和keepalive()从不阻塞等待(除connect回调本身)，可在主循环或uasyncio任务中反复调用。
+import time
+
+try:
+    import random
+except ImportError:
+    import urandom as random
+
+STATE_DISCONNECTED = 0
+STATE_CONNECTED = 1
+STATE_BACKOFF = 2
+STATE_NAMES = ('disconnected', 'connected', 'backoff')
+
+
+def _default_log(message, level='INFO', *args):
+    print(f'[{level}] {message.format(*args) if args else message}')
+
+
+class ConnectionSupervisor:
+    # connect(): 建立连接并订阅，成功返回True；为None时由调用方(如异步客户端任务)自行连接后报告结果
+    # disconnect(): 关闭当前连接；ping(): 发送PINGREQ，失败时抛出异常
+    # on_reconnect(ms): 断开后重新连上时调用，参数为从断开到重新连上的时长
+    def __init__(self, connect, disconnect, ping, ping_interval=30000, backoff_min=1000,
+                 backoff_max=60000, max_errors=5, log=None, on_reconnect=None):
+        self.connect = connect
+        self.disconnect = disconnect
+        self.ping = ping
+        self.ping_interval = ping_interval
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.max_errors = max_errors
+        self.log = log or _default_log
+        self.on_reconnect = on_reconnect
+
+        self.state = STATE_DISCONNECTED
+        self._state_since = time.ticks_ms()
+        self._backoff_ms = 0
+        self._last_tx = 0
+        self._last_rx = 0
+        self._last_check = 0  # 上一次保活检查的时刻，每ping_interval检查一次
+        self.failures = 0  # 连续连接失败次数
+        self.errors = 0  # 连续非致命错误次数
+        self.attempts = 0  # 累计连接尝试次数
+        self.connects = 0  # 累计连接成功次数
+        self.disconnects = 0  # 已连接后断开的次数
+        self.pings = 0  # 发送的PINGREQ数
+        self.pings_skipped = 0  # 因有流量证明链路可用而省去的PINGREQ数
+        self.last_reason = None  # 最近一次断开的原因
+        self._lost_at = None  # 最近一次断开的时刻，重新连上后清除
+        self.downtime_last = 0  # 最近一次断开到重新连上的时长(毫秒)
+        self.downtime_max = 0
+
+    def isconnected(self):
+        return self.state == STATE_CONNECTED
+
+    def state_name(self):
+        return STATE_NAMES[self.state]
+
+    def _enter(self, state):
+        self.state = state
+        self._state_since = time.ticks_ms()
+
+    # 下一次退避时长: 指数增长，取一半固定加一半随机(equal jitter)，避免设备同时重连
+    def _next_backoff(self):
+        base = self.backoff_min << min(self.failures - 1, 16)
+        if base > self.backoff_max:
+            base = self.backoff_max
+        half = base // 2
+        return half + (random.getrandbits(16) * (base - half) >> 16)
+
+    # 现在是否应该发起连接: 未连接，或退避已到期
+    def should_attempt(self):
+        if self.state == STATE_DISCONNECTED:
+            return True
+        if self.state == STATE_BACKOFF:
+            return time.ticks_diff(time.ticks_ms(), self._state_since) >= self._backoff_ms
+        return False
+
+    # 报告一次连接尝试的结果
+    def attempt_done(self, ok):
+        self.attempts += 1
+        if ok:
+            now = time.ticks_ms()
+            self.connects += 1
+            self.failures = 0
+            self.errors = 0
+            self._last_tx = now
+            self._last_rx = now
+            self._last_check = now
+            self._enter(STATE_CONNECTED)
+            if self._lost_at is not None:
+                downtime = time.ticks_diff(now, self._lost_at)
+                self._lost_at = None
+                self.downtime_last = downtime
+                if downtime > self.downtime_max:
+                    self.downtime_max = downtime
+                if self.on_reconnect is not None:
+                    self.on_reconnect(downtime)
+            return
+        self.failures += 1
+        self._backoff_ms = self._next_backoff()
+        self.log('MQTT连接失败({}次)，{}ms后重试', 'WARNING', self.failures, self._backoff_ms)
+        self._enter(STATE_BACKOFF)
+
+    # 确保已连接: 未连接且退避到期时同步调用connect()，返回当前是否已连接
+    def ensure(self):
+        if self.state != STATE_CONNECTED and self.connect is not None and self.should_attempt():
+            try:
+                ok = self.connect()
+            except Exception as e:
+                self.log('MQTT连接异常: {}', 'ERROR', e)
+                ok = False
+            self.attempt_done(ok)
+        return self.state == STATE_CONNECTED
+
+    # 记录发送成功；acked为True表示已收到代理的确认(QoS1)，同时证明接收方向可用
+    def sent(self, acked=False):
+        now = time.ticks_ms()
+        self._last_tx = now
+        if acked:
+            self._last_rx = now
+        self.errors = 0
+
+    def received(self):
+        self._last_rx = time.ticks_ms()
+
+    # 每ping_interval检查一次: 这段时间内收发都有流量时跳过PINGREQ，否则发送；
+    # ping失败视为连接已断，返回是否仍连接
+    def keepalive(self):
+        if self.state != STATE_CONNECTED:
+            return False
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self._last_check) < self.ping_interval:
+            return True
+        self._last_check = now
+        if (time.ticks_diff(now, self._last_tx) < self.ping_interval
+                and time.ticks_diff(now, self._last_rx) < self.ping_interval):
+            self.pings_skipped += 1
+            return True
+        try:
+            self.ping()
+            self.pings += 1
+            # PINGRESP由收消息路径处理；未响应时由之后的收发发现连接已断
+            self._last_tx = now
+            self._last_rx = now
+            return True
+        except Exception as e:
+            self.lost(f'ping失败: {e}')
+            return False
+
+    # 连接已断开(收发抛出OSError等): 关闭连接，下一次ensure()立即重连
+    def lost(self, reason=None):
+        if self.state != STATE_CONNECTED:
+            return
+        self.disconnects += 1
+        self.last_reason = reason
+        self._lost_at = time.ticks_ms()
+        self.log('MQTT连接已断开: {}', 'WARNING', reason)
+        try:
+            self.disconnect()
+        except Exception:
+            pass
+        self.errors = 0
+        self._enter(STATE_DISCONNECTED)
+
+    # 非致命错误: 连续max_errors次后视为连接已断
+    def error(self, reason=None):
+        self.errors += 1
+        if self.max_errors and self.errors >= self.max_errors:
+            self.lost(f'连续{self.errors}次错误: {reason}')
+
+    def stats(self):
+        return {
+            'state': self.state_name(),
+            'attempts': self.attempts,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'pings': self.pings,
+            'pings_skipped': self.pings_skipped,
+            'failures': self.failures,
+            'downtime_last': self.downtime_last,
+            'downtime_max': self.downtime_max,
+        }
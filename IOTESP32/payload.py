@@ -0,0 +1,278 @@
+# 温度消息载荷编码与解码
+# 单条消息: {"temperature": 25.6, "timestamp": ..., "device_id": "...", "unit": "°C"}
+# 批量消息把多条样本合并为一条MQTT消息，device_id和unit只出现一次:
+#   {"device_id": "...", "unit": "°C", "timestamps": [...], "temperatures": [...]}
+# 附加传感器的读数发布到各自主题: {"device_id": "...", "sensor": "battery", "value": 3.71, "unit": "V", "timestamp": ...}
+# 二进制帧(PAYLOAD_FORMAT = 'binary')，网络字节序:
+#   uint8 版本号 | uint8 样本数N | N x (uint32 时间戳 + int16 温度x100)
+# 单条样本仅8字节；device_id不在载荷中，由发布主题的最后一段携带。
+# 压缩块(PAYLOAD_FORMAT = 'compressed'的批量和补发消息)的版本号为2，格式见compress.py，发布到同一主题。
+# encode_json_sample_into/encode_json_reading_into把单条JSON消息直接写入预分配缓冲区，字段顺序与json.dumps一致，
+# 数值按定点小数逐位写出(温度两位、读数三位)，字符串字段由json_string预先编码，稳态发布不再创建字典和字符串。
+# decode_json/decode_binary/decode供消费端(CPython)使用，统一解码为批量结构。
+import json
+import struct
+
+FORMAT_VERSION = 1
+FRAME_HEADER = '!BB'
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER)
+FRAME_SAMPLE = '!Ih'
+FRAME_SAMPLE_SIZE = struct.calcsize(FRAME_SAMPLE)
+MAX_FRAME_SAMPLES = 255
+
+
+# 给定样本数的二进制帧长度
+def binary_frame_size(count):
+    return FRAME_HEADER_SIZE + count * FRAME_SAMPLE_SIZE
+
+
+# 温度转为int16的百分之一摄氏度，超出范围时截断
+def _centi(value):
+    centi = int(round(value * 100))
+    if centi > 32767:
+        return 32767
+    if centi < -32768:
+        return -32768
+    return centi
+
+
+# 编码批量温度消息，温度保留两位小数，与单条消息一致；extra中的字段原样附加
+def encode_json_batch(device_id, timestamps, values, unit='°C', extra=None):
+    message = {
+        'device_id': device_id,
+        'unit': unit,
+        'timestamps': list(timestamps),
+        'temperatures': [round(v, 2) for v in values],
+    }
+    if extra:
+        message.update(extra)
+    return json.dumps(message).encode()
+
+
+# 预先编码的JSON字段名
+_KEY_TEMPERATURE = b'{"temperature": '
+_KEY_TIMESTAMP = b', "timestamp": '
+_KEY_DEVICE_ID = b', "device_id": '
+_KEY_UNIT = b', "unit": '
+_KEY_SUPPRESSED = b', "suppressed": '
+_KEY_BATTERY = b', "battery": '
+_KEY_READING = b'{"device_id": '
+_KEY_SENSOR = b', "sensor": '
+_KEY_VALUE = b', "value": '
+_UNIT_CELSIUS = json.dumps('°C').encode()
+# 单条JSON消息除device_id外的最大长度，用于确定预分配缓冲区大小
+JSON_SAMPLE_SIZE = 160
+_FIXED_LIMIT = 1000000000  # 定点写出的数值上限，超出时由调用方改用json.dumps
+
+
+# 把字符串编码为带引号的JSON字符串字节，供上面的写入函数使用(在初始化时调用一次)
+def json_string(value):
+    return json.dumps(value).encode()
+
+
+# 把data逐字节写入buf的offset处，返回新的offset(逐字节复制不创建切片对象)
+def _put_bytes(buf, offset, data):
+    for i in range(len(data)):
+        buf[offset + i] = data[i]
+    return offset + len(data)
+
+
+# 写出非负整数的十进制数字，width为最少位数(不足时补0)，返回新的offset
+def _put_digits(buf, offset, value, width=1):
+    digits = 1
+    scale = 1
+    while value >= scale * 10 or digits < width:
+        scale *= 10
+        digits += 1
+    while scale:
+        buf[offset] = 48 + value // scale % 10
+        offset += 1
+        scale //= 10
+    return offset
+
+
+# 写出整数，返回新的offset
+def _put_int(buf, offset, value):
+    if value < 0:
+        buf[offset] = 45  # '-'
+        offset += 1
+        value = -value
+    return _put_digits(buf, offset, value)
+
+
+# 把数值按decimals位定点小数写出，例如25.6 -> 25.60；非有限值或绝对值过大时抛出ValueError
+def _put_fixed(buf, offset, value, decimals):
+    if not -_FIXED_LIMIT < value < _FIXED_LIMIT:
+        raise ValueError('数值超出定点编码范围')
+    scale = 10 ** decimals
+    scaled = int(round(value * scale))
+    if scaled < 0:
+        buf[offset] = 45
+        offset += 1
+        scaled = -scaled
+    offset = _put_digits(buf, offset, scaled // scale)
+    buf[offset] = 46  # '.'
+    return _put_digits(buf, offset + 1, scaled % scale, decimals)
+
+
+# 把一条温度样本编码为JSON写入buf，返回消息长度；device_id为json_string()的结果，suppressed/battery为None时省略
+def encode_json_sample_into(buf, device_id, timestamp, value, suppressed=None, battery=None):
+    offset = _put_bytes(buf, 0, _KEY_TEMPERATURE)
+    offset = _put_fixed(buf, offset, value, 2)
+    offset = _put_bytes(buf, offset, _KEY_TIMESTAMP)
+    offset = _put_int(buf, offset, timestamp)
+    offset = _put_bytes(buf, offset, _KEY_DEVICE_ID)
+    offset = _put_bytes(buf, offset, device_id)
+    offset = _put_bytes(buf, offset, _KEY_UNIT)
+    offset = _put_bytes(buf, offset, _UNIT_CELSIUS)
+    if suppressed is not None:
+        offset = _put_bytes(buf, offset, _KEY_SUPPRESSED)
+        offset = _put_int(buf, offset, suppressed)
+    if battery is not None:
+        offset = _put_bytes(buf, offset, _KEY_BATTERY)
+        offset = _put_fixed(buf, offset, battery, 2)
+    buf[offset] = 125  # '}'
+    return offset + 1
+
+
+# 把一条附加传感器读数编码为JSON写入buf，返回消息长度；device_id/sensor/unit为json_string()的结果
+def encode_json_reading_into(buf, device_id, sensor, timestamp, value, unit):
+    offset = _put_bytes(buf, 0, _KEY_READING)
+    offset = _put_bytes(buf, offset, device_id)
+    offset = _put_bytes(buf, offset, _KEY_SENSOR)
+    offset = _put_bytes(buf, offset, sensor)
+    offset = _put_bytes(buf, offset, _KEY_VALUE)
+    offset = _put_fixed(buf, offset, value, 3)
+    offset = _put_bytes(buf, offset, _KEY_UNIT)
+    offset = _put_bytes(buf, offset, unit)
+    offset = _put_bytes(buf, offset, _KEY_TIMESTAMP)
+    offset = _put_int(buf, offset, timestamp)
+    buf[offset] = 125
+    return offset + 1
+
+
+# 编码一条附加传感器读数，数值保留三位小数
+def encode_json_reading(device_id, sensor, timestamp, value, unit=''):
+    return json.dumps({
+        'device_id': device_id,
+        'sensor': sensor,
+        'value': round(value, 3),
+        'unit': unit,
+        'timestamp': timestamp,
+    }).encode()
+
+
+# 把一条样本编码进预分配缓冲区，返回帧长度
+def encode_binary_sample_into(buf, timestamp, value):
+    struct.pack_into(FRAME_HEADER, buf, 0, FORMAT_VERSION, 1)
+    struct.pack_into(FRAME_SAMPLE, buf, FRAME_HEADER_SIZE, timestamp & 0xFFFFFFFF, _centi(value))
+    return FRAME_HEADER_SIZE + FRAME_SAMPLE_SIZE
+
+
+# 把一批样本编码进预分配缓冲区，返回帧长度
+def encode_binary_into(buf, timestamps, values):
+    count = len(values)
+    if count > MAX_FRAME_SAMPLES:
+        raise ValueError(f'单帧最多{MAX_FRAME_SAMPLES}条样本')
+    struct.pack_into(FRAME_HEADER, buf, 0, FORMAT_VERSION, count)
+    offset = FRAME_HEADER_SIZE
+    for i in range(count):
+        struct.pack_into(FRAME_SAMPLE, buf, offset, timestamps[i] & 0xFFFFFFFF, _centi(values[i]))
+        offset += FRAME_SAMPLE_SIZE
+    return offset
+
+
+# 编码一批样本为新的bytes对象(参考实现，设备上优先使用encode_binary_into)
+def encode_binary(timestamps, values):
+    buf = bytearray(binary_frame_size(len(values)))
+    encode_binary_into(buf, timestamps, values)
+    return bytes(buf)
+
+
+# 由主题最后一段解析设备ID，例如 esp32/s3/temperature/bin/<device_id>
+def device_id_from_topic(topic):
+    if topic is None:
+        return None
+    if isinstance(topic, (bytes, bytearray)):
+        topic = bytes(topic).decode()
+    return topic.rsplit('/', 1)[-1]
+
+
+# 解码二进制帧，返回与decode_json相同的结构
+def decode_binary(data, topic=None):
+    data = bytes(data)
+    if len(data) < FRAME_HEADER_SIZE:
+        raise ValueError('二进制帧过短')
+    version, count = struct.unpack_from(FRAME_HEADER, data, 0)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'不支持的帧版本: {version}')
+    if len(data) != binary_frame_size(count):
+        raise ValueError(f'帧长度与样本数不符: {len(data)}字节, {count}条')
+    timestamps = []
+    temperatures = []
+    offset = FRAME_HEADER_SIZE
+    for _ in range(count):
+        timestamp, centi = struct.unpack_from(FRAME_SAMPLE, data, offset)
+        timestamps.append(timestamp)
+        temperatures.append(centi / 100)
+        offset += FRAME_SAMPLE_SIZE
+    return {
+        'device_id': device_id_from_topic(topic),
+        'unit': '°C',
+        'timestamps': timestamps,
+        'temperatures': temperatures,
+    }
+
+
+# 解码压缩块，返回与decode_json相同的结构
+def decode_compressed(data, topic=None):
+    from compress import decode_block
+    timestamps, temperatures = decode_block(data)
+    return {
+        'device_id': device_id_from_topic(topic),
+        'unit': '°C',
+        'timestamps': timestamps,
+        'temperatures': temperatures,
+    }
+
+
+# 自动识别格式并解码：JSON消息以'{'开头，首字节为压缩块版本号时按压缩块处理，其余按二进制帧处理
+def decode(data, topic=None):
+    data = bytes(data)
+    if data[:1] == b'{':
+        return decode_json(data)
+    if data[:1] == b'\x02':
+        return decode_compressed(data, topic)
+    return decode_binary(data, topic)
+
+
+# 解码温度消息(单条或批量)或附加传感器读数，返回字典:
+#   {'device_id': ..., 'unit': ..., 'timestamps': [...], 'temperatures': [...]}
+def decode_json(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode()
+    message = json.loads(data)
+    if not isinstance(message, dict):
+        raise ValueError('温度消息必须是JSON对象')
+
+    if 'temperatures' in message:
+        timestamps = message.get('timestamps') or []
+        temperatures = message['temperatures']
+        if len(timestamps) != len(temperatures):
+            raise ValueError('timestamps与temperatures长度不一致')
+    elif 'temperature' in message:
+        timestamps = [message.get('timestamp')]
+        temperatures = [message['temperature']]
+    elif 'value' in message:
+        # 附加传感器读数，数值同样放在temperatures中
+        timestamps = [message.get('timestamp')]
+        temperatures = [message['value']]
+    else:
+        raise ValueError('不是温度消息')
+
+    return {
+        'device_id': message.get('device_id'),
+        'unit': message.get('unit', '°C'),
+        'timestamps': list(timestamps),
+        'temperatures': [float(v) for v in temperatures],
+    }
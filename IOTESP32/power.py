@@ -0,0 +1,173 @@
+# 低功耗占空比模式支持
+# 深度睡眠会清空RAM，只有RTC内存(ESP32上最多2048字节)保留下来。
+# RetainedState把采样所需的最小状态紧凑地打包进RTC内存:
+#   头部: 魔数'DCS1', 版本, 标志, 样本序号, 虚拟时钟, 唤醒次数, 发布次数, 上次唤醒到发布耗时
+#   网络缓存: AP的BSSID和信道、静态IP配置、MQTT代理IP(用于唤醒后快速重连)
+#   发布策略: 上次发布值和时刻、统计计数
+#   滤波器状态(float列表) 和 待发布样本(uint32时间戳 + float温度)
+# 睡眠期间ticks_ms会归零，样本时间戳改用虚拟时钟clock_ms(睡前累计毫秒数 + 本次唤醒后的ticks)。
+import struct
+import machine
+
+MAGIC = b'DCS1'
+VERSION = 1
+RTC_MEMORY_SIZE = 2048
+
+HEADER_FORMAT = '<4sHHIIIIIHH'  # 魔数, 版本, 标志, seq, clock_ms, wakes, publishes, last_wake_ms, 滤波状态数, 待发样本数
+NET_FORMAT = '<6sB4s4s4s4s4s'  # bssid, channel, ip, mask, gateway, dns, broker_ip
+POLICY_FORMAT = '<fIIII'  # last_value, last_time, published, suppressed, heartbeats
+SAMPLE_FORMAT = '<If'
+
+FLAG_NET = 0x01
+FLAG_POLICY = 0x02
+
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+NET_SIZE = struct.calcsize(NET_FORMAT)
+POLICY_SIZE = struct.calcsize(POLICY_FORMAT)
+SAMPLE_SIZE = struct.calcsize(SAMPLE_FORMAT)
+
+
+def ip_to_bytes(ip):
+    if not ip:
+        return b'\x00\x00\x00\x00'
+    return bytes(int(part) for part in ip.split('.'))
+
+
+def bytes_to_ip(data):
+    return '.'.join(str(b) for b in data)
+
+
+# 网络缓存(bssid, channel, ifconfig, broker_ip)按NET_FORMAT写入buf[offset:]，未知的BSSID和代理IP写为全零
+# (也用于fast_boot的flash缓存)
+def pack_net(buf, offset, net):
+    bssid, channel, ifconfig, broker_ip = net
+    struct.pack_into(NET_FORMAT, buf, offset, bssid or b'', channel or 0,
+                     ip_to_bytes(ifconfig[0]), ip_to_bytes(ifconfig[1]),
+                     ip_to_bytes(ifconfig[2]), ip_to_bytes(ifconfig[3]), ip_to_bytes(broker_ip))
+
+
+def unpack_net(data, offset):
+    bssid, channel, ip, mask, gw, dns, broker_ip = struct.unpack_from(NET_FORMAT, data, offset)
+    broker_ip = bytes_to_ip(broker_ip)
+    return (bssid if bssid != b'\x00' * 6 else None, channel,
+            (bytes_to_ip(ip), bytes_to_ip(mask), bytes_to_ip(gw), bytes_to_ip(dns)),
+            broker_ip if broker_ip != '0.0.0.0' else None)
+
+
+# 本次启动是否由深度睡眠唤醒
+def woke_from_deepsleep():
+    try:
+        return machine.reset_cause() == machine.DEEPSLEEP_RESET
+    except AttributeError:
+        return False
+
+
+# 进入睡眠: deepsleep不会返回(芯片复位后重新执行main.py)，lightsleep在到期后返回
+def sleep(mode, ms):
+    ms = max(0, int(ms))
+    if mode == 'deepsleep':
+        machine.deepsleep(ms)
+    else:
+        machine.lightsleep(ms)
+
+
+class RetainedState:
+    def __init__(self, max_pending=128):
+        self.max_pending = max_pending
+        self.seq = 0  # 累计采样序号
+        self.clock_ms = 0  # 虚拟时钟: 截至本次唤醒的累计毫秒数
+        self.wakes = 0
+        self.publishes = 0
+        self.last_wake_ms = 0  # 上一次唤醒到发布完成的耗时
+        self.net = None  # (bssid, channel, (ip, mask, gw, dns), broker_ip)
+        self.policy = None  # (last_value, last_time, published, suppressed, heartbeats)
+        self.filter_state = []
+        self.pending_timestamps = []
+        self.pending_values = []
+        self.dropped = 0  # 本次运行中因待发队列满而丢弃的样本数(不保存)
+
+    # 追加一条待发布样本，队列满时丢弃最旧的
+    def add_pending(self, timestamp, value):
+        if len(self.pending_values) >= self.max_pending:
+            self.pending_timestamps.pop(0)
+            self.pending_values.pop(0)
+            self.dropped += 1
+        self.pending_timestamps.append(timestamp & 0xFFFFFFFF)
+        self.pending_values.append(value)
+        self.seq += 1
+
+    def clear_pending(self, n=None):
+        if n is None:
+            n = len(self.pending_values)
+        del self.pending_timestamps[:n]
+        del self.pending_values[:n]
+
+    def size(self):
+        size = HEADER_SIZE + len(self.filter_state) * 4 + len(self.pending_values) * SAMPLE_SIZE
+        if self.net:
+            size += NET_SIZE
+        if self.policy:
+            size += POLICY_SIZE
+        return size
+
+    def pack(self):
+        # 超出RTC内存时从最旧的待发样本开始舍弃
+        while self.pending_values and self.size() > RTC_MEMORY_SIZE:
+            self.clear_pending(1)
+            self.dropped += 1
+
+        buf = bytearray(self.size())
+        flags = (FLAG_NET if self.net else 0) | (FLAG_POLICY if self.policy else 0)
+        struct.pack_into(HEADER_FORMAT, buf, 0, MAGIC, VERSION, flags, self.seq, self.clock_ms & 0xFFFFFFFF,
+                         self.wakes, self.publishes, self.last_wake_ms, len(self.filter_state), len(self.pending_values))
+        offset = HEADER_SIZE
+        if self.net:
+            pack_net(buf, offset, self.net)
+            offset += NET_SIZE
+        if self.policy:
+            struct.pack_into(POLICY_FORMAT, buf, offset, *self.policy)
+            offset += POLICY_SIZE
+        for value in self.filter_state:
+            struct.pack_into('<f', buf, offset, value)
+            offset += 4
+        for i in range(len(self.pending_values)):
+            struct.pack_into(SAMPLE_FORMAT, buf, offset, self.pending_timestamps[i], self.pending_values[i])
+            offset += SAMPLE_SIZE
+        return buf
+
+    def unpack(self, data):
+        if len(data) < HEADER_SIZE:
+            return False
+        (magic, version, flags, self.seq, self.clock_ms, self.wakes, self.publishes,
+         self.last_wake_ms, n_filter, n_pending) = struct.unpack_from(HEADER_FORMAT, data, 0)
+        if magic != MAGIC or version != VERSION:
+            return False
+        offset = HEADER_SIZE
+        self.net = None
+        if flags & FLAG_NET:
+            self.net = unpack_net(data, offset)
+            offset += NET_SIZE
+        self.policy = None
+        if flags & FLAG_POLICY:
+            self.policy = struct.unpack_from(POLICY_FORMAT, data, offset)
+            offset += POLICY_SIZE
+        self.filter_state = [struct.unpack_from('<f', data, offset + i * 4)[0] for i in range(n_filter)]
+        offset += n_filter * 4
+        self.pending_timestamps = []
+        self.pending_values = []
+        for _ in range(n_pending):
+            timestamp, value = struct.unpack_from(SAMPLE_FORMAT, data, offset)
+            self.pending_timestamps.append(timestamp)
+            self.pending_values.append(value)
+            offset += SAMPLE_SIZE
+        return True
+
+    def save(self):
+        machine.RTC().memory(self.pack())
+
+    # 从RTC内存恢复，内容无效时返回False
+    def load(self):
+        try:
+            return self.unpack(machine.RTC().memory())
+        except Exception:
+            return False
@@ -0,0 +1,53 @@
+# 按变化上报(report-by-exception)的发布策略
+# 滤波后的温度相对上次发布值变化超过死区(绝对值或相对比例)时才发布；
+# 若连续静默超过心跳间隔，则无论是否变化都发布一次，证明设备仍在线。
+import time
+
+REL_FLOOR = 1.0  # 相对死区的基准下限: 上次发布值接近0时按该值计算，避免死区缩为0、每个样本都放行
+
+
+class DeadbandPolicy:
+    def __init__(self, absolute=0.2, relative=0.0, heartbeat=300000):
+        if absolute < 0 or relative < 0 or heartbeat < 0:
+            raise ValueError('死区和心跳间隔不能为负数')
+        self.absolute = absolute
+        self.relative = relative
+        self.heartbeat = heartbeat  # 最长静默时间(毫秒)，0表示不发心跳
+        self.last_value = None
+        self.last_time = 0
+        self.published = 0  # 放行的样本数
+        self.suppressed = 0  # 被死区抑制的样本数
+        self.heartbeats = 0  # 因心跳到期而放行的样本数
+
+    # 判断样本是否需要发布；被抑制时计数并返回False
+    def should_publish(self, value, now=None):
+        if self.last_value is None:
+            return True
+        if not self.absolute and not self.relative:
+            return True
+
+        delta = abs(value - self.last_value)
+        if self.absolute and delta >= self.absolute:
+            return True
+        if self.relative and delta >= max(abs(self.last_value), REL_FLOOR) * self.relative:
+            return True
+
+        if now is None:
+            now = time.ticks_ms()
+        if self.heartbeat and time.ticks_diff(now, self.last_time) >= self.heartbeat:
+            self.heartbeats += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    # 记录一次成功发布的值和时刻，作为后续比较的基准
+    def record(self, value, now=None):
+        self.last_value = value
+        self.last_time = time.ticks_ms() if now is None else now
+        self.published += 1
+
+    def reset(self):
+        self.last_value = None
+
+    def stats(self):
+        return {'published': self.published, 'suppressed': self.suppressed, 'heartbeats': self.heartbeats}
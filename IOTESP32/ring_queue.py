@@ -0,0 +1,46 @@
+# 线程间有界队列(单生产者单消费者)
+# 双线程模式(THREAD_MODE)下实时线程和网络线程之间传递读数和控制消息。与timer_sampler的环形缓冲区一样，
+# 生产者只修改_head、消费者只修改_tail，各自只读取对方的索引，不需要锁:
+# 生产者先写入槽位再推进_head，消费者看到新的_head时槽位已经写好。
+# 单个列表元素和整数属性的赋值在MicroPython(GIL)和CPython上都是原子的。
+# 队列满时push返回False并计入overflows，由调用方决定丢弃还是留在原处稍后再取。
+
+
+class RingQueue:
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError('队列容量必须大于0')
+        self.size = size
+        self._slots = [None] * (size + 1)  # 空出一个槽位区分空和满
+        self._head = 0  # 只由生产者修改
+        self._tail = 0  # 只由消费者修改
+        self.pushed = 0  # 放入的总条数(生产者计数)
+        self.overflows = 0  # 队列满而未放入的条数(生产者计数)
+
+    def __len__(self):
+        return (self._head - self._tail) % len(self._slots)
+
+    def full(self):
+        return (self._head + 1) % len(self._slots) == self._tail
+
+    # 生产者调用: 放入一项，队列满时返回False
+    def push(self, item):
+        head = self._head
+        following = (head + 1) % len(self._slots)
+        if following == self._tail:
+            self.overflows += 1
+            return False
+        self._slots[head] = item
+        self._head = following
+        self.pushed += 1
+        return True
+
+    # 消费者调用: 取出最早的一项，队列为空时返回None
+    def pop(self):
+        tail = self._tail
+        if tail == self._head:
+            return None
+        item = self._slots[tail]
+        self._slots[tail] = None
+        self._tail = (tail + 1) % len(self._slots)
+        return item
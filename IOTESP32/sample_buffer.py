@@ -0,0 +1,161 @@
+# 断网期间的温度样本持久化缓冲区(store-and-forward)
+# 样本以定长二进制记录保存在预分配的flash文件中，按环形缓冲区组织:
+#   文件头(24字节): 魔数 'SFB1', 版本, 记录长度, 容量, 读指针head, 记录数count, 丢弃数dropped
+#   记录区: capacity条记录，每条为 uint32时间戳(ticks_ms) + float32温度，共8字节
+# 读写指针随每次写入/取出更新到文件头，掉电重启后可以继续补发。
+import struct
+
+try:
+    import os
+except ImportError:
+    import uos as os
+
+MAGIC = b'SFB1'
+VERSION = 1
+HEADER_FORMAT = '<4sHHIIII'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+STATE_FORMAT = '<III'  # head, count, dropped
+STATE_OFFSET = 12
+RECORD_FORMAT = '<If'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+DROP_OLDEST = 'oldest'  # 缓冲区满时覆盖最旧的记录
+DROP_NEWEST = 'newest'  # 缓冲区满时丢弃新写入的记录
+
+
+class SampleBuffer:
+    def __init__(self, path, capacity=1024, drop_policy=DROP_OLDEST, batch_size=32):
+        if capacity < 1:
+            raise ValueError('缓冲区容量必须大于0')
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f'未知的丢弃策略: {drop_policy}')
+        self.path = path
+        self.capacity = capacity
+        self.drop_policy = drop_policy
+        self.batch_size = batch_size
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+
+        # 预分配的记录和批量读取缓冲区，稳态下读写不再分配内存
+        self._record = bytearray(RECORD_SIZE)
+        self._state = bytearray(struct.calcsize(STATE_FORMAT))
+        self._batch = bytearray(RECORD_SIZE * batch_size)
+        self._batch_mv = memoryview(self._batch)
+
+        self._file = self._open()
+
+    # 打开已有文件并校验文件头；文件不存在或参数不一致时重新预分配
+    def _open(self):
+        try:
+            f = open(self.path, 'r+b')
+            header = f.read(HEADER_SIZE)
+            if len(header) == HEADER_SIZE:
+                magic, version, record_size, capacity, head, count, dropped = struct.unpack(HEADER_FORMAT, header)
+                if (magic == MAGIC and version == VERSION and record_size == RECORD_SIZE
+                        and capacity == self.capacity and head < capacity and count <= capacity):
+                    self.head, self.count, self.dropped = head, count, dropped
+                    return f
+            f.close()
+        except OSError:
+            pass
+        return self._create()
+
+    def _create(self):
+        f = open(self.path, 'wb')
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_SIZE, self.capacity, 0, 0, 0))
+        # 分块写零，避免一次性分配整个记录区
+        chunk = bytearray(RECORD_SIZE * 64)
+        remaining = self.capacity * RECORD_SIZE
+        while remaining > 0:
+            n = min(remaining, len(chunk))
+            f.write(chunk if n == len(chunk) else memoryview(chunk)[:n])
+            remaining -= n
+        f.close()
+        self.head = self.count = self.dropped = 0
+        return open(self.path, 'r+b')
+
+    def _save_state(self):
+        struct.pack_into(STATE_FORMAT, self._state, 0, self.head, self.count, self.dropped)
+        self._file.seek(STATE_OFFSET)
+        self._file.write(self._state)
+        self._file.flush()
+
+    def __len__(self):
+        return self.count
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    # 写入一条样本，缓冲区满且策略为DROP_NEWEST时返回False
+    def push(self, timestamp, value):
+        if self.count >= self.capacity:
+            self.dropped += 1
+            if self.drop_policy == DROP_NEWEST:
+                self._save_state()
+                return False
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+
+        index = (self.head + self.count) % self.capacity
+        struct.pack_into(RECORD_FORMAT, self._record, 0, timestamp & 0xFFFFFFFF, value)
+        self._file.seek(HEADER_SIZE + index * RECORD_SIZE)
+        self._file.write(self._record)
+        self.count += 1
+        self._save_state()
+        return True
+
+    # 读取最旧的至多n条样本(不移除)，返回(时间戳列表, 温度列表)
+    def peek(self, n=None):
+        if n is None or n > self.batch_size:
+            n = self.batch_size
+        n = min(n, self.count)
+        timestamps = []
+        values = []
+        if n <= 0:
+            return timestamps, values
+
+        # 环形区可能回绕，最多分两段读取
+        first = min(n, self.capacity - self.head)
+        self._file.seek(HEADER_SIZE + self.head * RECORD_SIZE)
+        self._file.readinto(self._batch_mv[:first * RECORD_SIZE])
+        if first < n:
+            self._file.seek(HEADER_SIZE)
+            self._file.readinto(self._batch_mv[first * RECORD_SIZE:n * RECORD_SIZE])
+
+        for i in range(n):
+            timestamp, value = struct.unpack_from(RECORD_FORMAT, self._batch, i * RECORD_SIZE)
+            timestamps.append(timestamp)
+            values.append(value)
+        return timestamps, values
+
+    # 移除最旧的n条样本(通常在peek出的批次发布成功后调用)
+    def pop(self, n):
+        n = min(n, self.count)
+        if n <= 0:
+            return 0
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+        self._save_state()
+        return n
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self._save_state()
+
+    def stats(self):
+        return {'count': self.count, 'capacity': self.capacity, 'dropped': self.dropped}
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+# 删除缓冲区文件(用于重置)
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
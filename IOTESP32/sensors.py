@@ -0,0 +1,308 @@
+# 多传感器注册表
+# 每个传感器声明自己的读取函数、采样周期、滤波链和发布主题，由一个调度器统一按各自的绝对时间表采样:
+#   - SensorRegistry.poll(now, handler)依次读取所有已到期的传感器，把读数交给handler，
+#     主循环和asyncio采样任务都只调用这一个入口，新增传感器不需要新增循环或任务
+#   - next_delay(now)给出距最早到期传感器的毫秒数，asyncio模式下据此睡眠
+#   - 每个传感器统计读取次数、失败次数、读取耗时(微秒)和调度抖动(实际读取时刻晚于计划时刻的毫秒数)
+# 驱动: 'adc'(ADC通道电压，可乘分压系数) 和 'sht3x'(I2C温湿度，同一器件的温度和湿度两个通道共用一次测量)。
+import time
+
+from machine import Pin, ADC, I2C
+from temp_filter import build_chain
+
+DRIVERS = ('adc', 'sht3x')
+SHT3X_CHANNELS = ('temperature', 'humidity')
+INVALID_READING = ValueError('读数为NaN或超出有效范围')  # 无效读数的last_error，预先创建，定时器回调中不分配
+
+
+class Sensor:
+    # read(): 返回原始读数，失败时返回None或抛出异常；filter: 提供update()的滤波链，None表示不滤波
+    # valid_min/valid_max: 加偏移后的有效范围，None表示不限；NaN和超出范围的读数按读取失败处理，不进入滤波链
+    def __init__(self, name, read, period, filter=None, topic=None, unit='', offset=0.0, valid_min=None,
+                 valid_max=None):
+        if period < 1:
+            raise ValueError(f'传感器{name}的采样周期必须大于0')
+        self.name = name
+        self._read = read
+        self.period = period
+        self.filter = filter
+        self.topic = topic
+        self.unit = unit
+        self.offset = offset
+        self.valid_min = valid_min
+        self.valid_max = valid_max
+        self.due = None  # 下一次计划采样时刻(ticks_ms)，None表示不由注册表调度(如定时器采样)
+        self.last = None  # 最近一次成功读数(已滤波)
+        self.last_error = None
+        self.reads = 0
+        self.failures = 0
+        self.invalid = 0  # NaN或超出有效范围而丢弃的读数(同时计入failures)
+        self.last_invalid = None  # 最近一次无效读数(原始值)
+        self.skipped = 0  # 落后超过一个周期而放弃的采样点
+        self.read_us = 0  # 累计读取耗时
+        self.read_us_max = 0
+        self.jitter_ms = 0  # 累计调度抖动
+        self.jitter_max = 0
+        self.encoded = None  # 发布路径预先编码的主题和字段，首次发布时填充
+
+    # 读取一次原始值并记录读取耗时，失败或读数无效时返回None(可在定时器调度的回调中调用，不经过滤波链)
+    def acquire(self):
+        start = time.ticks_us()
+        try:
+            value = self._read()
+        except Exception as e:
+            self.last_error = e
+            value = None
+        else:
+            if value is not None and not self.valid(value):
+                self.last_error = INVALID_READING
+                self.last_invalid = value
+                self.invalid += 1
+                value = None
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        self.reads += 1
+        self.read_us += elapsed
+        if elapsed > self.read_us_max:
+            self.read_us_max = elapsed
+        if value is None:
+            self.failures += 1
+            return None
+        return float(value)
+
+    # 原始读数加偏移后是否为有效数值(NaN不等于自身)
+    def valid(self, value):
+        value += self.offset
+        if value != value:
+            return False
+        if self.valid_min is not None and value < self.valid_min:
+            return False
+        return self.valid_max is None or value <= self.valid_max
+
+    # 原始值加偏移并经滤波链处理，成为最近读数
+    def process(self, value):
+        if value is None:
+            return None
+        value += self.offset
+        if self.filter is not None:
+            value = self.filter.update(value)
+        self.last = value
+        return value
+
+    # 读取一次(加偏移并经滤波链处理)；失败时返回None
+    def read(self):
+        return self.process(self.acquire())
+
+    # 修改采样周期: 下一次采样改为上一次计划采样时刻加新周期，该时刻已过则立即采样
+    def set_period(self, period, now=None):
+        if period < 1:
+            raise ValueError(f'传感器{self.name}的采样周期必须大于0')
+        if self.due is not None:
+            now = time.ticks_ms() if now is None else now
+            due = time.ticks_add(self.due, period - self.period)
+            self.due = due if time.ticks_diff(due, now) > 0 else now
+        self.period = period
+
+    def stats(self):
+        reads = self.reads or 1
+        return {
+            'period': self.period,
+            'reads': self.reads,
+            'failures': self.failures,
+            'invalid': self.invalid,
+            'skipped': self.skipped,
+            'read_us_avg': self.read_us // reads,
+            'read_us_max': self.read_us_max,
+            'jitter_avg': self.jitter_ms // reads,
+            'jitter_max': self.jitter_max,
+        }
+
+
+class SensorRegistry:
+    def __init__(self):
+        self.sensors = []
+
+    def __len__(self):
+        return len(self.sensors)
+
+    # 注册传感器，第一次采样在now(缺省为当前时刻)到期；scheduled为False时只登记(统计和查找)，由调用方自行采样
+    def add(self, sensor, now=None, scheduled=True):
+        if self.get(sensor.name) is not None:
+            raise ValueError(f'传感器名称重复: {sensor.name}')
+        if scheduled:
+            sensor.due = time.ticks_ms() if now is None else now
+        self.sensors.append(sensor)
+        return sensor
+
+    # 调度开始: 所有传感器立即到期，从now起重新计时(不把初始化耗时计入抖动)
+    def start(self, now=None):
+        now = time.ticks_ms() if now is None else now
+        for sensor in self.sensors:
+            if sensor.due is not None:
+                sensor.due = now
+
+    def get(self, name):
+        for sensor in self.sensors:
+            if sensor.name == name:
+                return sensor
+        return None
+
+    # 距最早到期的传感器还有多少毫秒，已有到期的返回0
+    def next_delay(self, now):
+        delay = None
+        for sensor in self.sensors:
+            if sensor.due is None:
+                continue
+            d = time.ticks_diff(sensor.due, now)
+            if delay is None or d < delay:
+                delay = d
+        if delay is None:
+            return 1000
+        return delay if delay > 0 else 0
+
+    # 读取所有已到期的传感器，对每个读数调用handler(sensor, now, value)，value为None表示读取失败；返回读取次数
+    def poll(self, now, handler):
+        count = 0
+        for sensor in self.sensors:
+            if sensor.due is None:
+                continue
+            late = time.ticks_diff(now, sensor.due)
+            if late < 0:
+                continue
+            sensor.jitter_ms += late
+            if late > sensor.jitter_max:
+                sensor.jitter_max = late
+            value = sensor.read()
+            # 按绝对时间表推进，避免周期随循环耗时漂移；落后超过一个周期时放弃错过的采样点，重新对齐
+            sensor.due = time.ticks_add(sensor.due, sensor.period)
+            if time.ticks_diff(now, sensor.due) >= 0:
+                sensor.skipped += time.ticks_diff(now, sensor.due) // sensor.period + 1
+                sensor.due = time.ticks_add(now, sensor.period)
+            handler(sensor, now, value)
+            count += 1
+        return count
+
+    def stats(self):
+        return {sensor.name: sensor.stats() for sensor in self.sensors}
+
+
+# ADC通道电压(伏)乘以scale(如电池分压比)；优先使用固件校准后的read_uv()
+class AdcReader:
+    def __init__(self, pin, scale=1.0, atten=None):
+        self.adc = ADC(Pin(pin))
+        if atten is not None:
+            self.adc.atten(atten)
+        self.scale = scale
+
+    def __call__(self):
+        try:
+            volts = self.adc.read_uv() / 1000000
+        except AttributeError:
+            volts = self.adc.read_u16() * 3.3 / 65535
+        return volts * self.scale
+
+
+# SHT3x温湿度传感器: 单次测量(低重复性，约4ms)；同一轮调度中两个通道先后读取时，max_age毫秒内的结果共用
+class SHT3x:
+    MEASURE = b'\x24\x16'  # 单次测量，不使用时钟延展，低重复性
+    MEASURE_MS = 5
+
+    def __init__(self, i2c, addr=0x44, max_age=50):
+        self.i2c = i2c
+        self.addr = addr
+        self.max_age = max_age
+        self._buf = bytearray(6)
+        self._time = None
+        self.temperature = None
+        self.humidity = None
+
+    @staticmethod
+    def crc8(data, start, end):
+        crc = 0xFF
+        for i in range(start, end):
+            crc ^= data[i]
+            for _ in range(8):
+                crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        return crc
+
+    def measure(self):
+        now = time.ticks_ms()
+        if self._time is not None and time.ticks_diff(now, self._time) < self.max_age:
+            return
+        self.i2c.writeto(self.addr, self.MEASURE)
+        time.sleep_ms(self.MEASURE_MS)
+        buf = self._buf
+        self.i2c.readfrom_into(self.addr, buf)
+        if self.crc8(buf, 0, 2) != buf[2] or self.crc8(buf, 3, 5) != buf[5]:
+            raise OSError('SHT3x CRC校验失败')
+        self.temperature = -45 + 175 * ((buf[0] << 8) | buf[1]) / 65535
+        self.humidity = 100 * ((buf[3] << 8) | buf[4]) / 65535
+        self._time = now
+
+    def read_temperature(self):
+        self.measure()
+        return self.temperature
+
+    def read_humidity(self):
+        self.measure()
+        return self.humidity
+
+
+# 校验一项传感器配置(不访问硬件)，错误时抛出ValueError
+def check_spec(spec):
+    name = spec.get('name')
+    if not name:
+        raise ValueError('传感器缺少name')
+    driver = spec.get('driver')
+    if driver not in DRIVERS:
+        raise ValueError(f'传感器{name}的驱动必须是{"、".join(DRIVERS)}之一')
+    if spec.get('period', 0) < 100:
+        raise ValueError(f'传感器{name}的采样周期不能小于100ms')
+    if driver == 'adc' and spec.get('pin') is None:
+        raise ValueError(f'传感器{name}缺少ADC引脚pin')
+    if driver == 'sht3x':
+        if spec.get('channel', 'temperature') not in SHT3X_CHANNELS:
+            raise ValueError(f'传感器{name}的channel必须是temperature或humidity')
+        if spec.get('scl') is None or spec.get('sda') is None:
+            raise ValueError(f'传感器{name}缺少I2C引脚scl/sda')
+    if spec.get('filter'):
+        _filter_chain(spec)
+
+
+def _filter_chain(spec):
+    return build_chain(
+        spec['filter'],
+        samples=spec.get('samples', 5),
+        ema_alpha=spec.get('ema_alpha', 0.3),
+        median_samples=spec.get('median_samples', 5),
+        kalman_q=spec.get('kalman_q', 0.01),
+        kalman_r=spec.get('kalman_r', 0.5)
+    )
+
+
+# 按配置创建传感器；topic缺省为topic_prefix/name。devices缓存已创建的I2C器件，同一器件的多个通道共用
+def create_sensor(spec, topic_prefix, devices=None):
+    check_spec(spec)
+    name = spec['name']
+    driver = spec['driver']
+    unit = spec.get('unit')
+    if driver == 'adc':
+        read = AdcReader(spec['pin'], spec.get('scale', 1.0), spec.get('atten'))
+        unit = 'V' if unit is None else unit
+    else:
+        key = (spec.get('bus', 0), spec['scl'], spec['sda'], spec.get('addr', 0x44))
+        device = devices.get(key) if devices is not None else None
+        if device is None:
+            i2c = I2C(key[0], scl=Pin(key[1]), sda=Pin(key[2]), freq=spec.get('freq', 400000))
+            device = SHT3x(i2c, key[3])
+            if devices is not None:
+                devices[key] = device
+        if spec.get('channel', 'temperature') == 'humidity':
+            read = device.read_humidity
+            unit = '%RH' if unit is None else unit
+        else:
+            read = device.read_temperature
+            unit = '°C' if unit is None else unit
+    topic = spec.get('topic') or topic_prefix + b'/' + name.encode()
+    filter = _filter_chain(spec) if spec.get('filter') else None
+    return Sensor(name, read, spec['period'], filter, topic, unit, spec.get('offset', 0.0),
+                  spec.get('valid_min'), spec.get('valid_max'))
@@ -0,0 +1,244 @@
+# 温度滤波流水线
+# 每个滤波器提供 update(x) -> 滤波后的值 和 reset()，可按顺序串联成FilterChain。
+# state()/restore()把内部状态导出为浮点数列表并恢复，用于深度睡眠前保存到RTC内存。
+# 环形缓冲区使用预分配的array('f')，滑动平均维护累加和，更新为O(1)；
+# 稳态下不再创建列表等容器对象(在浮点数装箱的移植上，浮点运算本身仍会产生临时对象)。
+from array import array
+
+# 滑动平均累加和每隔多少个窗口重新求和一次，消除浮点累计误差
+_RESUM_WINDOWS = 16
+
+
+# 滑动平均：窗口未满时直接输出原始值(与原有行为一致)
+class MovingAverage:
+    def __init__(self, samples=5):
+        if samples < 1:
+            raise ValueError('滑动平均样本数必须大于0')
+        self.samples = samples
+        self._ring = array('f', [0.0] * samples)
+        self.reset()
+
+    def reset(self):
+        for i in range(self.samples):
+            self._ring[i] = 0.0
+        self._sum = 0.0
+        self._index = 0
+        self._count = 0
+        self._until_resum = self.samples * _RESUM_WINDOWS
+
+    def ready(self):
+        return self._count >= self.samples
+
+    def update(self, x):
+        ring = self._ring
+        i = self._index
+        if self._count >= self.samples:
+            self._sum -= ring[i]
+        else:
+            self._count += 1
+        ring[i] = x
+        # 累加从数组读回的单精度值，保证减去时完全抵消
+        self._sum += ring[i]
+        i += 1
+        self._index = 0 if i >= self.samples else i
+
+        self._until_resum -= 1
+        if self._until_resum <= 0:
+            total = 0.0
+            for j in range(self._count):
+                total += ring[j]
+            self._sum = total
+            self._until_resum = self.samples * _RESUM_WINDOWS
+
+        if self._count < self.samples:
+            return x
+        return self._sum / self.samples
+
+    def state(self):
+        return [self._index, self._count] + list(self._ring)
+
+    # 从values[offset:]恢复状态，返回下一个滤波器的起始位置
+    def restore(self, values, offset=0):
+        self._index = int(values[offset])
+        self._count = int(values[offset + 1])
+        total = 0.0
+        for i in range(self.samples):
+            self._ring[i] = values[offset + 2 + i]
+        for i in range(self._count):
+            total += self._ring[i]
+        self._sum = total
+        return offset + 2 + self.samples
+
+
+# 指数滑动平均(EMA): y += alpha * (x - y)
+class ExponentialMovingAverage:
+    def __init__(self, alpha=0.3):
+        if not 0 < alpha <= 1:
+            raise ValueError('EMA系数必须在(0, 1]之间')
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self._value = None
+
+    def ready(self):
+        return self._value is not None
+
+    def update(self, x):
+        if self._value is None:
+            self._value = x
+        else:
+            self._value += self.alpha * (x - self._value)
+        return self._value
+
+    def state(self):
+        return [0.0, 0.0] if self._value is None else [1.0, self._value]
+
+    def restore(self, values, offset=0):
+        self._value = values[offset + 1] if values[offset] else None
+        return offset + 2
+
+
+# 中值滤波：剔除单点尖峰；窗口未满时取已有样本的中值
+class Median:
+    def __init__(self, samples=5):
+        if samples < 1:
+            raise ValueError('中值滤波样本数必须大于0')
+        self.samples = samples
+        self._ring = array('f', [0.0] * samples)
+        self._sorted = array('f', [0.0] * samples)  # 排序用的预分配工作区
+        self.reset()
+
+    def reset(self):
+        self._index = 0
+        self._count = 0
+
+    def ready(self):
+        return self._count >= self.samples
+
+    def update(self, x):
+        ring = self._ring
+        ring[self._index] = x
+        self._index += 1
+        if self._index >= self.samples:
+            self._index = 0
+        if self._count < self.samples:
+            self._count += 1
+
+        # 小窗口下插入排序最快，且不分配新数组
+        work = self._sorted
+        n = self._count
+        for i in range(n):
+            v = ring[i]
+            j = i - 1
+            while j >= 0 and work[j] > v:
+                work[j + 1] = work[j]
+                j -= 1
+            work[j + 1] = v
+        if n & 1:
+            return work[n >> 1]
+        return (work[(n >> 1) - 1] + work[n >> 1]) / 2
+
+    def state(self):
+        return [self._index, self._count] + list(self._ring)
+
+    def restore(self, values, offset=0):
+        self._index = int(values[offset])
+        self._count = int(values[offset + 1])
+        for i in range(self.samples):
+            self._ring[i] = values[offset + 2 + i]
+        return offset + 2 + self.samples
+
+
+# 一维卡尔曼滤波(恒定值模型): q为过程噪声方差，r为测量噪声方差
+class Kalman:
+    def __init__(self, q=0.01, r=0.5):
+        if q <= 0 or r <= 0:
+            raise ValueError('卡尔曼滤波噪声参数必须大于0')
+        self.q = q
+        self.r = r
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._p = 1.0
+
+    def ready(self):
+        return self._value is not None
+
+    def update(self, x):
+        if self._value is None:
+            self._value = x
+            self._p = self.r
+            return x
+        p = self._p + self.q
+        k = p / (p + self.r)
+        self._value += k * (x - self._value)
+        self._p = (1 - k) * p
+        return self._value
+
+    def state(self):
+        if self._value is None:
+            return [0.0, 0.0, 0.0]
+        return [1.0, self._value, self._p]
+
+    def restore(self, values, offset=0):
+        if values[offset]:
+            self._value = values[offset + 1]
+            self._p = values[offset + 2]
+        else:
+            self.reset()
+        return offset + 3
+
+
+# 滤波器串联
+class FilterChain:
+    def __init__(self, filters):
+        self.filters = tuple(filters)
+
+    def reset(self):
+        for f in self.filters:
+            f.reset()
+
+    def ready(self):
+        for f in self.filters:
+            if not f.ready():
+                return False
+        return True
+
+    def update(self, x):
+        for f in self.filters:
+            x = f.update(x)
+        return x
+
+    def state(self):
+        values = []
+        for f in self.filters:
+            values.extend(f.state())
+        return values
+
+    def restore(self, values, offset=0):
+        for f in self.filters:
+            offset = f.restore(values, offset)
+        return offset
+
+
+# 按配置字符串构建滤波链，例如 'median,ema' 表示先中值去尖峰再做EMA
+# 可选: ma(滑动平均), ema, median, kalman
+def build_chain(spec='ma', samples=5, ema_alpha=0.3, median_samples=5, kalman_q=0.01, kalman_r=0.5):
+    filters = []
+    for name in spec.split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name == 'ma':
+            filters.append(MovingAverage(samples))
+        elif name == 'ema':
+            filters.append(ExponentialMovingAverage(ema_alpha))
+        elif name == 'median':
+            filters.append(Median(median_samples))
+        elif name == 'kalman':
+            filters.append(Kalman(kalman_q, kalman_r))
+        else:
+            raise ValueError(f'未知的温度滤波器: {name}')
+    return FilterChain(filters)
@@ -0,0 +1,5 @@
+# pytest公共设置: 把host/加入导入路径，测试中可直接from sim import Simulation
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'host'))
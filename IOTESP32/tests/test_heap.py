@@ -0,0 +1,22 @@
+# 主循环稳态分配预算: 仿真中用tracemalloc近似gc.mem_alloc()，每轮平均分配超出预算时run()抛出AssertionError
+import pytest
+
+from sim import Simulation
+
+BUDGET = 1024  # 与bench/bench_heap.py的--budget默认值一致
+
+
+@pytest.mark.parametrize('mode', ('main_loop', 'threads'))
+def test_main_loop_within_heap_budget(mode):
+    with Simulation(mode, heap_budget=BUDGET, TEMP_SAMPLE_INTERVAL=200) as sim:
+        sim.control(500, r=120)
+        sim.run(3.0)
+        stats = sim.main.heap.stats()
+        assert stats['iterations'] > 0
+        assert stats['alloc_avg'] <= BUDGET
+
+
+def test_exceeding_heap_budget_fails():
+    with Simulation('main_loop', heap_budget=1, TEMP_SAMPLE_INTERVAL=200) as sim:
+        with pytest.raises(AssertionError, match='超出预算'):
+            sim.run(2.0)
@@ -0,0 +1,74 @@
+# 在仿真中运行未修改的main.py，检查控制、断网补发、MQTT重连和无效读数处理
+import pytest
+
+import esp32
+from broker import BROKER
+from sim import Simulation, MODES
+
+INTERVAL = 200
+
+
+# 相邻样本的采样时间戳间隔都不超过1.5个采样周期，且没有重复样本
+def assert_no_gaps(samples):
+    stamps = sorted(ts for _, ts, _ in samples)
+    assert len(stamps) == len(set(stamps))
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    assert max(gaps) <= INTERVAL * 1.5, gaps
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_led_follows_control(mode):
+    with Simulation(mode, TEMP_SAMPLE_INTERVAL=INTERVAL) as sim:
+        sim.control(300, r=200, g=40, b=10)
+        sim.control(900, r=30, g=0, b=120)
+        sim.run(1.5)
+        latencies, lost = sim.control_latencies()
+        assert lost == 0
+        assert max(latencies) < 500
+        assert sim.frames()[-1][1][0] == (30, 0, 120)
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_replays_samples_after_wifi_outage(mode):
+    outage_at, outage = 1000, 1500
+    with Simulation(mode, TEMP_SAMPLE_INTERVAL=INTERVAL) as sim:
+        sim.wifi_outage(outage_at, outage)
+        sim.run(4.0)
+        samples = sim.samples()
+        during = [s for s in samples if outage_at + 100 <= sim.elapsed(s[1]) < outage_at + outage]
+        assert during, '断网期间的样本没有补发'
+        assert all(sim.elapsed(t) >= outage_at + outage for t, _, _ in during)
+        assert_no_gaps(samples)
+        assert sim.elapsed(samples[-1][1]) >= 3500
+        assert len(sim.main.sample_buffer) == 0
+
+
+@pytest.mark.parametrize('mode', MODES)
+@pytest.mark.parametrize('fault', ('outage', 'kick'))
+def test_reconnects_to_broker(mode, fault):
+    with Simulation(mode, TEMP_SAMPLE_INTERVAL=INTERVAL) as sim:
+        if fault == 'outage':
+            sim.broker_outage(1000, 1000)
+        else:
+            sim.at(1000, BROKER.kick)
+        sim.control(3000, r=90)
+        sim.run(4.0)
+        assert BROKER.connects >= 2
+        samples = sim.samples()
+        assert_no_gaps(samples)
+        assert sim.elapsed(samples[-1][1]) >= 3500
+        assert sim.control_latencies()[1] == 0
+
+
+@pytest.mark.parametrize('mode', ('main_loop', 'asyncio'))
+@pytest.mark.parametrize('chain', ('ma', 'ema', 'kalman'))
+@pytest.mark.parametrize('bad', (float('nan'), 500.0))
+def test_invalid_reading_never_reaches_filter(mode, chain, bad):
+    with Simulation(mode, TEMP_SAMPLE_INTERVAL=100, TEMP_FILTER_CHAIN=chain) as sim:
+        main = sim.load()
+        esp32.set_temperature_source(esp32.sequence([25.0] * 3 + [bad] + [25.0] * 26))
+        sim.run(3.0)
+        values = [value for _, _, value in sim.samples()]
+        assert len(values) >= 20
+        assert all(value == 25.0 for value in values)
+        assert main.temperature_sensor.invalid == 1
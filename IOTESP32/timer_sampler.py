@@ -0,0 +1,174 @@
+# 硬件定时器驱动的采样
+# machine.Timer按固定子周期触发，中断回调只记录时刻并通过micropython.schedule把读取交给解释器，
+# 每oversample个子样本取平均(抽取)后写入无锁环形缓冲区，主循环或采样任务再取出交给发布路径。
+# 这样采样时刻只取决于定时器，不再受慢速发布、重连或主循环休眠的影响:
+#   - 每个输出样本的时间戳是其子样本读取时刻的中点(oversample为1时即读取时刻)
+#   - 环形缓冲区单生产者(调度回调)单消费者(drain)，各自只修改自己的索引，满时丢弃新样本并计数
+#   - 上一次调度的读取尚未执行时又到了下一个触发点(解释器被长时间占用)，记为错过
+# 时间戳数组使用'L'(32位)，ticks_ms在2^30处回绕，不会溢出。
+import time
+from array import array
+
+import micropython
+from machine import Timer
+
+_NAN = float('nan')
+
+
+class TimerSampler:
+    # sensor: sensors.Sensor，使用其acquire()读取原始值，process()在消费端做偏移和滤波
+    def __init__(self, sensor, period, oversample=1, ring_size=32, timer_id=0):
+        if oversample < 1:
+            raise ValueError('过采样倍数必须大于0')
+        if period // oversample < 1:
+            raise ValueError('定时采样的子周期必须至少1ms')
+        if ring_size < 2:
+            raise ValueError('采样环形缓冲区至少2条')
+        self.sensor = sensor
+        self.period = period
+        self.oversample = oversample
+        self.sub_period = period // oversample
+        self.timer_id = timer_id
+        self.timer = None
+        self._size = ring_size
+        self._timestamps = array('L', [0] * ring_size)
+        self._values = array('f', [0.0] * ring_size)
+        self._head = 0  # 只由生产者修改
+        self._tail = 0  # 只由消费者修改
+        # 预先绑定方法，中断回调中调度时不需要分配内存
+        self._tick_ref = self._tick
+        self._acquire_ref = self._acquire
+        self._pending = False
+        self._tick_time = 0
+        self._slot = 0  # 当前触发点在抽取窗口中的位置
+        self._tick_slot = 0
+        self._sum = 0.0
+        self._count = 0
+        self._first = None  # 当前抽取窗口第一个子样本的读取时刻
+        self._last_acquire = None
+        self.ticks = 0
+        self.samples = 0
+        self.missed = 0  # 错过的触发点
+        self.overflows = 0  # 缓冲区满而丢弃的样本
+        self.jitter_ms = 0  # 相邻两次读取的间隔与子周期之差的绝对值，累计
+        self.jitter_max = 0
+        self.latency_ms = 0  # 从定时器触发到实际读取的延迟，累计
+        self.latency_max = 0
+        self.acquired = 0
+
+    def __len__(self):
+        return (self._head - self._tail) % self._size
+
+    def start(self):
+        self.stop()
+        self._slot = 0
+        self._sum = 0.0
+        self._count = 0
+        self._first = None
+        self._last_acquire = None
+        self.timer = Timer(self.timer_id)
+        self.timer.init(mode=Timer.PERIODIC, period=self.sub_period, callback=self._tick_ref)
+
+    # 修改输出样本周期；定时器运行中时按新的子周期重新启动，当前未完成的抽取窗口丢弃
+    def set_period(self, period):
+        if period // self.oversample < 1:
+            raise ValueError('定时采样的子周期必须至少1ms')
+        self.period = period
+        self.sub_period = period // self.oversample
+        if self.timer is not None:
+            self.start()
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    # 定时器中断回调: 只记录时刻并调度读取，不读取传感器、不分配内存
+    def _tick(self, timer):
+        self.ticks += 1
+        slot = self._slot
+        self._slot = 0 if slot + 1 >= self.oversample else slot + 1
+        if self._pending:
+            self.missed += 1
+            return
+        self._tick_time = time.ticks_ms()
+        self._tick_slot = slot
+        self._pending = True
+        try:
+            micropython.schedule(self._acquire_ref, 0)
+        except RuntimeError:
+            # 调度队列已满
+            self._pending = False
+            self.missed += 1
+
+    # 由解释器调度执行: 读取一个子样本，抽取窗口结束时把平均值写入环形缓冲区
+    def _acquire(self, _):
+        now = time.ticks_ms()
+        latency = time.ticks_diff(now, self._tick_time)
+        self.latency_ms += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        if self._last_acquire is not None:
+            jitter = abs(time.ticks_diff(now, self._last_acquire) - self.sub_period)
+            self.jitter_ms += jitter
+            if jitter > self.jitter_max:
+                self.jitter_max = jitter
+        self._last_acquire = now
+        self.acquired += 1
+
+        value = self.sensor.acquire()
+        if self._first is None:
+            self._first = now
+        if value is not None:
+            self._sum += value
+            self._count += 1
+        if self._tick_slot == self.oversample - 1:
+            if self._count:
+                self._push(time.ticks_add(self._first, time.ticks_diff(now, self._first) // 2),
+                           self._sum / self._count)
+            else:
+                self._push(now, _NAN)
+            self._sum = 0.0
+            self._count = 0
+            self._first = None
+        self._pending = False
+
+    def _push(self, timestamp, value):
+        head = self._head
+        nxt = head + 1
+        if nxt >= self._size:
+            nxt = 0
+        if nxt == self._tail:
+            self.overflows += 1
+            return
+        self._timestamps[head] = timestamp
+        self._values[head] = value
+        self._head = nxt
+        self.samples += 1
+
+    # 取出缓冲区中的样本，经传感器的偏移和滤波后调用handler(sensor, 时间戳, 值)，读取失败的值为None；返回取出条数
+    def drain(self, handler):
+        count = 0
+        sensor = self.sensor
+        while self._tail != self._head:
+            tail = self._tail
+            timestamp = self._timestamps[tail]
+            value = self._values[tail]
+            self._tail = tail + 1 if tail + 1 < self._size else 0
+            handler(sensor, timestamp, sensor.process(None if value != value else value))
+            count += 1
+        return count
+
+    def stats(self):
+        acquired = self.acquired or 1
+        return {
+            'ticks': self.ticks,
+            'samples': self.samples,
+            'missed': self.missed,
+            'overflows': self.overflows,
+            'queued': len(self),
+            'jitter_avg': self.jitter_ms // acquired,
+            'jitter_max': self.jitter_max,
+            'latency_avg': self.latency_ms // acquired,
+            'latency_max': self.latency_max,
+        }
@@ -0,0 +1,152 @@
+# MQTT的TLS传输
+# TLSContext在运行期间只创建一次: CA证书、客户端证书和私钥只在创建时读取和解析，之后每次重连复用同一个SSL上下文。
+# 每次连接成功后保存TLS会话(TLS 1.2的会话ID或会话票据，TLS 1.3的会话票据)，下次重连带上该会话做简化握手，
+# 省去证书链的传输和验证以及签名运算(TLS 1.2还少一次往返)；代理不接受时自动退回完整握手，计入rejected。
+# 接口与SSLContext相同(wrap_socket/wrap_bio)，可直接作为umqtt.simple的ssl参数和asyncio.open_connection的ssl参数。
+# SNI和证书验证始终使用server_hostname，连接快速启动缓存的代理IP时也按代理主机名验证。
+# 包装前给socket设置TCP_NODELAY: 简化握手以客户端的Finished结束，紧接着的CONNECT(以及umqtt分几次写出的报文)
+# 否则要等对端确认上一段才发出，遇到延迟确认时每次多等几十毫秒。
+# 固件的ssl模块不支持会话参数时只复用SSL上下文，不做会话恢复。
+import socket
+import ssl
+import time
+
+
+class TLSContext:
+    # ca_file为None时不验证代理证书(仅用于测试)；cert_file/key_file用于双向认证
+    # on_handshake(resumed, ms): 每次握手完成后调用，ms为阻塞握手的耗时，握手在事件循环中进行时为None
+    def __init__(self, server_hostname, ca_file=None, cert_file=None, key_file=None, resume=True, on_handshake=None,
+                 nodelay=True):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        if ca_file:
+            context.load_verify_locations(cafile=ca_file)
+            context.verify_mode = ssl.CERT_REQUIRED
+        else:
+            if hasattr(context, 'check_hostname'):
+                context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        if cert_file:
+            context.load_cert_chain(cert_file, key_file)
+        self.context = context
+        self.server_hostname = server_hostname
+        self.verified = bool(ca_file)
+        self.resume = resume
+        self.on_handshake = on_handshake
+        self.nodelay = nodelay
+        self.session = None  # 下次连接使用的TLS会话
+        self._conn = None  # 最近一次建立的TLS连接，连接成功后从中取出会话
+        self._offered = False  # 最近一次连接是否带了会话
+        self._pending = False  # 最近一次连接的握手尚未统计(握手在事件循环中进行)
+        self.full = 0  # 完整握手次数
+        self.resumed = 0  # 会话恢复次数
+        self.rejected = 0  # 带会话连接但代理要求完整握手的次数
+        self.failures = 0  # 握手失败次数
+        self.full_ms = 0  # 最近一次完整握手耗时(毫秒)
+        self.resumed_ms = 0  # 最近一次会话恢复耗时(毫秒)
+
+    # 带上保存的会话调用SSLContext的方法；ssl模块不接受会话参数时之后不再尝试
+    def _wrap(self, fn, *args, **kwargs):
+        self._offered = self.resume and self.session is not None
+        if self._offered:
+            try:
+                return fn(*args, session=self.session, **kwargs)
+            except TypeError:
+                self.resume = False
+                self.session = None
+                self._offered = False
+        return fn(*args, **kwargs)
+
+    # 握手失败: 丢弃会话，下一次做完整握手
+    def _failed(self):
+        self.failures += 1
+        self.session = None
+        self._conn = None
+
+    # 统计一次完成的握手；固件不提供session_reused时按是否带了会话判断
+    def _handshake_done(self, conn, ms):
+        self._pending = False
+        resumed = getattr(conn, 'session_reused', None)
+        if resumed is None:
+            resumed = self._offered
+        if resumed:
+            self.resumed += 1
+            if ms is not None:
+                self.resumed_ms = ms
+        else:
+            self.full += 1
+            if ms is not None:
+                self.full_ms = ms
+            if self._offered:
+                self.rejected += 1
+        if self.on_handshake is not None:
+            self.on_handshake(resumed, ms)
+
+    # 包装已连接的socket(umqtt.simple在connect()中调用)；do_handshake_on_connect为False时握手由调用方推进
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True, server_hostname=None):
+        if self.nodelay:
+            _set_nodelay(sock)
+        start = time.ticks_ms()
+        try:
+            conn = self._wrap(self.context.wrap_socket, sock, server_side=server_side,
+                              do_handshake_on_connect=do_handshake_on_connect,
+                              server_hostname=self.server_hostname)
+        except Exception:
+            self._failed()
+            raise
+        self._conn = conn
+        self._pending = True
+        if do_handshake_on_connect:
+            self._handshake_done(conn, time.ticks_diff(time.ticks_ms(), start))
+        return conn
+
+    # 包装内存BIO(CPython的asyncio流在事件循环中握手时调用)
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None):
+        conn = self._wrap(self.context.wrap_bio, incoming, outgoing, server_side=server_side,
+                          server_hostname=self.server_hostname)
+        self._conn = conn
+        self._pending = True
+        return conn
+
+    # 连接成功后调用(已收到代理的CONNACK等报文)，保存会话供下次重连使用；
+    # TLS 1.3的会话票据在握手之后才由代理发来，所以不能在握手刚完成时保存
+    def save_session(self):
+        conn = self._conn
+        if conn is None:
+            return False
+        self._conn = None
+        if self._pending:
+            self._handshake_done(conn, None)
+        session = getattr(conn, 'session', None) if self.resume else None
+        if session is None:
+            return False
+        self.session = session
+        return True
+
+    # 连接没有成功时调用；握手尚未完成(异步客户端的握手失败或超时)时计为握手失败并丢弃会话
+    def connect_failed(self):
+        if self._conn is not None and self._pending:
+            self._failed()
+        self._conn = None
+
+    def stats(self):
+        return {
+            'full': self.full,
+            'resumed': self.resumed,
+            'rejected': self.rejected,
+            'failures': self.failures,
+            'full_ms': self.full_ms,
+            'resumed_ms': self.resumed_ms,
+            'session': self.session is not None,
+        }
+
+
+# 关闭Nagle算法；固件的socket模块没有TCP_NODELAY时跳过
+def _set_nodelay(sock):
+    nodelay = getattr(socket, 'TCP_NODELAY', None)
+    if nodelay is None:
+        return False
+    try:
+        sock.setsockopt(getattr(socket, 'IPPROTO_TCP', 6), nodelay, 1)
+        return True
+    except (OSError, AttributeError):
+        return False
@@ -0,0 +1,214 @@
+# WiFi连接管理器
+# 非阻塞状态机: 空闲(idle) -> 连接中(connecting) -> 已连接(connected)，
+# 单次尝试超时或失败后进入退避(backoff)，退避时间按指数增长并带随机抖动。
+# poll()每次只推进一步且从不等待，可在主循环或uasyncio任务中反复调用。
+# 设置了快速重连参数(上次成功连接的BSSID、信道和静态IP)时，首次尝试跳过扫描和DHCP，
+# 失败则清除这些参数并立即按常规流程重试。
+import time
+import network
+
+try:
+    import random
+except ImportError:
+    import urandom as random
+
+STATE_IDLE = 0
+STATE_CONNECTING = 1
+STATE_CONNECTED = 2
+STATE_BACKOFF = 3
+STATE_NAMES = ('idle', 'connecting', 'connected', 'backoff')
+
+# 表示本次连接尝试已明确失败的状态码(不同固件版本可能缺少其中某些常量)
+_FAIL_STATUSES = tuple(
+    getattr(network, name) for name in ('STAT_WRONG_PASSWORD', 'STAT_NO_AP_FOUND', 'STAT_CONNECT_FAIL')
+    if hasattr(network, name)
+)
+
+
+def _default_log(message, level='INFO', *args):
+    print(f'[{level}] {message.format(*args) if args else message}')
+
+
+class WifiManager:
+    def __init__(self, ssid, password, connect_timeout=15000, backoff_min=1000,
+                 backoff_max=60000, reset_after=5, log=None):
+        self.ssid = ssid
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.reset_after = reset_after  # 连续失败多少次后重启网络接口
+        self.log = log or _default_log
+
+        self.wlan = network.WLAN(network.STA_IF)
+        self.state = STATE_IDLE
+        self.failures = 0  # 连续失败次数
+        self.attempts = 0  # 累计连接尝试次数
+        self.disconnects = 0  # 已连接后掉线次数
+        self._state_since = time.ticks_ms()
+        self._backoff_ms = 0
+        self._fast = None  # (bssid, channel, ifconfig)
+        self._fast_attempt = False
+        self.fast_connects = 0  # 使用快速重连参数成功连接的次数
+        self.last_connect_fast = False  # 最近一次连接是否使用了快速重连参数
+
+    def isconnected(self):
+        return self.state == STATE_CONNECTED and self.wlan.isconnected()
+
+    def state_name(self):
+        return STATE_NAMES[self.state]
+
+    # 设置快速重连参数，下一次连接尝试直接使用
+    def set_fast_params(self, bssid, channel, ifconfig):
+        self._fast = (bssid, channel, ifconfig)
+
+    # 获取当前连接的快速重连参数: 扫描一次找到信号最强的同名AP，返回(bssid, channel, ifconfig)
+    def fast_params(self):
+        bssid = None
+        channel = 0
+        try:
+            ssid = self.ssid.encode() if isinstance(self.ssid, str) else self.ssid
+            best_rssi = -1000
+            for ap in self.wlan.scan():
+                if ap[0] == ssid and ap[3] > best_rssi:
+                    bssid, channel, best_rssi = ap[1], ap[2], ap[3]
+        except Exception as e:
+            self.log('扫描AP失败: {}', 'WARNING', e)
+        return bssid, channel, self.wlan.ifconfig()
+
+    def _start_fast_attempt(self):
+        bssid, channel, ifconfig = self._fast
+        self._fast_attempt = True
+        # 静态IP跳过DHCP，指定BSSID跳过扫描
+        self.wlan.ifconfig(ifconfig)
+        if channel:
+            try:
+                self.wlan.config(channel=channel)
+            except Exception:
+                pass  # 部分固件不允许在STA模式下设置信道
+        if bssid:
+            self.wlan.connect(self.ssid, self.password, bssid=bssid)
+        else:
+            self.wlan.connect(self.ssid, self.password)
+
+    def _enter(self, state):
+        self.state = state
+        self._state_since = time.ticks_ms()
+
+    # 计算下一次退避时长: 指数增长，取一半固定加一半随机(equal jitter)，避免设备同时重连
+    def _next_backoff(self):
+        base = self.backoff_min << min(self.failures - 1, 16)
+        if base > self.backoff_max:
+            base = self.backoff_max
+        half = base // 2
+        return half + (random.getrandbits(16) * (base - half) >> 16)
+
+    def _start_attempt(self):
+        self.attempts += 1
+        try:
+            # 连续失败过多时重启网络接口(原main_loop中的恢复手段)
+            if self.reset_after and self.failures and self.failures % self.reset_after == 0:
+                self.log('WiFi连续连接失败，重启网络接口', 'WARNING')
+                self.wlan.active(False)
+            if not self.wlan.active():
+                self.wlan.active(True)
+            self.log('连接WiFi: {} (第{}次尝试)', 'INFO', self.ssid, self.attempts)
+            if self._fast:
+                self._start_fast_attempt()
+            else:
+                self._fast_attempt = False
+                self.wlan.connect(self.ssid, self.password)
+            self._enter(STATE_CONNECTING)
+        except Exception as e:
+            self.log('启动WiFi连接失败: {}', 'ERROR', e)
+            self._fail()
+
+    def _fail(self):
+        try:
+            self.wlan.disconnect()
+        except Exception:
+            pass
+        # 快速重连失败: 丢弃缓存参数，恢复DHCP后立即走常规流程，不计入失败次数
+        if self._fast_attempt:
+            self.log('快速重连失败，改用常规连接', 'WARNING')
+            self._fast = None
+            self._fast_attempt = False
+            try:
+                self.wlan.ifconfig('dhcp')
+            except Exception:
+                pass
+            self._enter(STATE_IDLE)
+            return
+        self.failures += 1
+        self._backoff_ms = self._next_backoff()
+        self.log('WiFi连接失败({}次)，{}ms后重试', 'WARNING', self.failures, self._backoff_ms)
+        self._enter(STATE_BACKOFF)
+
+    # 推进状态机一步，返回当前状态
+    def poll(self):
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self._state_since)
+
+        if self.state == STATE_IDLE:
+            if self.wlan.active() and self.wlan.isconnected():
+                self._enter(STATE_CONNECTED)
+            else:
+                self._start_attempt()
+
+        elif self.state == STATE_CONNECTING:
+            if self.wlan.isconnected():
+                self.log('WiFi已连接: {} (用时{}ms{})', 'INFO', self.wlan.ifconfig()[0], elapsed,
+                         ', 快速重连' if self._fast_attempt else '')
+                self.last_connect_fast = self._fast_attempt
+                if self._fast_attempt:
+                    self.fast_connects += 1
+                self.failures = 0
+                self._enter(STATE_CONNECTED)
+            elif elapsed >= self.connect_timeout:
+                self.log('WiFi连接超时({}ms)', 'WARNING', self.connect_timeout)
+                self._fail()
+            elif _FAIL_STATUSES and self.wlan.status() in _FAIL_STATUSES:
+                self.log('WiFi连接被拒绝，状态码: {}', 'WARNING', self.wlan.status())
+                self._fail()
+
+        elif self.state == STATE_CONNECTED:
+            if not self.wlan.isconnected():
+                self.disconnects += 1
+                self.log('WiFi连接已断开，立即重连', 'WARNING')
+                self._start_attempt()
+
+        elif self.state == STATE_BACKOFF:
+            if elapsed >= self._backoff_ms:
+                self._start_attempt()
+
+        return self.state
+
+    # 断开并关闭网络接口(低功耗模式下每个发布窗口结束后调用)
+    def power_off(self):
+        try:
+            self.wlan.disconnect()
+            self.wlan.active(False)
+        except Exception:
+            pass
+        self._enter(STATE_IDLE)
+
+    # 有界阻塞连接(用于启动阶段)：超时返回False，期间以sleep_ms让出CPU
+    def connect(self, timeout=None, poll_interval=50):
+        if timeout is None:
+            timeout = self.connect_timeout
+        start = time.ticks_ms()
+        while self.poll() != STATE_CONNECTED:
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout:
+                return False
+            time.sleep_ms(poll_interval)
+        return True
+
+    # uasyncio任务：周期性推进状态机
+    async def run(self, poll_interval=200):
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        while True:
+            self.poll()
+            await asyncio.sleep(poll_interval / 1000)